@@ -0,0 +1,155 @@
+"""SQLite engine configuration.
+
+Two modes, selected with the SQLITE_MODE environment variable:
+- production (default): WAL journal, synchronous=NORMAL, mmap and page cache
+  pragmas, and a real connection pool where each session owns its connection.
+  Readers never block the writer; concurrent writers wait on busy_timeout.
+- static: legacy behaviour, every thread shares one connection (StaticPool).
+
+In-memory databases (sqlite:// or :memory:) are per-connection, so they always
+use StaticPool.
+
+Tuning:
+- SQLITE_MMAP_SIZE: bytes to memory-map (default 256MB)
+- SQLITE_CACHE_SIZE_KB: page cache per connection in KB (default 64MB)
+- SQLITE_BUSY_TIMEOUT_MS: how long a writer waits for the lock (default 5000)
+"""
+
+import logging
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool, StaticPool
+
+logger = logging.getLogger(__name__)
+
+PRODUCTION = "production"
+STATIC = "static"
+
+
+def is_memory_url(database_url: str) -> bool:
+    """Whether the URL points to an in-memory SQLite database."""
+    path = database_url.split("://", 1)[-1].lstrip("/")
+    return not path or path.startswith(":memory:") or "mode=memory" in database_url
+
+
+def sqlite_pragmas() -> dict:
+    """PRAGMAs applied to every new connection in production mode."""
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024))),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "temp_store": "MEMORY",
+    }
+
+
+def create_sqlite_engine(
+    database_url: str,
+    mode: str = None,
+    pool_size: int = 10,
+    max_overflow: int = 20,
+    pool_timeout: int = 30,
+    **kwargs,
+):
+    """Create a SQLite engine.
+
+    Args:
+        database_url: SQLite connection URL
+        mode: "production" or "static" (defaults to SQLITE_MODE)
+        pool_size / max_overflow / pool_timeout: pool settings for production mode
+        **kwargs: extra create_engine arguments (e.g. echo)
+    """
+    mode = (mode or os.getenv("SQLITE_MODE", PRODUCTION)).lower()
+    connect_args = {"check_same_thread": False}
+
+    if mode != PRODUCTION or is_memory_url(database_url):
+        return create_engine(
+            database_url,
+            poolclass=StaticPool,
+            connect_args=connect_args,
+            **kwargs,
+        )
+
+    # Connections move between threads via the pool but are never shared at once
+    engine = create_engine(
+        database_url,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        connect_args=connect_args,
+        **kwargs,
+    )
+    apply_sqlite_pragmas(engine)
+    logger.info(f"SQLite production mode: WAL, pool {pool_size}+{max_overflow}")
+    return engine
+
+
+def apply_sqlite_pragmas(engine):
+    """Run the production PRAGMAs on every new DBAPI connection of a sync engine."""
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def async_database_url(database_url: str) -> str:
+    """Map a sync database URL to its async driver (aiosqlite / asyncpg)."""
+    scheme, sep, rest = database_url.partition("://")
+    driver = scheme.split("+", 1)[0]
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if driver in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return database_url
+
+
+def create_async_database_engine(
+    database_url: str,
+    mode: str = None,
+    pool_size: int = 10,
+    max_overflow: int = 20,
+    pool_timeout: int = 30,
+    **kwargs,
+):
+    """Create an AsyncEngine for the same database as ``database_url``.
+
+    SQLite gets the same mode handling and PRAGMAs as create_sqlite_engine.
+    Requires aiosqlite (SQLite) or asyncpg (PostgreSQL), plus greenlet.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    url = async_database_url(database_url)
+    if not url.startswith("sqlite"):
+        return create_async_engine(
+            url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_pre_ping=True,
+            **kwargs,
+        )
+
+    mode = (mode or os.getenv("SQLITE_MODE", PRODUCTION)).lower()
+    if mode != PRODUCTION or is_memory_url(database_url):
+        return create_async_engine(url, poolclass=StaticPool, **kwargs)
+
+    engine = create_async_engine(
+        url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        **kwargs,
+    )
+    apply_sqlite_pragmas(engine.sync_engine)
+    return engine
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite 并发基准测试
+
+混合读写负载：读线程按主键随机查询，写线程模拟渲染进度更新。对比
+- static：共享单连接（StaticPool），写线程各自提交
+- production：WAL + 连接池，写线程各自提交
+- production + writer：WAL + 连接池，写入经单写线程队列合并提交
+
+用法：
+    python benchmarks/bench_sqlite_concurrency.py [读线程数] [写线程数] [秒数]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.sqlite_mode import create_sqlite_engine
+from services.db_writer import DatabaseWriter
+
+ROWS = 20000
+TASKS = 64
+
+
+def prepare(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE assets (id INTEGER PRIMARY KEY, name TEXT, payload TEXT)"))
+        conn.execute(text("CREATE TABLE render_tasks (id TEXT PRIMARY KEY, status TEXT, progress REAL)"))
+        conn.execute(
+            text("INSERT INTO assets VALUES (:id, :name, :payload)"),
+            [{"id": i, "name": f"asset_{i}", "payload": "x" * 200} for i in range(ROWS)],
+        )
+        conn.execute(
+            text("INSERT INTO render_tasks VALUES (:id, 'processing', 0)"),
+            [{"id": f"task_{i}"} for i in range(TASKS)],
+        )
+
+
+def run(mode: str, use_writer: bool, readers: int, writers: int, seconds: float):
+    workdir = tempfile.mkdtemp()
+    engine = create_sqlite_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}", mode=mode)
+    prepare(engine)
+    Session = sessionmaker(bind=engine)
+    writer = DatabaseWriter(Session) if use_writer else None
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    read_latency, write_latency, errors = [], [], [0]
+
+    def read_loop():
+        session = Session()
+        local = []
+        rng = random.Random()
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                session.execute(text("SELECT name, payload FROM assets WHERE id = :id"),
+                                {"id": rng.randrange(ROWS)}).fetchone()
+                local.append(time.perf_counter() - start)
+            except Exception:
+                errors[0] += 1
+                session.rollback()
+        session.close()
+        with lock:
+            read_latency.extend(local)
+
+    def write_loop(index: int):
+        session = Session()
+        local = []
+        progress = 0
+        while not stop.is_set():
+            task_id = f"task_{(index * 7 + progress) % TASKS}"
+            progress += 1
+            params = {"p": progress, "id": task_id}
+            sql = "UPDATE render_tasks SET progress = :p WHERE id = :id"
+            start = time.perf_counter()
+            try:
+                if writer is not None:
+                    writer.execute(sql, params, key=("render_tasks", task_id))
+                else:
+                    session.execute(text(sql), params)
+                    session.commit()
+                local.append(time.perf_counter() - start)
+            except Exception:
+                errors[0] += 1
+                session.rollback()
+            time.sleep(0.001)   # 进度回调间隔
+        session.close()
+        with lock:
+            write_latency.extend(local)
+
+    threads = [threading.Thread(target=read_loop) for _ in range(readers)]
+    threads += [threading.Thread(target=write_loop, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    if writer is not None:
+        writer.flush()
+        transactions = writer.stats()["transactions"]
+        writer.close()
+    else:
+        transactions = len(write_latency)
+    engine.dispose()
+
+    def p95(values):
+        return float(np.percentile(values, 95)) * 1000 if values else float("nan")
+
+    return {
+        "reads_per_s": len(read_latency) / seconds,
+        "read_p95_ms": p95(read_latency),
+        "writes_per_s": len(write_latency) / seconds,
+        "write_p95_ms": p95(write_latency),
+        "commits": transactions,
+        "errors": errors[0],
+    }
+
+
+def main():
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 3.0
+    print(f"读线程 {readers}, 写线程 {writers}, {seconds:.0f}s")
+    print(f"{'模式':<22}{'读/秒':>10}{'读p95(ms)':>12}{'写/秒':>10}{'写p95(ms)':>12}{'提交数':>10}{'错误':>8}")
+    for label, mode, use_writer in (
+        ("static", "static", False),
+        ("production", "production", False),
+        ("production + writer", "production", True),
+    ):
+        r = run(mode, use_writer, readers, writers, seconds)
+        print(f"{label:<22}{r['reads_per_s']:>10.0f}{r['read_p95_ms']:>12.3f}"
+              f"{r['writes_per_s']:>10.0f}{r['write_p95_ms']:>12.3f}{r['commits']:>10}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
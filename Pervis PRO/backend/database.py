@@ -5,7 +5,7 @@ Phase 2: 使用SQLite进行快速开发，后续可切换PostgreSQL
 
 from sqlalchemy import create_engine, Column, String, Integer, Float, Text, DateTime, JSON
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.pool import StaticPool
+from app.sqlite_mode import async_database_url, create_async_database_engine, create_sqlite_engine
 from datetime import datetime
 import os
 
@@ -28,11 +28,12 @@ except ImportError:
 
 # 数据库引擎配置
 if "sqlite" in DATABASE_URL:
-    # SQLite配置 - 使用StaticPool以支持多线程
-    engine = create_engine(
+    # SQLite配置 - 默认 WAL + 连接池（SQLITE_MODE=static 恢复共享单连接）
+    engine = create_sqlite_engine(
         DATABASE_URL,
-        poolclass=StaticPool,
-        connect_args={"check_same_thread": False},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
         echo=False  # 生产环境关闭SQL日志
     )
 else:
@@ -391,8 +392,11 @@ class ImageVector(Base):
 
 # 数据库初始化
 def init_database():
-    """创建所有表"""
+    """创建所有表（含 FTS5 全文索引表，首次创建时从已有数据回填）"""
     Base.metadata.create_all(bind=engine)
+    from services.text_index import ensure_index
+    with engine.begin() as conn:
+        ensure_index(conn)
 
 # 数据库会话依赖
 def get_db():
@@ -400,4 +404,49 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# ============================================================
+# 异步数据库（SQLAlchemy AsyncSession + aiosqlite / asyncpg）
+# ============================================================
+
+# 与同步引擎指向同一个库；ASYNC_DATABASE_URL 可单独指定
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """获取异步引擎（首次调用时创建；缺少 aiosqlite / asyncpg 时抛出 ImportError）"""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_database_engine(
+            ASYNC_DATABASE_URL,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            echo=False
+        )
+    return _async_engine
+
+
+def get_async_session_factory():
+    """异步会话工厂（提交后不过期，返回的 ORM 对象在会话关闭后仍可读取）"""
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+        _async_session_factory = async_sessionmaker(
+            get_async_engine(),
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False
+        )
+    return _async_session_factory
+
+
+# 异步数据库会话依赖（每个请求一个 AsyncSession）
+async def get_async_db():
+    async with get_async_session_factory()() as db:
+        yield db
\ No newline at end of file
@@ -8,6 +8,7 @@ if env_path.exists():
 else:
     load_dotenv()  # 尝试加载当前目录的 .env
 
+import asyncio
 import logging
 import os
 
@@ -120,6 +121,10 @@ async def startup_event():
 
         await start_batch_processor()
         logger.info("批量处理器已启动")
+
+        from services.text_encoder import warmup_text_encoder
+
+        asyncio.create_task(warmup_text_encoder())
     except Exception as e:
         logger.error(f"启动事件失败: {e}")
 
@@ -12,6 +12,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 import uvicorn
+import asyncio
 import os
 import logging
 
@@ -157,6 +158,14 @@ async def startup_event():
         from services.batch_processor import start_batch_processor
         await start_batch_processor()
         logger.info("批量处理器已启动")
+        
+        # 启动素材库目录监听
+        from services.library_watcher import get_library_watcher
+        await get_library_watcher().start_enabled()
+        
+        # 预热共享文本编码模型（TEXT_ENCODER_WARMUP=1，后台加载不阻塞启动）
+        from services.text_encoder import warmup_text_encoder
+        asyncio.create_task(warmup_text_encoder())
     except Exception as e:
         logger.error(f"启动事件失败: {e}")
 
@@ -168,6 +177,14 @@ async def shutdown_event():
         from services.batch_processor import stop_batch_processor
         await stop_batch_processor()
         logger.info("批量处理器已停止")
+        
+        # 停止素材库目录监听
+        from services.library_watcher import shutdown_library_watcher
+        await shutdown_library_watcher()
+        
+        # 落盘任务注册表
+        from services.task_registry import shutdown_task_registry
+        shutdown_task_registry()
     except Exception as e:
         logger.error(f"关闭事件失败: {e}")
 
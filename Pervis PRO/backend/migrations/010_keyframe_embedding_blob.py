@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Migration 010: 关键帧视觉嵌入改为二进制列
+keyframes.visual_embedding（JSON 浮点数组）转换为 visual_embedding_blob（小端 float32），
+并记录 embedding_dim；转换后清空 JSON 列
+"""
+
+import json
+
+from sqlalchemy import inspect, text
+
+BATCH_SIZE = 500
+
+
+def upgrade(engine):
+    """执行迁移"""
+    import numpy as np
+
+    if not inspect(engine).has_table("keyframes"):
+        print("⏭️ Migration 010: keyframes 表不存在，跳过")
+        return
+
+    columns = {c["name"] for c in inspect(engine).get_columns("keyframes")}
+    with engine.connect() as conn:
+        if "visual_embedding_blob" not in columns:
+            conn.execute(text("ALTER TABLE keyframes ADD COLUMN visual_embedding_blob BLOB"))
+        if "embedding_dim" not in columns:
+            conn.execute(text("ALTER TABLE keyframes ADD COLUMN embedding_dim INTEGER DEFAULT 0"))
+        conn.commit()
+
+        converted = 0
+        while True:
+            rows = conn.execute(text("""
+                SELECT id, visual_embedding FROM keyframes
+                WHERE visual_embedding IS NOT NULL AND visual_embedding_blob IS NULL
+                LIMIT :limit
+            """), {"limit": BATCH_SIZE}).fetchall()
+            if not rows:
+                break
+
+            for row_id, raw in rows:
+                embedding = json.loads(raw) if isinstance(raw, str) else raw
+                if embedding is None:
+                    conn.execute(text(
+                        "UPDATE keyframes SET visual_embedding = NULL, has_embedding = 0 WHERE id = :id"
+                    ), {"id": row_id})
+                    continue
+                conn.execute(text("""
+                    UPDATE keyframes
+                    SET visual_embedding_blob = :blob, embedding_dim = :dim, visual_embedding = NULL
+                    WHERE id = :id
+                """), {
+                    "blob": np.asarray(embedding, dtype="<f4").tobytes(),
+                    "dim": len(embedding),
+                    "id": row_id,
+                })
+            conn.commit()
+            converted += len(rows)
+
+        print(f"✅ Migration 010: 关键帧嵌入已转换为二进制列（{converted} 条）")
+
+
+def downgrade(engine):
+    """回滚迁移（二进制嵌入写回 JSON 列，保留新增列）"""
+    import numpy as np
+
+    if not inspect(engine).has_table("keyframes"):
+        return
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id, visual_embedding_blob FROM keyframes WHERE visual_embedding_blob IS NOT NULL"
+        )).fetchall()
+        for row_id, blob in rows:
+            conn.execute(text("""
+                UPDATE keyframes SET visual_embedding = :embedding, visual_embedding_blob = NULL
+                WHERE id = :id
+            """), {
+                "embedding": json.dumps(np.frombuffer(blob, dtype="<f4").tolist()),
+                "id": row_id,
+            })
+        conn.commit()
+        print("✅ Migration 010: 关键帧嵌入已还原为 JSON 列")
+
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, str(__file__).replace("migrations/010_keyframe_embedding_blob.py", ""))
+    from database import engine
+    upgrade(engine)
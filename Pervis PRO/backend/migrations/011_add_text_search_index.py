@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Migration 011: 添加 FTS5 全文检索索引
+创建 text_documents / text_fts（见 services/text_index.py），并从已有数据重建索引：
+assets.processing_metadata 中的转录片段、关键帧描述、视觉摘要，以及 asset_segments 描述。
+完成后写入已回填标记，TextSearchIndex.available() 以此判断索引可用。
+可重复执行（切换 TEXT_INDEX_TOKENIZER 后重新运行以重建索引）
+"""
+
+
+def upgrade(engine):
+    """执行迁移"""
+    from services.text_index import rebuild_index
+
+    with engine.connect() as conn:
+        indexed = rebuild_index(conn)
+        if indexed is None:
+            print("⏭️ Migration 011: 数据库不支持 FTS5，跳过")
+            return
+        conn.commit()
+        print(f"✅ Migration 011: 全文检索索引创建成功（{indexed} 条文档）")
+
+
+def downgrade(engine):
+    """回滚迁移"""
+    from services.text_index import drop_schema, fts5_supported
+
+    with engine.connect() as conn:
+        if not fts5_supported(conn):
+            return
+        drop_schema(conn)
+        conn.commit()
+        print("✅ Migration 011: 全文检索索引已删除")
+
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, str(__file__).replace("migrations/011_add_text_search_index.py", ""))
+    from database import engine
+    upgrade(engine)
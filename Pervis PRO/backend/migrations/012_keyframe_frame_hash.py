@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Migration 012: 关键帧感知哈希
+keyframes 新增 frame_hash（16 位十六进制感知哈希）、end_timestamp、duplicate_count，
+并为已有缩略图补算哈希（算法与 KeyFrameConfig.hash_algorithm 一致，
+由 KEYFRAME_HASH_ALGORITHM 配置；只补算，不合并已入库的关键帧）
+"""
+
+import os
+
+from sqlalchemy import inspect, text
+
+BATCH_SIZE = 500
+
+
+def upgrade(engine):
+    """执行迁移"""
+    if not inspect(engine).has_table("keyframes"):
+        print("⏭️ Migration 012: keyframes 表不存在，跳过")
+        return
+
+    columns = {c["name"] for c in inspect(engine).get_columns("keyframes")}
+    with engine.connect() as conn:
+        if "frame_hash" not in columns:
+            conn.execute(text("ALTER TABLE keyframes ADD COLUMN frame_hash VARCHAR(16)"))
+        if "end_timestamp" not in columns:
+            conn.execute(text("ALTER TABLE keyframes ADD COLUMN end_timestamp FLOAT"))
+        if "duplicate_count" not in columns:
+            conn.execute(text("ALTER TABLE keyframes ADD COLUMN duplicate_count INTEGER DEFAULT 0"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_keyframes_frame_hash ON keyframes (frame_hash)"
+        ))
+        conn.commit()
+
+        from PIL import Image
+        from models.keyframe import KeyFrameConfig
+        from services.frame_hash import compute_hash, hash_to_hex
+
+        algorithm = KeyFrameConfig().hash_algorithm
+
+        hashed = 0
+        last_id = 0
+        while True:
+            rows = conn.execute(text("""
+                SELECT id, image_path FROM keyframes
+                WHERE frame_hash IS NULL AND id > :last_id
+                ORDER BY id LIMIT :limit
+            """), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+            if not rows:
+                break
+
+            for row_id, image_path in rows:
+                if not image_path or not os.path.exists(image_path):
+                    continue
+                try:
+                    with Image.open(image_path) as img:
+                        frame_hash = hash_to_hex(compute_hash(img, algorithm))
+                except OSError:
+                    continue
+                conn.execute(text("UPDATE keyframes SET frame_hash = :hash WHERE id = :id"),
+                             {"hash": frame_hash, "id": row_id})
+                hashed += 1
+            conn.commit()
+            last_id = rows[-1][0]
+
+        print(f"✅ Migration 012: 关键帧感知哈希列已添加（{algorithm} 补算 {hashed} 条）")
+
+
+def downgrade(engine):
+    """回滚迁移（删除索引，保留新增列）"""
+    if not inspect(engine).has_table("keyframes"):
+        return
+
+    with engine.connect() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ix_keyframes_frame_hash"))
+        conn.commit()
+        print("✅ Migration 012: 关键帧哈希索引已删除")
+
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, str(__file__).replace("migrations/012_keyframe_frame_hash.py", ""))
+    from database import engine
+    upgrade(engine)
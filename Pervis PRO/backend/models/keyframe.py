@@ -8,11 +8,13 @@ Task: 6.2 关键帧数据模型
 定义关键帧的数据结构和配置类。
 """
 
+import os
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 from sqlalchemy import (
     Boolean,
     Column,
@@ -21,6 +23,7 @@ from sqlalchemy import (
     ForeignKey,
     Integer,
     JSON,
+    LargeBinary,
     String,
     Text,
 )
@@ -46,6 +49,13 @@ class ExtractionStrategy(str, Enum):
 # 配置数据类
 # ============================================================
 
+def _default_scene_threshold() -> float:
+    """场景检测阈值默认值（与 VideoPreprocessor 相同，共享场景切点缓存）"""
+    from services.scene_detection import SceneDetectionParams
+
+    return SceneDetectionParams.from_env().threshold
+
+
 @dataclass
 class KeyFrameConfig:
     """关键帧提取配置"""
@@ -54,10 +64,17 @@ class KeyFrameConfig:
     max_frames: int = 20             # 最大帧数
     interval_seconds: float = 5.0    # 固定间隔（秒）
     motion_threshold: float = 0.3    # 运动阈值
-    scene_threshold: float = 30.0    # 场景变化阈值
+    scene_threshold: float = field(  # 场景变化阈值，默认与预处理共用 SCENE_DETECT_THRESHOLD
+        default_factory=_default_scene_threshold
+    )
     thumbnail_width: int = 320       # 缩略图宽度
     thumbnail_height: int = 180      # 缩略图高度
     thumbnail_format: str = "jpg"    # 缩略图格式
+    dedupe_enabled: bool = True      # 合并近重复帧
+    dedupe_threshold: int = 6        # 近重复汉明距离阈值（64 位哈希）
+    hash_algorithm: str = field(     # 感知哈希算法（dhash / phash），迁移补算与提取共用
+        default_factory=lambda: os.getenv("KEYFRAME_HASH_ALGORITHM", "dhash")
+    )
     
     @property
     def thumbnail_size(self) -> Tuple[int, int]:
@@ -84,6 +101,9 @@ class KeyFrameConfig:
             "scene_threshold": self.scene_threshold,
             "thumbnail_size": self.thumbnail_size,
             "thumbnail_format": self.thumbnail_format,
+            "dedupe_enabled": self.dedupe_enabled,
+            "dedupe_threshold": self.dedupe_threshold,
+            "hash_algorithm": self.hash_algorithm,
         }
     
     @classmethod
@@ -98,10 +118,13 @@ class KeyFrameConfig:
             max_frames=data.get("max_frames", 20),
             interval_seconds=data.get("interval_seconds", 5.0),
             motion_threshold=data.get("motion_threshold", 0.3),
-            scene_threshold=data.get("scene_threshold", 30.0),
+            scene_threshold=data.get("scene_threshold", _default_scene_threshold()),
             thumbnail_width=data.get("thumbnail_width", 320),
             thumbnail_height=data.get("thumbnail_height", 180),
             thumbnail_format=data.get("thumbnail_format", "jpg"),
+            dedupe_enabled=data.get("dedupe_enabled", True),
+            dedupe_threshold=data.get("dedupe_threshold", 6),
+            hash_algorithm=data.get("hash_algorithm", os.getenv("KEYFRAME_HASH_ALGORITHM", "dhash")),
         )
 
 
@@ -130,6 +153,11 @@ class KeyFrameData:
     # 视觉嵌入
     visual_embedding: Optional[List[float]] = None
     
+    # 感知哈希（16 位十六进制）；代表帧覆盖到 end_timestamp，并入了 duplicate_count 个近重复帧
+    frame_hash: Optional[str] = None
+    end_timestamp: Optional[float] = None
+    duplicate_count: int = 0
+    
     # 图像尺寸
     image_width: int = 320
     image_height: int = 180
@@ -154,6 +182,9 @@ class KeyFrameData:
             "is_scene_start": self.is_scene_start,
             "has_embedding": self.visual_embedding is not None,
             "image_size": self.image_size,
+            "frame_hash": self.frame_hash,
+            "end_timestamp": self.end_timestamp,
+            "duplicate_count": self.duplicate_count,
         }
     
     @classmethod
@@ -174,9 +205,33 @@ class KeyFrameData:
             visual_embedding=data.get("visual_embedding"),
             image_width=data.get("image_width", 320),
             image_height=data.get("image_height", 180),
+            frame_hash=data.get("frame_hash"),
+            end_timestamp=data.get("end_timestamp"),
+            duplicate_count=data.get("duplicate_count", 0),
         )
 
 
+# ============================================================
+# 嵌入编码
+# ============================================================
+
+EMBEDDING_DTYPE = np.dtype("<f4")   # 小端 float32
+
+
+def pack_embedding(embedding: Optional[List[float]]) -> Optional[bytes]:
+    """嵌入 → 紧凑 float32 二进制"""
+    if embedding is None:
+        return None
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def unpack_embedding(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    """紧凑 float32 二进制 → 向量（只读视图，不复制）"""
+    if blob is None:
+        return None
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+
+
 # ============================================================
 # 数据库模型
 # ============================================================
@@ -209,7 +264,14 @@ class KeyFrame(Base):
     contrast = Column(Float, default=0.0)
     dominant_colors = Column(JSON, default=list)
     
-    # 视觉嵌入（存储为 JSON）
+    # 感知哈希与近重复合并
+    frame_hash = Column(String(16), nullable=True, index=True)
+    end_timestamp = Column(Float, nullable=True)
+    duplicate_count = Column(Integer, default=0)
+    
+    # 视觉嵌入（紧凑 float32 二进制；visual_embedding 为旧版 JSON 列，迁移 010 后为空）
+    visual_embedding_blob = Column(LargeBinary, nullable=True)
+    embedding_dim = Column(Integer, default=0)
     visual_embedding = Column(JSON, nullable=True)
     has_embedding = Column(Boolean, default=False)
     
@@ -217,7 +279,20 @@ class KeyFrame(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_data(self) -> KeyFrameData:
+    def get_embedding(self) -> Optional[List[float]]:
+        """视觉嵌入（优先二进制列，兼容未迁移的 JSON 列）"""
+        if self.visual_embedding_blob is not None:
+            return unpack_embedding(self.visual_embedding_blob).tolist()
+        return self.visual_embedding
+    
+    def set_embedding(self, embedding: Optional[List[float]]):
+        """写入视觉嵌入（二进制列）"""
+        self.visual_embedding_blob = pack_embedding(embedding)
+        self.embedding_dim = len(embedding) if embedding is not None else 0
+        self.visual_embedding = None
+        self.has_embedding = embedding is not None
+    
+    def to_data(self, include_embedding: bool = True) -> KeyFrameData:
         """转换为数据类"""
         return KeyFrameData(
             keyframe_id=self.keyframe_id,
@@ -232,32 +307,54 @@ class KeyFrame(Base):
             contrast=self.contrast,
             dominant_colors=self.dominant_colors or [],
             is_scene_start=self.is_scene_start,
-            visual_embedding=self.visual_embedding,
+            visual_embedding=self.get_embedding() if include_embedding else None,
             image_width=self.image_width,
             image_height=self.image_height,
+            frame_hash=self.frame_hash,
+            end_timestamp=self.end_timestamp,
+            duplicate_count=self.duplicate_count or 0,
         )
     
+    # 重复保存时更新的列（frame_index / 尺寸等创建后不变）
+    UPDATABLE_COLUMNS = (
+        "timestamp", "timecode", "image_path", "scene_id", "motion_score",
+        "brightness", "contrast", "dominant_colors", "is_scene_start",
+        "frame_hash", "end_timestamp", "duplicate_count",
+        "visual_embedding_blob", "embedding_dim", "visual_embedding", "has_embedding",
+    )
+    
+    @staticmethod
+    def data_mapping(data: KeyFrameData) -> Dict[str, Any]:
+        """数据类 → 列值字典（供 bulk_insert_mappings / bulk_update_mappings 使用）"""
+        embedding = data.visual_embedding
+        return {
+            "keyframe_id": data.keyframe_id,
+            "asset_id": data.asset_id,
+            "frame_index": data.frame_index,
+            "timestamp": data.timestamp,
+            "timecode": data.timecode,
+            "image_path": data.image_path,
+            "image_width": data.image_width,
+            "image_height": data.image_height,
+            "scene_id": data.scene_id,
+            "is_scene_start": data.is_scene_start,
+            "motion_score": data.motion_score,
+            "brightness": data.brightness,
+            "contrast": data.contrast,
+            "dominant_colors": data.dominant_colors,
+            "frame_hash": data.frame_hash,
+            "end_timestamp": data.end_timestamp,
+            "duplicate_count": data.duplicate_count,
+            "visual_embedding_blob": pack_embedding(embedding),
+            "embedding_dim": len(embedding) if embedding is not None else 0,
+            "visual_embedding": None,
+            "has_embedding": embedding is not None,
+        }
+    
     @classmethod
     def from_data(cls, data: KeyFrameData) -> "KeyFrame":
         """从数据类创建"""
-        return cls(
-            keyframe_id=data.keyframe_id,
-            asset_id=data.asset_id,
-            frame_index=data.frame_index,
-            timestamp=data.timestamp,
-            timecode=data.timecode,
-            image_path=data.image_path,
-            image_width=data.image_width,
-            image_height=data.image_height,
-            scene_id=data.scene_id,
-            is_scene_start=data.is_scene_start,
-            motion_score=data.motion_score,
-            brightness=data.brightness,
-            contrast=data.contrast,
-            dominant_colors=data.dominant_colors,
-            visual_embedding=data.visual_embedding,
-            has_embedding=data.visual_embedding is not None,
-        )
+        return cls(**cls.data_mapping(data))
 
 
 class KeyFrameExtractionJob(Base):
@@ -11,6 +11,9 @@
 - POST /api/libraries/{id}/scan - 扫描素材库
 - POST /api/libraries/{id}/toggle - 切换激活状态
 - POST /api/libraries/{id}/sync - 同步统计信息
+- POST /api/libraries/{id}/watch - 开启目录监听（实时入库）
+- DELETE /api/libraries/{id}/watch - 关闭目录监听
+- GET /api/libraries/watch/status - 目录监听状态
 - GET /api/libraries/validate-path - 验证路径
 - GET /api/libraries/env-config - 获取环境配置
 - POST /api/libraries/import-env - 从环境变量导入
@@ -209,10 +212,11 @@ async def delete_library(
 async def scan_library(
     library_id: int,
     max_files: Optional[int] = Query(None, description="最大扫描文件数"),
+    full: bool = Query(False, description="忽略扫描日志，强制全量扫描"),
     service = Depends(get_library_service)
 ):
-    """扫描素材库"""
-    result = service.scan_library(library_id, max_files=max_files)
+    """扫描素材库（默认增量扫描）"""
+    result = service.scan_library(library_id, max_files=max_files, full_rescan=full)
     
     if result.errors:
         return {
@@ -255,6 +259,49 @@ async def sync_library_stats(
     return result
 
 
+@router.get("/watch/status")
+async def get_watch_status():
+    """获取目录监听状态"""
+    from services.library_watcher import get_library_watcher
+    return get_library_watcher().get_status()
+
+
+async def _set_library_watch(library_id: int, enabled: bool, db: Session):
+    from models.asset_library import AssetLibrary
+    from services.library_watcher import get_library_watcher
+    
+    library = db.query(AssetLibrary).filter(AssetLibrary.id == library_id).first()
+    if not library:
+        raise HTTPException(status_code=404, detail="素材库不存在")
+    
+    watcher = get_library_watcher()
+    if enabled:
+        if not library.is_active:
+            raise HTTPException(status_code=400, detail="素材库未激活")
+        if not await watcher.watch(library):
+            raise HTTPException(status_code=400, detail=f"路径不可访问: {library.path}")
+    else:
+        await watcher.unwatch(library_id)
+    
+    # JSON 列需要整体赋值才能被识别为变更
+    library.extra_metadata = {**(library.extra_metadata or {}), "watch": enabled}
+    db.commit()
+    
+    return {"success": True, "library_id": library_id, "watching": watcher.is_watching(library_id)}
+
+
+@router.post("/{library_id}/watch")
+async def enable_library_watch(library_id: int, db: Session = Depends(get_db)):
+    """开启目录监听：新文件去抖、合批、限流后自动入库"""
+    return await _set_library_watch(library_id, True, db)
+
+
+@router.delete("/{library_id}/watch")
+async def disable_library_watch(library_id: int, db: Session = Depends(get_db)):
+    """关闭目录监听"""
+    return await _set_library_watch(library_id, False, db)
+
+
 @router.get("/{library_id}/assets")
 async def get_library_assets(
     library_id: int,
@@ -7,8 +7,9 @@ Phase 1.3: 集成视频预处理管道（PySceneDetect + Gemini + Milvus）
 import logging
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from database import get_db
+from database import get_db, get_async_db
 from services.asset_processor import AssetProcessor
 from models.base import AssetUploadResponse, AssetStatusResponse, AssetSegment, ProcessingStatus
 import asyncio
@@ -89,7 +90,7 @@ async def upload_asset(
     )
 
 @router.get("/{asset_id}/status", response_model=AssetStatusResponse)
-async def get_asset_status(asset_id: str, db: Session = Depends(get_db)):
+async def get_asset_status(asset_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     查询素材处理状态
     Phase 2: 从数据库获取真实处理状态
@@ -98,7 +99,7 @@ async def get_asset_status(asset_id: str, db: Session = Depends(get_db)):
     asset_processor = AssetProcessor(db)
     
     try:
-        status_data = asset_processor.get_asset_status(asset_id)
+        status_data = await asset_processor.get_asset_status(asset_id)
         
         if status_data["status"] == "error":
             return AssetStatusResponse(
@@ -4,9 +4,9 @@ Phase 4: 批量上传、队列管理、性能监控
 """
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from database import get_db
-from services.batch_processor import get_batch_processor, TaskPriority
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from services.batch_processor import get_batch_processor, TaskPriority, AdmissionRejectedError
 from services.database_service import DatabaseService
 from models.base import AssetCreate
 from pydantic import BaseModel
@@ -36,7 +36,7 @@ async def batch_upload_assets(
     priority: str = Form("normal"),  # low, normal, high, urgent
     enable_transcription: bool = Form(True),
     enable_visual_analysis: bool = Form(True),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     批量上传资产文件
@@ -77,7 +77,7 @@ async def batch_upload_assets(
                 source="batch_upload"
             )
             
-            asset = db_service.create_asset(asset_data)
+            asset = await db_service.create_asset(asset_data)
             
             # 保存上传文件到临时位置
             temp_file_path = await _save_uploaded_file(file)
@@ -111,6 +111,8 @@ async def batch_upload_assets(
             estimated_processing_time=total_estimated_time
         )
         
+    except AdmissionRejectedError as e:
+        raise HTTPException(status_code=503, detail=f"任务队列繁忙，请稍后重试: {str(e)}")
     except HTTPException:
         raise
     except Exception as e:
@@ -185,9 +187,9 @@ async def get_queue_status():
         raise HTTPException(status_code=500, detail=f"队列状态查询失败: {str(e)}")
 
 @router.get("/tasks/history")
-async def get_task_history(limit: int = 100):
+async def get_task_history(limit: int = 100, offset: int = 0):
     """
-    获取任务历史
+    获取任务历史（分页）
     """
     
     try:
@@ -195,12 +197,14 @@ async def get_task_history(limit: int = 100):
             limit = 1000  # 限制最大查询数量
         
         batch_processor = get_batch_processor()
-        history = await batch_processor.get_task_history(limit)
+        history = await batch_processor.get_task_history(limit, offset=max(0, offset))
         
         return {
             "status": "success",
             "tasks": history,
-            "total_count": len(history)
+            "total_count": len(history),
+            "total": batch_processor.registry.count(source=batch_processor.TASK_SOURCE),
+            "offset": max(0, offset)
         }
         
     except Exception as e:
@@ -258,7 +262,9 @@ async def get_processing_stats():
                 "queue_size": queue_status["queue_size"],
                 "running_tasks": queue_status["running_tasks"],
                 "active_workers": queue_status["active_workers"]
-            }
+            },
+            "pools": queue_status["pools"],
+            "per_type": queue_status["per_type"]
         }
         
     except Exception as e:
@@ -267,10 +273,10 @@ async def get_processing_stats():
 @router.post("/process/asset/{asset_id}")
 async def process_single_asset(
     asset_id: str,
-    task_type: str,  # video_processing, transcription, visual_analysis
+    task_type: str,  # video_processing, transcription, visual_analysis, visual_tagging
     priority: str = "normal",
     parameters: Optional[Dict] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     处理单个资产
@@ -278,7 +284,7 @@ async def process_single_asset(
     
     try:
         # 验证任务类型
-        valid_task_types = ["video_processing", "transcription", "visual_analysis"]
+        valid_task_types = ["video_processing", "transcription", "visual_analysis", "visual_tagging"]
         if task_type not in valid_task_types:
             raise HTTPException(
                 status_code=400, 
@@ -296,7 +302,7 @@ async def process_single_asset(
         
         # 检查资产是否存在
         db_service = DatabaseService(db)
-        asset = db_service.get_asset(asset_id)
+        asset = await db_service.get_asset(asset_id)
         if not asset:
             raise HTTPException(status_code=404, detail="资产不存在")
         
@@ -319,6 +325,8 @@ async def process_single_asset(
             "message": f"任务已提交: {task_type}"
         }
         
+    except AdmissionRejectedError as e:
+        raise HTTPException(status_code=503, detail=f"任务队列繁忙，请稍后重试: {str(e)}")
     except HTTPException:
         raise
     except Exception as e:
@@ -4,8 +4,8 @@ Phase 2: 真实数据库存储反馈信息
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from services.database_service import DatabaseService
 from models.base import FeedbackRequest, FeedbackResponse
 import logging
@@ -14,7 +14,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.post("/record", response_model=FeedbackResponse)
-async def record_feedback(request: FeedbackRequest, db: Session = Depends(get_db)):
+async def record_feedback(request: FeedbackRequest, db: AsyncSession = Depends(get_async_db)):
     """
     记录用户反馈
     Phase 2: 存储到数据库，为后续学习算法准备数据
@@ -24,7 +24,7 @@ async def record_feedback(request: FeedbackRequest, db: Session = Depends(get_db
         db_service = DatabaseService(db)
         
         # 创建反馈记录
-        feedback = db_service.create_feedback(
+        feedback = await db_service.create_feedback(
             beat_id=request.beat_id,
             asset_id=request.asset_id,
             segment_id=request.segment_id,
@@ -5,7 +5,8 @@ Phase 4: 融合文本、音频、视觉的综合搜索API
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_async_db
 from services.multimodal_search import MultimodalSearchService as MultimodalSearchEngine
 from services.visual_processor import VisualProcessor
 from pydantic import BaseModel
@@ -194,7 +195,7 @@ async def visual_search(
 async def analyze_visual_features(
     asset_id: str,
     request: VisualAnalysisRequest = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     为指定资产进行视觉特征分析
@@ -207,12 +208,12 @@ async def analyze_visual_features(
         visual_processor = VisualProcessor()
         
         # 检查资产是否存在
-        asset = db_service.get_asset(asset_id)
+        asset = await db_service.get_asset(asset_id)
         if not asset:
             raise HTTPException(status_code=404, detail="资产不存在")
         
         # 检查是否已有视觉分析数据
-        existing_visual_data = db_service.get_visual_data(asset_id)
+        existing_visual_data = await db_service.get_visual_data(asset_id)
         if existing_visual_data and not (request and request.force_reanalyze):
             return {
                 "status": "success",
@@ -233,7 +234,7 @@ async def analyze_visual_features(
         if result["status"] == "success":
             # 存储视觉分析数据
             visual_data = result["visual_analysis"]
-            db_service.store_visual_data(asset_id, visual_data)
+            await db_service.store_visual_data(asset_id, visual_data)
             
             return {
                 "status": "success",
@@ -251,7 +252,7 @@ async def analyze_visual_features(
 @router.get("/visual/status/{asset_id}")
 async def get_visual_analysis_status(
     asset_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取资产的视觉分析状态
@@ -263,12 +264,12 @@ async def get_visual_analysis_status(
         db_service = DatabaseService(db)
         
         # 检查资产是否存在
-        asset = db_service.get_asset(asset_id)
+        asset = await db_service.get_asset(asset_id)
         if not asset:
             raise HTTPException(status_code=404, detail="资产不存在")
         
         # 获取视觉分析数据
-        visual_data = db_service.get_visual_data(asset_id)
+        visual_data = await db_service.get_visual_data(asset_id)
         
         if visual_data:
             visual_summary = visual_data.get("visual_description", {}).get("visual_summary", {})
@@ -296,7 +297,7 @@ async def get_visual_analysis_status(
 async def get_visual_analysis_data(
     asset_id: str,
     include_keyframes: bool = False,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取资产的完整视觉分析数据
@@ -308,12 +309,12 @@ async def get_visual_analysis_data(
         db_service = DatabaseService(db)
         
         # 检查资产是否存在
-        asset = db_service.get_asset(asset_id)
+        asset = await db_service.get_asset(asset_id)
         if not asset:
             raise HTTPException(status_code=404, detail="资产不存在")
         
         # 获取视觉分析数据
-        visual_data = db_service.get_visual_data(asset_id)
+        visual_data = await db_service.get_visual_data(asset_id)
         
         if not visual_data:
             raise HTTPException(status_code=404, detail="视觉分析数据不存在")
@@ -4,16 +4,16 @@ Phase 2: 集成真实的Gemini AI服务和数据库
 """
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.base import ScriptAnalysisRequest, ScriptAnalysisResponse
 from services.script_processor import ScriptProcessor
-from database import get_db
+from database import get_async_db
 from pydantic import BaseModel
 
 router = APIRouter()
 
 @router.post("/analyze", response_model=ScriptAnalysisResponse)
-async def analyze_script(request: ScriptAnalysisRequest, db: Session = Depends(get_db)):
+async def analyze_script(request: ScriptAnalysisRequest, db: AsyncSession = Depends(get_async_db)):
     """
     剧本分析接口
     Phase 2: 使用Gemini AI进行真实的剧本分析
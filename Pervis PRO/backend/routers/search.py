@@ -8,6 +8,7 @@ Task: 3.3 搜索 API
 提供素材搜索接口：
 - POST /api/search - 混合搜索
 - GET /api/search/stats - 搜索统计
+- GET /api/search/facets - 标签分面计数
 """
 
 import logging
@@ -29,6 +30,9 @@ from services.search_service_enhanced import (
     MatchAlgorithm,
     get_enhanced_search_service,
 )
+from services.search_cache import get_search_cache
+from services.store_stats import COVERAGE_FIELDS, FACET_FIELDS
+from services.tag_parser import get_tag_parser
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +52,8 @@ class SearchRequestModel(BaseModel):
     vector_weight: float = Field(default=0.6, ge=0, le=1, description="向量权重")
     top_k: int = Field(default=5, ge=1, le=100, description="返回数量")
     min_score: float = Field(default=0.0, ge=0, le=1, description="最低分数阈值")
+    diversity_lambda: float = Field(default=0.7, ge=0, le=1, description="MMR 相关性权重（1 关闭多样性重排）")
+    max_per_video: int = Field(default=2, ge=0, description="同一视频排在前面的最大数量（0 不限制）")
     
     model_config = ConfigDict(json_schema_extra={
         "example": {
@@ -74,6 +80,8 @@ class EnhancedSearchRequestModel(BaseModel):
     vector_weight: float = Field(default=0.6, ge=0, le=1, description="向量权重")
     top_k: int = Field(default=5, ge=1, le=100, description="返回数量")
     min_score: float = Field(default=0.0, ge=0, le=1, description="最低分数阈值")
+    diversity_lambda: float = Field(default=0.7, ge=0, le=1, description="MMR 相关性权重（1 关闭多样性重排）")
+    max_per_video: int = Field(default=2, ge=0, description="同一视频排在前面的最大数量（0 不限制）")
     deduplicate: bool = Field(default=True, description="是否去重")
     dedupe_threshold: float = Field(default=0.95, ge=0, le=1, description="去重阈值")
     
@@ -116,6 +124,13 @@ class SearchStatsModel(BaseModel):
     indexed_assets: int
     embedding_coverage: float
     tag_coverage: Dict[str, float]
+    cache: Dict[str, Any] = Field(default_factory=dict, description="搜索结果缓存命中率")
+
+
+class SearchFacetsModel(BaseModel):
+    """标签分面统计模型"""
+    total: int
+    facets: Dict[str, Dict[str, int]]
 
 
 # ============================================================
@@ -160,6 +175,8 @@ async def search_assets(request: SearchRequestModel):
             vector_weight=request.vector_weight,
             top_k=request.top_k,
             min_score=request.min_score,
+            diversity_lambda=request.diversity_lambda,
+            max_per_video=request.max_per_video,
         )
         
         # 执行搜索
@@ -176,60 +193,64 @@ async def search_assets(request: SearchRequestModel):
 
 @router.get("/stats", response_model=SearchStatsModel)
 async def get_search_stats():
-    """获取搜索统计信息"""
+    """获取搜索统计信息（读取存储维护的聚合计数器，O(1)）"""
     try:
         service = get_search_service()
         await service.initialize()
         
         store = service.video_store
-        total = await store.count()
-        
-        # 统计嵌入覆盖率
-        embedded_count = 0
-        tag_stats = {
-            "scene_type": 0,
-            "time_of_day": 0,
-            "shot_size": 0,
-            "camera_move": 0,
-            "action_type": 0,
-            "mood": 0,
-            "characters": 0,
-            "vfx": 0,
-        }
-        
-        if hasattr(store, '_segments'):
-            for segment in store._segments.values():
-                if segment.embedding:
-                    embedded_count += 1
-                
-                tags = segment.tags
-                for field in tag_stats:
-                    value = tags.get(field)
-                    if value and value not in ["UNKNOWN", "未知", ""]:
-                        if isinstance(value, list) and value:
-                            tag_stats[field] += 1
-                        elif not isinstance(value, list):
-                            tag_stats[field] += 1
-        
-        # 计算覆盖率
-        embedding_coverage = embedded_count / total if total > 0 else 0
-        tag_coverage = {
-            field: count / total if total > 0 else 0
-            for field, count in tag_stats.items()
-        }
-        
-        return {
-            "total_assets": total,
-            "indexed_assets": total,
-            "embedding_coverage": round(embedding_coverage, 4),
-            "tag_coverage": {k: round(v, 4) for k, v in tag_coverage.items()},
-        }
+        aggregates = getattr(store, "aggregates", None)
+        if aggregates is not None:
+            stats = aggregates.coverage()
+        else:
+            # 不维护聚合计数的存储（Milvus）只返回总数
+            total = await store.count()
+            stats = {
+                "total_assets": total,
+                "indexed_assets": total,
+                "embedding_coverage": 0,
+                "tag_coverage": {field: 0 for field in COVERAGE_FIELDS},
+            }
+        
+        stats["cache"] = get_search_cache().stats()
+        return stats
         
     except Exception as e:
         logger.error(f"获取统计失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"获取统计失败: {str(e)}")
 
 
+@router.get("/facets", response_model=SearchFacetsModel)
+async def get_search_facets(fields: Optional[str] = None):
+    """
+    获取标签分面计数
+    
+    返回 L1/L2 标签各取值的片段数，用于构建过滤器界面。
+    fields 为逗号分隔的字段名，默认返回全部分面字段。
+    """
+    try:
+        service = get_search_service()
+        await service.initialize()
+        
+        requested = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else FACET_FIELDS
+        unknown = [f for f in requested if f not in FACET_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"不支持的分面字段: {', '.join(unknown)}")
+        
+        store = service.video_store
+        aggregates = getattr(store, "aggregates", None)
+        if aggregates is None:
+            return {"total": await store.count(), "facets": {field: {} for field in requested}}
+        
+        return {"total": aggregates.total, "facets": aggregates.facets(requested)}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取分面统计失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"获取分面统计失败: {str(e)}")
+
+
 @router.post("/quick")
 async def quick_search(
     query: str,
@@ -244,33 +265,8 @@ async def quick_search(
     try:
         service = get_search_service()
         
-        # 简单的标签解析
-        tags = {}
-        query_lower = query.lower()
-        
-        # 动作类型
-        if any(k in query for k in ["战斗", "打斗", "攻击"]):
-            tags["action_type"] = "FIGHT"
-        elif any(k in query for k in ["追逐", "追"]):
-            tags["action_type"] = "CHASE"
-        elif any(k in query for k in ["对话", "说话"]):
-            tags["action_type"] = "DIALOGUE"
-        
-        # 情绪
-        if any(k in query for k in ["热血", "燃"]):
-            tags["mood"] = "EPIC"
-        elif any(k in query for k in ["悲伤", "哭"]):
-            tags["mood"] = "SAD"
-        elif any(k in query for k in ["紧张", "危险"]):
-            tags["mood"] = "TENSE"
-        
-        # 角色
-        characters = []
-        for char in ["炭治郎", "善逸", "伊之助", "弥豆子", "义勇"]:
-            if char in query:
-                characters.append(char)
-        if characters:
-            tags["characters"] = characters
+        # 标签词表自动机一次扫描解析查询中的标签
+        tags = get_tag_parser().parse(query)
         
         # 构建请求
         search_request = SearchRequest(
@@ -342,6 +338,8 @@ async def search_assets_enhanced(request: EnhancedSearchRequestModel):
             vector_weight=request.vector_weight,
             top_k=request.top_k,
             min_score=request.min_score,
+            diversity_lambda=request.diversity_lambda,
+            max_per_video=request.max_per_video,
             deduplicate=request.deduplicate,
             dedupe_threshold=request.dedupe_threshold,
         )
@@ -32,71 +32,21 @@ class ScanResponse(BaseModel):
 
 SUPPORTED_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.mp3', '.wav', '.jpg', '.png'}
 
+def _guess_mime_type(ext: str) -> str:
+    """简单推断类型"""
+    if ext in {'.mp4', '.mov', '.avi', '.mkv'}:
+        return "video/mp4"  # 简化
+    if ext in {'.jpg', '.png'}:
+        return "image/jpeg"
+    if ext in {'.mp3', '.wav'}:
+        return "audio/mpeg"
+    return "application/octet-stream"
+
+
 async def scan_directory_task(path: str, recursive: bool, db: Session):
     """后台任务：扫描目录并入库"""
-    logger.info(f"开始扫描目录: {path}")
-    new_count = 0
-    scanned_count = 0
-    
     try:
-        # 规范化路径
-        base_path = Path(path).resolve()
-        if not base_path.exists():
-            logger.error(f"路径不存在: {path}")
-            return
-            
-        # 遍历生成器
-        iterator = base_path.rglob("*") if recursive else base_path.glob("*")
-        
-        for file_path in iterator:
-            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                scanned_count += 1
-                
-                try:
-                    # 检查是否已存在 (通过绝对路径)
-                    # 注意：这里可能性能一般，生产环境应优化为批量查询或BloomFilter
-                    exists = db.query(Asset).filter(Asset.file_path == str(file_path)).first()
-                    
-                    if not exists:
-                        # 创建新资产记录
-                        file_stat = file_path.stat()
-                        
-                        # 简单推断类型
-                        mime_type = "application/octet-stream"
-                        if file_path.suffix.lower() in {'.mp4', '.mov', '.avi', '.mkv'}:
-                            mime_type = "video/mp4" # 简化
-                        elif file_path.suffix.lower() in {'.jpg', '.png'}:
-                            mime_type = "image/jpeg"
-                            
-                        new_asset = Asset(
-                            id=str(uuid.uuid4()),
-                            project_id="default_project",
-                            filename=file_path.name,
-                            file_path=str(file_path),
-                            mime_type=mime_type,
-                            file_size=file_stat.st_size,
-                            processing_status=ProcessingStatus.COMPLETED, # 外部素材默认为完成
-                            # 对于外部素材，我们暂时没有缩略图，后续可以是另一个任务生成
-                            thumbnail_path=None, 
-                            created_at=datetime.fromtimestamp(file_stat.st_ctime),
-                            updated_at=datetime.now()
-                        )
-                        db.add(new_asset)
-                        new_count += 1
-                        
-                        # 每100个提交一次，避免事务过大
-                        if new_count % 100 == 0:
-                            db.commit()
-                            
-                except Exception as e:
-                    logger.error(f"处理文件出错 {file_path}: {e}")
-                    continue
-                    
-        db.commit()
-        logger.info(f"扫描完成: {path}. 扫描: {scanned_count}, 新增: {new_count}")
-        
-    except Exception as e:
-        logger.error(f"扫描任务失败: {e}")
+        scan_directory_task_sync(path, recursive, db)
     finally:
         db.close() # 确保后台任务关闭Session
 
@@ -151,41 +101,63 @@ async def scan_storage(
     )
 
 def scan_directory_task_sync(path: str, recursive: bool, db: Session):
-    """同步版本的扫描逻辑"""
-    # 逻辑同上，只是去掉了 async
+    """
+    同步版本的扫描逻辑
+
+    使用增量扫描器（目录日志跳过未变化的子树），并一次性加载已有路径集合
+    做存在性检查，避免逐文件 SELECT。
+    """
+    from services.library_scanner import IncrementalScanner, load_existing_asset_paths
+
     logger.info(f"开始后台扫描: {path}")
     new_count = 0
-    scanned_count = 0
     try:
         base_path = Path(path).resolve()
-        iterator = base_path.rglob("*") if recursive else base_path.glob("*")
-        for file_path in iterator:
-            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                scanned_count += 1
-                try:
-                    exists = db.query(Asset).filter(Asset.file_path == str(file_path)).first()
-                    if not exists:
-                        file_stat = file_path.stat()
-                        mime_type = "video/mp4" # Simplified
-                        if file_path.suffix.lower() in {'.jpg', '.png'}: mime_type = "image/jpeg"
-                        
-                        new_asset = Asset(
-                            id=str(uuid.uuid4()),
-                            project_id="default_project",
-                            filename=file_path.name,
-                            file_path=str(file_path),
-                            mime_type=mime_type,
-                            file_size=file_stat.st_size,
-                            processing_status=ProcessingStatus.COMPLETED,
-                            thumbnail_path=None,
-                            created_at=datetime.fromtimestamp(file_stat.st_ctime),
-                            updated_at=datetime.now()
-                        )
-                        db.add(new_asset)
-                        new_count += 1
-                        if new_count % 50 == 0: db.commit()
-                except Exception as e:
-                    logger.error(f"File error: {e}")
+        if not base_path.exists():
+            logger.error(f"路径不存在: {path}")
+            return
+
+        scan = IncrementalScanner().scan(
+            str(base_path),
+            recursive=recursive,
+            extensions=SUPPORTED_EXTENSIONS
+        )
+        existing_paths = load_existing_asset_paths(db, str(base_path))
+
+        pending = []
+        for scanned in scan.files:
+            if scanned.path in existing_paths:
+                continue
+            pending.append({
+                "id": str(uuid.uuid4()),
+                "project_id": "default_project",
+                "filename": scanned.name,
+                "file_path": scanned.path,
+                "mime_type": _guess_mime_type(scanned.extension),
+                "source": "external",
+                "processing_status": ProcessingStatus.COMPLETED.value,  # 外部素材默认为完成
+                # 对于外部素材，我们暂时没有缩略图，后续可以是另一个任务生成
+                "thumbnail_path": None,
+                "processing_metadata": {"file_size": scanned.size},
+                "created_at": datetime.fromtimestamp(scanned.mtime)
+            })
+            existing_paths.add(scanned.path)
+
+            # 每500个提交一次，避免事务过大
+            if len(pending) >= 500:
+                db.bulk_insert_mappings(Asset, pending)
+                db.commit()
+                new_count += len(pending)
+                pending = []
+
+        if pending:
+            db.bulk_insert_mappings(Asset, pending)
+            new_count += len(pending)
         db.commit()
+        logger.info(
+            f"扫描完成: {path}. 扫描: {len(scan.files)}, 新增: {new_count}, "
+            f"跳过未变化目录: {scan.dirs_skipped}"
+        )
     except Exception as e:
+        db.rollback()
         logger.error(f"Scan error: {e}")
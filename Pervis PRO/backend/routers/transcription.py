@@ -4,8 +4,8 @@ Phase 4: 音频转录相关的API端点
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from services.database_service import DatabaseService
 from pydantic import BaseModel
 from typing import List, Optional
@@ -36,7 +36,7 @@ class TranscriptionSearchRequest(BaseModel):
 async def transcribe_asset(
     asset_id: str,
     request: TranscriptionRequest = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     为指定资产进行音频转录
@@ -53,12 +53,12 @@ async def transcribe_asset(
         transcriber = AudioTranscriber()
         
         # 检查资产是否存在
-        asset = db_service.get_asset(asset_id)
+        asset = await db_service.get_asset(asset_id)
         if not asset:
             raise HTTPException(status_code=404, detail="资产不存在")
         
         # 检查是否已有转录数据
-        existing_transcription = db_service.get_transcription_data(asset_id)
+        existing_transcription = await db_service.get_transcription_data(asset_id)
         if existing_transcription and not (request and request.force_retranscribe):
             return {
                 "status": "success",
@@ -83,7 +83,7 @@ async def transcribe_asset(
         if result["status"] == "success":
             # 存储转录数据
             transcription_data = result["transcription"]
-            db_service.store_transcription_data(asset_id, transcription_data)
+            await db_service.store_transcription_data(asset_id, transcription_data)
             
             return {
                 "status": "success",
@@ -102,7 +102,7 @@ async def transcribe_asset(
 @router.get("/status/{asset_id}")
 async def get_transcription_status(
     asset_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取资产的转录状态
@@ -112,12 +112,12 @@ async def get_transcription_status(
         db_service = DatabaseService(db)
         
         # 检查资产是否存在
-        asset = db_service.get_asset(asset_id)
+        asset = await db_service.get_asset(asset_id)
         if not asset:
             raise HTTPException(status_code=404, detail="资产不存在")
         
         # 获取转录数据
-        transcription_data = db_service.get_transcription_data(asset_id)
+        transcription_data = await db_service.get_transcription_data(asset_id)
         
         if transcription_data:
             return {
@@ -142,7 +142,7 @@ async def get_transcription_status(
 @router.get("/data/{asset_id}")
 async def get_transcription_data(
     asset_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取资产的完整转录数据
@@ -152,12 +152,12 @@ async def get_transcription_data(
         db_service = DatabaseService(db)
         
         # 检查资产是否存在
-        asset = db_service.get_asset(asset_id)
+        asset = await db_service.get_asset(asset_id)
         if not asset:
             raise HTTPException(status_code=404, detail="资产不存在")
         
         # 获取转录数据
-        transcription_data = db_service.get_transcription_data(asset_id)
+        transcription_data = await db_service.get_transcription_data(asset_id)
         
         if not transcription_data:
             raise HTTPException(status_code=404, detail="转录数据不存在")
@@ -175,7 +175,7 @@ async def get_transcription_data(
 @router.post("/search")
 async def search_transcription_text(
     request: TranscriptionSearchRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     在转录文本中搜索关键词
@@ -185,7 +185,7 @@ async def search_transcription_text(
         db_service = DatabaseService(db)
         
         # 执行搜索
-        results = db_service.search_transcription_text(request.query, request.limit)
+        results = await db_service.search_transcription_text(request.query, request.limit)
         
         return {
             "status": "success",
@@ -10,13 +10,16 @@ Phase 4: API 端点集成
 - POST /api/wizard/generate-content - 内容生成 (Script_Agent/Art_Agent)
 - POST /api/wizard/process-assets - 素材处理 (Art_Agent)
 - GET /api/wizard/task-status/{id} - 任务状态查询
+- GET /api/wizard/tasks - 任务列表（分页）
 - POST /api/wizard/recall-assets - 素材召回 (Storyboard_Agent)
+- POST /api/wizard/recall-assets/batch - 批量素材召回 (Storyboard_Agent)
 - POST /api/wizard/review-content - 内容审核 (Director_Agent)
 """
 
 import asyncio
 import logging
 import sys
+import time
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
@@ -309,41 +312,75 @@ class RecallAssetsResponse(BaseModel):
     placeholder_message: str = ""
     error: Optional[str] = None
 
+class BatchRecallScene(BaseModel):
+    """批量召回中的单个场次"""
+    scene_id: str = Field(..., description="场次ID")
+    query: str = Field("", description="搜索查询")
+    tags: List[str] = Field(default_factory=list, description="标签（key:value，参与标签召回）")
+    filters: Dict[str, Any] = Field(default_factory=dict, description="硬过滤条件（向量召回只在满足条件的素材中进行）")
+
+
+class BatchRecallAssetsRequest(BaseModel):
+    """批量素材召回请求"""
+    scenes: List[BatchRecallScene] = Field(..., min_length=1, max_length=500, description="场次列表")
+    strategy: str = Field("hybrid", description="召回策略: tag_only, vector_only, hybrid")
+    deduplicate: bool = Field(False, description="跨场次去重，同一素材只推荐给得分最高的场次")
+
+
+class BatchRecallAssetsResponse(BaseModel):
+    """批量素材召回响应"""
+    results: List[RecallAssetsResponse] = Field(default_factory=list)
+    total_scenes: int = 0
+    search_time_ms: float = 0.0
+
 
 # ============================================================================
-# 任务存储（内存，生产环境应使用数据库）
+# 任务存储（统一任务注册表，SQLite 持久化）
 # ============================================================================
 
-_tasks: Dict[str, Dict[str, Any]] = {}
+_TASK_SOURCE = "wizard"
+
+
+def _record_to_task(record) -> Dict[str, Any]:
+    """将注册表记录转换为向导任务字典"""
+    return {
+        "task_id": record.task_id,
+        "task_type": record.task_type,
+        "status": record.status,
+        "progress": record.progress,
+        "message": record.message,
+        "result": record.result,
+        "created_at": datetime.utcfromtimestamp(record.created_at).isoformat(),
+        "updated_at": datetime.utcfromtimestamp(record.updated_at).isoformat(),
+        "error": record.error
+    }
 
 
 def _create_task(task_type: str) -> str:
     """创建任务"""
-    task_id = f"task_{uuid4().hex[:12]}"
-    _tasks[task_id] = {
-        "task_id": task_id,
-        "task_type": task_type,
-        "status": TaskStatus.PENDING,
-        "progress": 0.0,
-        "message": "任务已创建",
-        "result": None,
-        "created_at": datetime.utcnow().isoformat(),
-        "updated_at": datetime.utcnow().isoformat(),
-        "error": None
-    }
-    return task_id
+    from services.task_registry import get_task_registry
+    record = get_task_registry().create(
+        task_type,
+        source=_TASK_SOURCE,
+        status=TaskStatus.PENDING,
+        message="任务已创建"
+    )
+    return record.task_id
 
 
 def _update_task(task_id: str, **kwargs):
     """更新任务"""
-    if task_id in _tasks:
-        _tasks[task_id].update(kwargs)
-        _tasks[task_id]["updated_at"] = datetime.utcnow().isoformat()
+    from services.task_registry import get_task_registry
+    get_task_registry().update(task_id, **kwargs)
 
 
 def _get_task(task_id: str) -> Optional[Dict[str, Any]]:
     """获取任务"""
-    return _tasks.get(task_id)
+    from services.task_registry import get_task_registry
+    record = get_task_registry().get(task_id)
+    if record is None or record.source != _TASK_SOURCE:
+        return None
+    return _record_to_task(record)
 
 
 # ============================================================================
@@ -796,6 +833,67 @@ async def get_task_status(task_id: str) -> TaskStatusResponse:
     )
 
 
+@router.get("/tasks")
+async def list_tasks(
+    status: Optional[TaskStatus] = None,
+    task_type: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 50
+) -> Dict[str, Any]:
+    """
+    任务列表接口
+
+    按创建时间倒序分页返回向导任务。
+    """
+    from services.task_registry import get_task_registry
+
+    page = get_task_registry().list_tasks(
+        status=status,
+        task_type=task_type,
+        source=_TASK_SOURCE,
+        offset=offset,
+        limit=min(max(limit, 1), 200)
+    )
+    return {
+        "tasks": [_record_to_task(r) for r in page["items"]],
+        "total": page["total"],
+        "offset": page["offset"],
+        "limit": page["limit"],
+        "has_more": page["has_more"]
+    }
+
+
+def _parse_recall_tags(tags: List[str]) -> Dict[str, Any]:
+    """标签列表转换为标签字典（见 TagParser.parse_tag_list）"""
+    from services.tag_parser import get_tag_parser
+    
+    return get_tag_parser().parse_tag_list(tags)
+
+
+def _to_recall_response(result) -> RecallAssetsResponse:
+    """RecallResult 转换为响应模型"""
+    candidates = [
+        AssetCandidateInfo(
+            candidate_id=c.candidate_id,
+            asset_id=c.asset_id,
+            asset_path=c.asset_path,
+            score=c.score,
+            rank=c.rank,
+            tags=c.tags.get("free_tags", []) if isinstance(c.tags, dict) else [],
+            match_reason=c.match_reason
+        )
+        for c in result.candidates
+    ]
+    
+    return RecallAssetsResponse(
+        scene_id=result.scene_id,
+        candidates=candidates,
+        total_searched=result.total_searched,
+        has_match=result.has_match,
+        placeholder_message=result.placeholder_message
+    )
+
+
 @router.post("/recall-assets", response_model=RecallAssetsResponse)
 async def recall_assets(request: RecallAssetsRequest) -> RecallAssetsResponse:
     """
@@ -810,15 +908,7 @@ async def recall_assets(request: RecallAssetsRequest) -> RecallAssetsResponse:
         
         if storyboard_agent:
             # 转换标签格式
-            tags_dict = {}
-            for tag in request.tags:
-                if ":" in tag:
-                    key, value = tag.split(":", 1)
-                    tags_dict[key] = value
-                else:
-                    if "free_tags" not in tags_dict:
-                        tags_dict["free_tags"] = []
-                    tags_dict["free_tags"].append(tag)
+            tags_dict = _parse_recall_tags(request.tags)
             
             # 调用 Storyboard_Agent 召回
             result = await storyboard_agent.recall_assets(
@@ -828,27 +918,7 @@ async def recall_assets(request: RecallAssetsRequest) -> RecallAssetsResponse:
                 strategy=request.strategy
             )
             
-            # 转换候选格式
-            candidates = [
-                AssetCandidateInfo(
-                    candidate_id=c.candidate_id,
-                    asset_id=c.asset_id,
-                    asset_path=c.asset_path,
-                    score=c.score,
-                    rank=c.rank,
-                    tags=c.tags.get("free_tags", []) if isinstance(c.tags, dict) else [],
-                    match_reason=c.match_reason
-                )
-                for c in result.candidates
-            ]
-            
-            return RecallAssetsResponse(
-                scene_id=result.scene_id,
-                candidates=candidates,
-                total_searched=result.total_searched,
-                has_match=result.has_match,
-                placeholder_message=result.placeholder_message
-            )
+            return _to_recall_response(result)
         
         # 回退：返回空结果
         return RecallAssetsResponse(
@@ -869,6 +939,65 @@ async def recall_assets(request: RecallAssetsRequest) -> RecallAssetsResponse:
         )
 
 
+@router.post("/recall-assets/batch", response_model=BatchRecallAssetsResponse)
+async def recall_assets_batch(request: BatchRecallAssetsRequest) -> BatchRecallAssetsResponse:
+    """
+    批量素材召回接口
+    
+    一次请求召回整部剧本全部场次的候选：查询一次批量编码、
+    一次矩阵乘法完成向量打分，可选跨场次去重。
+    """
+    start_time = time.time()
+    scene_ids = [scene.scene_id for scene in request.scenes]
+    
+    def failed(message: str, error: Optional[str] = None) -> BatchRecallAssetsResponse:
+        return BatchRecallAssetsResponse(
+            results=[
+                RecallAssetsResponse(
+                    scene_id=scene_id,
+                    candidates=[],
+                    has_match=False,
+                    placeholder_message=message,
+                    error=error
+                )
+                for scene_id in scene_ids
+            ],
+            total_scenes=len(scene_ids),
+            search_time_ms=(time.time() - start_time) * 1000
+        )
+    
+    try:
+        storyboard_agent = _get_storyboard_agent()
+        if not storyboard_agent:
+            return failed("Storyboard_Agent 服务不可用")
+        
+        scenes = []
+        for scene in request.scenes:
+            tags_dict = _parse_recall_tags(scene.tags)
+            scenes.append({
+                "scene_id": scene.scene_id,
+                "query": scene.query,
+                "tags": tags_dict if tags_dict else None,
+                "filters": scene.filters or None,
+            })
+        
+        results = await storyboard_agent.recall_assets_batch(
+            scenes,
+            strategy=request.strategy,
+            deduplicate=request.deduplicate
+        )
+        
+        return BatchRecallAssetsResponse(
+            results=[_to_recall_response(r) for r in results],
+            total_scenes=len(results),
+            search_time_ms=(time.time() - start_time) * 1000
+        )
+        
+    except Exception as e:
+        logger.error(f"批量素材召回失败: {e}")
+        return failed(f"召回失败: {str(e)}", str(e))
+
+
 # ============================================================================
 # 新增端点：内容审核
 # ============================================================================
@@ -79,6 +79,47 @@ class AgentTask:
             "updated_at": self.updated_at.isoformat(),
             "completed_at": self.completed_at.isoformat() if self.completed_at else None
         }
+    
+    def to_record_fields(self) -> Dict[str, Any]:
+        """转换为任务注册表字段"""
+        return {
+            "status": self.status.value,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "details": {
+                "agent_type": self.agent_type,
+                "input_data": self.input_data,
+                "review_result": self.review_result,
+                "source": self.source.value
+            }
+        }
+    
+    @classmethod
+    def from_record(cls, record) -> "AgentTask":
+        """从任务注册表记录恢复"""
+        details = record.details or {}
+        return cls(
+            task_id=record.task_id,
+            task_type=record.task_type,
+            agent_type=details.get("agent_type", ""),
+            status=AgentTaskStatus(record.status),
+            progress=record.progress,
+            message=record.message,
+            input_data=details.get("input_data") or {},
+            result=record.result,
+            review_result=details.get("review_result"),
+            source=ContentSource(details.get("source", ContentSource.USER.value)),
+            error=record.error,
+            created_at=datetime.fromtimestamp(record.created_at),
+            updated_at=datetime.fromtimestamp(record.updated_at),
+            completed_at=datetime.fromtimestamp(record.completed_at) if record.completed_at else None
+        )
+
+
+# 已结束的任务状态：从活跃任务表移出，仅保留在任务注册表中
+_FINISHED_STATUSES = (AgentTaskStatus.COMPLETED, AgentTaskStatus.FAILED, AgentTaskStatus.CANCELLED)
 
 
 @dataclass
@@ -103,8 +144,12 @@ class AgentService:
     4. 返回结果
     """
     
+    TASK_SOURCE = "agent"
+    
     def __init__(self):
+        # 仅保存进行中的任务；全部任务状态由任务注册表持久化
         self._tasks: Dict[str, AgentTask] = {}
+        self._registry = None
         self._llm_adapter = None
         self._callbacks: Dict[str, List[Callable]] = {}
         self._event_service = None
@@ -119,6 +164,13 @@ class AgentService:
                 logger.warning(f"EventService 加载失败: {e}")
         return self._event_service
     
+    def _get_registry(self):
+        """延迟加载任务注册表"""
+        if self._registry is None:
+            from services.task_registry import get_task_registry
+            self._registry = get_task_registry()
+        return self._registry
+    
     def _get_llm_adapter(self):
         """延迟加载 LLM 适配器"""
         if self._llm_adapter is None:
@@ -143,11 +195,20 @@ class AgentService:
             input_data=input_data or {}
         )
         self._tasks[task.task_id] = task
+        registry = self._get_registry()
+        registry.create(task_type, source=self.TASK_SOURCE, task_id=task.task_id)
+        registry.update(task.task_id, **task.to_record_fields())
         return task
     
     def get_task(self, task_id: str) -> Optional[AgentTask]:
         """获取任务"""
-        return self._tasks.get(task_id)
+        task = self._tasks.get(task_id)
+        if task is not None:
+            return task
+        record = self._get_registry().get(task_id)
+        if record is None or record.source != self.TASK_SOURCE:
+            return None
+        return AgentTask.from_record(record)
     
     def update_task(
         self,
@@ -159,7 +220,7 @@ class AgentService:
         error: str = None
     ):
         """更新任务状态"""
-        task = self._tasks.get(task_id)
+        task = self.get_task(task_id)
         if task:
             if status:
                 task.status = status
@@ -176,6 +237,11 @@ class AgentService:
             if status == AgentTaskStatus.COMPLETED:
                 task.completed_at = datetime.now()
             
+            # 同步到任务注册表；结束的任务移出活跃表
+            self._get_registry().update(task_id, **task.to_record_fields())
+            if task.status in _FINISHED_STATUSES:
+                self._tasks.pop(task_id, None)
+            
             # 触发回调
             self._trigger_callbacks(task_id, task)
             
@@ -433,17 +499,21 @@ class AgentService:
         agent_type: str = None,
         limit: int = 100
     ) -> List[AgentTask]:
-        """列出任务"""
-        tasks = list(self._tasks.values())
-        
-        if status:
-            tasks = [t for t in tasks if t.status == status]
-        if agent_type:
-            tasks = [t for t in tasks if t.agent_type == agent_type]
+        """列出任务（按创建时间倒序）"""
+        registry = self._get_registry()
+        if not agent_type:
+            page = registry.list_tasks(status=status, source=self.TASK_SOURCE, limit=limit)
+            return [self._tasks.get(r.task_id) or AgentTask.from_record(r) for r in page["items"]]
         
-        # 按创建时间倒序
-        tasks.sort(key=lambda t: t.created_at, reverse=True)
-        return tasks[:limit]
+        # agent_type 存于 details，需在来源索引上逐条过滤
+        page = registry.list_tasks(status=status, source=self.TASK_SOURCE, limit=registry.count())
+        tasks = []
+        for record in page["items"]:
+            if (record.details or {}).get("agent_type") == agent_type:
+                tasks.append(self._tasks.get(record.task_id) or AgentTask.from_record(record))
+                if len(tasks) >= limit:
+                    break
+        return tasks
     
     def cancel_task(self, task_id: str) -> bool:
         """取消任务"""
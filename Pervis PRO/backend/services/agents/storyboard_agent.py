@@ -7,6 +7,7 @@ Task: 2.6 实现 Storyboard_Agent
 
 提供故事板相关的 AI 功能：
 - 素材召回（返回 Top 5 候选）
+- 批量素材召回（整部剧本一次召回，可跨场次去重）
 - 候选缓存
 - 丝滑切换候选
 - 粗剪（FFmpeg）
@@ -90,13 +91,15 @@ class StoryboardAgentService:
     """
     
     TOP_K = 5  # 返回 Top 5 候选
+    DIVERSITY_LAMBDA = 0.7  # MMR 相关性权重（1.0 关闭）
+    MAX_PER_VIDEO = 2  # 同一源视频排在前面的最大候选数（0 不限制）
     
     def __init__(self, output_dir: str = None):
         self.output_dir = output_dir or "data/rough_cuts"
         self._llm_adapter = None
         self._video_store = None
         self._candidate_cache: Dict[str, List[AssetCandidate]] = {}
-        self._embedding_model = None
+        self._text_encoder = None
     
     def _get_llm_adapter(self):
         """延迟加载 LLM 适配器"""
@@ -119,28 +122,12 @@ class StoryboardAgentService:
                 logger.error(f"视频存储加载失败: {e}")
         return self._video_store
     
-    def _get_embedding_model(self):
-        """延迟加载嵌入模型"""
-        if self._embedding_model is None:
-            try:
-                # 尝试导入 sentence_transformers
-                # 注意：可能因为 NumPy 版本不兼容而失败
-                from sentence_transformers import SentenceTransformer
-                self._embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-                logger.info("嵌入模型加载成功")
-            except ImportError as e:
-                logger.warning(f"sentence_transformers 未安装: {e}")
-                self._embedding_model = False  # 标记为不可用
-            except Exception as e:
-                # NumPy 版本冲突等问题
-                logger.warning(f"嵌入模型加载失败（可能是 NumPy 版本问题）: {e}")
-                logger.info("提示: 可以尝试运行 'pip install numpy<2' 来解决此问题")
-                self._embedding_model = False  # 标记为不可用
-        
-        # 返回 None 如果模型不可用
-        if self._embedding_model is False:
-            return None
-        return self._embedding_model
+    def _get_text_encoder(self):
+        """延迟获取共享文本编码服务"""
+        if self._text_encoder is None:
+            from services.text_encoder import get_text_encoder
+            self._text_encoder = get_text_encoder()
+        return self._text_encoder
     
     async def recall_assets(
         self,
@@ -179,41 +166,24 @@ class StoryboardAgentService:
             if strategy in ["tag_only", "hybrid"] and tags:
                 tag_results = await video_store.search_by_tags(tags, top_k=self.TOP_K * 2)
                 for r in tag_results:
-                    candidates.append(AssetCandidate(
-                        candidate_id=f"cand_{uuid4().hex[:8]}",
-                        asset_id=r.segment.segment_id,
-                        asset_path=r.segment.video_path,
-                        score=r.score,
-                        rank=0,
-                        tags=r.segment.tags,
-                        match_reason=r.match_reason,
-                        thumbnail_path=r.segment.thumbnail_path,
-                        duration=r.segment.duration
-                    ))
+                    candidates.append(self._to_candidate(r, r.match_reason))
             
-            # 向量搜索
-            if strategy in ["vector_only", "hybrid"]:
-                embedding = self._generate_query_embedding(query)
+            # 向量搜索（空查询不编码，避免空串向量召回无关素材）
+            if strategy in ["vector_only", "hybrid"] and query and query.strip():
+                embedding = await self._generate_query_embedding(query)
                 if embedding:
                     vector_results = await video_store.search(
                         embedding, top_k=self.TOP_K * 2
                     )
                     for r in vector_results:
-                        candidates.append(AssetCandidate(
-                            candidate_id=f"cand_{uuid4().hex[:8]}",
-                            asset_id=r.segment.segment_id,
-                            asset_path=r.segment.video_path,
-                            score=r.score,
-                            rank=0,
-                            tags=r.segment.tags,
-                            match_reason="向量相似度匹配",
-                            thumbnail_path=r.segment.thumbnail_path,
-                            duration=r.segment.duration
-                        ))
+                        candidates.append(self._to_candidate(r, "向量相似度匹配"))
             
             # 合并排序
             candidates = self._merge_and_rank(candidates)
             
+            # 多样性重排（避免同一源视频的近似片段占满 Top K）
+            candidates = await self._diversify(video_store, candidates)
+            
             # 取 Top K
             candidates = candidates[:self.TOP_K]
             
@@ -237,15 +207,150 @@ class StoryboardAgentService:
         
         return result
     
-    def _generate_query_embedding(self, query: str) -> Optional[List[float]]:
-        """生成查询向量"""
-        model = self._get_embedding_model()
-        if model:
-            try:
-                return model.encode(query).tolist()
-            except Exception as e:
-                logger.error(f"生成查询向量失败: {e}")
-        return None
+    async def recall_assets_batch(
+        self,
+        scenes: List[Dict[str, Any]],
+        strategy: str = "hybrid",
+        deduplicate: bool = False
+    ) -> List[RecallResult]:
+        """
+        批量素材召回（整部剧本一次召回）
+        
+        全部场次的查询一次批量编码，向量召回用一次矩阵乘法完成，
+        场次的 filters 作为硬过滤条件经标签索引生效。
+        
+        Args:
+            scenes: 场次列表 [{"scene_id", "query", "tags", "filters"}, ...]
+            strategy: 召回策略 (tag_only, vector_only, hybrid)
+            deduplicate: 跨场次去重（场次按多样性排名轮流取素材，同一素材只进入一个场次）
+        
+        Returns:
+            与 scenes 顺序一致的召回结果
+        """
+        if not scenes:
+            return []
+        
+        video_store = self._get_video_store()
+        if not video_store:
+            return [
+                self._return_empty_with_placeholder(s["scene_id"], "视频存储服务不可用")
+                for s in scenes
+            ]
+        
+        # 去重时每个场次需要更大的候选池
+        pool_k = self.TOP_K * (4 if deduplicate else 2)
+        
+        try:
+            await video_store.initialize()
+            
+            pools: List[List[AssetCandidate]] = [[] for _ in scenes]
+            
+            # 标签搜索
+            if strategy in ["tag_only", "hybrid"]:
+                for pool, scene in zip(pools, scenes):
+                    if not scene.get("tags"):
+                        continue
+                    for r in await video_store.search_by_tags(scene["tags"], top_k=pool_k):
+                        pool.append(self._to_candidate(r, r.match_reason))
+            
+            # 向量搜索：一次批量编码 + 一次批量检索（跳过空查询的场次）
+            vector_scenes = [
+                i for i, s in enumerate(scenes) if (s.get("query") or "").strip()
+            ]
+            if strategy in ["vector_only", "hybrid"] and vector_scenes:
+                embeddings = await self._generate_query_embeddings(
+                    [scenes[i]["query"] for i in vector_scenes]
+                )
+                if embeddings:
+                    batch_results = await video_store.search_batch(
+                        embeddings,
+                        top_k=pool_k,
+                        filters=[scenes[i].get("filters") or None for i in vector_scenes]
+                    )
+                    for i, vector_results in zip(vector_scenes, batch_results):
+                        for r in vector_results:
+                            pools[i].append(self._to_candidate(r, "向量相似度匹配"))
+            
+            ranked = [await self._diversify(video_store, self._merge_and_rank(pool)) for pool in pools]
+            if deduplicate:
+                ranked = self._assign_unique(ranked)
+            
+            total_searched = await video_store.count()
+            results = []
+            for scene, candidates in zip(scenes, ranked):
+                candidates = candidates[:self.TOP_K]
+                for i, c in enumerate(candidates):
+                    c.rank = i + 1
+                self._candidate_cache[scene["scene_id"]] = candidates
+                
+                result = RecallResult(
+                    scene_id=scene["scene_id"],
+                    candidates=candidates,
+                    total_searched=total_searched,
+                    has_match=len(candidates) > 0
+                )
+                if not result.has_match:
+                    result.placeholder_message = "未找到匹配的素材，请上传更多素材或调整搜索条件"
+                results.append(result)
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"批量素材召回失败: {e}")
+            return [self._return_empty_with_placeholder(s["scene_id"], str(e)) for s in scenes]
+    
+    def _to_candidate(self, r, match_reason: str) -> AssetCandidate:
+        """存储搜索结果 → 候选"""
+        return AssetCandidate(
+            candidate_id=f"cand_{uuid4().hex[:8]}",
+            asset_id=r.segment.segment_id,
+            asset_path=r.segment.video_path,
+            score=r.score,
+            rank=0,
+            tags=r.segment.tags,
+            match_reason=match_reason,
+            thumbnail_path=r.segment.thumbnail_path,
+            duration=r.segment.duration
+        )
+    
+    def _assign_unique(
+        self,
+        ranked: List[List[AssetCandidate]]
+    ) -> List[List[AssetCandidate]]:
+        """
+        跨场次去重：按场次轮转，每个场次沿自己的多样性重排顺序取下一个未分配素材
+
+        保留每个场次内的 MMR 顺序（不再按全局得分重排），
+        同一素材被多个场次需要时，由轮转中先轮到的场次获得。
+        """
+        assigned: List[List[AssetCandidate]] = [[] for _ in ranked]
+        cursors = [0] * len(ranked)
+        used = set()
+        progress = True
+        while progress:
+            progress = False
+            for scene_index, candidates in enumerate(ranked):
+                if len(assigned[scene_index]) >= self.TOP_K:
+                    continue
+                cursor = cursors[scene_index]
+                while cursor < len(candidates) and candidates[cursor].asset_id in used:
+                    cursor += 1
+                if cursor < len(candidates):
+                    c = candidates[cursor]
+                    used.add(c.asset_id)
+                    assigned[scene_index].append(c)
+                    cursor += 1
+                    progress = True
+                cursors[scene_index] = cursor
+        return assigned
+    
+    async def _generate_query_embedding(self, query: str) -> Optional[List[float]]:
+        """生成查询向量（共享编码服务，命中查询向量缓存时不调用模型）"""
+        return await self._get_text_encoder().encode_one(query)
+    
+    async def _generate_query_embeddings(self, queries: List[str]) -> Optional[List[List[float]]]:
+        """批量生成查询向量（一次编码全部未缓存的查询）"""
+        return await self._get_text_encoder().encode(queries)
     
     def _merge_and_rank(
         self,
@@ -269,6 +374,32 @@ class StoryboardAgentService:
         
         return sorted_candidates
     
+    async def _diversify(
+        self,
+        video_store,
+        candidates: List[AssetCandidate]
+    ) -> List[AssetCandidate]:
+        """MMR + 每视频上限重排（只改变顺序）"""
+        if len(candidates) <= 1:
+            return candidates
+        from services.diversity import mmr_rerank
+        try:
+            embeddings, video_ids = await video_store.diversity_features(
+                [c.asset_id for c in candidates]
+            )
+        except Exception as e:
+            logger.warning(f"多样性重排跳过: {e}")
+            return candidates
+        order = mmr_rerank(
+            [c.score for c in candidates],
+            embeddings,
+            video_ids,
+            top_k=self.TOP_K,
+            diversity_lambda=self.DIVERSITY_LAMBDA,
+            max_per_group=self.MAX_PER_VIDEO,
+        )
+        return [candidates[i] for i in order]
+    
     def _return_empty_with_placeholder(
         self,
         scene_id: str,
@@ -461,11 +592,14 @@ class StoryboardAgentService:
         return self._simple_tokenize(scene_description)
     
     def _simple_tokenize(self, text: str) -> List[str]:
-        """简单分词"""
+        """简单分词：标签词表命中的关键词优先，其余按连续汉字/字母切分"""
         import re
+        from services.tag_parser import get_tag_parser
+        
+        keywords = get_tag_parser().keywords(text)
         # 移除标点，按空格分词
         words = re.findall(r'[\u4e00-\u9fa5]+|[a-zA-Z]+', text)
-        return list(set(words))[:10]
+        return list(dict.fromkeys(keywords + words))[:10]
 
 
 # 全局服务实例
@@ -342,7 +342,8 @@ class AssetLibraryService:
         self,
         library_id: int,
         max_files: int = None,
-        update_stats: bool = True
+        update_stats: bool = True,
+        full_rescan: bool = False
     ) -> ScanResult:
         """
         扫描素材库
@@ -351,6 +352,7 @@ class AssetLibraryService:
             library_id: 素材库ID
             max_files: 最大扫描文件数（用于预览）
             update_stats: 是否更新数据库统计
+            full_rescan: 忽略扫描日志，强制全量扫描
         """
         from models.asset_library import AssetLibrary
         
@@ -377,65 +379,62 @@ class AssetLibraryService:
         extensions = set(library.file_extensions or DEFAULT_VIDEO_EXTENSIONS)
         exclude_patterns = library.exclude_patterns or []
         
-        # 扫描文件
+        # 增量扫描文件（目录 mtime 未变化的子树直接复用扫描日志）
         try:
-            for root, dirs, files in os.walk(library.path):
-                # 检查是否应该排除此目录
-                rel_path = os.path.relpath(root, library.path)
-                if any(pattern in rel_path for pattern in exclude_patterns):
-                    continue
+            from services.library_scanner import IncrementalScanner, load_existing_asset_paths
+            
+            scan = IncrementalScanner().scan(
+                library.path,
+                recursive=bool(library.scan_subdirs),
+                exclude_patterns=exclude_patterns,
+                full=full_rescan
+            )
+            if scan.dirs_scanned + scan.dirs_skipped == 0:
+                result.errors.extend(scan.errors)
+            elif scan.errors:
+                # 与 os.walk 一致：不可读的子目录只记录日志，不中断扫描
+                logger.warning(f"扫描时跳过 {len(scan.errors)} 个不可读目录: {scan.errors[:5]}")
+            result.directories = scan.directories
+            
+            # 与 Asset 表比对：一次性加载已有路径集合
+            existing_paths = load_existing_asset_paths(self.db, library.path)
+            
+            for scanned in scan.files:
+                # 检查最大文件数限制
+                if max_files and result.total_files >= max_files:
+                    break
                 
-                # 记录目录
-                if rel_path != ".":
-                    result.directories.append(rel_path)
+                ext = scanned.extension
                 
-                for filename in files:
-                    # 检查最大文件数限制
-                    if max_files and result.total_files >= max_files:
-                        break
-                    
-                    ext = os.path.splitext(filename)[1].lower()
-                    file_path = os.path.join(root, filename)
-                    
-                    try:
-                        file_size = os.path.getsize(file_path)
-                    except Exception:
-                        file_size = 0
-                    
-                    # 分类文件
-                    if ext in extensions or ext in DEFAULT_VIDEO_EXTENSIONS:
-                        result.video_files += 1
-                        file_type = "video"
-                    elif ext in DEFAULT_IMAGE_EXTENSIONS:
-                        result.image_files += 1
-                        file_type = "image"
-                    elif ext in DEFAULT_AUDIO_EXTENSIONS:
-                        result.audio_files += 1
-                        file_type = "audio"
-                    else:
-                        result.other_files += 1
-                        file_type = "other"
-                        continue  # 跳过不支持的文件类型
-                    
-                    result.total_files += 1
-                    result.total_size_bytes += file_size
-                    
-                    result.file_list.append({
-                        "filename": filename,
-                        "path": file_path,
-                        "rel_path": os.path.relpath(file_path, library.path),
-                        "size": file_size,
-                        "type": file_type,
-                        "extension": ext
-                    })
+                # 分类文件
+                if ext in extensions or ext in DEFAULT_VIDEO_EXTENSIONS:
+                    result.video_files += 1
+                    file_type = "video"
+                elif ext in DEFAULT_IMAGE_EXTENSIONS:
+                    result.image_files += 1
+                    file_type = "image"
+                elif ext in DEFAULT_AUDIO_EXTENSIONS:
+                    result.audio_files += 1
+                    file_type = "audio"
+                else:
+                    result.other_files += 1
+                    continue  # 跳过不支持的文件类型
                 
-                # 如果不扫描子目录，跳出
-                if not library.scan_subdirs:
-                    break
+                result.total_files += 1
+                result.total_size_bytes += scanned.size
+                if scanned.path in existing_paths:
+                    result.existing_assets += 1
+                else:
+                    result.new_assets += 1
                 
-                # 检查最大文件数限制
-                if max_files and result.total_files >= max_files:
-                    break
+                result.file_list.append({
+                    "filename": scanned.name,
+                    "path": scanned.path,
+                    "rel_path": os.path.relpath(scanned.path, library.path),
+                    "size": scanned.size,
+                    "type": file_type,
+                    "extension": ext
+                })
                     
         except Exception as e:
             result.errors.append(f"扫描错误: {e}")
@@ -126,13 +126,13 @@ class AssetProcessor:
                     pil_images = visual_result.get("images", [])
                     # 存储视觉分析数据到数据库
                     visual_data = visual_result["visual_analysis"]
-                    self.db_service.store_visual_data(asset_id, visual_data)
+                    await self.db_service.store_visual_data(asset_id, visual_data)
 
             # 3. AI内容分析 (Multimodal Vision)
             await self.db_service.update_asset_status(asset_id, "processing", 60)
             
             # 获取资产信息用于AI分析
-            asset = self.db_service.get_asset(asset_id)
+            asset = await self.db_service.get_asset(asset_id)
             description = f"视频文件: {asset.filename}"
             
             # 传入关键帧图片进行多模态分析
@@ -150,27 +150,28 @@ class AssetProcessor:
             if ai_result["status"] == "success":
                 ai_data = ai_result["data"]
                 
-                # 创建segment记录
-                for segment_data in ai_data.get("segments", []):
-                    segment = await self.db_service.create_asset_segment(
-                        asset_id=asset_id,
-                        start_time=segment_data.get("start_time", 0),
-                        end_time=segment_data.get("end_time", 10),
-                        description=segment_data.get("description", ""),
-                        tags=segment_data.get("tags", {})
-                    )
-                    
-                    # 准备向量化数据
-                    segments_for_vectors.append({
-                        "id": segment.id,
-                        "description": segment.description,
-                        "tags": {
-                            "emotions": segment.emotion_tags or [],
-                            "scenes": segment.scene_tags or [],
-                            "actions": segment.action_tags or [],
-                            "cinematography": segment.cinematography_tags or []
-                        }
-                    })
+                # 创建segment记录（一个事务内批量提交）
+                async with self.db_service.batch():
+                    for segment_data in ai_data.get("segments", []):
+                        segment = await self.db_service.create_asset_segment(
+                            asset_id=asset_id,
+                            start_time=segment_data.get("start_time", 0),
+                            end_time=segment_data.get("end_time", 10),
+                            description=segment_data.get("description", ""),
+                            tags=segment_data.get("tags", {})
+                        )
+                        
+                        # 准备向量化数据
+                        segments_for_vectors.append({
+                            "id": segment.id,
+                            "description": segment.description,
+                            "tags": {
+                                "emotions": segment.emotion_tags or [],
+                                "scenes": segment.scene_tags or [],
+                                "actions": segment.action_tags or [],
+                                "cinematography": segment.cinematography_tags or []
+                            }
+                        })
                 
                 # 4. 音频转录处理
             await self.db_service.update_asset_status(asset_id, "processing", 80)
@@ -183,7 +184,7 @@ class AssetProcessor:
                 if transcription_result["status"] == "success":
                     # 存储转录数据到数据库
                     transcription_data = transcription_result["transcription"]
-                    self.db_service.store_transcription_data(asset_id, transcription_data)
+                    await self.db_service.store_transcription_data(asset_id, transcription_data)
             
             # 5. [Moved] 视觉特征提取已在步骤2完成
             # 此前逻辑已合并到上方
@@ -327,10 +328,10 @@ class AssetProcessor:
             })
         
         # 获取转录数据
-        transcription_data = self.db_service.get_transcription_data(asset_id)
+        transcription_data = await self.db_service.get_transcription_data(asset_id)
         
         # 获取视觉分析数据
-        visual_data = self.db_service.get_visual_data(asset_id)
+        visual_data = await self.db_service.get_visual_data(asset_id)
         
         return {
             "status": asset.processing_status,
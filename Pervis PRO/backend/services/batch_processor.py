@@ -1,20 +1,31 @@
 """
 批量处理队列管理器
 Phase 4: 并发处理、队列管理、性能优化
+
+调度模型：
+- 每种资源池（CPU 进程池 / IO 线程池 / LLM 槽位）各自维护一个带老化的优先级堆
+- 任务按类型路由到资源池，池内按 (入队时间 - 优先级 × 老化间隔) 出队，低优先级任务不会饿死
+- 提交时按队列深度和系统负载做准入控制
 """
 
 import asyncio
+import heapq
+import itertools
 import json
 import time
-from typing import Dict, Any, List, Optional, Callable
-from dataclasses import dataclass, asdict
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Deque, Tuple
+from dataclasses import dataclass, asdict, field
 from enum import Enum
 from pathlib import Path
 import logging
 import uuid
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import os
 
+from services.task_registry import get_task_registry, TaskRecord
+
 logger = logging.getLogger(__name__)
 
 class TaskStatus(Enum):
@@ -33,7 +44,7 @@ class TaskPriority(Enum):
 @dataclass
 class BatchTask:
     id: str
-    task_type: str  # 'video_processing', 'transcription', 'visual_analysis'
+    task_type: str  # 'video_processing', 'transcription', 'visual_analysis', 'visual_tagging'
     asset_id: str
     file_path: str
     parameters: Dict[str, Any]
@@ -48,37 +59,222 @@ class BatchTask:
     retry_count: int = 0
     max_retries: int = 3
 
+
+class AdmissionRejectedError(Exception):
+    """任务因队列已满或系统负载过高被拒绝"""
+    pass
+
+
+# 资源池名称
+POOL_CPU = "cpu"    # 解码/视觉分析/转录：进程池
+POOL_IO = "io"      # FFmpeg 子进程：线程池
+POOL_LLM = "llm"    # 外部 LLM / 视觉模型调用：并发槽位（在事件循环上 await）
+
+# 任务类型 -> 资源池
+TASK_POOLS: Dict[str, str] = {
+    "video_processing": POOL_IO,
+    "transcription": POOL_CPU,
+    "visual_analysis": POOL_CPU,
+    "visual_tagging": POOL_LLM,
+}
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+# ============================================================
+# 进程池任务（须为模块级函数以便 pickle）
+# ============================================================
+
+_process_visual_processor = None
+_process_transcriber = None
+
+
+def _visual_analysis_job(file_path: str, asset_id: str, sample_interval: float) -> Dict[str, Any]:
+    """在子进程中执行视觉分析；模型在每个工作进程内只加载一次"""
+    global _process_visual_processor
+    if _process_visual_processor is None:
+        from services.visual_processor import VisualProcessor
+        _process_visual_processor = VisualProcessor()
+    return asyncio.run(
+        _process_visual_processor.extract_visual_features(file_path, asset_id, sample_interval)
+    )
+
+
+def _transcription_job(file_path: str, asset_id: str) -> Dict[str, Any]:
+    """在子进程中执行音频转录；模型在每个工作进程内只加载一次"""
+    global _process_transcriber
+    if _process_transcriber is None:
+        from services.audio_transcriber import AudioTranscriber
+        _process_transcriber = AudioTranscriber()
+    return asyncio.run(_process_transcriber.transcribe_audio(file_path, asset_id))
+
+
+# ============================================================
+# 优先级队列（带老化）
+# ============================================================
+
+class AgingPriorityQueue:
+    """
+    带老化的优先级队列
+
+    排序键 = 入队时间 - 优先级 × aging_seconds。等价于每等待 aging_seconds
+    秒优先级提升一级，但键是静态的，可以直接用堆维护。
+    """
+
+    def __init__(self, aging_seconds: float = 30.0):
+        self.aging_seconds = aging_seconds
+        self._heap: List[Tuple[float, int, BatchTask]] = []
+        self._seq = itertools.count()
+        self._removed: set = set()
+        self._not_empty = asyncio.Event()
+
+    def put(self, task: BatchTask, enqueued_at: Optional[float] = None):
+        enqueued_at = time.time() if enqueued_at is None else enqueued_at
+        key = enqueued_at - task.priority.value * self.aging_seconds
+        heapq.heappush(self._heap, (key, next(self._seq), task))
+        self._removed.discard(task.id)
+        self._not_empty.set()
+
+    async def get(self) -> BatchTask:
+        while True:
+            while self._heap:
+                _, _, task = heapq.heappop(self._heap)
+                if task.id in self._removed:
+                    self._removed.discard(task.id)
+                    continue
+                if not self._heap:
+                    self._not_empty.clear()
+                return task
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+    def remove(self, task_id: str) -> Optional[BatchTask]:
+        """惰性删除：标记后在出队时跳过"""
+        for _, _, task in self._heap:
+            if task.id == task_id and task_id not in self._removed:
+                self._removed.add(task_id)
+                return task
+        return None
+
+    def qsize(self) -> int:
+        return len(self._heap) - len(self._removed)
+
+    def snapshot(self) -> List[BatchTask]:
+        return [t for _, _, t in sorted(self._heap) if t.id not in self._removed]
+
+
+@dataclass
+class ResourcePool:
+    """资源池：独立的优先级队列 + 并发上限 + 执行器"""
+    name: str
+    concurrency: int
+    executor: Optional[Any] = None
+    queue: Optional[AgingPriorityQueue] = None
+    running: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "executor": type(self.executor).__name__ if self.executor else None,
+        }
+
+
+@dataclass
+class TypeMetrics:
+    """按任务类型统计的吞吐指标"""
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    total_processing_time: float = 0.0
+    total_wait_time: float = 0.0
+    finished_at: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+
+    def to_dict(self, window: float = 60.0) -> Dict[str, Any]:
+        now = time.time()
+        recent = sum(1 for t in self.finished_at if now - t <= window)
+        done = self.completed + self.failed
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "average_processing_time": self.total_processing_time / done if done else 0.0,
+            "average_wait_time": self.total_wait_time / done if done else 0.0,
+            "throughput_per_min": recent * 60.0 / window,
+        }
+
+
 class BatchProcessor:
     
-    def __init__(self, max_workers: int = None, max_concurrent_tasks: int = 5):
+    TASK_SOURCE = "batch"
+    
+    def __init__(self,
+                 max_workers: int = None,
+                 max_concurrent_tasks: int = 5,
+                 cpu_workers: int = None,
+                 llm_slots: int = 2,
+                 max_queue_size: int = 1000,
+                 max_load_ratio: float = 2.0,
+                 aging_seconds: float = 30.0):
         self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
         self.max_concurrent_tasks = max_concurrent_tasks
+        self.max_queue_size = max_queue_size
+        self.max_load_ratio = max_load_ratio
         
-        # 任务队列和状态管理
-        self.task_queue: asyncio.Queue = asyncio.Queue()
+        # 任务状态管理
         self.running_tasks: Dict[str, BatchTask] = {}
-        self.completed_tasks: Dict[str, BatchTask] = {}
-        self.task_history: List[BatchTask] = []
+        # 已结束的任务只保存在任务注册表中（持久化 + TTL 淘汰）
+        self.registry = get_task_registry()
         
         # 线程池和进程池
+        cpu_workers = cpu_workers or min(4, os.cpu_count() or 1)
         self.thread_executor = ThreadPoolExecutor(max_workers=self.max_workers)
-        self.process_executor = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+        self.process_executor = ProcessPoolExecutor(max_workers=cpu_workers)
+        
+        # 资源池：CPU 进程池 / IO 线程池（FFmpeg）/ LLM 槽位
+        self.pools: Dict[str, ResourcePool] = {
+            POOL_CPU: ResourcePool(POOL_CPU, cpu_workers, self.process_executor),
+            POOL_IO: ResourcePool(POOL_IO, max_concurrent_tasks, self.thread_executor),
+            POOL_LLM: ResourcePool(POOL_LLM, llm_slots, None),
+        }
+        for pool in self.pools.values():
+            pool.queue = AgingPriorityQueue(aging_seconds)
         
         # 统计信息
         self.stats = {
             "total_tasks": 0,
             "completed_tasks": 0,
             "failed_tasks": 0,
+            "rejected_tasks": 0,
             "average_processing_time": 0.0,
             "queue_size": 0,
             "active_workers": 0
         }
+        self.type_metrics: Dict[str, TypeMetrics] = {}
         
         # 控制标志
         self.is_running = False
         self.worker_tasks: List[asyncio.Task] = []
         
-        logger.info(f"批量处理器初始化: {self.max_workers}个工作线程, {max_concurrent_tasks}个并发任务")
+        logger.info(
+            f"批量处理器初始化: CPU进程池 {cpu_workers}, IO并发 {max_concurrent_tasks}, "
+            f"LLM槽位 {llm_slots}, 队列上限 {max_queue_size}"
+        )
+    
+    def _pool_for(self, task_type: str) -> ResourcePool:
+        return self.pools[TASK_POOLS.get(task_type, POOL_IO)]
+    
+    def _metrics_for(self, task_type: str) -> TypeMetrics:
+        metrics = self.type_metrics.get(task_type)
+        if metrics is None:
+            metrics = self.type_metrics[task_type] = TypeMetrics()
+        return metrics
+    
+    def _queue_size(self) -> int:
+        return sum(pool.queue.qsize() for pool in self.pools.values())
     
     async def start(self):
         """启动批量处理器"""
@@ -89,10 +285,11 @@ class BatchProcessor:
         
         self.is_running = True
         
-        # 启动工作协程
-        for i in range(self.max_concurrent_tasks):
-            worker_task = asyncio.create_task(self._worker(f"worker-{i}"))
-            self.worker_tasks.append(worker_task)
+        # 每个资源池按其并发上限启动工作协程
+        for pool in self.pools.values():
+            for i in range(pool.concurrency):
+                worker_task = asyncio.create_task(self._worker(f"{pool.name}-worker-{i}", pool))
+                self.worker_tasks.append(worker_task)
         
         # 启动统计更新协程
         stats_task = asyncio.create_task(self._update_stats())
@@ -121,6 +318,32 @@ class BatchProcessor:
         
         logger.info("批量处理器已停止")
     
+    def check_admission(self, task_type: str, priority: TaskPriority) -> Optional[str]:
+        """
+        准入控制
+        
+        Returns:
+            拒绝原因；None 表示允许提交
+        """
+        
+        if self._queue_size() >= self.max_queue_size:
+            return f"队列已满 ({self.max_queue_size})"
+        
+        # 高优先级任务只受队列上限约束
+        if priority.value >= TaskPriority.HIGH.value:
+            return None
+        
+        if hasattr(os, "getloadavg"):
+            load_ratio = os.getloadavg()[0] / (os.cpu_count() or 1)
+            if load_ratio > self.max_load_ratio:
+                return f"系统负载过高 ({load_ratio:.2f})"
+        
+        pool = self._pool_for(task_type)
+        if pool.queue.qsize() >= pool.concurrency * 50:
+            return f"资源池 {pool.name} 积压过多 ({pool.queue.qsize()})"
+        
+        return None
+    
     async def submit_task(self, 
                          task_type: str,
                          asset_id: str,
@@ -129,6 +352,12 @@ class BatchProcessor:
                          priority: TaskPriority = TaskPriority.NORMAL) -> str:
         """提交批量处理任务"""
         
+        reason = self.check_admission(task_type, priority)
+        if reason:
+            self.stats["rejected_tasks"] += 1
+            self._metrics_for(task_type).rejected += 1
+            raise AdmissionRejectedError(reason)
+        
         task_id = f"task_{uuid.uuid4().hex[:8]}"
         
         task = BatchTask(
@@ -142,11 +371,20 @@ class BatchProcessor:
             created_at=time.time()
         )
         
-        await self.task_queue.put(task)
+        self.registry.create(
+            task_type,
+            source=self.TASK_SOURCE,
+            task_id=task_id,
+            details=self._task_details(task)
+        )
+        
+        pool = self._pool_for(task_type)
+        pool.queue.put(task, task.created_at)
         self.stats["total_tasks"] += 1
-        self.stats["queue_size"] = self.task_queue.qsize()
+        self.stats["queue_size"] = self._queue_size()
+        self._metrics_for(task_type).submitted += 1
         
-        logger.info(f"任务已提交: {task_id} ({task_type})")
+        logger.info(f"任务已提交: {task_id} ({task_type}, {pool.name}, {priority.name})")
         return task_id
     
     async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
@@ -157,17 +395,11 @@ class BatchProcessor:
             task = self.running_tasks[task_id]
             return self._task_to_dict(task)
         
-        # 检查已完成的任务
-        if task_id in self.completed_tasks:
-            task = self.completed_tasks[task_id]
-            return self._task_to_dict(task)
-        
-        # 检查队列中的任务
-        for task in list(self.task_queue._queue):
-            if task.id == task_id:
-                return self._task_to_dict(task)
-        
-        return None
+        # 队列中及已结束的任务均由注册表索引
+        record = self.registry.get(task_id)
+        if record is None or record.source != self.TASK_SOURCE:
+            return None
+        return self._record_to_dict(record)
     
     async def cancel_task(self, task_id: str) -> bool:
         """取消任务"""
@@ -176,50 +408,46 @@ class BatchProcessor:
         if task_id in self.running_tasks:
             task = self.running_tasks[task_id]
             task.status = TaskStatus.CANCELLED
+            self.registry.update(task_id, status=task.status.value)
             logger.info(f"任务已标记为取消: {task_id}")
             return True
         
         # 如果任务在队列中，移除
-        queue_items = []
-        found = False
-        
-        while not self.task_queue.empty():
-            task = await self.task_queue.get()
-            if task.id == task_id:
+        for pool in self.pools.values():
+            task = pool.queue.remove(task_id)
+            if task is not None:
                 task.status = TaskStatus.CANCELLED
-                self.completed_tasks[task_id] = task
-                found = True
+                self.registry.update(task_id, status=task.status.value)
                 logger.info(f"任务已从队列中取消: {task_id}")
-            else:
-                queue_items.append(task)
+                return True
         
-        # 重新加入队列
-        for item in queue_items:
-            await self.task_queue.put(item)
-        
-        return found
+        return False
     
     async def get_queue_status(self) -> Dict[str, Any]:
         """获取队列状态"""
         
         return {
-            "queue_size": self.task_queue.qsize(),
+            "queue_size": self._queue_size(),
             "running_tasks": len(self.running_tasks),
-            "completed_tasks": len(self.completed_tasks),
+            "completed_tasks": sum(
+                self.registry.count(status=s.value, source=self.TASK_SOURCE)
+                for s in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+            ),
             "stats": self.stats.copy(),
+            "pools": {name: pool.to_dict() for name, pool in self.pools.items()},
+            "per_type": {name: m.to_dict() for name, m in self.type_metrics.items()},
             "is_running": self.is_running,
             "active_workers": len([t for t in self.worker_tasks if not t.done()])
         }
     
-    async def _worker(self, worker_name: str):
-        """工作协程"""
+    async def _worker(self, worker_name: str, pool: ResourcePool):
+        """工作协程：只从所属资源池的优先级队列取任务"""
         
         logger.info(f"工作协程启动: {worker_name}")
         
         while self.is_running:
             try:
-                # 获取任务 (带超时)
-                task = await asyncio.wait_for(self.task_queue.get(), timeout=1.0)
+                task = await pool.queue.get()
                 
                 if task.status == TaskStatus.CANCELLED:
                     continue
@@ -228,6 +456,8 @@ class BatchProcessor:
                 task.status = TaskStatus.RUNNING
                 task.started_at = time.time()
                 self.running_tasks[task.id] = task
+                pool.running += 1
+                self.registry.update(task.id, status=task.status.value, started_at=task.started_at)
                 
                 logger.info(f"{worker_name} 开始处理任务: {task.id} ({task.task_type})")
                 
@@ -245,37 +475,56 @@ class BatchProcessor:
                     task.retry_count += 1
                     
                     if task.retry_count < task.max_retries:
-                        # 重新加入队列
+                        # 重新加入队列（保留原入队时间，老化继续累积）
                         task.status = TaskStatus.PENDING
-                        await self.task_queue.put(task)
+                        pool.queue.put(task, task.created_at)
                         logger.info(f"任务重试: {task.id} ({task.retry_count}/{task.max_retries})")
                     else:
                         task.status = TaskStatus.FAILED
                         self.stats["failed_tasks"] += 1
+                finally:
+                    pool.running -= 1
                 
                 # 完成任务
                 task.completed_at = time.time()
-                self.completed_tasks[task.id] = task
+                self.registry.update(
+                    task.id,
+                    status=task.status.value,
+                    progress=task.progress,
+                    result=task.result,
+                    error=task.error,
+                    retry_count=task.retry_count
+                )
                 
                 if task.id in self.running_tasks:
                     del self.running_tasks[task.id]
                 
-                # 更新平均处理时间
-                if task.started_at and task.completed_at:
+                # 更新平均处理时间和按类型吞吐指标
+                if task.status != TaskStatus.PENDING:
                     processing_time = task.completed_at - task.started_at
                     self._update_average_processing_time(processing_time)
+                    self._record_metrics(task, processing_time)
                 
                 logger.info(f"{worker_name} 完成任务: {task.id} ({task.status.value})")
                 
-            except asyncio.TimeoutError:
-                # 超时，继续循环
-                continue
+            except asyncio.CancelledError:
+                break
             except Exception as e:
                 logger.error(f"{worker_name} 工作协程错误: {e}")
                 await asyncio.sleep(1)
         
         logger.info(f"工作协程停止: {worker_name}")
     
+    def _record_metrics(self, task: BatchTask, processing_time: float):
+        metrics = self._metrics_for(task.task_type)
+        if task.status == TaskStatus.COMPLETED:
+            metrics.completed += 1
+        elif task.status == TaskStatus.FAILED:
+            metrics.failed += 1
+        metrics.total_processing_time += processing_time
+        metrics.total_wait_time += max(0.0, task.started_at - task.created_at)
+        metrics.finished_at.append(task.completed_at)
+    
     async def _execute_task(self, task: BatchTask) -> Dict[str, Any]:
         """执行具体任务"""
         
@@ -285,11 +534,25 @@ class BatchProcessor:
             return await self._execute_transcription(task)
         elif task.task_type == "visual_analysis":
             return await self._execute_visual_analysis(task)
+        elif task.task_type == "visual_tagging":
+            return await self._execute_visual_tagging(task)
         else:
             raise ValueError(f"未知任务类型: {task.task_type}")
     
+    async def _run_cpu(self, func: Callable, *args) -> Any:
+        """在 CPU 进程池中执行；进程池损坏时回退到线程池"""
+        
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.process_executor, func, *args)
+        except BrokenProcessPool:
+            logger.warning("CPU 进程池已损坏，重建后回退到线程池执行")
+            self.process_executor = ProcessPoolExecutor(max_workers=self.pools[POOL_CPU].concurrency)
+            self.pools[POOL_CPU].executor = self.process_executor
+            return await loop.run_in_executor(self.thread_executor, func, *args)
+    
     async def _execute_video_processing(self, task: BatchTask) -> Dict[str, Any]:
-        """执行视频处理任务"""
+        """执行视频处理任务（FFmpeg 子进程，IO 线程池）"""
         
         from services.video_processor import VideoProcessor
         
@@ -299,7 +562,7 @@ class BatchProcessor:
         task.progress = 10.0
         
         # 执行视频处理
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         result = await loop.run_in_executor(
             self.thread_executor,
             lambda: asyncio.run(processor.process_video(task.asset_id, task.file_path))
@@ -309,27 +572,19 @@ class BatchProcessor:
         return result
     
     async def _execute_transcription(self, task: BatchTask) -> Dict[str, Any]:
-        """执行转录任务"""
-        
-        from services.audio_transcriber import AudioTranscriber
-        
-        transcriber = AudioTranscriber()
+        """执行转录任务（CPU 进程池）"""
         
         # 更新进度
         task.progress = 10.0
         
         # 执行转录
-        result = await transcriber.transcribe_audio(task.file_path, task.asset_id)
+        result = await self._run_cpu(_transcription_job, task.file_path, task.asset_id)
         
         task.progress = 100.0
         return result
     
     async def _execute_visual_analysis(self, task: BatchTask) -> Dict[str, Any]:
-        """执行视觉分析任务"""
-        
-        from services.visual_processor import VisualProcessor
-        
-        processor = VisualProcessor()
+        """执行视觉分析任务（CPU 进程池）"""
         
         # 更新进度
         task.progress = 10.0
@@ -338,23 +593,60 @@ class BatchProcessor:
         sample_interval = task.parameters.get("sample_interval", 2.0)
         
         # 执行视觉分析
-        result = await processor.extract_visual_features(
-            task.file_path, task.asset_id, sample_interval
+        result = await self._run_cpu(
+            _visual_analysis_job, task.file_path, task.asset_id, sample_interval
         )
         
         task.progress = 100.0
         return result
     
+    async def _execute_visual_tagging(self, task: BatchTask) -> Dict[str, Any]:
+        """执行视觉标签任务（LLM 槽位，Ollama 视觉模型）"""
+        
+        from services.ollama_vision import get_vision_provider
+        
+        # 图像来源：参数指定 > 素材本身为图片 > 已提取的关键帧
+        image_paths = task.parameters.get("image_paths")
+        if not image_paths:
+            if Path(task.file_path).suffix.lower() in IMAGE_EXTENSIONS:
+                image_paths = [task.file_path]
+            else:
+                keyframe_dir = Path("data/keyframes") / task.asset_id
+                image_paths = sorted(
+                    str(p) for p in keyframe_dir.glob("*") if p.suffix.lower() in IMAGE_EXTENSIONS
+                ) if keyframe_dir.is_dir() else []
+        if not image_paths:
+            raise ValueError(f"没有可分析的图像: {task.asset_id}")
+        
+        vision = get_vision_provider()
+        if not await vision.check_availability():
+            raise RuntimeError(f"视觉模型 {vision.model} 不可用")
+        
+        task.progress = 10.0
+        
+        def on_progress(done: int, total: int):
+            task.progress = 10.0 + 90.0 * done / total
+        
+        tags = await vision.batch_analyze(image_paths, progress_callback=on_progress)
+        
+        task.progress = 100.0
+        return {
+            "asset_id": task.asset_id,
+            "frames": [{"image_path": path, "tags": t} for path, t in zip(image_paths, tags)],
+        }
+    
     async def _update_stats(self):
         """更新统计信息"""
         
         while self.is_running:
             try:
-                self.stats["queue_size"] = self.task_queue.qsize()
-                self.stats["active_workers"] = len([t for t in self.worker_tasks if not t.done()])
+                self.stats["queue_size"] = self._queue_size()
+                self.stats["active_workers"] = sum(pool.running for pool in self.pools.values())
                 
                 await asyncio.sleep(5)  # 每5秒更新一次
                 
+            except asyncio.CancelledError:
+                break
             except Exception as e:
                 logger.error(f"统计更新错误: {e}")
                 await asyncio.sleep(5)
@@ -363,9 +655,9 @@ class BatchProcessor:
         """更新平均处理时间"""
         
         current_avg = self.stats["average_processing_time"]
-        completed_count = self.stats["completed_tasks"]
+        completed_count = self.stats["completed_tasks"] + self.stats["failed_tasks"]
         
-        if completed_count == 1:
+        if completed_count <= 1:
             self.stats["average_processing_time"] = processing_time
         else:
             # 计算移动平均
@@ -390,42 +682,64 @@ class BatchProcessor:
         
         return task_dict
     
-    async def get_task_history(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """获取任务历史"""
-        
-        all_tasks = []
-        
-        # 添加已完成的任务
-        for task in self.completed_tasks.values():
-            all_tasks.append(self._task_to_dict(task))
-        
-        # 添加运行中的任务
-        for task in self.running_tasks.values():
-            all_tasks.append(self._task_to_dict(task))
-        
-        # 按创建时间排序
-        all_tasks.sort(key=lambda x: x["created_at"], reverse=True)
+    def _task_details(self, task: BatchTask) -> Dict[str, Any]:
+        """注册表 details 字段"""
+        return {
+            "asset_id": task.asset_id,
+            "file_path": task.file_path,
+            "parameters": task.parameters,
+            "priority": task.priority.value,
+            "retry_count": task.retry_count,
+            "max_retries": task.max_retries
+        }
+    
+    def _record_to_dict(self, record: TaskRecord) -> Dict[str, Any]:
+        """将注册表记录转换为与 _task_to_dict 相同的结构"""
+        details = record.details or {}
+        started_at = details.get("started_at")
+        if started_at and record.completed_at:
+            processing_time = record.completed_at - started_at
+        elif started_at:
+            processing_time = time.time() - started_at
+        else:
+            processing_time = 0
         
-        return all_tasks[:limit]
+        return {
+            "id": record.task_id,
+            "task_type": record.task_type,
+            "asset_id": details.get("asset_id"),
+            "file_path": details.get("file_path"),
+            "parameters": details.get("parameters", {}),
+            "priority": details.get("priority", TaskPriority.NORMAL.value),
+            "status": record.status,
+            "created_at": record.created_at,
+            "started_at": started_at,
+            "completed_at": record.completed_at,
+            "progress": record.progress,
+            "result": record.result,
+            "error": record.error,
+            "retry_count": details.get("retry_count", 0),
+            "max_retries": details.get("max_retries", 3),
+            "processing_time": processing_time
+        }
+    
+    async def get_task_history(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """获取任务历史（按创建时间倒序）"""
+        
+        page = self.registry.list_tasks(source=self.TASK_SOURCE, offset=offset, limit=limit)
+        return [
+            self._task_to_dict(self.running_tasks[r.task_id])
+            if r.task_id in self.running_tasks else self._record_to_dict(r)
+            for r in page["items"]
+        ]
     
     async def cleanup_old_tasks(self, max_age_hours: int = 24):
         """清理旧任务"""
         
-        current_time = time.time()
-        max_age_seconds = max_age_hours * 3600
-        
-        # 清理已完成的任务
-        to_remove = []
-        for task_id, task in self.completed_tasks.items():
-            if current_time - task.created_at > max_age_seconds:
-                to_remove.append(task_id)
-        
-        for task_id in to_remove:
-            del self.completed_tasks[task_id]
-        
-        logger.info(f"清理了 {len(to_remove)} 个旧任务")
+        removed = self.registry.evict_expired(ttl=max_age_hours * 3600, source=self.TASK_SOURCE)
+        logger.info(f"清理了 {removed} 个旧任务")
         
-        return len(to_remove)
+        return removed
 
 # 全局批量处理器实例
 _batch_processor: Optional[BatchProcessor] = None
@@ -438,10 +752,16 @@ def get_batch_processor() -> BatchProcessor:
     if _batch_processor is None:
         max_workers = int(os.getenv("BATCH_MAX_WORKERS", "8"))
         max_concurrent = int(os.getenv("BATCH_MAX_CONCURRENT", "5"))
+        cpu_workers = int(os.getenv("BATCH_CPU_WORKERS", "0")) or None
         
         _batch_processor = BatchProcessor(
             max_workers=max_workers,
-            max_concurrent_tasks=max_concurrent
+            max_concurrent_tasks=max_concurrent,
+            cpu_workers=cpu_workers,
+            llm_slots=int(os.getenv("BATCH_LLM_SLOTS", "2")),
+            max_queue_size=int(os.getenv("BATCH_MAX_QUEUE", "1000")),
+            max_load_ratio=float(os.getenv("BATCH_MAX_LOAD_RATIO", "2.0")),
+            aging_seconds=float(os.getenv("BATCH_AGING_SECONDS", "30"))
         )
     
     return _batch_processor
@@ -43,6 +43,13 @@ class MockRedis:
             }
             return True
     
+    async def incr(self, key: str) -> int:
+        async with self._lock:
+            item = self._data.get(key)
+            value = int(item['value']) + 1 if item else 1
+            self._data[key] = {'value': str(value), 'expires_at': None, 'created_at': datetime.now()}
+            return value
+    
     async def delete(self, key: str) -> int:
         async with self._lock:
             if key in self._data:
@@ -160,6 +167,18 @@ class CacheService:
             self.stats['errors'] += 1
             return False
     
+    async def incr(self, key: str) -> Optional[int]:
+        """原子递增计数器（不过期），失败返回 None"""
+        if not self._initialized:
+            await self.initialize()
+        
+        try:
+            return int(await self.redis.incr(key))
+        except Exception as e:
+            logger.error(f"缓存递增失败 {key}: {e}")
+            self.stats['errors'] += 1
+            return None
+    
     async def delete(self, key: str) -> bool:
         """删除缓存值"""
         if not self._initialized:
@@ -13,12 +13,21 @@ Task: 7.1 CLIP 嵌入服务
 - 图像嵌入：将关键帧图像转换为向量
 - 文本嵌入：将查询文本转换为向量（与图像同空间）
 - 跨模态搜索：用文本搜索图像，用图像搜索图像
+
+批量嵌入：
+- HuggingFace：图像解码与预处理在线程池中按批进行，并预取后续批次；
+  每批张量一次前向（torch.inference_mode），前向同样在线程中执行，不阻塞事件循环
+- Ollama：图像描述请求共用一个客户端，并发数受 max_concurrency 限制，
+  描述文本再批量做文本嵌入
+- 单张 / 单条接口走同一批量路径
 """
 
 import asyncio
 import base64
 import logging
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -37,9 +46,22 @@ class CLIPConfig:
     model_name: str = "llava:7b"
     ollama_base_url: str = "http://localhost:11434"
     dimension: int = 768
-    batch_size: int = 4
+    batch_size: int = 16           # HuggingFace 每批前向的图像/文本数
+    max_concurrency: int = 4       # Ollama 并发请求数
+    prefetch_batches: int = 2      # HuggingFace 预取的批次数
+    decode_workers: int = 4        # 图像解码与预处理线程数
     timeout: float = 60.0
     use_huggingface: bool = False  # 是否使用 HuggingFace 模型
+    
+    @classmethod
+    def from_env(cls) -> "CLIPConfig":
+        """从环境变量读取批量参数"""
+        return cls(
+            batch_size=int(os.getenv("CLIP_BATCH_SIZE", "16")),
+            max_concurrency=int(os.getenv("CLIP_MAX_CONCURRENCY", "4")),
+            prefetch_batches=int(os.getenv("CLIP_PREFETCH_BATCHES", "2")),
+            decode_workers=int(os.getenv("CLIP_DECODE_WORKERS", "4")),
+        )
 
 
 # ============================================================
@@ -54,6 +76,15 @@ class CLIPEmbeddingService:
         self._initialized = False
         self._hf_model = None
         self._hf_processor = None
+        self._decode_executor: Optional[ThreadPoolExecutor] = None
+    
+    def _get_decode_executor(self) -> ThreadPoolExecutor:
+        if self._decode_executor is None:
+            self._decode_executor = ThreadPoolExecutor(
+                max_workers=max(1, self.config.decode_workers),
+                thread_name_prefix="clip-decode"
+            )
+        return self._decode_executor
     
     async def initialize(self):
         """初始化服务"""
@@ -127,79 +158,193 @@ class CLIPEmbeddingService:
         Returns:
             嵌入向量，失败返回 None
         """
+        return (await self.embed_images_batch([image_path]))[0]
+    
+    async def embed_images_batch(
+        self,
+        image_paths: List[str],
+        show_progress: bool = False,
+    ) -> List[Optional[List[float]]]:
+        """
+        批量图像嵌入
+        
+        Args:
+            image_paths: 图像文件路径列表
+            show_progress: 是否显示进度
+            
+        Returns:
+            与输入一一对应的嵌入向量列表（失败项为 None）
+        """
         await self.initialize()
         
-        if not os.path.exists(image_path):
-            logger.error(f"图像文件不存在: {image_path}")
-            return None
+        if not image_paths:
+            return []
         
         if self.config.use_huggingface:
-            return await self._embed_image_huggingface(image_path)
+            return await self._embed_images_huggingface(image_paths, show_progress)
         else:
-            return await self._embed_image_ollama(image_path)
+            return await self._embed_images_ollama(image_paths, show_progress)
+    
+    # ---------- Ollama ----------
+    
+    async def _embed_images_ollama(
+        self,
+        image_paths: List[str],
+        show_progress: bool = False,
+    ) -> List[Optional[List[float]]]:
+        """使用 Ollama 进行图像嵌入（图像描述 + 文本嵌入，并发受限）"""
+        semaphore = asyncio.Semaphore(max(1, self.config.max_concurrency))
+        total = len(image_paths)
+        completed = 0
+        
+        async def describe(client: httpx.AsyncClient, image_path: str) -> Optional[str]:
+            nonlocal completed
+            async with semaphore:
+                description = await self._describe_image_ollama(client, image_path)
+            completed += 1
+            if show_progress and completed % 10 == 0:
+                logger.info(f"图像描述进度: {completed}/{total}")
+            return description
+        
+        async with httpx.AsyncClient(timeout=self.config.timeout) as client:
+            descriptions = await asyncio.gather(*[describe(client, path) for path in image_paths])
+        
+        # 描述文本批量嵌入
+        positions = [i for i, description in enumerate(descriptions) if description]
+        results: List[Optional[List[float]]] = [None] * total
+        if positions:
+            from .ollama_embedding import get_embedding_service
+            embeddings = await get_embedding_service().embed_batch(
+                [descriptions[i] for i in positions],
+                batch_size=max(1, self.config.max_concurrency)
+            )
+            for i, embedding in zip(positions, embeddings):
+                results[i] = embedding
+        return results
     
-    async def _embed_image_ollama(self, image_path: str) -> Optional[List[float]]:
-        """使用 Ollama 进行图像嵌入"""
+    async def _describe_image_ollama(self, client: httpx.AsyncClient, image_path: str) -> Optional[str]:
+        """使用 Ollama 视觉模型生成图像描述"""
         try:
-            # 读取图像并转为 base64
-            with open(image_path, "rb") as f:
-                image_data = base64.b64encode(f.read()).decode("utf-8")
+            # 读取图像并转为 base64（线程中读取）
+            image_data = await asyncio.get_running_loop().run_in_executor(
+                self._get_decode_executor(), _read_base64, image_path
+            )
+            if image_data is None:
+                logger.error(f"图像文件不存在: {image_path}")
+                return None
             
             # 调用 Ollama API 获取图像描述
             # 注意：Ollama 的 llava 模型不直接返回嵌入向量
             # 我们使用图像描述 + 文本嵌入的方式
-            async with httpx.AsyncClient(timeout=self.config.timeout) as client:
-                response = await client.post(
-                    f"{self.config.ollama_base_url}/api/generate",
-                    json={
-                        "model": self.config.model_name,
-                        "prompt": "Describe this image in detail for visual search indexing. Focus on: objects, colors, actions, scene type, mood, and composition.",
-                        "images": [image_data],
-                        "stream": False,
-                    },
-                )
+            response = await client.post(
+                f"{self.config.ollama_base_url}/api/generate",
+                json={
+                    "model": self.config.model_name,
+                    "prompt": "Describe this image in detail for visual search indexing. Focus on: objects, colors, actions, scene type, mood, and composition.",
+                    "images": [image_data],
+                    "stream": False,
+                },
+            )
+            
+            if response.status_code == 200:
+                return response.json().get("response", "") or None
+            else:
+                logger.error(f"Ollama API 错误: {response.status_code}")
+                return None
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    description = data.get("response", "")
-                    
-                    # 使用文本嵌入服务获取向量
-                    from .ollama_embedding import get_embedding_service
-                    embedding_service = get_embedding_service()
-                    embedding = await embedding_service.embed(description)
-                    
-                    return embedding
-                else:
-                    logger.error(f"Ollama API 错误: {response.status_code}")
-                    return None
-                    
         except Exception as e:
             logger.error(f"Ollama 图像嵌入失败: {e}")
             return None
     
-    async def _embed_image_huggingface(self, image_path: str) -> Optional[List[float]]:
-        """使用 HuggingFace CLIP 进行图像嵌入"""
-        try:
-            from PIL import Image
-            import torch
-            
-            # 加载图像
-            image = Image.open(image_path).convert("RGB")
-            
-            # 处理图像
-            inputs = self._hf_processor(images=image, return_tensors="pt")
-            
-            # 获取图像特征
-            with torch.no_grad():
-                image_features = self._hf_model.get_image_features(**inputs)
-                # 归一化
-                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-            
-            return image_features[0].tolist()
+    # ---------- HuggingFace ----------
+    
+    async def _embed_images_huggingface(
+        self,
+        image_paths: List[str],
+        show_progress: bool = False,
+    ) -> List[Optional[List[float]]]:
+        """使用 HuggingFace CLIP 进行图像嵌入（预处理预取 + 按批前向）"""
+        loop = asyncio.get_running_loop()
+        size = max(1, self.config.batch_size)
+        batches = [list(range(i, min(i + size, len(image_paths)))) for i in range(0, len(image_paths), size)]
+        results: List[Optional[List[float]]] = [None] * len(image_paths)
+        
+        # 预处理在解码线程池中提前进行，最多领先 prefetch_batches 批
+        pending = deque()
+        next_batch = 0
+        
+        def prefetch():
+            nonlocal next_batch
+            while next_batch < len(batches) and len(pending) <= max(0, self.config.prefetch_batches):
+                indices = batches[next_batch]
+                future = loop.run_in_executor(
+                    self._get_decode_executor(),
+                    self._preprocess_images,
+                    [image_paths[i] for i in indices]
+                )
+                pending.append((indices, future))
+                next_batch += 1
+        
+        prefetch()
+        done = 0
+        while pending:
+            indices, future = pending.popleft()
+            prefetch()
+            try:
+                pixel_values, valid = await future
+                if pixel_values is not None:
+                    vectors = await loop.run_in_executor(None, self._image_features, pixel_values)
+                    for position, vector in zip(valid, vectors):
+                        results[indices[position]] = vector
+            except Exception as e:
+                logger.error(f"HuggingFace 图像嵌入失败: {e}")
             
-        except Exception as e:
-            logger.error(f"HuggingFace 图像嵌入失败: {e}")
-            return None
+            done += len(indices)
+            if show_progress:
+                logger.info(f"图像嵌入进度: {done}/{len(image_paths)}")
+        
+        return results
+    
+    def _preprocess_images(self, image_paths: List[str]):
+        """解码并预处理一批图像（线程中执行），返回 (pixel_values, 有效图像在批内的位置)"""
+        from PIL import Image
+        
+        images = []
+        valid = []
+        for position, image_path in enumerate(image_paths):
+            try:
+                with Image.open(image_path) as image:
+                    images.append(image.convert("RGB"))
+                valid.append(position)
+            except Exception as e:
+                logger.error(f"图像读取失败: {image_path}: {e}")
+        
+        if not images:
+            return None, []
+        return self._hf_processor(images=images, return_tensors="pt")["pixel_values"], valid
+    
+    def _image_features(self, pixel_values) -> List[List[float]]:
+        """一批图像张量的 CLIP 特征（线程中执行）"""
+        import torch
+        
+        with torch.inference_mode():
+            image_features = self._hf_model.get_image_features(pixel_values=pixel_values)
+            # 归一化
+            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        return image_features.tolist()
+    
+    def _text_features(self, texts: List[str]) -> List[List[float]]:
+        """一批文本的 CLIP 特征（线程中执行）"""
+        import torch
+        
+        inputs = self._hf_processor(text=texts, return_tensors="pt", padding=True, truncation=True)
+        with torch.inference_mode():
+            text_features = self._hf_model.get_text_features(**inputs)
+            # 归一化
+            text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+        return text_features.tolist()
+    
+    # ---------- 文本 ----------
     
     async def embed_text(self, text: str) -> Optional[List[float]]:
         """
@@ -211,63 +356,40 @@ class CLIPEmbeddingService:
         Returns:
             嵌入向量，失败返回 None
         """
-        await self.initialize()
-        
-        if self.config.use_huggingface:
-            return await self._embed_text_huggingface(text)
-        else:
-            # 使用 Ollama 文本嵌入
-            from .ollama_embedding import get_embedding_service
-            embedding_service = get_embedding_service()
-            return await embedding_service.embed(text)
+        return (await self.embed_texts_batch([text]))[0]
     
-    async def _embed_text_huggingface(self, text: str) -> Optional[List[float]]:
-        """使用 HuggingFace CLIP 进行文本嵌入"""
-        try:
-            import torch
-            
-            # 处理文本
-            inputs = self._hf_processor(text=[text], return_tensors="pt", padding=True)
-            
-            # 获取文本特征
-            with torch.no_grad():
-                text_features = self._hf_model.get_text_features(**inputs)
-                # 归一化
-                text_features = text_features / text_features.norm(dim=-1, keepdim=True)
-            
-            return text_features[0].tolist()
-            
-        except Exception as e:
-            logger.error(f"HuggingFace 文本嵌入失败: {e}")
-            return None
-    
-    async def embed_images_batch(
-        self,
-        image_paths: List[str],
-        show_progress: bool = False,
-    ) -> List[Optional[List[float]]]:
+    async def embed_texts_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
         """
-        批量图像嵌入
+        批量文本嵌入（与图像同空间）
         
         Args:
-            image_paths: 图像文件路径列表
-            show_progress: 是否显示进度
+            texts: 文本列表
             
         Returns:
-            嵌入向量列表
+            与输入一一对应的嵌入向量列表（失败项为 None）
         """
         await self.initialize()
         
-        results = []
-        total = len(image_paths)
+        if not texts:
+            return []
         
-        for i, path in enumerate(image_paths):
-            embedding = await self.embed_image(path)
-            results.append(embedding)
-            
-            if show_progress and (i + 1) % 10 == 0:
-                logger.info(f"图像嵌入进度: {i + 1}/{total}")
+        if not self.config.use_huggingface:
+            # 使用 Ollama 文本嵌入
+            from .ollama_embedding import get_embedding_service
+            return await get_embedding_service().embed_batch(
+                texts, batch_size=max(1, self.config.max_concurrency)
+            )
         
+        loop = asyncio.get_running_loop()
+        size = max(1, self.config.batch_size)
+        results: List[Optional[List[float]]] = []
+        for i in range(0, len(texts), size):
+            chunk = texts[i:i + size]
+            try:
+                results.extend(await loop.run_in_executor(None, self._text_features, chunk))
+            except Exception as e:
+                logger.error(f"HuggingFace 文本嵌入失败: {e}")
+                results.extend([None] * len(chunk))
         return results
     
     def similarity(self, vec1: List[float], vec2: List[float]) -> float:
@@ -304,6 +426,14 @@ class CLIPEmbeddingService:
         return self.config.model_name
 
 
+def _read_base64(image_path: str) -> Optional[str]:
+    """读取图像文件为 base64（文件不存在时返回 None）"""
+    if not os.path.exists(image_path):
+        return None
+    with open(image_path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+
 # ============================================================
 # 全局实例
 # ============================================================
@@ -316,7 +446,7 @@ def get_clip_service() -> CLIPEmbeddingService:
     global _clip_service
     
     if _clip_service is None:
-        _clip_service = CLIPEmbeddingService()
+        _clip_service = CLIPEmbeddingService(CLIPConfig.from_env())
     
     return _clip_service
 
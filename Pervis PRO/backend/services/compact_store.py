@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑列式片段存储
+
+MemoryVideoStore 的紧凑模式（compact=True 或 VIDEO_STORE_COMPACT=1）使用本模块
+代替 segment_id → VideoSegment 字典：
+- 嵌入向量存入共享的向量列（单位向量 + 模长，可直接用于余弦打分；
+  可选 float16 / int8 量化，见 vector_index）
+- 标签值按字段驻留为 int32 编码，按列存储；列表值整体驻留为元组
+- video_id / 路径 / 描述等字符串去重后以编码存储
+- 数值字段存入 float64 / int64 列
+- 行号由调用方分配（MemoryVideoStore 使用标签倒排索引的序号），
+  倒排表与向量矩阵按同一行号寻址
+
+CompactSegmentMap 实现 MutableMapping 接口，读取时按需物化为 VideoSegment，
+因此现有直接访问 store._segments 的代码无需修改。物化结果是副本：
+修改返回对象的 tags 不会写回存储（需重新 insert）；嵌入以 float32 精度保存。
+"""
+
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .vector_index import VectorColumn, VectorQuantization
+
+# 文本列：video_id, video_path, thumbnail_path, description
+_TEXT_COLUMNS = 4
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class ValuePool:
+    """值驻留池：相同的值只保存一份，以从 1 开始的整数编码引用（0 表示缺失）"""
+
+    __slots__ = ("_values", "_codes")
+
+    def __init__(self):
+        self._values: List[Any] = [None]
+        self._codes: Dict[Any, int] = {}
+
+    def intern(self, key: Any, value: Any) -> int:
+        code = self._codes.get(key)
+        if code is None:
+            code = len(self._values)
+            self._values.append(value)
+            self._codes[key] = code
+        return code
+
+    def value(self, code: int) -> Any:
+        return self._values[code]
+
+    def __len__(self) -> int:
+        return len(self._values) - 1
+
+
+def _value_key(value: Any) -> Optional[Tuple]:
+    """可驻留值的键（带类型，避免 1 / 1.0 / True 混同）；不可哈希时返回 None"""
+    if isinstance(value, tuple):
+        return None  # 元组与列表值的存储形式冲突，按原样保存
+    try:
+        if isinstance(value, list):
+            key = ("list", tuple((type(v), v) for v in value))
+        else:
+            key = ("scalar", type(value), value)
+        hash(key)
+        return key
+    except TypeError:
+        return None
+
+
+class SegmentColumns:
+    """片段列存储"""
+
+    def __init__(
+        self,
+        quantization: VectorQuantization = VectorQuantization.NONE,
+        vector_path: Optional[str] = None,
+    ):
+        self.capacity = 0
+        self.strings = ValuePool()
+        self.layouts = ValuePool()                       # 标签字段顺序元组
+        self.text = np.zeros((0, _TEXT_COLUMNS), dtype=np.int32)
+        self.times = np.zeros((0, 3), dtype=np.float64)  # start, end, duration
+        self.created = np.zeros(0, dtype=np.int64)       # 微秒时间戳（naive datetime）
+        self.layout_codes = np.zeros(0, dtype=np.int32)
+        self.tag_codes: Dict[str, np.ndarray] = {}
+        self.tag_values: Dict[str, ValuePool] = {}
+
+        self.vectors = VectorColumn(quantization, vector_path)
+        self.has_embedding = np.zeros(0, dtype=bool)
+
+        # 无法列式存储的少数值
+        self._extra_tags: Dict[int, Dict[str, Any]] = {}
+        self._extra_embeddings: Dict[int, List[float]] = {}
+        self._extra_created: Dict[int, Any] = {}
+
+    # ---------- 容量 ----------
+
+    def _grow(self, row: int):
+        if row < self.capacity:
+            return
+        capacity = max(16, row + 1, self.capacity + self.capacity // 2)
+
+        def resize(array: np.ndarray) -> np.ndarray:
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self.text = resize(self.text)
+        self.times = resize(self.times)
+        self.created = resize(self.created)
+        self.layout_codes = resize(self.layout_codes)
+        for field in self.tag_codes:
+            self.tag_codes[field] = resize(self.tag_codes[field])
+        self.has_embedding = resize(self.has_embedding)
+        self.capacity = capacity
+
+    # ---------- 写入 ----------
+
+    def _intern_string(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        return self.strings.intern(value, value)
+
+    def put(self, row: int, segment) -> None:
+        """写入一行（覆盖原有内容）"""
+        self._grow(row)
+        self.clear(row)
+
+        self.text[row] = (
+            self._intern_string(segment.video_id),
+            self._intern_string(segment.video_path),
+            self._intern_string(segment.thumbnail_path),
+            self._intern_string(segment.description),
+        )
+        self.times[row] = (segment.start_time, segment.end_time, segment.duration)
+
+        created_at = segment.created_at
+        if isinstance(created_at, datetime) and created_at.tzinfo is None:
+            self.created[row] = (created_at - _EPOCH) // _MICROSECOND
+        else:
+            self._extra_created[row] = created_at
+
+        tags = segment.tags or {}
+        fields = tuple(tags)
+        self.layout_codes[row] = self.layouts.intern(fields, fields)
+        extra = {}
+        for field, value in tags.items():
+            key = _value_key(value)
+            if key is None:
+                extra[field] = value
+                continue
+            codes = self.tag_codes.get(field)
+            if codes is None:
+                codes = self.tag_codes[field] = np.zeros(self.capacity, dtype=np.int32)
+                self.tag_values[field] = ValuePool()
+            stored = tuple(value) if isinstance(value, list) else value
+            codes[row] = self.tag_values[field].intern(key, stored)
+        if extra:
+            self._extra_tags[row] = extra
+
+        self._put_embedding(row, segment.embedding)
+
+    def _put_embedding(self, row: int, embedding: Optional[List[float]]):
+        if embedding is None:
+            return
+        if self.vectors.set(row, embedding):
+            self.has_embedding[row] = True
+        else:
+            self._extra_embeddings[row] = list(embedding)  # 空列表或维度不一致时单独保存
+
+    def clear(self, row: int):
+        """清空一行"""
+        if row >= self.capacity:
+            return
+        self.text[row] = 0
+        self.layout_codes[row] = 0
+        for codes in self.tag_codes.values():
+            codes[row] = 0
+        self.vectors.clear(row)
+        self.has_embedding[row] = False
+        self._extra_tags.pop(row, None)
+        self._extra_embeddings.pop(row, None)
+        self._extra_created.pop(row, None)
+
+    # ---------- 读取 ----------
+
+    def tags(self, row: int) -> Dict[str, Any]:
+        extra = self._extra_tags.get(row, {})
+        tags = {}
+        for field in self.layouts.value(int(self.layout_codes[row])) or ():
+            if field in extra:
+                tags[field] = extra[field]
+                continue
+            value = self.tag_values[field].value(int(self.tag_codes[field][row]))
+            tags[field] = list(value) if isinstance(value, tuple) else value
+        return tags
+
+    def embedding(self, row: int) -> Optional[List[float]]:
+        if self.has_embedding[row]:
+            return self.vectors.get(row)
+        return self._extra_embeddings.get(row)
+
+    def materialize(self, row: int, segment_id: str):
+        from .milvus_store import VideoSegment
+
+        strings = self.strings
+        video_id, video_path, thumbnail_path, description = (int(c) for c in self.text[row])
+        start_time, end_time, duration = (float(t) for t in self.times[row])
+        if row in self._extra_created:
+            created_at = self._extra_created[row]
+        else:
+            created_at = _EPOCH + int(self.created[row]) * _MICROSECOND
+        return VideoSegment(
+            segment_id=segment_id,
+            video_id=strings.value(video_id),
+            video_path=strings.value(video_path),
+            start_time=start_time,
+            end_time=end_time,
+            duration=duration,
+            tags=self.tags(row),
+            embedding=self.embedding(row),
+            thumbnail_path=strings.value(thumbnail_path),
+            description=strings.value(description),
+            created_at=created_at,
+        )
+
+    def nbytes(self) -> int:
+        arrays = [self.text, self.times, self.created, self.layout_codes,
+                  self.has_embedding, *self.tag_codes.values()]
+        return int(sum(a.nbytes for a in arrays)) + self.vectors.nbytes()
+
+
+class CompactSegmentMap(MutableMapping):
+    """
+    segment_id → VideoSegment 的列式映射
+
+    行号由 row_of(segment_id) 提供；读取时物化 VideoSegment。
+    """
+
+    __slots__ = ("columns", "_rows", "_row_of")
+
+    def __init__(
+        self,
+        row_of: Callable[[str], Optional[int]],
+        quantization: VectorQuantization = VectorQuantization.NONE,
+        vector_path: Optional[str] = None,
+    ):
+        self.columns = SegmentColumns(quantization, vector_path)
+        self._rows: Dict[str, int] = {}
+        self._row_of = row_of
+
+    def row(self, segment_id: str) -> Optional[int]:
+        return self._rows.get(segment_id)
+
+    def __getitem__(self, segment_id: str):
+        row = self._rows[segment_id]
+        return self.columns.materialize(row, segment_id)
+
+    def __setitem__(self, segment_id: str, segment):
+        row = self._row_of(segment_id)
+        if row is None:
+            raise KeyError(f"片段未分配行号: {segment_id}")
+        previous = self._rows.get(segment_id)
+        if previous is not None and previous != row:
+            self.columns.clear(previous)
+        self._rows[segment_id] = row
+        self.columns.put(row, segment)
+
+    def __delitem__(self, segment_id: str):
+        row = self._rows.pop(segment_id)
+        self.columns.clear(row)
+
+    def __contains__(self, segment_id: object) -> bool:
+        return segment_id in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._rows))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def memory_stats(self) -> Dict[str, Any]:
+        columns = self.columns
+        return {
+            "segments": len(self._rows),
+            "capacity": columns.capacity,
+            "embedding_dim": columns.vectors.dim,
+            "quantization": columns.vectors.quantization.value,
+            "column_bytes": columns.nbytes(),
+            "vector_file_bytes": columns.vectors.file_bytes(),
+            "distinct_strings": len(columns.strings),
+            "tag_fields": len(columns.tag_codes),
+            "distinct_tag_values": sum(len(p) for p in columns.tag_values.values()),
+        }
@@ -2,33 +2,111 @@
 数据库服务层
 Phase 2: 基础CRUD操作
 P0 Fix: 异步化数据库操作
+
+基于 SQLAlchemy 2.0 AsyncSession（aiosqlite / asyncpg），数据库 I/O 不阻塞事件循环：
+- 传入请求级 AsyncSession（Depends(get_async_db)）时所有操作共用该会话
+- 传入同步 Session 或不传时，每个操作使用独立的短事务会话
+  （适用于在请求结束后仍运行的后台任务）
+- 写操作默认各自提交；在 `async with db_service.batch():` 中的写操作只 flush，
+  退出时一次提交（失败整体回滚）
+- 转录片段、片段描述、关键帧描述与视觉摘要在同一事务内写入 FTS5 全文索引
+  （services/text_index.py），文本检索走索引；索引不可用时回退到扫描匹配
 """
 
-from sqlalchemy.orm import Session
-from database import Project, Beat, Asset, AssetSegment, AssetVector, FeedbackLog
+from contextlib import asynccontextmanager
+from database import Project, Beat, Asset, AssetSegment, AssetVector, FeedbackLog, get_async_session_factory
 from models.base import ProjectCreate, BeatCreate, AssetCreate
+from services.text_index import (
+    SOURCE_KEYFRAME, SOURCE_SEGMENT, SOURCE_TRANSCRIPT, SOURCE_VISUAL,
+    get_text_index, keyframe_documents, segment_documents,
+    transcription_documents, visual_summary_documents,
+)
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
-import asyncio
-from datetime import datetime
 from typing import List, Optional
-from concurrent.futures import ThreadPoolExecutor
 
 class DatabaseService:
     
-    def __init__(self, db: Session):
+    # 转录检索时每个素材最多取的命中片段数
+    TEXT_HITS_PER_ASSET = 10
+    # 视觉特征检索的候选素材上限
+    VISUAL_CANDIDATE_LIMIT = 1000
+    VISUAL_QUERY_FIELDS = ("brightness_level", "color_tone", "visual_complexity", "lighting_quality")
+    
+    def __init__(self, db=None):
         self.db = db
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        self._request_session: Optional[AsyncSession] = db if isinstance(db, AsyncSession) else None
+        self._batch_session: Optional[AsyncSession] = None
+        self.text_index = get_text_index()
+    
+    # 会话与提交
+    @asynccontextmanager
+    async def _session(self):
+        """当前操作使用的会话"""
+        if self._batch_session is not None:
+            yield self._batch_session
+        elif self._request_session is not None:
+            yield self._request_session
+        else:
+            async with get_async_session_factory()() as session:
+                yield session
+    
+    async def _commit(self, session: AsyncSession):
+        """批量模式下只 flush（生成主键与默认值），否则提交"""
+        if self._batch_session is not None:
+            await session.flush()
+        else:
+            await session.commit()
+    
+    @asynccontextmanager
+    async def batch(self):
+        """
+        批量写入：块内的写操作在退出时一次提交
+        
+        async with db_service.batch():
+            for data in segments:
+                await db_service.create_asset_segment(...)
+        """
+        if self._batch_session is not None:
+            yield self
+            return
+        
+        owned = self._request_session is None
+        session = get_async_session_factory()() if owned else self._request_session
+        self._batch_session = session
+        try:
+            yield self
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            self._batch_session = None
+            if owned:
+                await session.close()
+    
+    async def _add(self, obj):
+        async with self._session() as session:
+            session.add(obj)
+            await self._commit(session)
+        return obj
+    
+    async def _first(self, statement):
+        async with self._session() as session:
+            return (await session.execute(statement)).scalars().first()
+    
+    async def _all(self, statement) -> list:
+        async with self._session() as session:
+            return list((await session.execute(statement)).scalars().all())
+    
+    async def _update_asset(self, asset_id: str, **values):
+        async with self._session() as session:
+            await session.execute(update(Asset).where(Asset.id == asset_id).values(**values))
+            await self._commit(session)
     
     # Project 操作
     async def create_project(self, project_data: ProjectCreate) -> Project:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor, 
-            self._create_project_sync, 
-            project_data
-        )
-    
-    def _create_project_sync(self, project_data: ProjectCreate) -> Project:
         project = Project(
             id=f"proj_{uuid.uuid4().hex[:8]}",
             title=project_data.title,
@@ -38,43 +116,16 @@ class DatabaseService:
             characters=[],
             current_stage="ANALYSIS"
         )
-        self.db.add(project)
-        self.db.commit()
-        self.db.refresh(project)
-        return project
+        return await self._add(project)
     
     async def get_project(self, project_id: str) -> Optional[Project]:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._get_project_sync,
-            project_id
-        )
-    
-    def _get_project_sync(self, project_id: str) -> Optional[Project]:
-        return self.db.query(Project).filter(Project.id == project_id).first()
+        return await self._first(select(Project).where(Project.id == project_id))
     
     async def list_projects(self) -> List[Project]:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._list_projects_sync
-        )
-    
-    def _list_projects_sync(self) -> List[Project]:
-        return self.db.query(Project).order_by(Project.created_at.desc()).all()
+        return await self._all(select(Project).order_by(Project.created_at.desc()))
     
     # Beat 操作
     async def create_beat(self, beat_data: BeatCreate, order_index: int = 0) -> Beat:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._create_beat_sync,
-            beat_data,
-            order_index
-        )
-    
-    def _create_beat_sync(self, beat_data: BeatCreate, order_index: int = 0) -> Beat:
         beat = Beat(
             id=f"beat_{uuid.uuid4().hex[:8]}",
             project_id=beat_data.project_id,
@@ -87,45 +138,18 @@ class DatabaseService:
             duration=beat_data.duration,
             user_notes=beat_data.user_notes
         )
-        self.db.add(beat)
-        self.db.commit()
-        self.db.refresh(beat)
-        return beat
+        return await self._add(beat)
     
     async def get_beats_by_project(self, project_id: str) -> List[Beat]:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._get_beats_by_project_sync,
-            project_id
+        return await self._all(
+            select(Beat).where(Beat.project_id == project_id).order_by(Beat.order_index)
         )
     
-    def _get_beats_by_project_sync(self, project_id: str) -> List[Beat]:
-        return self.db.query(Beat).filter(
-            Beat.project_id == project_id
-        ).order_by(Beat.order_index).all()
-    
     async def get_beat(self, beat_id: str) -> Optional[Beat]:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._get_beat_sync,
-            beat_id
-        )
-    
-    def _get_beat_sync(self, beat_id: str) -> Optional[Beat]:
-        return self.db.query(Beat).filter(Beat.id == beat_id).first()
+        return await self._first(select(Beat).where(Beat.id == beat_id))
     
     # Asset 操作
     async def create_asset(self, asset_data: AssetCreate) -> Asset:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._create_asset_sync,
-            asset_data
-        )
-    
-    def _create_asset_sync(self, asset_data: AssetCreate) -> Asset:
         asset = Asset(
             id=f"asset_{uuid.uuid4().hex[:8]}",
             project_id=asset_data.project_id,
@@ -135,80 +159,38 @@ class DatabaseService:
             processing_status="uploaded",
             processing_progress=0
         )
-        self.db.add(asset)
-        self.db.commit()
-        self.db.refresh(asset)
-        return asset
+        return await self._add(asset)
     
     async def get_asset(self, asset_id: str) -> Optional[Asset]:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._get_asset_sync,
-            asset_id
-        )
+        return await self._first(select(Asset).where(Asset.id == asset_id))
     
-    def _get_asset_sync(self, asset_id: str) -> Optional[Asset]:
-        return self.db.query(Asset).filter(Asset.id == asset_id).first()
+    async def get_assets(self, asset_ids: List[str]) -> List[Asset]:
+        """按 ID 批量获取资产（单次 IN 查询）"""
+        if not asset_ids:
+            return []
+        return await self._all(select(Asset).where(Asset.id.in_(set(asset_ids))))
     
     async def update_asset_status(self, asset_id: str, status: str, progress: int = None):
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._update_asset_status_sync,
-            asset_id,
-            status,
-            progress
-        )
-    
-    def _update_asset_status_sync(self, asset_id: str, status: str, progress: int = None):
-        asset = self._get_asset_sync(asset_id)
-        if asset:
-            asset.processing_status = status
-            if progress is not None:
-                asset.processing_progress = progress
-            self.db.commit()
+        values = {"processing_status": status}
+        if progress is not None:
+            values["processing_progress"] = progress
+        await self._update_asset(asset_id, **values)
     
-    async def update_asset_paths(self, asset_id: str, file_path: str = None, 
+    async def update_asset_paths(self, asset_id: str, file_path: str = None,
                           proxy_path: str = None, thumbnail_path: str = None):
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._update_asset_paths_sync,
-            asset_id,
-            file_path,
-            proxy_path,
-            thumbnail_path
-        )
-    
-    def _update_asset_paths_sync(self, asset_id: str, file_path: str = None, 
-                          proxy_path: str = None, thumbnail_path: str = None):
-        asset = self._get_asset_sync(asset_id)
-        if asset:
-            if file_path:
-                asset.file_path = file_path
-            if proxy_path:
-                asset.proxy_path = proxy_path
-            if thumbnail_path:
-                asset.thumbnail_path = thumbnail_path
-            self.db.commit()
+        values = {}
+        if file_path:
+            values["file_path"] = file_path
+        if proxy_path:
+            values["proxy_path"] = proxy_path
+        if thumbnail_path:
+            values["thumbnail_path"] = thumbnail_path
+        if values:
+            await self._update_asset(asset_id, **values)
     
     # AssetSegment 操作
     async def create_asset_segment(self, asset_id: str, start_time: float, end_time: float,
                            description: str, tags: dict) -> AssetSegment:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._create_asset_segment_sync,
-            asset_id,
-            start_time,
-            end_time,
-            description,
-            tags
-        )
-    
-    def _create_asset_segment_sync(self, asset_id: str, start_time: float, end_time: float,
-                           description: str, tags: dict) -> AssetSegment:
         segment = AssetSegment(
             id=f"seg_{uuid.uuid4().hex[:8]}",
             asset_id=asset_id,
@@ -220,93 +202,17 @@ class DatabaseService:
             action_tags=tags.get("actions", []),
             cinematography_tags=tags.get("cinematography", [])
         )
-        self.db.add(segment)
-        self.db.commit()
-        self.db.refresh(segment)
+        async with self._session() as session:
+            session.add(segment)
+            await self.text_index.add(session, asset_id, SOURCE_SEGMENT, segment_documents(segment))
+            await self._commit(session)
         return segment
     
     async def get_asset_segments(self, asset_id: str) -> List[AssetSegment]:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._get_asset_segments_sync,
-            asset_id
-        )
-    
-    def _get_asset_segments_sync(self, asset_id: str) -> List[AssetSegment]:
-        return self.db.query(AssetSegment).filter(
-            AssetSegment.asset_id == asset_id
-        ).all()
-    
-    # AssetVector 操作
-    async def create_asset_vector(self, asset_id: str, vector_data: str, 
-                          content_type: str, text_content: str,
-                          segment_id: str = None) -> AssetVector:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._create_asset_vector_sync,
-            asset_id,
-            vector_data,
-            content_type,
-            text_content,
-            segment_id
-        )
-    
-    def _create_asset_vector_sync(self, asset_id: str, vector_data: str, 
-                          content_type: str, text_content: str,
-                          segment_id: str = None) -> AssetVector:
-        vector = AssetVector(
-            id=f"vec_{uuid.uuid4().hex[:8]}",
-            asset_id=asset_id,
-            segment_id=segment_id,
-            vector_data=vector_data,
-            content_type=content_type,
-            text_content=text_content
-        )
-        self.db.add(vector)
-        self.db.commit()
-        self.db.refresh(vector)
-        return vector
-    
-    def update_asset_paths(self, asset_id: str, file_path: str = None, 
-                          proxy_path: str = None, thumbnail_path: str = None):
-        asset = self.get_asset(asset_id)
-        if asset:
-            if file_path:
-                asset.file_path = file_path
-            if proxy_path:
-                asset.proxy_path = proxy_path
-            if thumbnail_path:
-                asset.thumbnail_path = thumbnail_path
-            self.db.commit()
-    
-    # AssetSegment 操作
-    def create_asset_segment(self, asset_id: str, start_time: float, end_time: float,
-                           description: str, tags: dict) -> AssetSegment:
-        segment = AssetSegment(
-            id=f"seg_{uuid.uuid4().hex[:8]}",
-            asset_id=asset_id,
-            start_time=start_time,
-            end_time=end_time,
-            description=description,
-            emotion_tags=tags.get("emotions", []),
-            scene_tags=tags.get("scenes", []),
-            action_tags=tags.get("actions", []),
-            cinematography_tags=tags.get("cinematography", [])
-        )
-        self.db.add(segment)
-        self.db.commit()
-        self.db.refresh(segment)
-        return segment
-    
-    def get_asset_segments(self, asset_id: str) -> List[AssetSegment]:
-        return self.db.query(AssetSegment).filter(
-            AssetSegment.asset_id == asset_id
-        ).all()
+        return await self._all(select(AssetSegment).where(AssetSegment.asset_id == asset_id))
     
     # AssetVector 操作
-    def create_asset_vector(self, asset_id: str, vector_data: str, 
+    async def create_asset_vector(self, asset_id: str, vector_data: str,
                           content_type: str, text_content: str,
                           segment_id: str = None) -> AssetVector:
         vector = AssetVector(
@@ -317,18 +223,15 @@ class DatabaseService:
             content_type=content_type,
             text_content=text_content
         )
-        self.db.add(vector)
-        self.db.commit()
-        self.db.refresh(vector)
-        return vector
+        return await self._add(vector)
     
-    def search_vectors_by_similarity(self, query_vector: str, limit: int = 10) -> List[AssetVector]:
+    async def search_vectors_by_similarity(self, query_vector: str, limit: int = 10) -> List[AssetVector]:
         # Phase 2: 简单实现，返回所有向量
         # 后续Phase会实现真正的向量相似度搜索
-        return self.db.query(AssetVector).limit(limit).all()
+        return await self._all(select(AssetVector).limit(limit))
     
     # FeedbackLog 操作
-    def create_feedback(self, beat_id: str, asset_id: str, segment_id: str,
+    async def create_feedback(self, beat_id: str, asset_id: str, segment_id: str,
                        action: str, context: str = None, query_context: str = None) -> FeedbackLog:
         feedback = FeedbackLog(
             id=f"fb_{uuid.uuid4().hex[:8]}",
@@ -339,44 +242,128 @@ class DatabaseService:
             context=context,
             query_context=query_context
         )
-        self.db.add(feedback)
-        self.db.commit()
-        self.db.refresh(feedback)
-        return feedback
+        return await self._add(feedback)
+    
+    # 处理元数据（Asset.processing_metadata）
+    async def _store_metadata(self, asset_id: str, key: str, value: dict, documents: dict = None):
+        """写入元数据，并在同一事务内替换对应来源的全文索引文档（来源 → 文档列表）"""
+        async with self._session() as session:
+            asset = (await session.execute(select(Asset).where(Asset.id == asset_id))).scalars().first()
+            if asset:
+                # JSON 列需整体赋值才会被识别为变更
+                metadata = dict(asset.processing_metadata or {})
+                metadata[key] = value
+                asset.processing_metadata = metadata
+                for source, source_documents in (documents or {}).items():
+                    await self.text_index.replace(session, asset_id, source, source_documents)
+                await self._commit(session)
+    
+    async def _get_metadata(self, asset_id: str, key: str) -> Optional[dict]:
+        asset = await self.get_asset(asset_id)
+        if asset and asset.processing_metadata:
+            return asset.processing_metadata.get(key)
+        return None
+    
+    async def _assets_with_metadata(self) -> List[Asset]:
+        return await self._all(select(Asset).where(Asset.processing_metadata.isnot(None)))
     
     # 转录数据操作
-    def store_transcription_data(self, asset_id: str, transcription_data: dict):
+    async def store_transcription_data(self, asset_id: str, transcription_data: dict):
         """存储转录数据到资产的元数据中"""
-        asset = self.get_asset(asset_id)
-        if asset:
-            # 将转录数据存储在metadata字段中
-            if not asset.metadata:
-                asset.metadata = {}
-            
-            asset.metadata["transcription"] = transcription_data
-            self.db.commit()
-    
-    def get_transcription_data(self, asset_id: str) -> Optional[dict]:
+        await self._store_metadata(asset_id, "transcription", transcription_data, {
+            SOURCE_TRANSCRIPT: transcription_documents(transcription_data)
+        })
+    
+    async def get_transcription_data(self, asset_id: str) -> Optional[dict]:
         """获取资产的转录数据"""
-        asset = self.get_asset(asset_id)
-        if asset and asset.metadata:
-            return asset.metadata.get("transcription")
-        return None
+        return await self._get_metadata(asset_id, "transcription")
     
-    def search_transcription_text(self, query: str, limit: int = 10) -> List[dict]:
-        """在转录文本中搜索关键词"""
+    async def search_text_segments(self, query: str, limit: int = 20,
+                                   sources: List[str] = None,
+                                   asset_ids: List[str] = None) -> List[dict]:
+        """
+        全文检索片段级命中（供混合搜索融合）
+        
+        Args:
+            query: 查询文本
+            limit: 最多返回的命中数
+            sources: 限定来源（transcript / segment / keyframe / visual）
+            asset_ids: 限定素材
+        
+        Returns:
+            按 BM25 分数降序的命中 {asset_id, source, ref_id, start_time, end_time, text, score}；
+            索引不可用时返回空列表
+        """
+        async with self._session() as session:
+            hits = await self.text_index.search(session, query, limit, sources, asset_ids)
+        return hits or []
+    
+    async def search_transcription_text(self, query: str, limit: int = 10) -> List[dict]:
+        """
+        在转录文本中搜索关键词（按素材分组，素材按最佳片段的 BM25 分数排序）
+        
+        查询的全部词项都须命中（AND），与扫描回退的整串匹配保持一致，
+        避免只共享部分二元组（如「治郎」之于「炭治郎」）的片段被返回。
+        """
+        async with self._session() as session:
+            hits = await self.text_index.search(
+                session, query, limit * self.TEXT_HITS_PER_ASSET, [SOURCE_TRANSCRIPT],
+                operator="AND"
+            )
+        if hits is None:
+            return await self._scan_transcription_text(query, limit)
+        
+        grouped = {}
+        for hit in hits:
+            if hit["asset_id"] not in grouped:
+                if len(grouped) >= limit:
+                    continue
+                grouped[hit["asset_id"]] = []
+            grouped[hit["asset_id"]].append(hit)
+        
+        assets = {asset.id: asset for asset in await self.get_assets(list(grouped))}
+        results = []
+        for asset_id, asset_hits in grouped.items():
+            asset = assets.get(asset_id)
+            if asset is None:
+                continue
+            transcription = (asset.processing_metadata or {}).get("transcription", {})
+            confidences = {
+                str(segment.get("id")): segment.get("confidence")
+                for segment in transcription.get("segments", [])
+            }
+            results.append({
+                "asset_id": asset_id,
+                "filename": asset.filename,
+                "language": transcription.get("language", "unknown"),
+                "score": asset_hits[0]["score"],
+                "matching_segments": [
+                    {
+                        "segment_id": hit["ref_id"],
+                        "start_time": hit["start_time"],
+                        "end_time": hit["end_time"],
+                        "text": hit["text"],
+                        "confidence": confidences.get(hit["ref_id"]),
+                        "score": hit["score"]
+                    }
+                    for hit in asset_hits
+                ]
+            })
+        
+        return results
+    
+    async def _scan_transcription_text(self, query: str, limit: int) -> List[dict]:
+        """逐个素材子串匹配（全文索引不可用时）"""
         results = []
         
         # 查询所有有转录数据的资产
-        assets = self.db.query(Asset).filter(
-            Asset.metadata.isnot(None)
-        ).all()
+        assets = await self._assets_with_metadata()
         
         for asset in assets:
-            if asset.metadata and "transcription" in asset.metadata:
-                transcription = asset.metadata["transcription"]
+            if asset.processing_metadata and "transcription" in asset.processing_metadata:
+                transcription = asset.processing_metadata["transcription"]
                 full_text = transcription.get("full_text", "").lower()
-                
+        
                 # 简单的关键词匹配
                 if query.lower() in full_text:
                     # 查找匹配的片段
@@ -390,7 +377,7 @@ class DatabaseService:
                                 "text": segment["text"],
                                 "confidence": segment["confidence"]
                             })
-                    
+        
                     if matching_segments:
                         results.append({
                             "asset_id": asset.id,
@@ -398,49 +385,54 @@ class DatabaseService:
                             "language": transcription.get("language", "unknown"),
                             "matching_segments": matching_segments
                         })
-                
+        
                 if len(results) >= limit:
                     break
         
         return results
     
     # 视觉数据操作
-    def store_visual_data(self, asset_id: str, visual_data: dict):
+    async def store_visual_data(self, asset_id: str, visual_data: dict):
         """存储视觉分析数据到资产的元数据中"""
-        asset = self.get_asset(asset_id)
-        if asset:
-            # 将视觉数据存储在metadata字段中
-            if not asset.metadata:
-                asset.metadata = {}
-            
-            asset.metadata["visual_analysis"] = visual_data
-            self.db.commit()
-    
-    def get_visual_data(self, asset_id: str) -> Optional[dict]:
+        await self._store_metadata(asset_id, "visual_analysis", visual_data, {
+            SOURCE_KEYFRAME: keyframe_documents(visual_data),
+            SOURCE_VISUAL: visual_summary_documents(visual_data)
+        })
+    
+    async def get_visual_data(self, asset_id: str) -> Optional[dict]:
         """获取资产的视觉分析数据"""
-        asset = self.get_asset(asset_id)
-        if asset and asset.metadata:
-            return asset.metadata.get("visual_analysis")
-        return None
+        return await self._get_metadata(asset_id, "visual_analysis")
     
-    def search_visual_features(self, query_tags: dict, limit: int = 10) -> List[dict]:
+    async def search_visual_features(self, query_tags: dict, limit: int = 10) -> List[dict]:
         """基于视觉特征搜索资产"""
-        results = []
+        # 全文索引按摘要标签预筛候选素材，再逐个精确匹配
+        terms = " ".join(
+            str(query_tags[name]) for name in self.VISUAL_QUERY_FIELDS if query_tags.get(name)
+        )
+        hits = None
+        if terms:
+            async with self._session() as session:
+                hits = await self.text_index.search(
+                    session, terms, self.VISUAL_CANDIDATE_LIMIT, [SOURCE_VISUAL],
+                    operator="AND", prefix=True
+                )
+        if hits is None:
+            # 查询所有有视觉数据的资产
+            assets = await self._assets_with_metadata()
+        else:
+            assets = await self.get_assets(list(dict.fromkeys(hit["asset_id"] for hit in hits)))
         
-        # 查询所有有视觉数据的资产
-        assets = self.db.query(Asset).filter(
-            Asset.metadata.isnot(None)
-        ).all()
+        results = []
         
         for asset in assets:
-            if asset.metadata and "visual_analysis" in asset.metadata:
-                visual_data = asset.metadata["visual_analysis"]
-                
+            if asset.processing_metadata and "visual_analysis" in asset.processing_metadata:
+                visual_data = asset.processing_metadata["visual_analysis"]
+        
                 # 检查视觉特征匹配
                 if self._match_visual_features(visual_data, query_tags):
                     keyframes = visual_data.get("keyframes", [])
                     visual_summary = visual_data.get("visual_description", {}).get("visual_summary", {})
-                    
+        
                     results.append({
                         "asset_id": asset.id,
                         "filename": asset.filename,
@@ -448,7 +440,7 @@ class DatabaseService:
                         "keyframes_count": len(keyframes),
                         "duration": visual_data.get("duration", 0)
                     })
-                
+        
                 if len(results) >= limit:
                     break
         
@@ -487,4 +479,4 @@ class DatabaseService:
             if lighting_query.lower() not in lighting.lower():
                 return False
         
-        return True
\ No newline at end of file
+        return True
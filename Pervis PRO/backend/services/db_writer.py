@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+单写线程数据库写入队列
+
+SQLite 同一时刻只允许一个写事务。渲染线程的进度更新等高频小写入如果各自
+提交，会在写锁上互相等待，并与请求处理中的写入争用。本模块把这类写入交给
+一个专用线程：
+- 写入以 job(session) 形式入队，调用方不等待提交（需要时可等待返回的 Future）
+- 写线程一次取出队列中积压的全部写入（最多 DB_WRITER_MAX_BATCH 个），
+  在一个事务中执行并提交一次
+- 带 key 的写入（如某个任务的进度）在尚未执行时被同 key 的新写入替换，
+  只落库最新值；key 只应用于整行覆盖式的写入
+- 批量事务失败时回滚，并逐个重试以定位失败的写入
+
+配置（环境变量）：
+- DB_WRITER_MAX_BATCH: 单个事务最多合并的写入数（默认 64）
+"""
+
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+class _WriteJob:
+    __slots__ = ("func", "key", "futures")
+
+    def __init__(self, func: Callable, key: Optional[Hashable]):
+        self.func = func
+        self.key = key
+        self.futures: List[Future] = [Future()]
+
+
+class DatabaseWriter:
+    """单写线程写入队列"""
+
+    def __init__(self, session_factory: Optional[Callable] = None, max_batch: int = 64):
+        """
+        Args:
+            session_factory: 创建会话的工厂（默认 database.SessionLocal）
+            max_batch: 单个事务最多合并的写入数
+        """
+        self._session_factory = session_factory
+        self.max_batch = max(1, max_batch)
+
+        self._queue: "queue.Queue[Optional[_WriteJob]]" = queue.Queue()
+        self._pending_keys: Dict[Hashable, _WriteJob] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+        self._stats = {"submitted": 0, "coalesced": 0, "executed": 0, "transactions": 0, "failed": 0}
+
+    # ---------- 提交 ----------
+
+    def submit(self, func: Callable[[Any], Any], key: Optional[Hashable] = None) -> Future:
+        """
+        提交写入
+
+        Args:
+            func: 在写线程中执行的 func(session)，无需自行提交
+            key: 合并键；同 key 且尚未执行的写入只保留最新的一个
+
+        Returns:
+            写入提交后完成的 Future（结果为 func 的返回值）
+        """
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("数据库写入队列已关闭")
+            self._ensure_thread()
+            self._stats["submitted"] += 1
+
+            pending = self._pending_keys.get(key) if key is not None else None
+            if pending is not None:
+                # 替换排队中的旧写入，保留其队列位置
+                pending.func = func
+                future = Future()
+                pending.futures.append(future)
+                self._stats["coalesced"] += 1
+                return future
+
+            job = _WriteJob(func, key)
+            if key is not None:
+                self._pending_keys[key] = job
+            self._queue.put(job)
+            return job.futures[0]
+
+    def execute(self, statement: str, params: Optional[Dict[str, Any]] = None,
+                key: Optional[Hashable] = None) -> Future:
+        """提交一条 SQL 写入"""
+        return self.submit(lambda session: session.execute(text(statement), params or {}), key=key)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前提交的写入全部落库"""
+        try:
+            self.submit(lambda session: None).result(timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """写完积压的写入后停止写线程"""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    # ---------- 写线程 ----------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def _new_session(self):
+        if self._session_factory is None:
+            from database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _run(self):
+        session = self._new_session()
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                batch = [job]
+                stop = False
+                while len(batch) < self.max_batch:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        stop = True
+                        break
+                    batch.append(job)
+                self._execute(session, batch)
+                if stop:
+                    return
+        finally:
+            session.close()
+
+    def _take(self, batch: List[_WriteJob]):
+        """出队后不再接受合并"""
+        with self._lock:
+            for job in batch:
+                if job.key is not None and self._pending_keys.get(job.key) is job:
+                    del self._pending_keys[job.key]
+
+    def _execute(self, session, batch: List[_WriteJob]):
+        self._take(batch)
+        try:
+            results = [job.func(session) for job in batch]
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(batch) == 1:
+                self._fail(batch[0], e)
+                return
+            for job in batch:
+                self._execute(session, [job])
+            return
+
+        self._stats["transactions"] += 1
+        self._stats["executed"] += len(batch)
+        for job, result in zip(batch, results):
+            for future in job.futures:
+                future.set_result(result)
+
+    def _fail(self, job: _WriteJob, error: Exception):
+        self._stats["failed"] += 1
+        logger.error(f"数据库写入失败: {error}")
+        for future in job.futures:
+            future.set_exception(error)
+
+    # ---------- 统计 ----------
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "queued": self._queue.qsize(),
+            "max_batch": self.max_batch,
+        }
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_db_writer: Optional[DatabaseWriter] = None
+_db_writer_lock = threading.Lock()
+
+
+def get_db_writer() -> DatabaseWriter:
+    """获取全局数据库写入队列"""
+    global _db_writer
+    if _db_writer is None:
+        with _db_writer_lock:
+            if _db_writer is None:
+                _db_writer = DatabaseWriter(max_batch=int(os.getenv("DB_WRITER_MAX_BATCH", "64")))
+    return _db_writer
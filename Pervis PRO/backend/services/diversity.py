@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+多样性重排（MMR）
+
+召回结果常出现同一源视频切出的多个近似片段。本模块在排序后的前 N 个候选上
+执行最大边际相关（Maximal Marginal Relevance）重排：
+
+    MMR(i) = λ · relevance(i) − (1 − λ) · max_{j∈已选} cos(e_i, e_j)
+
+- 候选嵌入的两两相似度一次矩阵乘法算出，贪心选择时只增量更新
+  “与已选集合的最大相似度”向量，N=200 时耗时在 1 ms 量级
+- 可选按分组（video_id）限制数量：达到上限的分组其余候选排到最后，
+  候选不足时仍会补齐，不会减少结果数量
+- 没有嵌入的候选与其它候选相似度视为 0（只受分组上限约束）
+"""
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def embedding_matrix(embeddings: Sequence[Optional[Sequence[float]]]) -> np.ndarray:
+    """
+    嵌入列表 → 行归一化矩阵
+
+    维度以第一个非空嵌入为准；缺失、维度不一致或零向量的行为零行。
+    """
+    dim = next((len(e) for e in embeddings if e is not None and len(e)), 0)
+    matrix = np.zeros((len(embeddings), dim), dtype=np.float32)
+    for i, embedding in enumerate(embeddings):
+        if embedding is not None and len(embedding) == dim:
+            matrix[i] = embedding
+    norms = np.linalg.norm(matrix, axis=1)
+    valid = norms > 0
+    matrix[valid] /= norms[valid, None]
+    return matrix
+
+
+def mmr_rerank(
+    scores: Sequence[float],
+    embeddings: Optional[np.ndarray] = None,
+    groups: Optional[Sequence[Optional[str]]] = None,
+    top_k: Optional[int] = None,
+    diversity_lambda: float = 0.7,
+    max_per_group: int = 0,
+) -> List[int]:
+    """
+    MMR 重排
+
+    Args:
+        scores: 候选相关性分数（通常已按降序排列，平局时保持输入顺序）
+        embeddings: 行归一化嵌入矩阵（N × dim），None 表示只按分组上限重排
+        groups: 候选分组（如 video_id），None 元素不计入上限
+        top_k: 需要按 MMR 选出的数量，其余候选按原顺序追加（默认全部）
+        diversity_lambda: 相关性权重 λ（1.0 即不考虑相似度）
+        max_per_group: 每组上限（0 表示不限制）
+
+    Returns:
+        重排后的候选下标（包含全部候选）
+    """
+    n = len(scores)
+    use_similarity = embeddings is not None and embeddings.size > 0 and diversity_lambda < 1.0
+    use_groups = groups is not None and max_per_group > 0
+    if n <= 1 or not (use_similarity or use_groups):
+        return list(range(n))
+
+    top_k = n if top_k is None else min(top_k, n)
+    relevance = np.asarray(scores, dtype=np.float32)
+    similarity = embeddings @ embeddings.T if use_similarity else None
+
+    if use_groups:
+        codes = {}
+        group_of = np.array(
+            [-1 if g is None else codes.setdefault(g, len(codes)) for g in groups],
+            dtype=np.int64,
+        )
+        group_counts = np.zeros(len(codes), dtype=np.int64)
+
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    deferred = np.zeros(n, dtype=bool)
+    order: List[int] = []
+
+    while len(order) < top_k:
+        candidates = available & ~deferred
+        if not candidates.any():
+            break
+        if use_similarity:
+            marginal = diversity_lambda * relevance - (1 - diversity_lambda) * max_similarity
+        else:
+            marginal = relevance.copy()
+        marginal[~candidates] = -np.inf
+        chosen = int(np.argmax(marginal))
+
+        order.append(chosen)
+        available[chosen] = False
+        if use_similarity:
+            np.maximum(max_similarity, similarity[chosen], out=max_similarity)
+        if use_groups and group_of[chosen] >= 0:
+            group = group_of[chosen]
+            group_counts[group] += 1
+            if group_counts[group] >= max_per_group:
+                deferred |= group_of == group
+
+    # 未选中的候选按原顺序追加：未超限的在前，超过分组上限的在后
+    rest = np.flatnonzero(available)
+    order.extend(rest[~deferred[rest]].tolist())
+    order.extend(rest[deferred[rest]].tolist())
+    return order
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+关键帧感知哈希与近重复检测
+
+静态镜头会产生一串几乎相同的关键帧，每帧各自生成 CLIP 嵌入、向量索引和
+数据库记录。本模块：
+- 在提取关键帧读取图像时计算 64 位感知哈希（dHash，可选 pHash）
+- 素材内：按时间顺序与当前代表帧比较，汉明距离不超过阈值的帧并入代表帧，
+  代表帧记录覆盖的时间范围（end_timestamp）与并入数量
+- 跨素材：进程级 BK 树索引全部关键帧哈希，查找与某素材大部分关键帧近似
+  重复的其他素材，用于标记素材库中的重复源文件
+
+哈希以 16 位十六进制字符串存储（SQLite INTEGER 为有符号 64 位）。
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8   # 8x8 = 64 位
+
+
+# ============================================================
+# 哈希计算
+# ============================================================
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).flatten()).tobytes(), "big")
+
+
+def dhash(image, hash_size: int = HASH_SIZE) -> int:
+    """差值哈希：灰度缩放到 (hash_size+1)×hash_size，比较水平相邻像素"""
+    from PIL import Image
+
+    gray = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def phash(image, hash_size: int = HASH_SIZE) -> int:
+    """感知哈希：32×32 灰度图做二维 DCT，低频系数与中位数比较"""
+    from PIL import Image
+
+    gray = image.convert("L").resize((32, 32), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.float64)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:hash_size, :hash_size]
+    median = np.median(low.flatten()[1:])   # 不含直流分量
+    return _bits_to_int(low > median)
+
+
+def compute_hash(image, algorithm: str = "dhash") -> int:
+    """按算法名计算哈希（dhash / phash）"""
+    return phash(image) if algorithm == "phash" else dhash(image)
+
+
+def hash_to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def hex_to_hash(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value, 16)
+    except ValueError:
+        return None
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+# ============================================================
+# 素材内近重复合并
+# ============================================================
+
+def collapse_near_duplicates(keyframes: List[Any], threshold: int) -> Tuple[List[Any], List[Any]]:
+    """
+    合并素材内的近重复关键帧
+
+    按时间顺序，每帧与当前代表帧比较哈希：距离不超过 threshold 时并入代表帧
+    （代表帧 end_timestamp 延伸到该帧、duplicate_count 加一），否则成为新的代表帧。
+    与代表帧而非上一帧比较，缓慢摇镜不会被一路串联合并。没有哈希的帧保留。
+
+    Args:
+        keyframes: KeyFrameData 列表（使用 frame_hash / timestamp / end_timestamp / duplicate_count）
+        threshold: 汉明距离阈值（64 位哈希，常用 4-10）
+
+    Returns:
+        (保留的代表帧, 被并入的帧)
+    """
+    kept: List[Any] = []
+    dropped: List[Any] = []
+    representative = None
+    representative_hash = None
+
+    for keyframe in sorted(keyframes, key=lambda kf: kf.timestamp):
+        frame_hash = hex_to_hash(keyframe.frame_hash)
+        if (
+            frame_hash is not None
+            and representative_hash is not None
+            and hamming_distance(frame_hash, representative_hash) <= threshold
+        ):
+            representative.end_timestamp = max(
+                representative.end_timestamp or representative.timestamp,
+                keyframe.end_timestamp or keyframe.timestamp,
+            )
+            representative.duplicate_count += 1 + keyframe.duplicate_count
+            dropped.append(keyframe)
+            continue
+
+        kept.append(keyframe)
+        representative = keyframe
+        representative_hash = frame_hash
+
+    return kept, dropped
+
+
+# ============================================================
+# BK 树
+# ============================================================
+
+class BKTree:
+    """汉明距离 BK 树（半径查询只访问满足三角不等式的子树）"""
+
+    def __init__(self):
+        self._root: Optional[list] = None   # [hash, items, {distance: child}]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, hash_value: int, item: Any):
+        self._size += 1
+        if self._root is None:
+            self._root = [hash_value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, [item], {}]
+                return
+            node = child
+
+    def search(self, hash_value: int, radius: int) -> List[Tuple[int, Any]]:
+        """返回距离不超过 radius 的 (距离, 条目)"""
+        if self._root is None:
+            return []
+        results = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_value, node[0])
+            if distance <= radius:
+                results.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return results
+
+
+# ============================================================
+# 跨素材哈希索引
+# ============================================================
+
+class FrameHashIndex:
+    """关键帧哈希索引（进程级）"""
+
+    def __init__(self):
+        self.loaded = False
+        self._tree = BKTree()
+        # keyframe_id → (asset_id, hash, version)；树中条目为 (keyframe_id, version)，版本不符即已失效
+        self._entries: Dict[str, Tuple[str, int, int]] = {}
+        self._by_asset: Dict[str, Set[str]] = {}
+        self._version = 0
+        self._lock = threading.RLock()
+
+    # ---------- 加载 ----------
+
+    def ensure_loaded(self, db) -> bool:
+        """首次调用时从数据库载入全部关键帧哈希"""
+        if self.loaded:
+            return True
+        with self._lock:
+            if self.loaded:
+                return True
+            from models.keyframe import KeyFrame
+
+            rows = db.query(KeyFrame).with_entities(
+                KeyFrame.keyframe_id, KeyFrame.asset_id, KeyFrame.frame_hash
+            ).filter(KeyFrame.frame_hash.isnot(None))
+            count = 0
+            for keyframe_id, asset_id, frame_hash in rows:
+                count += self._put(keyframe_id, asset_id, hex_to_hash(frame_hash))
+            self.loaded = True
+            logger.info(f"关键帧哈希索引已加载: {count} 个关键帧, {len(self._by_asset)} 个素材")
+            return True
+
+    # ---------- 更新 ----------
+
+    def _put(self, keyframe_id: str, asset_id: str, frame_hash: Optional[int]) -> bool:
+        self._discard(keyframe_id)
+        if frame_hash is None:
+            return False
+        self._version += 1
+        self._entries[keyframe_id] = (asset_id, frame_hash, self._version)
+        self._by_asset.setdefault(asset_id, set()).add(keyframe_id)
+        self._tree.add(frame_hash, (keyframe_id, self._version))
+        return True
+
+    def _discard(self, keyframe_id: str):
+        entry = self._entries.pop(keyframe_id, None)
+        if entry is not None:
+            ids = self._by_asset.get(entry[0])
+            if ids is not None:
+                ids.discard(keyframe_id)
+                if not ids:
+                    del self._by_asset[entry[0]]
+
+    def upsert(self, keyframes: Iterable[Tuple[str, str, Optional[str]]]) -> int:
+        """写入 (keyframe_id, asset_id, 十六进制哈希)；哈希为 None 时移除。未载入时忽略"""
+        if not self.loaded:
+            return 0
+        count = 0
+        with self._lock:
+            for keyframe_id, asset_id, frame_hash in keyframes:
+                count += self._put(keyframe_id, asset_id, hex_to_hash(frame_hash))
+            self._maybe_rebuild()
+        return count
+
+    def remove_asset(self, asset_id: str):
+        with self._lock:
+            for keyframe_id in list(self._by_asset.get(asset_id, ())):
+                self._discard(keyframe_id)
+            self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        """失效条目超过有效条目时重建 BK 树"""
+        if len(self._tree) <= 2 * len(self._entries) + 64:
+            return
+        self._tree = BKTree()
+        for keyframe_id, (_, frame_hash, version) in self._entries.items():
+            self._tree.add(frame_hash, (keyframe_id, version))
+
+    def clear(self):
+        with self._lock:
+            self._tree = BKTree()
+            self._entries.clear()
+            self._by_asset.clear()
+            self.loaded = False
+
+    # ---------- 查询 ----------
+
+    def find_similar(self, frame_hash: int, radius: int,
+                     exclude_asset: Optional[str] = None) -> List[Dict[str, Any]]:
+        """查找哈希距离不超过 radius 的关键帧"""
+        with self._lock:
+            results = []
+            for distance, (keyframe_id, version) in self._tree.search(frame_hash, radius):
+                entry = self._entries.get(keyframe_id)
+                if entry is None or entry[2] != version or entry[0] == exclude_asset:
+                    continue
+                results.append({"keyframe_id": keyframe_id, "asset_id": entry[0], "distance": distance})
+        results.sort(key=lambda r: r["distance"])
+        return results
+
+    def find_duplicate_assets(self, asset_id: str, frame_hashes: List[str], threshold: int,
+                              min_ratio: float = 0.8) -> List[Dict[str, Any]]:
+        """
+        查找与给定素材近似重复的其他素材
+
+        Args:
+            asset_id: 素材 ID（结果中排除）
+            frame_hashes: 该素材关键帧的十六进制哈希
+            threshold: 单帧汉明距离阈值
+            min_ratio: 至少有该比例的关键帧在另一素材中有近似帧才视为重复
+
+        Returns:
+            [{asset_id, matched_frames, ratio}]，按 ratio 降序
+        """
+        hashes = [h for h in (hex_to_hash(value) for value in frame_hashes) if h is not None]
+        if not hashes:
+            return []
+
+        matched: Dict[str, int] = {}
+        for frame_hash in hashes:
+            for other in {r["asset_id"] for r in self.find_similar(frame_hash, threshold, asset_id)}:
+                matched[other] = matched.get(other, 0) + 1
+
+        results = [
+            {"asset_id": other, "matched_frames": count, "ratio": count / len(hashes)}
+            for other, count in matched.items()
+            if count / len(hashes) >= min_ratio
+        ]
+        results.sort(key=lambda r: (-r["ratio"], r["asset_id"]))
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "keyframes": len(self._entries),
+            "assets": len(self._by_asset),
+            "tree_nodes": len(self._tree),
+        }
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_frame_hash_index: Optional[FrameHashIndex] = None
+
+
+def get_frame_hash_index() -> FrameHashIndex:
+    """获取全局关键帧哈希索引"""
+    global _frame_hash_index
+    if _frame_hash_index is None:
+        _frame_hash_index = FrameHashIndex()
+    return _frame_hash_index
@@ -2,10 +2,25 @@
 图片导出服务
 支持PNG和JPG格式的BeatBoard导出
 增强功能：联系表导出、按场次分组、ZIP打包
+
+渲染模型：
+- Pillow 绘制在进程池中执行（每个 Beat 一个任务），不阻塞事件循环
+- 已完成的图片经队列交给写线程直接写入 ZIP，不再落地临时目录
+- 字体和解码后的缩略图在每个工作进程内缓存，跨 Beat 复用（图片缓存按字节数限制，IMAGE_EXPORT_CACHE_MB）
+- 写线程失败时生产者不再阻塞在满队列上，导出直接失败并清理 ZIP
 """
 
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from functools import lru_cache
+import asyncio
+import io
+import logging
+import queue
+import threading
 import uuid
 import zipfile
 import os
@@ -15,7 +30,281 @@ from sqlalchemy.orm import Session
 
 from PIL import Image, ImageDraw, ImageFont
 
-from database import Project, Beat, ExportHistory
+from database import Project, Beat, ExportHistory, Asset
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png'}
+
+
+# ============================================================
+# 渲染函数（模块级，可在进程池中执行）
+# ============================================================
+
+@lru_cache(maxsize=32)
+def _load_font(size: int):
+    """加载字体（进程内缓存）"""
+    try:
+        return ImageFont.truetype("msyh.ttc", size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+class _ImageCache:
+    """按解码后字节数限制的 LRU 图片缓存（整幅 Beat 背景单张可达数 MB，按条数限制不可控）"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._items: "OrderedDict[tuple, Image.Image]" = OrderedDict()
+
+    @staticmethod
+    def _nbytes(img: Image.Image) -> int:
+        return img.width * img.height * len(img.getbands())
+
+    def get(self, key: tuple) -> Optional[Image.Image]:
+        img = self._items.get(key)
+        if img is not None:
+            self._items.move_to_end(key)
+        return img
+
+    def put(self, key: tuple, img: Image.Image):
+        nbytes = self._nbytes(img)
+        if nbytes > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.current_bytes -= self._nbytes(old)
+        self._items[key] = img
+        self.current_bytes += nbytes
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.current_bytes -= self._nbytes(evicted)
+
+
+_image_cache = _ImageCache(int(float(os.getenv("IMAGE_EXPORT_CACHE_MB", "64")) * 1024 * 1024))
+
+
+def _load_image(path: str, size: Tuple[int, int]) -> Optional[Image.Image]:
+    """解码并缩放图片"""
+    try:
+        with Image.open(path) as img:
+            # JPEG 解码时直接按目标尺寸降采样，避免解码整幅原图
+            img.draft('RGB', size)
+            return img.convert('RGB').resize(size)
+    except Exception:
+        return None
+
+
+def _cached_image(path: Optional[str], size: Tuple[int, int]) -> Optional[Image.Image]:
+    """进程内缓存的 _load_image，mtime 参与缓存键以感知文件更新"""
+    if not path:
+        return None
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    key = (path, mtime, size)
+    img = _image_cache.get(key)
+    if img is None:
+        img = _load_image(path, size)
+        if img is not None:
+            _image_cache.put(key, img)
+    return img
+
+
+def _encode_image(img: Image.Image, format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if format.lower() == "png":
+        img.save(buffer, 'PNG', quality=quality)
+    else:
+        img.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def _render_beat(spec: Dict[str, Any]) -> Tuple[str, bytes]:
+    """渲染单个 Beat，返回 (ZIP 内路径, 图片字节)"""
+    width, height = spec["width"], spec["height"]
+    img = Image.new('RGB', (width, height), color='#1a1a1a')
+
+    # 如果有素材，尝试加载
+    background = _cached_image(spec.get("image_path"), (width, height))
+    if background is not None:
+        img.paste(background, (0, 0))
+        # 添加半透明遮罩
+        overlay = Image.new('RGBA', (width, height), (0, 0, 0, 128))
+        img = Image.alpha_composite(img.convert('RGBA'), overlay).convert('RGB')
+    draw = ImageDraw.Draw(img)
+
+    title_font = _load_font(48)
+    body_font = _load_font(28)
+    small_font = _load_font(20)
+
+    # 绘制Beat信息
+    beat_title = f"Beat {spec['order_index'] + 1}"
+    if spec.get("scene_slug"):
+        beat_title = f"{spec['scene_slug']} - Beat {spec['order_index'] + 1}"
+
+    draw.text((width // 2, 80), beat_title, fill='#fbbf24', font=title_font, anchor='mm')
+
+    # 绘制内容
+    content = spec.get("content")
+    if content:
+        # 自动换行
+        max_chars_per_line = 50
+        lines = [content[i:i + max_chars_per_line] for i in range(0, len(content), max_chars_per_line)]
+
+        y_offset = 200
+        for line in lines[:8]:  # 最多8行
+            draw.text((width // 2, y_offset), line, fill='#f3f4f6', font=body_font, anchor='mm')
+            y_offset += 40
+
+    # 绘制时长和标签
+    info_y = height - 100
+    if spec.get("duration"):
+        draw.text((100, info_y), f"时长: {spec['duration']}秒", fill='#9ca3af', font=small_font)
+
+    all_tags = (spec.get("emotion_tags") or [])[:3] + (spec.get("scene_tags") or [])[:3]
+    if all_tags:
+        tags_text = " | ".join(all_tags[:5])
+        draw.text((width - 100, info_y), tags_text, fill='#9ca3af', font=small_font, anchor='rm')
+
+    filename = f"beat_{spec['order_index'] + 1:03d}.{spec['format']}"
+    arcname = f"{spec['folder']}/{filename}" if spec.get("folder") else filename
+    return arcname, _encode_image(img, spec["format"], spec["quality"])
+
+
+def _render_contact_sheet(spec: Dict[str, Any]) -> Tuple[bytes, int, int]:
+    """渲染联系表，返回 (图片字节, 宽, 高)"""
+    beats = spec["beats"]
+    columns = spec["columns"]
+    thumbnail_width = spec["thumbnail_width"]
+    thumbnail_height = spec["thumbnail_height"]
+
+    # 计算布局
+    total_beats = len(beats)
+    rows = math.ceil(total_beats / columns)
+
+    margin = 20
+    header_height = 100
+    footer_height = 50
+
+    # 计算总尺寸
+    total_width = columns * thumbnail_width + (columns + 1) * margin
+    total_height = header_height + rows * thumbnail_height + (rows + 1) * margin + footer_height
+
+    img = Image.new('RGB', (total_width, total_height), color='#1a1a1a')
+    draw = ImageDraw.Draw(img)
+
+    title_font = _load_font(36)
+    label_font = _load_font(14)
+    small_font = _load_font(12)
+
+    # 绘制标题
+    draw.text((total_width // 2, 50), f"{spec['title']} - 联系表", fill='#fbbf24', font=title_font, anchor='mm')
+
+    thumb_size = (thumbnail_width - 4, thumbnail_height - 30)
+    for i, beat in enumerate(beats):
+        row = i // columns
+        col = i % columns
+
+        x = margin + col * (thumbnail_width + margin)
+        y = header_height + margin + row * (thumbnail_height + margin)
+
+        # 绘制缩略图背景
+        draw.rectangle([x, y, x + thumbnail_width, y + thumbnail_height],
+                       fill='#2d2d2d', outline='#3d3d3d', width=1)
+
+        # 如果有素材缩略图，加载并绘制
+        thumb_img = _cached_image(beat.get("thumbnail_path"), thumb_size)
+        if thumb_img is not None:
+            img.paste(thumb_img, (x + 2, y + 2))
+
+        # 绘制Beat编号
+        draw.text((x + 5, y + thumbnail_height - 25), f"#{beat['order_index'] + 1}",
+                  fill='#fbbf24', font=label_font)
+
+        # 绘制时长
+        if beat.get("duration"):
+            draw.text((x + thumbnail_width - 40, y + thumbnail_height - 25),
+                      f"{beat['duration']}s", fill='#9ca3af', font=small_font)
+
+    # 绘制页脚
+    footer_text = f"共 {total_beats} 个镜头 | 导出时间: {spec['exported_at']}"
+    draw.text((total_width // 2, total_height - 25), footer_text,
+              fill='#6b7280', font=small_font, anchor='mm')
+
+    return _encode_image(img, spec["format"], spec["quality"]), total_width, total_height
+
+
+# ============================================================
+# 渲染进程池
+# ============================================================
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+_fallback_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        workers = int(os.getenv("IMAGE_EXPORT_WORKERS", "0")) or (os.cpu_count() or 1)
+        _render_pool = ProcessPoolExecutor(max_workers=workers)
+    return _render_pool
+
+
+async def _run_render(func, *args):
+    """在渲染进程池中执行；进程池损坏时重建并回退到线程池"""
+    global _render_pool, _fallback_pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_render_pool(), func, *args)
+    except BrokenProcessPool:
+        logger.warning("渲染进程池已损坏，重建后回退到线程池执行")
+        _render_pool = None
+        if _fallback_pool is None:
+            _fallback_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        return await loop.run_in_executor(_fallback_pool, func, *args)
+
+
+# 渲染结果队列长度（写线程落后时生产者最多积压这么多张图片）
+ZIP_QUEUE_SIZE = 64
+
+
+def _zip_writer(zip_path: Path, entries: "queue.Queue", failed: threading.Event) -> int:
+    """写线程：从队列取 (arcname, data) 写入 ZIP，收到 None 结束；异常时置位 failed"""
+    count = 0
+    try:
+        # PNG/JPEG 已经是压缩格式，再 DEFLATE 只浪费 CPU
+        with zipfile.ZipFile(str(zip_path), 'w', zipfile.ZIP_STORED) as zipf:
+            while True:
+                item = entries.get()
+                if item is None:
+                    break
+                arcname, data = item
+                zipf.writestr(arcname, data)
+                count += 1
+    except BaseException:
+        failed.set()
+        raise
+    return count
+
+
+def _put_entry(entries: "queue.Queue", item, failed: threading.Event) -> bool:
+    """生产者放入队列；写线程已失败时返回 False，而不是在满队列上永久阻塞"""
+    while not failed.is_set():
+        try:
+            entries.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _safe_scene_name(scene_name: str) -> str:
+    """清理场次名称（移除非法字符）"""
+    safe = "".join(c for c in scene_name if c.isalnum() or c in (' ', '-', '_')).strip()
+    return safe or "scene"
 
 
 class ImageExporter:
@@ -61,16 +350,10 @@ class ImageExporter:
             draw = ImageDraw.Draw(img)
             
             # 加载字体
-            try:
-                title_font = ImageFont.truetype("msyh.ttc", 48)
-                heading_font = ImageFont.truetype("msyh.ttc", 32)
-                body_font = ImageFont.truetype("msyh.ttc", 24)
-                small_font = ImageFont.truetype("msyh.ttc", 18)
-            except:
-                title_font = ImageFont.load_default()
-                heading_font = ImageFont.load_default()
-                body_font = ImageFont.load_default()
-                small_font = ImageFont.load_default()
+            title_font = _load_font(48)
+            heading_font = _load_font(32)
+            body_font = _load_font(24)
+            small_font = _load_font(18)
             
             # 绘制标题
             title_text = project.title
@@ -184,6 +467,72 @@ class ImageExporter:
             }
 
 
+    def _load_asset_paths(self, beats: List[Beat]) -> Dict[str, Asset]:
+        """一次查询加载所有 Beat 的主素材"""
+        asset_ids = {beat.main_asset_id for beat in beats if beat.main_asset_id}
+        if not asset_ids:
+            return {}
+        assets = self.db.query(Asset).filter(Asset.id.in_(asset_ids)).all()
+        return {asset.id: asset for asset in assets}
+
+    def _contact_sheet_spec(
+        self,
+        project: Project,
+        beats: List[Beat],
+        assets: Dict[str, Asset],
+        format: str,
+        columns: int,
+        thumbnail_width: int,
+        thumbnail_height: int,
+        quality: int
+    ) -> Dict[str, Any]:
+        beat_specs = []
+        for beat in beats:
+            asset = assets.get(beat.main_asset_id)
+            beat_specs.append({
+                "order_index": beat.order_index,
+                "duration": beat.duration,
+                "thumbnail_path": asset.thumbnail_path if asset else None,
+            })
+        return {
+            "title": project.title,
+            "beats": beat_specs,
+            "format": format.lower(),
+            "columns": columns,
+            "thumbnail_width": thumbnail_width,
+            "thumbnail_height": thumbnail_height,
+            "quality": quality,
+            "exported_at": datetime.now().strftime('%Y-%m-%d %H:%M'),
+        }
+
+    @staticmethod
+    def _beat_spec(
+        beat: Beat,
+        asset: Optional[Asset],
+        folder: Optional[str],
+        format: str,
+        width: int,
+        height: int,
+        quality: int
+    ) -> Dict[str, Any]:
+        image_path = None
+        if asset and asset.file_path and Path(asset.file_path).suffix.lower() in IMAGE_SUFFIXES:
+            image_path = asset.file_path
+        return {
+            "order_index": beat.order_index,
+            "scene_slug": getattr(beat, "scene_slug", None),
+            "content": beat.content,
+            "duration": beat.duration,
+            "emotion_tags": list(beat.emotion_tags or []),
+            "scene_tags": list(beat.scene_tags or []),
+            "image_path": image_path,
+            "folder": folder,
+            "format": format,
+            "width": width,
+            "height": height,
+            "quality": quality,
+        }
+
     async def export_contact_sheet(
         self,
         project_id: str,
@@ -219,88 +568,21 @@ class ImageExporter:
             if not beats:
                 return {"status": "error", "message": "没有找到Beat数据"}
             
-            # 计算布局
-            total_beats = len(beats)
-            rows = math.ceil(total_beats / columns)
-            
-            margin = 20
-            header_height = 100
-            footer_height = 50
-            
-            # 计算总尺寸
-            total_width = columns * thumbnail_width + (columns + 1) * margin
-            total_height = header_height + rows * thumbnail_height + (rows + 1) * margin + footer_height
-            
-            # 创建图片
-            img = Image.new('RGB', (total_width, total_height), color='#1a1a1a')
-            draw = ImageDraw.Draw(img)
-            
-            # 加载字体
-            try:
-                title_font = ImageFont.truetype("msyh.ttc", 36)
-                label_font = ImageFont.truetype("msyh.ttc", 14)
-                small_font = ImageFont.truetype("msyh.ttc", 12)
-            except:
-                title_font = ImageFont.load_default()
-                label_font = ImageFont.load_default()
-                small_font = ImageFont.load_default()
-            
-            # 绘制标题
-            title_text = f"{project.title} - 联系表"
-            draw.text((total_width // 2, 50), title_text, fill='#fbbf24', font=title_font, anchor='mm')
-            
-            # 绘制每个Beat缩略图
-            for i, beat in enumerate(beats):
-                row = i // columns
-                col = i % columns
-                
-                x = margin + col * (thumbnail_width + margin)
-                y = header_height + margin + row * (thumbnail_height + margin)
-                
-                # 绘制缩略图背景
-                draw.rectangle([x, y, x + thumbnail_width, y + thumbnail_height], 
-                             fill='#2d2d2d', outline='#3d3d3d', width=1)
-                
-                # 如果有素材缩略图，加载并绘制
-                if beat.main_asset_id:
-                    try:
-                        from database import Asset
-                        asset = self.db.query(Asset).filter(Asset.id == beat.main_asset_id).first()
-                        if asset and asset.thumbnail_url:
-                            thumb_path = Path(asset.thumbnail_url)
-                            if thumb_path.exists():
-                                thumb_img = Image.open(str(thumb_path))
-                                thumb_img = thumb_img.resize((thumbnail_width - 4, thumbnail_height - 30))
-                                img.paste(thumb_img, (x + 2, y + 2))
-                    except Exception as e:
-                        pass  # 忽略缩略图加载错误
-                
-                # 绘制Beat编号
-                beat_label = f"#{beat.order_index + 1}"
-                draw.text((x + 5, y + thumbnail_height - 25), beat_label, fill='#fbbf24', font=label_font)
-                
-                # 绘制时长
-                if beat.duration:
-                    duration_text = f"{beat.duration}s"
-                    draw.text((x + thumbnail_width - 40, y + thumbnail_height - 25), 
-                            duration_text, fill='#9ca3af', font=small_font)
+            file_format = format.lower()
+            if file_format not in ["png", "jpg", "jpeg"]:
+                return {"status": "error", "message": f"不支持的格式: {format}"}
             
-            # 绘制页脚
-            footer_text = f"共 {total_beats} 个镜头 | 导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-            draw.text((total_width // 2, total_height - 25), footer_text, 
-                     fill='#6b7280', font=small_font, anchor='mm')
+            # 在渲染进程池中绘制，不阻塞事件循环
+            spec = self._contact_sheet_spec(
+                project, beats, self._load_asset_paths(beats),
+                file_format, columns, thumbnail_width, thumbnail_height, quality
+            )
+            data, total_width, total_height = await _run_render(_render_contact_sheet, spec)
             
             # 保存图片
-            file_format = format.lower()
             filename = f"{project_id}_contact_sheet_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
             file_path = self.export_dir / filename
-            
-            if file_format == "png":
-                img.save(str(file_path), 'PNG', quality=quality)
-            elif file_format in ["jpg", "jpeg"]:
-                img.save(str(file_path), 'JPEG', quality=quality)
-            else:
-                return {"status": "error", "message": f"不支持的格式: {format}"}
+            await asyncio.to_thread(file_path.write_bytes, data)
             
             # 记录导出历史
             export_record = ExportHistory(
@@ -308,13 +590,13 @@ class ImageExporter:
                 project_id=project_id,
                 export_type="contact_sheet",
                 file_path=str(file_path),
-                file_size=file_path.stat().st_size,
+                file_size=len(data),
                 file_format=file_format,
                 options={
                     "columns": columns,
                     "thumbnail_width": thumbnail_width,
                     "thumbnail_height": thumbnail_height,
-                    "beat_count": total_beats
+                    "beat_count": len(beats)
                 },
                 status="completed",
                 created_at=datetime.now()
@@ -325,10 +607,10 @@ class ImageExporter:
             return {
                 "status": "success",
                 "file_path": str(file_path),
-                "file_size": file_path.stat().st_size,
+                "file_size": len(data),
                 "width": total_width,
                 "height": total_height,
-                "beat_count": total_beats,
+                "beat_count": len(beats),
                 "export_id": export_record.id
             }
             
@@ -352,6 +634,8 @@ class ImageExporter:
         导出故事板为 ZIP 包
         按场次分组，包含联系表
         
+        每个 Beat 作为独立任务提交到渲染进程池，完成即写入 ZIP。
+        
         Args:
             project_id: 项目ID
             format: 图片格式 (png/jpg)
@@ -361,6 +645,7 @@ class ImageExporter:
             group_by_scene: 是否按场次分组
             include_contact_sheet: 是否包含联系表
         """
+        zip_path = None
         try:
             # 加载项目数据
             project = self.db.query(Project).filter(Project.id == project_id).first()
@@ -375,205 +660,94 @@ class ImageExporter:
             if not beats:
                 return {"status": "error", "message": "没有找到Beat数据"}
             
-            # 创建临时目录
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            temp_dir = self.export_dir / f"temp_{project_id}_{timestamp}"
-            temp_dir.mkdir(exist_ok=True)
+            assets = self._load_asset_paths(beats)
             
-            exported_files = []
+            # 构建渲染任务（按场次分组时每个场次一个文件夹）
+            specs = []
+            for beat in beats:
+                folder = _safe_scene_name(getattr(beat, "scene_slug", None) or "未分类") if group_by_scene else None
+                specs.append(self._beat_spec(
+                    beat, assets.get(beat.main_asset_id), folder, format, width, height, quality
+                ))
             
-            try:
-                # 按场次分组
-                if group_by_scene:
-                    scenes = {}
-                    for beat in beats:
-                        scene_slug = beat.scene_slug or "未分类"
-                        if scene_slug not in scenes:
-                            scenes[scene_slug] = []
-                        scenes[scene_slug].append(beat)
-                    
-                    # 为每个场次创建文件夹
-                    for scene_name, scene_beats in scenes.items():
-                        # 清理场次名称（移除非法字符）
-                        safe_scene_name = "".join(c for c in scene_name if c.isalnum() or c in (' ', '-', '_')).strip()
-                        if not safe_scene_name:
-                            safe_scene_name = "scene"
-                        
-                        scene_dir = temp_dir / safe_scene_name
-                        scene_dir.mkdir(exist_ok=True)
-                        
-                        # 导出每个Beat
-                        for beat in scene_beats:
-                            beat_file = await self._export_single_beat(
-                                beat, scene_dir, format, width, height, quality
-                            )
-                            if beat_file:
-                                exported_files.append(beat_file)
-                else:
-                    # 不分组，直接导出
-                    for beat in beats:
-                        beat_file = await self._export_single_beat(
-                            beat, temp_dir, format, width, height, quality
-                        )
-                        if beat_file:
-                            exported_files.append(beat_file)
-                
-                # 生成联系表
-                if include_contact_sheet:
-                    contact_result = await self.export_contact_sheet(
-                        project_id, format, columns=4, quality=quality
-                    )
-                    if contact_result["status"] == "success":
-                        # 复制联系表到临时目录
-                        import shutil
-                        contact_src = Path(contact_result["file_path"])
-                        contact_dst = temp_dir / f"00_contact_sheet.{format}"
-                        shutil.copy(str(contact_src), str(contact_dst))
-                        exported_files.insert(0, str(contact_dst))
-                
-                # 创建 ZIP 文件
-                zip_filename = f"{project_id}_storyboard_{timestamp}.zip"
-                zip_path = self.export_dir / zip_filename
-                
-                with zipfile.ZipFile(str(zip_path), 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for file_path in exported_files:
-                        arcname = os.path.relpath(file_path, temp_dir)
-                        zipf.write(file_path, arcname)
-                
-                # 记录导出历史
-                export_record = ExportHistory(
-                    id=str(uuid.uuid4()),
-                    project_id=project_id,
-                    export_type="storyboard_zip",
-                    file_path=str(zip_path),
-                    file_size=zip_path.stat().st_size,
-                    file_format="zip",
-                    options={
-                        "format": format,
-                        "width": width,
-                        "height": height,
-                        "quality": quality,
-                        "group_by_scene": group_by_scene,
-                        "include_contact_sheet": include_contact_sheet,
-                        "file_count": len(exported_files)
-                    },
-                    status="completed",
-                    created_at=datetime.now()
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            zip_filename = f"{project_id}_storyboard_{timestamp}.zip"
+            zip_path = self.export_dir / zip_filename
+            
+            # 写线程消费队列，渲染结果完成一个写一个
+            entries: "queue.Queue" = queue.Queue(maxsize=ZIP_QUEUE_SIZE)
+            writer_failed = threading.Event()
+            writer = asyncio.get_running_loop().run_in_executor(
+                None, _zip_writer, zip_path, entries, writer_failed
+            )
+            
+            jobs = [_run_render(_render_beat, spec) for spec in specs]
+            if include_contact_sheet:
+                contact_spec = self._contact_sheet_spec(
+                    project, beats, assets, format, 4, 400, 225, quality
                 )
-                self.db.add(export_record)
-                self.db.commit()
                 
-                return {
-                    "status": "success",
-                    "file_path": str(zip_path),
-                    "file_size": zip_path.stat().st_size,
-                    "file_count": len(exported_files),
-                    "export_id": export_record.id
-                }
+                async def render_contact_sheet():
+                    data, _, _ = await _run_render(_render_contact_sheet, contact_spec)
+                    return f"00_contact_sheet.{format}", data
                 
-            finally:
-                # 清理临时目录
-                import shutil
-                if temp_dir.exists():
-                    shutil.rmtree(str(temp_dir), ignore_errors=True)
+                jobs.insert(0, render_contact_sheet())
             
-        except Exception as e:
-            return {
-                "status": "error",
-                "message": f"故事板ZIP导出失败: {str(e)}"
-            }
-
-    async def _export_single_beat(
-        self,
-        beat: Beat,
-        output_dir: Path,
-        format: str,
-        width: int,
-        height: int,
-        quality: int
-    ) -> Optional[str]:
-        """导出单个Beat为图片"""
-        try:
-            # 创建图片
-            img = Image.new('RGB', (width, height), color='#1a1a1a')
-            draw = ImageDraw.Draw(img)
-            
-            # 加载字体
+            tasks = [asyncio.ensure_future(job) for job in jobs]
             try:
-                title_font = ImageFont.truetype("msyh.ttc", 48)
-                body_font = ImageFont.truetype("msyh.ttc", 28)
-                small_font = ImageFont.truetype("msyh.ttc", 20)
-            except:
-                title_font = ImageFont.load_default()
-                body_font = ImageFont.load_default()
-                small_font = ImageFont.load_default()
-            
-            # 如果有素材，尝试加载
-            if beat.main_asset_id:
-                try:
-                    from database import Asset
-                    asset = self.db.query(Asset).filter(Asset.id == beat.main_asset_id).first()
-                    if asset and asset.file_path:
-                        asset_path = Path(asset.file_path)
-                        if asset_path.exists() and asset_path.suffix.lower() in ['.jpg', '.jpeg', '.png']:
-                            asset_img = Image.open(str(asset_path))
-                            asset_img = asset_img.resize((width, height))
-                            img.paste(asset_img, (0, 0))
-                            # 添加半透明遮罩
-                            overlay = Image.new('RGBA', (width, height), (0, 0, 0, 128))
-                            img = Image.alpha_composite(img.convert('RGBA'), overlay).convert('RGB')
-                            draw = ImageDraw.Draw(img)
-                except Exception:
-                    pass
-            
-            # 绘制Beat信息
-            beat_title = f"Beat {beat.order_index + 1}"
-            if beat.scene_slug:
-                beat_title = f"{beat.scene_slug} - Beat {beat.order_index + 1}"
-            
-            draw.text((width // 2, 80), beat_title, fill='#fbbf24', font=title_font, anchor='mm')
-            
-            # 绘制内容
-            if beat.content:
-                # 自动换行
-                content = beat.content
-                max_chars_per_line = 50
-                lines = []
-                for i in range(0, len(content), max_chars_per_line):
-                    lines.append(content[i:i+max_chars_per_line])
-                
-                y_offset = 200
-                for line in lines[:8]:  # 最多8行
-                    draw.text((width // 2, y_offset), line, fill='#f3f4f6', font=body_font, anchor='mm')
-                    y_offset += 40
-            
-            # 绘制时长和标签
-            info_y = height - 100
-            if beat.duration:
-                draw.text((100, info_y), f"时长: {beat.duration}秒", fill='#9ca3af', font=small_font)
-            
-            # 标签
-            all_tags = []
-            if beat.emotion_tags:
-                all_tags.extend(beat.emotion_tags[:3])
-            if beat.scene_tags:
-                all_tags.extend(beat.scene_tags[:3])
-            
-            if all_tags:
-                tags_text = " | ".join(all_tags[:5])
-                draw.text((width - 100, info_y), tags_text, fill='#9ca3af', font=small_font, anchor='rm')
+                for job in asyncio.as_completed(tasks):
+                    try:
+                        item = await job
+                    except Exception as e:
+                        logger.error(f"导出Beat失败: {e}")
+                        continue
+                    if not await asyncio.to_thread(_put_entry, entries, item, writer_failed):
+                        break
+            finally:
+                # 写线程失败或导出被取消时不再等待剩余渲染
+                for task in tasks:
+                    task.cancel()
+                await asyncio.to_thread(_put_entry, entries, None, writer_failed)
+                file_count = await writer
             
-            # 保存图片
-            filename = f"beat_{beat.order_index + 1:03d}.{format}"
-            file_path = output_dir / filename
+            file_size = zip_path.stat().st_size
             
-            if format.lower() == "png":
-                img.save(str(file_path), 'PNG', quality=quality)
-            else:
-                img.save(str(file_path), 'JPEG', quality=quality)
+            # 记录导出历史
+            export_record = ExportHistory(
+                id=str(uuid.uuid4()),
+                project_id=project_id,
+                export_type="storyboard_zip",
+                file_path=str(zip_path),
+                file_size=file_size,
+                file_format="zip",
+                options={
+                    "format": format,
+                    "width": width,
+                    "height": height,
+                    "quality": quality,
+                    "group_by_scene": group_by_scene,
+                    "include_contact_sheet": include_contact_sheet,
+                    "file_count": file_count
+                },
+                status="completed",
+                created_at=datetime.now()
+            )
+            self.db.add(export_record)
+            self.db.commit()
             
-            return str(file_path)
+            return {
+                "status": "success",
+                "file_path": str(zip_path),
+                "file_size": file_size,
+                "file_count": file_count,
+                "export_id": export_record.id
+            }
             
         except Exception as e:
-            print(f"导出Beat失败: {e}")
-            return None
+            # 清理未完成的 ZIP
+            if zip_path is not None and zip_path.exists():
+                zip_path.unlink(missing_ok=True)
+            return {
+                "status": "error",
+                "message": f"故事板ZIP导出失败: {str(e)}"
+            }
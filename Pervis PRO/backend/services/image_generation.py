@@ -20,6 +20,8 @@ from pathlib import Path
 from typing import Any, Dict, List, Optional
 from uuid import uuid4
 
+from services.task_registry import get_task_registry
+
 # 确保加载 .env 文件
 from dotenv import load_dotenv
 env_path = Path(__file__).parent.parent.parent / ".env"
@@ -123,6 +125,8 @@ class ImageGenerationService:
         ImageType.REFERENCE: "reference image, clear details, professional quality"
     }
     
+    TASK_SOURCE = "image_generation"
+    
     DEFAULT_NEGATIVE = "blurry, low quality, distorted, deformed, ugly, bad anatomy, watermark, text, logo"
     
     def __init__(self):
@@ -130,6 +134,7 @@ class ImageGenerationService:
         self.replicate_token = os.getenv("REPLICATE_API_TOKEN", "")
         self.output_dir = Path(os.getenv("STORAGE_ROOT", "data")) / "generated_images"
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        # 仅保存进行中的任务；结束后的结果由任务注册表持久化
         self._tasks: Dict[str, ImageGenerationResult] = {}
         
         # 确定使用哪个提供商
@@ -187,12 +192,39 @@ class ImageGenerationService:
             provider=self._provider.value
         )
         self._tasks[task_id] = result
+        registry = get_task_registry()
+        registry.create(
+            "image_generation",
+            source=self.TASK_SOURCE,
+            task_id=task_id,
+            details={"image_type": result.image_type, "entity_id": request.entity_id}
+        )
         
-        if not self.is_configured:
-            result.status = "failed"
-            result.error = "未配置图片生成 API，请在 .env 中设置 GEMINI_API_KEY"
-            return result
+        try:
+            if not self.is_configured:
+                result.status = "failed"
+                result.error = "未配置图片生成 API，请在 .env 中设置 GEMINI_API_KEY"
+                return result
+            
+            await self._run_generation(task_id, request, result)
+        finally:
+            registry.update(
+                task_id,
+                status=result.status,
+                result=result.to_dict(),
+                error=result.error
+            )
+            self._tasks.pop(task_id, None)
         
+        return result
+    
+    async def _run_generation(
+        self,
+        task_id: str,
+        request: ImageGenerationRequest,
+        result: ImageGenerationResult
+    ):
+        """执行图片生成并填充结果"""
         try:
             result.status = "processing"
             full_prompt = self._build_prompt(request)
@@ -229,8 +261,6 @@ class ImageGenerationService:
             logger.error(f"图片生成失败: {e}")
             result.status = "failed"
             result.error = str(e)
-        
-        return result
     
     async def _call_gemini_imagen(self, prompt: str) -> Optional[bytes]:
         """调用 Gemini API 生成图片
@@ -426,7 +456,16 @@ class ImageGenerationService:
     
     def get_task(self, task_id: str) -> Optional[ImageGenerationResult]:
         """获取生成任务状态"""
-        return self._tasks.get(task_id)
+        result = self._tasks.get(task_id)
+        if result is not None:
+            return result
+        
+        record = get_task_registry().get(task_id)
+        if record is None or record.source != self.TASK_SOURCE or not record.result:
+            return None
+        data = dict(record.result)
+        data["created_at"] = datetime.fromisoformat(data["created_at"])
+        return ImageGenerationResult(**data)
     
     async def generate_character_image(
         self,
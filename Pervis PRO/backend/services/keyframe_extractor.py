@@ -10,6 +10,9 @@ Task: 6.1 关键帧提取服务
 - interval: 固定间隔提取
 - motion: 动作峰值提取
 - hybrid: 混合策略（推荐）
+
+场景检测结果经 services.scene_detection 缓存，各策略与 VideoPreprocessor 共享。
+提取后按感知哈希合并近重复帧（静态镜头），见 services.frame_hash。
 """
 
 import asyncio
@@ -29,6 +32,8 @@ from models.keyframe import (
     generate_keyframe_id,
     timestamp_to_timecode,
 )
+from services.frame_hash import collapse_near_duplicates, compute_hash, hash_to_hex
+from services.scene_detection import SceneDetectionParams, get_scene_detector
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +52,7 @@ class ExtractionResult:
     fps: float
     error_message: str = ""
     extraction_time_ms: float = 0.0
+    duplicates_removed: int = 0           # 合并掉的近重复帧数
 
 
 # ============================================================
@@ -164,7 +170,7 @@ class KeyFrameExtractor:
                 
                 if success:
                     # 获取帧元数据
-                    metadata = await self._get_frame_metadata(str(image_path))
+                    metadata = await self._get_frame_metadata(str(image_path), config.hash_algorithm)
                     
                     keyframe = KeyFrameData(
                         keyframe_id=keyframe_id,
@@ -181,9 +187,23 @@ class KeyFrameExtractor:
                         is_scene_start=(i == 0 or timestamp in timestamps[:1]),
                         image_width=config.thumbnail_width,
                         image_height=config.thumbnail_height,
+                        frame_hash=metadata.get("frame_hash"),
                     )
                     keyframes.append(keyframe)
             
+            # 合并近重复帧，删除被并入帧的图像
+            duplicates_removed = 0
+            if config.dedupe_enabled and len(keyframes) > 1:
+                keyframes, dropped = collapse_near_duplicates(keyframes, config.dedupe_threshold)
+                for keyframe in dropped:
+                    try:
+                        os.remove(keyframe.image_path)
+                    except OSError:
+                        pass
+                duplicates_removed = len(dropped)
+                if dropped:
+                    logger.debug(f"{asset_id}: 合并 {duplicates_removed} 个近重复关键帧")
+            
             elapsed_ms = (datetime.now() - start_time).total_seconds() * 1000
             
             return ExtractionResult(
@@ -193,6 +213,7 @@ class KeyFrameExtractor:
                 duration=duration,
                 fps=fps,
                 extraction_time_ms=elapsed_ms,
+                duplicates_removed=duplicates_removed,
             )
             
         except Exception as e:
@@ -269,71 +290,11 @@ class KeyFrameExtractor:
         video_path: str,
         config: KeyFrameConfig,
     ) -> List[float]:
-        """场景变化检测提取"""
-        timestamps = []
-        
-        try:
-            # 尝试使用 PySceneDetect
-            from scenedetect import detect, ContentDetector
-            
-            scene_list = detect(video_path, ContentDetector(threshold=config.scene_threshold))
-            
-            for scene in scene_list:
-                # 获取场景开始时间
-                start_time = scene[0].get_seconds()
-                timestamps.append(start_time)
-            
-            # 如果没有检测到场景，添加开始帧
-            if not timestamps:
-                timestamps.append(0.0)
-                
-        except ImportError:
-            logger.warning("PySceneDetect 未安装，使用 FFmpeg 场景检测")
-            timestamps = await self._extract_scene_change_ffmpeg(video_path, config)
-        except Exception as e:
-            logger.error(f"场景检测失败: {e}")
-            timestamps = [0.0]
-        
-        return timestamps
-    
-    async def _extract_scene_change_ffmpeg(
-        self,
-        video_path: str,
-        config: KeyFrameConfig,
-    ) -> List[float]:
-        """使用 FFmpeg 进行场景检测"""
-        timestamps = [0.0]  # 始终包含开始帧
-        
-        try:
-            # 使用 FFmpeg 的 scene 滤镜
-            cmd = [
-                self.ffmpeg_path,
-                "-i", video_path,
-                "-vf", f"select='gt(scene,{config.scene_threshold/100})',showinfo",
-                "-f", "null",
-                "-",
-            ]
-            
-            result = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-            _, stderr = await result.communicate()
-            
-            # 解析输出获取时间戳
-            import re
-            for line in stderr.decode().split("\n"):
-                match = re.search(r"pts_time:(\d+\.?\d*)", line)
-                if match:
-                    timestamp = float(match.group(1))
-                    if timestamp not in timestamps:
-                        timestamps.append(timestamp)
-            
-        except Exception as e:
-            logger.error(f"FFmpeg 场景检测失败: {e}")
-        
-        return sorted(timestamps)
+        """场景变化检测提取（共享场景检测缓存，同一文件同一阈值只检测一次）"""
+        result = await get_scene_detector().detect(
+            video_path, SceneDetectionParams.from_env(config.scene_threshold)
+        )
+        return list(result.cuts) if result is not None else [0.0]
     
     def _extract_interval(
         self,
@@ -435,13 +396,14 @@ class KeyFrameExtractor:
             logger.error(f"提取帧失败: {e}")
             return False
     
-    async def _get_frame_metadata(self, image_path: str) -> Dict[str, Any]:
-        """获取帧元数据"""
+    async def _get_frame_metadata(self, image_path: str, hash_algorithm: str = "dhash") -> Dict[str, Any]:
+        """获取帧元数据（含感知哈希）"""
         metadata = {
             "motion_score": 0.0,
             "brightness": 128.0,
             "contrast": 0.0,
             "dominant_colors": [],
+            "frame_hash": None,
         }
         
         try:
@@ -453,6 +415,9 @@ class KeyFrameExtractor:
                 if img.mode != "RGB":
                     img = img.convert("RGB")
                 
+                # 感知哈希（用已解码的图像计算，不再读盘）
+                metadata["frame_hash"] = hash_to_hex(compute_hash(img, hash_algorithm))
+                
                 # 缩小图像以加速计算
                 img_small = img.resize((50, 50))
                 pixels = list(img_small.getdata())
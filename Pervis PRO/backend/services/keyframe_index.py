@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+关键帧视觉向量索引（进程级）
+
+KeyFrameStore.search_by_embedding 不再逐行读取 ORM 对象、解析 JSON 后逐条点积：
+- 首次查询时一次性读取 keyframes 表的二进制嵌入列，按素材分块载入内存
+- 各素材的向量在合并矩阵中占据连续的行区间（asset_id → [start, end)），
+  限定素材的查询只在对应区间上做矩阵乘法
+- update_embedding / save_keyframes_batch / delete_keyframes_by_asset 同步增量更新，
+  合并矩阵在变更后的下一次查询时重建
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class KeyFrameRef:
+    """索引中的关键帧元数据"""
+    keyframe_id: str
+    asset_id: str
+    timestamp: float
+    timecode: str
+    image_path: str
+
+
+@dataclass
+class _AssetBlock:
+    """单个素材的关键帧（行归一化向量 + 元数据）"""
+    refs: List[KeyFrameRef] = field(default_factory=list)
+    vectors: List[np.ndarray] = field(default_factory=list)
+    positions: Dict[str, int] = field(default_factory=dict)   # keyframe_id → 块内位置
+
+
+class KeyFrameVectorIndex:
+    """关键帧视觉向量索引"""
+
+    def __init__(self):
+        self.dim = 0
+        self.loaded = False
+        self._blocks: Dict[str, _AssetBlock] = {}
+        self._owners: Dict[str, str] = {}        # keyframe_id → asset_id（所在块）
+        self._lock = threading.RLock()
+
+        # 合并矩阵（脏时重建）
+        self._matrix: Optional[np.ndarray] = None
+        self._refs: List[KeyFrameRef] = []
+        self._ranges: Dict[str, Tuple[int, int]] = {}
+
+    # ---------- 加载 ----------
+
+    def ensure_loaded(self, db) -> bool:
+        """首次调用时从数据库载入全部嵌入"""
+        if self.loaded:
+            return True
+        with self._lock:
+            if self.loaded:
+                return True
+            from models.keyframe import KeyFrame, unpack_embedding
+
+            rows = db.query(KeyFrame).with_entities(
+                KeyFrame.keyframe_id,
+                KeyFrame.asset_id,
+                KeyFrame.timestamp,
+                KeyFrame.timecode,
+                KeyFrame.image_path,
+                KeyFrame.visual_embedding_blob,
+                KeyFrame.visual_embedding,
+            ).filter(KeyFrame.has_embedding == True).order_by(KeyFrame.asset_id, KeyFrame.timestamp)
+
+            count = 0
+            for keyframe_id, asset_id, timestamp, timecode, image_path, blob, legacy in rows:
+                vector = unpack_embedding(blob) if blob is not None else legacy
+                if vector is None:
+                    continue
+                ref = KeyFrameRef(keyframe_id, asset_id, timestamp, timecode, image_path)
+                count += self._put(ref, vector)
+            self.loaded = True
+            logger.info(f"关键帧向量索引已加载: {count} 个关键帧, {len(self._blocks)} 个素材")
+            return True
+
+    # ---------- 更新 ----------
+
+    def _put(self, ref: KeyFrameRef, vector) -> bool:
+        vector = np.asarray(vector, dtype=np.float32)
+        if not self.dim:
+            self.dim = len(vector)
+        if len(vector) != self.dim:
+            logger.warning(f"关键帧嵌入维度不一致，跳过: {ref.keyframe_id} ({len(vector)} != {self.dim})")
+            return False
+        norm = float(np.linalg.norm(vector))
+        if norm == 0:
+            return False
+
+        # 关键帧改挂到其他素材时先从原素材块移除
+        owner = self._owners.get(ref.keyframe_id)
+        if owner is not None and owner != ref.asset_id:
+            self._remove(owner, ref.keyframe_id)
+
+        block = self._blocks.setdefault(ref.asset_id, _AssetBlock())
+        position = block.positions.get(ref.keyframe_id)
+        if position is None:
+            block.positions[ref.keyframe_id] = len(block.refs)
+            block.refs.append(ref)
+            block.vectors.append(vector / norm)
+        else:
+            block.refs[position] = ref
+            block.vectors[position] = vector / norm
+        self._owners[ref.keyframe_id] = ref.asset_id
+        self._matrix = None
+        return True
+
+    def upsert(self, keyframes: Iterable[Tuple[KeyFrameRef, Optional[List[float]]]]) -> int:
+        """写入（或替换）关键帧向量；嵌入为 None 时移除。未载入时忽略（载入时从数据库读取）"""
+        if not self.loaded:
+            return 0
+        count = 0
+        with self._lock:
+            for ref, vector in keyframes:
+                if vector is None:
+                    self._remove(self._owners.get(ref.keyframe_id, ref.asset_id), ref.keyframe_id)
+                else:
+                    count += self._put(ref, vector)
+        return count
+
+    def _remove(self, asset_id: str, keyframe_id: str):
+        block = self._blocks.get(asset_id)
+        if block is None or keyframe_id not in block.positions:
+            return
+        position = block.positions.pop(keyframe_id)
+        self._owners.pop(keyframe_id, None)
+        del block.refs[position]
+        del block.vectors[position]
+        for i in range(position, len(block.refs)):
+            block.positions[block.refs[i].keyframe_id] = i
+        if not block.refs:
+            del self._blocks[asset_id]
+        self._matrix = None
+
+    def remove_asset(self, asset_id: str) -> int:
+        """移除素材的全部关键帧"""
+        with self._lock:
+            block = self._blocks.pop(asset_id, None)
+            if block is None:
+                return 0
+            for keyframe_id in block.positions:
+                self._owners.pop(keyframe_id, None)
+            self._matrix = None
+            return len(block.refs)
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self._owners.clear()
+            self._matrix = None
+            self.dim = 0
+            self.loaded = False
+
+    # ---------- 查询 ----------
+
+    def _merged(self) -> Tuple[np.ndarray, List[KeyFrameRef], Dict[str, Tuple[int, int]]]:
+        """合并矩阵（各素材连续排列）"""
+        with self._lock:
+            if self._matrix is None:
+                refs: List[KeyFrameRef] = []
+                ranges: Dict[str, Tuple[int, int]] = {}
+                vectors: List[np.ndarray] = []
+                for asset_id, block in self._blocks.items():
+                    ranges[asset_id] = (len(refs), len(refs) + len(block.refs))
+                    refs.extend(block.refs)
+                    vectors.extend(block.vectors)
+                self._matrix = np.vstack(vectors) if vectors else np.zeros((0, self.dim), dtype=np.float32)
+                self._refs = refs
+                self._ranges = ranges
+            return self._matrix, self._refs, self._ranges
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        asset_ids: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """余弦相似度 top_k（可限定素材）"""
+        matrix, refs, ranges = self._merged()
+        if not len(refs) or top_k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if len(query) != self.dim or norm == 0:
+            return []
+        query /= norm
+
+        if asset_ids:
+            spans = [ranges[a] for a in dict.fromkeys(asset_ids) if a in ranges]
+            if not spans:
+                return []
+            rows = np.concatenate([np.arange(start, end) for start, end in spans])
+            scores = matrix[rows] @ query if len(spans) > 1 else matrix[spans[0][0]:spans[0][1]] @ query
+        else:
+            rows = None
+            scores = matrix @ query
+
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+
+        results = []
+        for i in best.tolist():
+            ref = refs[int(rows[i]) if rows is not None else i]
+            results.append({
+                "keyframe_id": ref.keyframe_id,
+                "asset_id": ref.asset_id,
+                "timestamp": ref.timestamp,
+                "timecode": ref.timecode,
+                "image_path": ref.image_path,
+                "score": float(scores[i]),
+            })
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "keyframes": sum(len(b.refs) for b in self._blocks.values()),
+            "assets": len(self._blocks),
+            "dim": self.dim,
+        }
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_keyframe_index: Optional[KeyFrameVectorIndex] = None
+
+
+def get_keyframe_index() -> KeyFrameVectorIndex:
+    """获取全局关键帧向量索引"""
+    global _keyframe_index
+    if _keyframe_index is None:
+        _keyframe_index = KeyFrameVectorIndex()
+    return _keyframe_index
@@ -12,6 +12,7 @@ Task: 6.3 关键帧存储服务
 - 视觉嵌入存储和搜索
 """
 
+import heapq
 import json
 import logging
 import os
@@ -21,7 +22,10 @@ from typing import Any, Dict, List, Optional
 
 from sqlalchemy.orm import Session
 
-from ..models.keyframe import KeyFrame, KeyFrameData, KeyFrameExtractionJob
+from models.keyframe import KeyFrame, KeyFrameData, KeyFrameExtractionJob
+
+from .frame_hash import get_frame_hash_index
+from .keyframe_index import KeyFrameRef, get_keyframe_index
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +33,9 @@ logger = logging.getLogger(__name__)
 class KeyFrameStore:
     """关键帧存储服务"""
     
+    # 单次 IN 查询的参数数量
+    IN_CHUNK_SIZE = 500
+    
     def __init__(
         self,
         db: Session,
@@ -69,8 +76,7 @@ class KeyFrameStore:
                 existing.contrast = keyframe.contrast
                 existing.dominant_colors = keyframe.dominant_colors
                 existing.is_scene_start = keyframe.is_scene_start
-                existing.visual_embedding = keyframe.visual_embedding
-                existing.has_embedding = keyframe.visual_embedding is not None
+                existing.set_embedding(keyframe.visual_embedding)
                 existing.updated_at = datetime.utcnow()
             else:
                 # 创建新记录
@@ -79,8 +85,9 @@ class KeyFrameStore:
             
             self.db.commit()
             
-            # 更新缓存
+            # 更新缓存与向量索引
             self._update_cache(keyframe)
+            self._update_index([keyframe])
             
             return True
             
@@ -90,44 +97,68 @@ class KeyFrameStore:
             return False
     
     async def save_keyframes_batch(self, keyframes: List[KeyFrameData]) -> int:
-        """批量保存关键帧"""
-        saved_count = 0
+        """
+        批量保存关键帧（集合式 upsert）
+        
+        一次 IN 查询取得已存在的记录，新记录 bulk_insert_mappings、已存在的记录
+        bulk_update_mappings，缓存按素材做一次有序合并。
+        同一批中重复的 keyframe_id 以最后一个为准。
+        """
+        if not keyframes:
+            return 0
+        
+        batch = list({kf.keyframe_id: kf for kf in keyframes}.values())
         
         try:
-            for keyframe in keyframes:
-                existing = self.db.query(KeyFrame).filter(
-                    KeyFrame.keyframe_id == keyframe.keyframe_id
-                ).first()
-                
-                if existing:
-                    existing.timestamp = keyframe.timestamp
-                    existing.timecode = keyframe.timecode
-                    existing.image_path = keyframe.image_path
-                    existing.scene_id = keyframe.scene_id
-                    existing.motion_score = keyframe.motion_score
-                    existing.brightness = keyframe.brightness
-                    existing.contrast = keyframe.contrast
-                    existing.dominant_colors = keyframe.dominant_colors
-                    existing.is_scene_start = keyframe.is_scene_start
-                    existing.visual_embedding = keyframe.visual_embedding
-                    existing.has_embedding = keyframe.visual_embedding is not None
-                    existing.updated_at = datetime.utcnow()
+            existing = self._existing_ids([kf.keyframe_id for kf in batch])
+            now = datetime.utcnow()
+            
+            inserts, updates = [], []
+            for keyframe in batch:
+                mapping = KeyFrame.data_mapping(keyframe)
+                row_id = existing.get(keyframe.keyframe_id)
+                if row_id is None:
+                    mapping["created_at"] = now
+                    mapping["updated_at"] = now
+                    inserts.append(mapping)
                 else:
-                    db_keyframe = KeyFrame.from_data(keyframe)
-                    self.db.add(db_keyframe)
-                
-                saved_count += 1
-                self._update_cache(keyframe)
-            
+                    update = {column: mapping[column] for column in KeyFrame.UPDATABLE_COLUMNS}
+                    update["id"] = row_id
+                    update["updated_at"] = now
+                    updates.append(update)
+            
+            if inserts:
+                self.db.bulk_insert_mappings(KeyFrame, inserts)
+            if updates:
+                self.db.bulk_update_mappings(KeyFrame, updates)
             self.db.commit()
-            logger.info(f"批量保存 {saved_count} 个关键帧")
             
         except Exception as e:
             logger.error(f"批量保存关键帧失败: {e}")
             self.db.rollback()
-            saved_count = 0
+            return 0
+        
+        by_asset: Dict[str, List[KeyFrameData]] = {}
+        for keyframe in batch:
+            by_asset.setdefault(keyframe.asset_id, []).append(keyframe)
+        for asset_id, asset_keyframes in by_asset.items():
+            self._merge_cache(asset_id, asset_keyframes)
+        self._update_index(batch)
         
-        return saved_count
+        logger.info(f"批量保存 {len(batch)} 个关键帧（新增 {len(inserts)}，更新 {len(updates)}）")
+        return len(batch)
+    
+    def _existing_ids(self, keyframe_ids: List[str]) -> Dict[str, int]:
+        """keyframe_id → 主键（分块 IN 查询，避免超出 SQLite 参数上限）"""
+        existing: Dict[str, int] = {}
+        for start in range(0, len(keyframe_ids), self.IN_CHUNK_SIZE):
+            chunk = keyframe_ids[start:start + self.IN_CHUNK_SIZE]
+            existing.update(
+                self.db.query(KeyFrame.keyframe_id, KeyFrame.id).filter(
+                    KeyFrame.keyframe_id.in_(chunk)
+                )
+            )
+        return existing
     
     async def get_keyframe(self, keyframe_id: str) -> Optional[KeyFrameData]:
         """获取单个关键帧"""
@@ -159,12 +190,10 @@ class KeyFrameStore:
                 KeyFrame.asset_id == asset_id
             ).order_by(KeyFrame.timestamp)
             
-            keyframes = []
-            for db_kf in query.all():
-                kf_data = db_kf.to_data()
-                if not include_embeddings:
-                    kf_data.visual_embedding = None
-                keyframes.append(kf_data)
+            keyframes = [
+                db_kf.to_data(include_embedding=include_embeddings)
+                for db_kf in query.all()
+            ]
             
             # 更新缓存（不含嵌入）
             if not include_embeddings:
@@ -199,9 +228,11 @@ class KeyFrameStore:
             
             self.db.commit()
             
-            # 清除缓存
+            # 清除缓存、向量索引与哈希索引
             if asset_id in self._cache:
                 del self._cache[asset_id]
+            get_keyframe_index().remove_asset(asset_id)
+            get_frame_hash_index().remove_asset(asset_id)
             
             logger.info(f"删除素材 {asset_id} 的 {deleted} 个关键帧")
             return deleted
@@ -229,11 +260,11 @@ class KeyFrameStore:
             if not db_keyframe:
                 return False
             
-            db_keyframe.visual_embedding = embedding
-            db_keyframe.has_embedding = True
+            db_keyframe.set_embedding(embedding)
             db_keyframe.updated_at = datetime.utcnow()
             
             self.db.commit()
+            get_keyframe_index().upsert([(self._index_ref(db_keyframe), embedding)])
             return True
             
         except Exception as e:
@@ -247,63 +278,41 @@ class KeyFrameStore:
         top_k: int = 10,
         asset_ids: Optional[List[str]] = None,
     ) -> List[Dict[str, Any]]:
-        """通过视觉嵌入搜索关键帧"""
-        import numpy as np
+        """
+        通过视觉嵌入搜索关键帧
         
+        首次调用时将全部嵌入载入进程级向量索引，之后的查询为内存中的矩阵乘法，
+        不再逐行读取与解析数据库记录。
+        """
         try:
-            # 构建查询
-            query = self.db.query(KeyFrame).filter(
-                KeyFrame.has_embedding == True
-            )
-            
-            if asset_ids:
-                query = query.filter(KeyFrame.asset_id.in_(asset_ids))
-            
-            # 获取所有有嵌入的关键帧
-            keyframes = query.all()
-            
-            if not keyframes:
-                return []
-            
-            # 计算相似度
-            query_vec = np.array(query_embedding)
-            query_norm = np.linalg.norm(query_vec)
-            
-            if query_norm == 0:
-                return []
-            
-            results = []
-            for kf in keyframes:
-                if not kf.visual_embedding:
-                    continue
-                
-                kf_vec = np.array(kf.visual_embedding)
-                kf_norm = np.linalg.norm(kf_vec)
-                
-                if kf_norm == 0:
-                    continue
-                
-                # 余弦相似度
-                similarity = float(np.dot(query_vec, kf_vec) / (query_norm * kf_norm))
-                
-                results.append({
-                    "keyframe_id": kf.keyframe_id,
-                    "asset_id": kf.asset_id,
-                    "timestamp": kf.timestamp,
-                    "timecode": kf.timecode,
-                    "image_path": kf.image_path,
-                    "score": similarity,
-                })
-            
-            # 按相似度排序
-            results.sort(key=lambda x: x["score"], reverse=True)
-            
-            return results[:top_k]
+            index = get_keyframe_index()
+            index.ensure_loaded(self.db)
+            return index.search(query_embedding, top_k=top_k, asset_ids=asset_ids)
             
         except Exception as e:
             logger.error(f"嵌入搜索失败: {e}")
             return []
     
+    @staticmethod
+    def _index_ref(keyframe) -> KeyFrameRef:
+        """关键帧（KeyFrame / KeyFrameData）→ 索引元数据"""
+        return KeyFrameRef(
+            keyframe_id=keyframe.keyframe_id,
+            asset_id=keyframe.asset_id,
+            timestamp=keyframe.timestamp,
+            timecode=keyframe.timecode,
+            image_path=keyframe.image_path,
+        )
+    
+    def _update_index(self, keyframes: List[KeyFrameData]):
+        """同步向量索引与哈希索引（索引未载入时无需处理）"""
+        get_keyframe_index().upsert(
+            (self._index_ref(kf), kf.visual_embedding) for kf in keyframes
+        )
+        get_frame_hash_index().upsert(
+            (kf.keyframe_id, kf.asset_id, kf.frame_hash) for kf in keyframes
+        )
+    
     # ============================================================
     # 提取任务管理
     # ============================================================
@@ -430,56 +439,39 @@ class KeyFrameStore:
     
     def _update_cache(self, keyframe: KeyFrameData):
         """更新内存缓存"""
-        asset_id = keyframe.asset_id
-        
-        if asset_id not in self._cache:
-            self._cache[asset_id] = []
-        
-        # 查找并更新或添加
-        found = False
-        for i, kf in enumerate(self._cache[asset_id]):
-            if kf.keyframe_id == keyframe.keyframe_id:
-                # 不存储嵌入到缓存
-                cached_kf = KeyFrameData(
-                    keyframe_id=keyframe.keyframe_id,
-                    asset_id=keyframe.asset_id,
-                    frame_index=keyframe.frame_index,
-                    timestamp=keyframe.timestamp,
-                    timecode=keyframe.timecode,
-                    image_path=keyframe.image_path,
-                    scene_id=keyframe.scene_id,
-                    motion_score=keyframe.motion_score,
-                    brightness=keyframe.brightness,
-                    contrast=keyframe.contrast,
-                    dominant_colors=keyframe.dominant_colors,
-                    is_scene_start=keyframe.is_scene_start,
-                    image_width=keyframe.image_width,
-                    image_height=keyframe.image_height,
-                )
-                self._cache[asset_id][i] = cached_kf
-                found = True
-                break
+        self._merge_cache(keyframe.asset_id, [keyframe])
+    
+    def _merge_cache(self, asset_id: str, keyframes: List[KeyFrameData]):
+        """
+        将同一素材的关键帧合并进缓存（按时间戳有序）
         
-        if not found:
-            cached_kf = KeyFrameData(
-                keyframe_id=keyframe.keyframe_id,
-                asset_id=keyframe.asset_id,
-                frame_index=keyframe.frame_index,
-                timestamp=keyframe.timestamp,
-                timecode=keyframe.timecode,
-                image_path=keyframe.image_path,
-                scene_id=keyframe.scene_id,
-                motion_score=keyframe.motion_score,
-                brightness=keyframe.brightness,
-                contrast=keyframe.contrast,
-                dominant_colors=keyframe.dominant_colors,
-                is_scene_start=keyframe.is_scene_start,
-                image_width=keyframe.image_width,
-                image_height=keyframe.image_height,
-            )
-            self._cache[asset_id].append(cached_kf)
-            # 按时间戳排序
-            self._cache[asset_id].sort(key=lambda x: x.timestamp)
+        原有条目中被替换的先移除，其余仍有序；新条目排序后与之归并，
+        时间戳相同时原有条目在前。
+        """
+        incoming = {kf.keyframe_id: self._cache_entry(kf) for kf in keyframes}
+        cached = [kf for kf in self._cache.get(asset_id, []) if kf.keyframe_id not in incoming]
+        added = sorted(incoming.values(), key=lambda x: x.timestamp)
+        self._cache[asset_id] = list(heapq.merge(cached, added, key=lambda x: x.timestamp))
+    
+    @staticmethod
+    def _cache_entry(keyframe: KeyFrameData) -> KeyFrameData:
+        """缓存条目（不存储嵌入）"""
+        return KeyFrameData(
+            keyframe_id=keyframe.keyframe_id,
+            asset_id=keyframe.asset_id,
+            frame_index=keyframe.frame_index,
+            timestamp=keyframe.timestamp,
+            timecode=keyframe.timecode,
+            image_path=keyframe.image_path,
+            scene_id=keyframe.scene_id,
+            motion_score=keyframe.motion_score,
+            brightness=keyframe.brightness,
+            contrast=keyframe.contrast,
+            dominant_colors=keyframe.dominant_colors,
+            is_scene_start=keyframe.is_scene_start,
+            image_width=keyframe.image_width,
+            image_height=keyframe.image_height,
+        )
     
     def clear_cache(self):
         """清除缓存"""
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+增量素材库扫描器
+
+替代 os.walk / rglob + 逐文件 getsize 的全量扫描：
+- 持久化的目录状态日志（每个目录的 mtime_ns、条目数、文件列表、子目录列表）
+- 目录 mtime 未变化时直接复用日志中的文件列表，只对子目录各做一次 stat
+- os.scandir 遍历，文件大小/时间取自 DirEntry 缓存的 stat
+- 线程池并行遍历目录（对 NAS 等高延迟存储尤其有效）
+- 与数据库比对时一次性加载已有路径集合，避免逐文件查询
+
+注意：目录 mtime 只反映直接条目的增删改名。原地覆盖写入的文件（大小变化但
+文件名不变）需要 full=True 强制全量扫描才能发现。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# 数据结构
+# ============================================================
+
+@dataclass
+class ScannedFile:
+    """扫描到的文件"""
+    path: str
+    name: str
+    size: int
+    mtime: float
+
+    @property
+    def extension(self) -> str:
+        return os.path.splitext(self.name)[1].lower()
+
+
+@dataclass
+class DirectoryState:
+    """目录状态（日志条目）"""
+    path: str
+    mtime_ns: int
+    entry_count: int
+    files: List[Tuple[str, int, float]] = field(default_factory=list)   # (name, size, mtime)
+    subdirs: List[str] = field(default_factory=list)                     # 子目录名
+
+
+@dataclass
+class IncrementalScanResult:
+    """增量扫描结果"""
+    root: str
+    files: List[ScannedFile] = field(default_factory=list)
+    directories: List[str] = field(default_factory=list)
+    added: List[str] = field(default_factory=list)       # 相对上次扫描新增的文件路径
+    removed: List[str] = field(default_factory=list)     # 相对上次扫描消失的文件路径
+    dirs_scanned: int = 0
+    dirs_skipped: int = 0
+    errors: List[str] = field(default_factory=list)
+    duration_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "root": self.root,
+            "total_files": len(self.files),
+            "directories": len(self.directories),
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "dirs_scanned": self.dirs_scanned,
+            "dirs_skipped": self.dirs_skipped,
+            "errors_count": len(self.errors),
+            "duration_ms": self.duration_ms,
+        }
+
+
+# ============================================================
+# 目录状态日志
+# ============================================================
+
+class ScanJournal:
+    """持久化的目录状态日志（SQLite）"""
+
+    def __init__(self, db_path: str = "data/scan_journal.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS scan_journal (
+                root TEXT NOT NULL,
+                dir_path TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                entry_count INTEGER NOT NULL,
+                files TEXT NOT NULL,
+                subdirs TEXT NOT NULL,
+                scanned_at REAL NOT NULL,
+                PRIMARY KEY (root, dir_path)
+            )
+        """)
+        self._conn.commit()
+
+    def load(self, root: str) -> Dict[str, DirectoryState]:
+        """加载某个扫描根目录下的全部目录状态"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dir_path, mtime_ns, entry_count, files, subdirs FROM scan_journal WHERE root = ?",
+                (root,)
+            ).fetchall()
+        states = {}
+        for dir_path, mtime_ns, entry_count, files, subdirs in rows:
+            states[dir_path] = DirectoryState(
+                path=dir_path,
+                mtime_ns=mtime_ns,
+                entry_count=entry_count,
+                files=[tuple(f) for f in json.loads(files)],
+                subdirs=json.loads(subdirs),
+            )
+        return states
+
+    def save(self, root: str, changed: Iterable[DirectoryState], removed: Iterable[str]):
+        """批量写入变化的目录状态，删除已消失的目录"""
+        now = time.time()
+        rows = [
+            (root, s.path, s.mtime_ns, s.entry_count,
+             json.dumps(s.files, ensure_ascii=False), json.dumps(s.subdirs, ensure_ascii=False), now)
+            for s in changed
+        ]
+        removed_rows = [(root, p) for p in removed]
+        with self._lock:
+            if rows:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO scan_journal "
+                    "(root, dir_path, mtime_ns, entry_count, files, subdirs, scanned_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            if removed_rows:
+                self._conn.executemany(
+                    "DELETE FROM scan_journal WHERE root = ? AND dir_path = ?", removed_rows
+                )
+            self._conn.commit()
+
+    def clear(self, root: str):
+        """清除某个根目录的日志（下次扫描为全量扫描）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM scan_journal WHERE root = ?", (root,))
+            self._conn.commit()
+
+
+# ============================================================
+# 扫描器
+# ============================================================
+
+class IncrementalScanner:
+    """增量目录扫描器"""
+
+    def __init__(self, journal: Optional[ScanJournal] = None, max_workers: int = 16):
+        self.journal = journal or get_scan_journal()
+        self.max_workers = max_workers
+
+    @staticmethod
+    def _read_directory(path: str) -> DirectoryState:
+        """scandir 读取一个目录；文件大小/时间使用 DirEntry 缓存的 stat"""
+        dir_stat = os.stat(path)
+        files: List[Tuple[str, int, float]] = []
+        subdirs: List[str] = []
+        count = 0
+        with os.scandir(path) as it:
+            for entry in it:
+                count += 1
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        files.append((entry.name, st.st_size, st.st_mtime))
+                except OSError:
+                    continue
+        return DirectoryState(
+            path=path,
+            mtime_ns=dir_stat.st_mtime_ns,
+            entry_count=count,
+            files=files,
+            subdirs=subdirs,
+        )
+
+    def _visit(
+        self,
+        path: str,
+        previous: Optional[DirectoryState],
+        full: bool,
+    ) -> Tuple[DirectoryState, bool]:
+        """
+        访问一个目录
+
+        Returns:
+            (目录状态, 是否重新读取)
+        """
+        if previous is not None and not full and os.stat(path).st_mtime_ns == previous.mtime_ns:
+            return previous, False
+        return self._read_directory(path), True
+
+    def scan(
+        self,
+        root: str,
+        recursive: bool = True,
+        extensions: Optional[Set[str]] = None,
+        exclude_patterns: Optional[List[str]] = None,
+        full: bool = False,
+    ) -> IncrementalScanResult:
+        """
+        扫描根目录
+
+        Args:
+            root: 根目录
+            recursive: 是否递归子目录
+            extensions: 只返回这些扩展名的文件（小写，含点）；None 表示全部
+            exclude_patterns: 相对路径包含这些子串的目录被跳过
+            full: 忽略日志，强制全量扫描
+        """
+        start = time.time()
+        root = os.path.abspath(root)
+        result = IncrementalScanResult(root=root)
+        exclude_patterns = exclude_patterns or []
+
+        previous_states = {} if full else self.journal.load(root)
+        previous_files = {
+            os.path.join(s.path, name)
+            for s in previous_states.values() for name, _, _ in s.files
+        }
+
+        changed: List[DirectoryState] = []
+        seen_dirs: Set[str] = set()
+        states: Dict[str, DirectoryState] = {}
+
+        def excluded(dir_path: str) -> bool:
+            rel = os.path.relpath(dir_path, root)
+            return rel != "." and any(p in rel for p in exclude_patterns)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending: Dict[Future, str] = {
+                executor.submit(self._visit, root, previous_states.get(root), full): root
+            }
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_path = pending.pop(future)
+                    try:
+                        state, rescanned = future.result()
+                    except Exception as e:
+                        result.errors.append(f"{dir_path}: {e}")
+                        continue
+
+                    seen_dirs.add(dir_path)
+                    states[dir_path] = state
+                    if rescanned:
+                        result.dirs_scanned += 1
+                        changed.append(state)
+                    else:
+                        result.dirs_skipped += 1
+
+                    if dir_path != root:
+                        result.directories.append(os.path.relpath(dir_path, root))
+
+                    if not recursive:
+                        continue
+                    for name in state.subdirs:
+                        child = os.path.join(dir_path, name)
+                        if excluded(child):
+                            continue
+                        pending[executor.submit(
+                            self._visit, child, previous_states.get(child), full
+                        )] = child
+
+        # 汇总文件
+        current_files: Set[str] = set()
+        for dir_path, state in states.items():
+            for name, size, mtime in state.files:
+                file_path = os.path.join(dir_path, name)
+                current_files.add(file_path)
+                if extensions is not None and os.path.splitext(name)[1].lower() not in extensions:
+                    continue
+                result.files.append(ScannedFile(path=file_path, name=name, size=size, mtime=mtime))
+
+        if previous_states:
+            result.added = sorted(current_files - previous_files)
+            result.removed = sorted(previous_files - current_files)
+        else:
+            result.added = sorted(current_files)
+
+        # 非递归扫描只覆盖根目录，不应清除子目录日志
+        removed_dirs = [d for d in previous_states if d not in seen_dirs] if recursive else []
+        try:
+            self.journal.save(root, changed, removed_dirs)
+        except Exception as e:
+            logger.error(f"扫描日志写入失败: {e}")
+
+        result.duration_ms = (time.time() - start) * 1000
+        logger.info(
+            f"增量扫描完成: {root}, 文件 {len(result.files)}, "
+            f"重新读取目录 {result.dirs_scanned}, 跳过 {result.dirs_skipped}, "
+            f"新增 {len(result.added)}, 移除 {len(result.removed)}, 耗时 {result.duration_ms:.0f}ms"
+        )
+        return result
+
+
+def load_existing_asset_paths(db, root: Optional[str] = None) -> Set[str]:
+    """一次性加载数据库中已有的素材路径集合（可按根目录前缀过滤）"""
+    from database import Asset
+
+    query = db.query(Asset.file_path).filter(Asset.file_path.isnot(None))
+    if root:
+        query = query.filter(Asset.file_path.like(f"{os.path.abspath(root)}%"))
+    return {row[0] for row in query}
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_scan_journal: Optional[ScanJournal] = None
+
+
+def get_scan_journal() -> ScanJournal:
+    """获取全局扫描日志"""
+    global _scan_journal
+    if _scan_journal is None:
+        _scan_journal = ScanJournal(os.getenv("SCAN_JOURNAL_DB", "data/scan_journal.db"))
+    return _scan_journal
@@ -0,0 +1,658 @@
+# -*- coding: utf-8 -*-
+"""
+素材库目录监听与实时入库
+
+为开启监听模式的素材库（AssetLibrary.metadata["watch"] = true）持续发现新素材：
+- 本地路径：watchdog（Linux 下为 inotify）事件驱动
+- 网络路径（network/smb/nfs）或 watchdog 不可用：基于增量扫描器定时轮询
+  （watchdog 已列入 requirements.txt；未安装时本地库同样退化为轮询，
+  发现延迟上限为 LIBRARY_WATCH_POLL_INTERVAL 秒，启动时记录告警）
+- 事件去抖：文件在静默期内大小不再变化才视为写入完成
+- 合批：就绪文件按库分批生成入库任务（DB 写入、关键帧、文本/视觉嵌入、存储写入）
+- 限流：令牌桶限制每分钟入库文件数，避免大批量拷贝时压垮机器
+
+入库任务登记在任务注册表（source="library_watch"）中，可通过任务接口查询进度。
+"""
+
+import asyncio
+import logging
+import mimetypes
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 尝试导入 watchdog（inotify）
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+    WATCHDOG_AVAILABLE = False
+
+# 需要轮询的路径类型（inotify 收不到远端写入的事件）
+POLLING_PATH_TYPES = {"network", "smb", "nfs"}
+
+TASK_SOURCE = "library_watch"
+
+
+# ============================================================
+# 配置
+# ============================================================
+
+@dataclass
+class WatcherConfig:
+    """监听配置"""
+    debounce_seconds: float = 5.0        # 最后一次事件后的静默期
+    poll_interval: float = 30.0          # 轮询模式扫描间隔
+    batch_size: int = 50                 # 单个入库任务的最大文件数
+    rate_per_minute: int = 120           # 每分钟最多入库文件数
+    max_concurrent_jobs: int = 1         # 并行入库任务数
+    extract_keyframes: bool = True
+    embed_text: bool = True
+    embed_visual: bool = True
+    flag_duplicates: bool = True         # 按关键帧哈希标记重复源文件
+    duplicate_threshold: int = 6         # 单帧汉明距离阈值
+    duplicate_min_ratio: float = 0.8     # 近似帧占比达到该值视为重复
+
+    @classmethod
+    def from_env(cls) -> "WatcherConfig":
+        return cls(
+            debounce_seconds=float(os.getenv("LIBRARY_WATCH_DEBOUNCE", "5")),
+            poll_interval=float(os.getenv("LIBRARY_WATCH_POLL_INTERVAL", "30")),
+            batch_size=int(os.getenv("LIBRARY_WATCH_BATCH_SIZE", "50")),
+            rate_per_minute=int(os.getenv("LIBRARY_WATCH_RATE", "120")),
+            max_concurrent_jobs=int(os.getenv("LIBRARY_WATCH_JOBS", "1")),
+        )
+
+
+# ============================================================
+# 限流
+# ============================================================
+
+class TokenBucket:
+    """令牌桶限流器（每分钟 rate 个令牌，允许 burst 突发）"""
+
+    def __init__(self, rate_per_minute: int, burst: Optional[int] = None):
+        self.rate = max(rate_per_minute, 1) / 60.0
+        self.capacity = float(burst or max(rate_per_minute // 6, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: int = 1):
+        """获取令牌，不足时等待"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+# ============================================================
+# 监听状态
+# ============================================================
+
+@dataclass
+class PendingFile:
+    """等待去抖的文件"""
+    path: str
+    size: int
+    last_event: float
+
+
+@dataclass
+class LibraryWatch:
+    """单个素材库的监听状态"""
+    library_id: int
+    root: str
+    extensions: Set[str]
+    exclude_patterns: List[str]
+    recursive: bool = True
+    mode: str = "inotify"                # inotify / polling
+    observer: Any = None
+    poll_task: Optional[asyncio.Task] = None
+    pending: Dict[str, PendingFile] = field(default_factory=dict)
+    removed: Set[str] = field(default_factory=set)
+    events_received: int = 0
+    files_ingested: int = 0
+    started_at: float = field(default_factory=time.time)
+
+    def accepts(self, path: str) -> bool:
+        """路径是否属于本库需要入库的文件"""
+        if os.path.splitext(path)[1].lower() not in self.extensions:
+            return False
+        rel = os.path.relpath(os.path.dirname(path), self.root)
+        if rel.startswith(".."):
+            return False
+        if not self.recursive and rel != ".":
+            return False
+        return not any(p in rel for p in self.exclude_patterns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "library_id": self.library_id,
+            "root": self.root,
+            "mode": self.mode,
+            "pending": len(self.pending),
+            "events_received": self.events_received,
+            "files_ingested": self.files_ingested,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+        }
+
+
+class _WatchdogHandler(FileSystemEventHandler):
+    """把 watchdog 线程中的事件转交到事件循环"""
+
+    def __init__(self, service: "LibraryWatcherService", library_id: int):
+        super().__init__()
+        self.service = service
+        self.library_id = library_id
+
+    def _dispatch(self, path: str, removed: bool = False):
+        self.service._loop.call_soon_threadsafe(
+            self.service._record_event, self.library_id, path, removed
+        )
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._dispatch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._dispatch(event.src_path)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self._dispatch(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._dispatch(event.src_path, removed=True)
+            self._dispatch(event.dest_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self._dispatch(event.src_path, removed=True)
+
+
+# ============================================================
+# 监听服务
+# ============================================================
+
+class LibraryWatcherService:
+    """素材库监听服务"""
+
+    def __init__(self, config: Optional[WatcherConfig] = None):
+        self.config = config or WatcherConfig.from_env()
+        self._watches: Dict[int, LibraryWatch] = {}
+        self._jobs: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._limiter = TokenBucket(self.config.rate_per_minute)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ---------- 生命周期 ----------
+
+    async def _ensure_running(self):
+        if self._flush_task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._jobs = asyncio.Queue()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        self._workers = [
+            asyncio.create_task(self._ingest_worker())
+            for _ in range(max(self.config.max_concurrent_jobs, 1))
+        ]
+
+    async def start_enabled(self) -> int:
+        """启动所有开启了监听模式的激活素材库"""
+        from database import SessionLocal
+        from models.asset_library import AssetLibrary
+
+        db = SessionLocal()
+        try:
+            libraries = db.query(AssetLibrary).filter(AssetLibrary.is_active == True).all()
+            enabled = [lib for lib in libraries if (lib.extra_metadata or {}).get("watch")]
+        finally:
+            db.close()
+
+        started = 0
+        for library in enabled:
+            if await self.watch(library):
+                started += 1
+        if started:
+            logger.info(f"已启动 {started} 个素材库的目录监听")
+        return started
+
+    async def watch(self, library) -> bool:
+        """开始监听一个素材库（AssetLibrary 实例）"""
+        from services.asset_library_service import DEFAULT_VIDEO_EXTENSIONS
+
+        if library.id in self._watches:
+            return True
+        if not os.path.isdir(library.path):
+            logger.warning(f"素材库路径不可访问，无法监听: {library.path}")
+            return False
+
+        await self._ensure_running()
+
+        watch = LibraryWatch(
+            library_id=library.id,
+            root=os.path.abspath(library.path),
+            extensions={e.lower() for e in (library.file_extensions or DEFAULT_VIDEO_EXTENSIONS)},
+            exclude_patterns=library.exclude_patterns or [],
+            recursive=bool(library.scan_subdirs),
+        )
+
+        use_polling = not WATCHDOG_AVAILABLE or (library.path_type or "local") in POLLING_PATH_TYPES
+        if not WATCHDOG_AVAILABLE:
+            logger.warning(f"未安装 watchdog，素材库 {library.id} 改用轮询（间隔 {self.config.poll_interval}s）")
+        if not use_polling:
+            try:
+                observer = Observer()
+                observer.schedule(
+                    _WatchdogHandler(self, library.id), watch.root, recursive=watch.recursive
+                )
+                observer.daemon = True
+                observer.start()
+                watch.observer = observer
+            except OSError as e:
+                # 典型情况：inotify watch 数量达到上限（ENOSPC）
+                logger.warning(f"inotify 监听失败，改用轮询: {watch.root}: {e}")
+                use_polling = True
+
+        if use_polling:
+            watch.mode = "polling"
+            watch.poll_task = asyncio.create_task(self._poll_loop(watch))
+
+        self._watches[library.id] = watch
+        logger.info(f"开始监听素材库 {library.id}: {watch.root} ({watch.mode})")
+        return True
+
+    async def unwatch(self, library_id: int) -> bool:
+        """停止监听一个素材库"""
+        watch = self._watches.pop(library_id, None)
+        if watch is None:
+            return False
+        if watch.observer is not None:
+            watch.observer.stop()
+            await asyncio.to_thread(watch.observer.join, 5)
+        if watch.poll_task is not None:
+            watch.poll_task.cancel()
+        logger.info(f"停止监听素材库 {library_id}")
+        return True
+
+    async def shutdown(self):
+        """停止全部监听和入库任务"""
+        for library_id in list(self._watches):
+            await self.unwatch(library_id)
+        for task in [self._flush_task, *self._workers]:
+            if task is not None:
+                task.cancel()
+        self._flush_task = None
+        self._workers = []
+
+    def is_watching(self, library_id: int) -> bool:
+        return library_id in self._watches
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "watchdog_available": WATCHDOG_AVAILABLE,
+            "queued_jobs": self._jobs.qsize() if self._jobs else 0,
+            "rate_per_minute": self.config.rate_per_minute,
+            "libraries": [w.to_dict() for w in self._watches.values()],
+        }
+
+    # ---------- 事件收集 ----------
+
+    def _record_event(self, library_id: int, path: str, removed: bool = False):
+        """记录一个文件事件（在事件循环线程中调用）"""
+        watch = self._watches.get(library_id)
+        if watch is None or not watch.accepts(path):
+            return
+        watch.events_received += 1
+        if removed:
+            watch.pending.pop(path, None)
+            watch.removed.add(path)
+            return
+        watch.removed.discard(path)
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            return
+        watch.pending[path] = PendingFile(path=path, size=size, last_event=time.monotonic())
+
+    async def _poll_loop(self, watch: LibraryWatch):
+        """轮询模式：增量扫描器只重新读取 mtime 变化的目录"""
+        from services.library_scanner import IncrementalScanner, ScanJournal
+
+        # 独立日志：手动扫描接口更新共享日志后，轮询不会漏掉两次轮询之间的新增文件
+        scanner = IncrementalScanner(
+            journal=ScanJournal(os.getenv("LIBRARY_WATCH_JOURNAL_DB", "data/watch_journal.db"))
+        )
+        try:
+            # 首次监听时建立基线，已有文件交给手动扫描处理
+            if not await asyncio.to_thread(scanner.journal.load, watch.root):
+                await asyncio.to_thread(
+                    scanner.scan, watch.root, watch.recursive, None, watch.exclude_patterns
+                )
+            while True:
+                await asyncio.sleep(self.config.poll_interval)
+                result = await asyncio.to_thread(
+                    scanner.scan, watch.root, watch.recursive, None, watch.exclude_patterns
+                )
+                for path in result.removed:
+                    self._record_event(watch.library_id, path, removed=True)
+                for path in result.added:
+                    self._record_event(watch.library_id, path)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"素材库轮询失败 {watch.root}: {e}")
+
+    # ---------- 去抖与合批 ----------
+
+    async def _flush_loop(self):
+        interval = max(self.config.debounce_seconds / 2, 0.5)
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                for watch in list(self._watches.values()):
+                    self._flush_watch(watch)
+        except asyncio.CancelledError:
+            pass
+
+    def _flush_watch(self, watch: LibraryWatch):
+        """把静默期已过且大小稳定的文件分批放入入库队列"""
+        now = time.monotonic()
+        ready: List[str] = []
+        for path, item in list(watch.pending.items()):
+            if now - item.last_event < self.config.debounce_seconds:
+                continue
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                watch.pending.pop(path, None)
+                continue
+            if size != item.size:
+                # 仍在写入（如网络拷贝），重新计时
+                item.size = size
+                item.last_event = now
+                continue
+            watch.pending.pop(path, None)
+            ready.append(path)
+
+        batch_size = max(self.config.batch_size, 1)
+        for i in range(0, len(ready), batch_size):
+            self._jobs.put_nowait((watch.library_id, ready[i:i + batch_size], []))
+
+        if watch.removed:
+            self._jobs.put_nowait((watch.library_id, [], sorted(watch.removed)))
+            watch.removed = set()
+
+    # ---------- 入库 ----------
+
+    async def _ingest_worker(self):
+        from services.task_registry import get_task_registry
+
+        registry = get_task_registry()
+        try:
+            while True:
+                library_id, added, removed = await self._jobs.get()
+                record = registry.create(
+                    "library_ingest",
+                    source=TASK_SOURCE,
+                    status="working",
+                    message=f"入库 {len(added)} 个文件",
+                    details={"library_id": library_id, "files": len(added), "removed": len(removed)},
+                )
+                try:
+                    if removed:
+                        await self._remove_files(removed)
+                    ingested = await self._ingest_batch(library_id, added, record.task_id)
+                    watch = self._watches.get(library_id)
+                    if watch is not None:
+                        watch.files_ingested += ingested
+                    registry.update(
+                        record.task_id, status="completed", progress=100,
+                        result={"ingested": ingested, "removed": len(removed)},
+                    )
+                except Exception as e:
+                    logger.error(f"素材库 {library_id} 入库失败: {e}")
+                    registry.update(record.task_id, status="failed", error=str(e))
+                finally:
+                    self._jobs.task_done()
+        except asyncio.CancelledError:
+            pass
+
+    async def _ingest_batch(self, library_id: int, paths: List[str], task_id: str) -> int:
+        """入库一批文件：批量写 DB，再逐个（限流）提取关键帧和嵌入"""
+        from services.task_registry import get_task_registry
+
+        if not paths:
+            return 0
+        assets = await asyncio.to_thread(self._insert_assets, paths)
+        if not assets:
+            return 0
+
+        registry = get_task_registry()
+        for index, (asset_id, path) in enumerate(assets, 1):
+            await self._limiter.acquire()
+            try:
+                await self._index_file(asset_id, path)
+            except Exception as e:
+                logger.warning(f"索引失败 {path}: {e}")
+            registry.update(task_id, progress=int(index * 100 / len(assets)))
+        return len(assets)
+
+    def _insert_assets(self, paths: List[str]) -> List[tuple]:
+        """批量写入 Asset 表（跳过已存在路径），返回 (asset_id, path) 列表"""
+        from database import Asset, SessionLocal
+        from models.base import ProcessingStatus
+        from services.library_scanner import load_existing_asset_paths
+
+        db = SessionLocal()
+        try:
+            existing = load_existing_asset_paths(db, os.path.commonpath(paths))
+            rows = []
+            for path in paths:
+                if path in existing:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                rows.append({
+                    "id": str(uuid.uuid4()),
+                    "project_id": "default_project",
+                    "filename": os.path.basename(path),
+                    "file_path": path,
+                    "mime_type": mimetypes.guess_type(path)[0] or "application/octet-stream",
+                    "source": "external",
+                    "processing_status": ProcessingStatus.COMPLETED.value,
+                    "thumbnail_path": None,
+                    "processing_metadata": {"file_size": st.st_size, "ingest": TASK_SOURCE},
+                    "created_at": datetime.fromtimestamp(st.st_mtime),
+                })
+            if rows:
+                db.bulk_insert_mappings(Asset, rows)
+                db.commit()
+            return [(row["id"], row["file_path"]) for row in rows]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _index_file(self, asset_id: str, path: str):
+        """关键帧 + 视觉嵌入 + 文本嵌入 + 写入视频存储"""
+        from services.asset_library_service import DEFAULT_VIDEO_EXTENSIONS
+        from services.milvus_store import VideoSegment, get_video_store
+
+        if os.path.splitext(path)[1].lower() not in DEFAULT_VIDEO_EXTENSIONS:
+            return
+
+        duration = 0.0
+        thumbnail_path = None
+        if self.config.extract_keyframes:
+            from services.keyframe_extractor import get_keyframe_extractor
+
+            extraction = await get_keyframe_extractor().extract(path, asset_id)
+            if extraction.success:
+                duration = extraction.duration
+                if extraction.keyframes:
+                    thumbnail_path = extraction.keyframes[0].image_path
+                if self.config.flag_duplicates and extraction.keyframes:
+                    await asyncio.to_thread(self._flag_duplicates, asset_id, path, extraction.keyframes)
+                if extraction.keyframes:
+                    # 先比对再落库：哈希索引在比对时已从 keyframes 表载入，落库时增量更新
+                    await asyncio.to_thread(self._save_keyframes, path, extraction.keyframes)
+                if self.config.embed_visual:
+                    await self._embed_keyframes(asset_id, extraction.keyframes)
+
+        embedding = None
+        name = Path(path).stem
+        description = f"{Path(path).parent.name} {name}".strip()
+        if self.config.embed_text:
+            from services.ollama_embedding import get_embedding_service
+
+            embedding = await get_embedding_service().embed(description)
+
+        await get_video_store().insert(VideoSegment(
+            segment_id=asset_id,
+            video_id=asset_id,
+            video_path=path,
+            start_time=0,
+            end_time=duration,
+            duration=duration,
+            tags={"source": TASK_SOURCE},
+            embedding=embedding,
+            thumbnail_path=thumbnail_path,
+            description=name[:50],
+        ))
+
+    def _flag_duplicates(self, asset_id: str, path: str, keyframes: list):
+        """关键帧哈希与已入库素材比对，重复时在 processing_metadata 记录 duplicate_of"""
+        from database import Asset, SessionLocal
+        from services.frame_hash import get_frame_hash_index
+
+        index = get_frame_hash_index()
+        db = SessionLocal()
+        try:
+            index.ensure_loaded(db)
+            duplicates = index.find_duplicate_assets(
+                asset_id,
+                [kf.frame_hash for kf in keyframes],
+                self.config.duplicate_threshold,
+                self.config.duplicate_min_ratio,
+            )
+            if not duplicates:
+                return
+            asset = db.query(Asset).filter(Asset.id == asset_id).first()
+            if asset is not None:
+                asset.processing_metadata = {
+                    **(asset.processing_metadata or {}),
+                    "duplicate_of": [d["asset_id"] for d in duplicates],
+                }
+                db.commit()
+            logger.info(f"疑似重复源文件 {path}: 与 {duplicates[0]['asset_id']} 相似 ({duplicates[0]['ratio']:.0%})")
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"重复检测失败 {path}: {e}")
+        finally:
+            db.close()
+
+    def _save_keyframes(self, path: str, keyframes: list):
+        """关键帧（含感知哈希）经 KeyFrameStore 写入 keyframes 表，同步更新向量与哈希索引，
+        重启后 FrameHashIndex.ensure_loaded 从表中恢复"""
+        from database import SessionLocal
+        from services.keyframe_store import KeyFrameStore
+
+        db = SessionLocal()
+        try:
+            if not asyncio.run(KeyFrameStore(db).save_keyframes_batch(keyframes)):
+                logger.warning(f"关键帧保存失败 {path}")
+        finally:
+            db.close()
+
+    async def _embed_keyframes(self, asset_id: str, keyframes: list):
+        from services.clip_embedding import get_clip_service
+        from services.visual_vector_store import get_visual_store
+
+        clip_service = get_clip_service()
+        visual_store = get_visual_store()
+        keyframes = [kf for kf in keyframes if kf.image_path and os.path.exists(kf.image_path)]
+        # 一个文件的全部关键帧一次批量嵌入
+        vectors = await clip_service.embed_images_batch([kf.image_path for kf in keyframes])
+        for kf, vector in zip(keyframes, vectors):
+            if vector:
+                visual_store.add(
+                    keyframe_id=f"{asset_id}_kf_{kf.frame_index:04d}",
+                    asset_id=asset_id,
+                    vector=vector,
+                    frame_index=kf.frame_index,
+                    timestamp=kf.timestamp,
+                    timecode=kf.timecode,
+                    thumbnail_path=kf.image_path,
+                    metadata={"scene_id": kf.scene_id},
+                )
+
+    async def _remove_files(self, paths: List[str]):
+        """文件被删除/移走：从内存检索存储中移除（DB 记录保留，由手动同步处理）"""
+        from database import Asset, SessionLocal
+        from services.frame_hash import get_frame_hash_index
+        from services.milvus_store import get_video_store
+        from services.visual_vector_store import get_visual_store
+
+        def lookup() -> List[str]:
+            db = SessionLocal()
+            try:
+                return [row[0] for row in db.query(Asset.id).filter(Asset.file_path.in_(paths))]
+            finally:
+                db.close()
+
+        asset_ids = await asyncio.to_thread(lookup)
+        video_store = get_video_store()
+        visual_store = get_visual_store()
+        for asset_id in asset_ids:
+            await video_store.delete(asset_id)
+            visual_store.remove_by_asset(asset_id)
+            get_frame_hash_index().remove_asset(asset_id)
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_library_watcher: Optional[LibraryWatcherService] = None
+
+
+def get_library_watcher() -> LibraryWatcherService:
+    """获取素材库监听服务"""
+    global _library_watcher
+    if _library_watcher is None:
+        _library_watcher = LibraryWatcherService()
+    return _library_watcher
+
+
+async def shutdown_library_watcher():
+    """停止素材库监听服务"""
+    global _library_watcher
+    if _library_watcher is not None:
+        await _library_watcher.shutdown()
+        _library_watcher = None
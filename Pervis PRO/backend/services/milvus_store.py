@@ -15,15 +15,22 @@ Requirements: 17.2, 17.3, 17.4
 """
 
 import logging
+import os
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from uuid import uuid4
 
 import numpy as np
 
+from .compact_store import CompactSegmentMap
+from .diversity import embedding_matrix
+from .store_stats import StoreAggregates
+from .tag_index import TagInvertedIndex
+from .vector_index import VectorQuantization, top_k_rows
+
 logger = logging.getLogger(__name__)
 
 
@@ -78,8 +85,47 @@ class SearchResult:
     match_reason: str = ""
 
 
+class StoreEvent(str, Enum):
+    """存储变更事件"""
+    INSERT = "insert"
+    DELETE = "delete"
+
+
+# 变更监听器：listener(event, segment_id, segment)；删除事件中 segment 可能为 None
+StoreListener = Callable[[StoreEvent, str, Optional[VideoSegment]], None]
+
+
 class BaseVideoStore(ABC):
-    """视频存储基类"""
+    """视频存储基类
+    
+    派生索引（TF-IDF、统计等）通过 add_listener 订阅插入/删除事件做增量维护。
+    generation 为变更代数，每次插入/删除递增，搜索结果缓存以此隐式失效；
+    epoch 标识存储实例，避免不同实例（进程）的代数在共享缓存中混淆。
+    """
+    
+    def __init__(self):
+        self._listeners: List[StoreListener] = []
+        self.generation = 0
+        self.epoch = uuid4().hex
+    
+    def add_listener(self, listener: StoreListener):
+        """注册变更监听器"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+    
+    def remove_listener(self, listener: StoreListener):
+        """注销变更监听器"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _notify(self, event: StoreEvent, segment_id: str, segment: Optional[VideoSegment] = None):
+        """递增变更代数并通知监听器；监听器异常不影响存储写入"""
+        self.generation += 1
+        for listener in self._listeners:
+            try:
+                listener(event, segment_id, segment)
+            except Exception as e:
+                logger.error(f"存储监听器处理 {event.value} 失败: {e}")
     
     @abstractmethod
     async def initialize(self) -> bool:
@@ -106,6 +152,34 @@ class BaseVideoStore(ABC):
         """向量搜索"""
         pass
     
+    async def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        filters: Optional[List[Optional[Dict[str, Any]]]] = None
+    ) -> List[List[SearchResult]]:
+        """批量向量搜索（默认逐条调用 search；filters 与查询一一对应）"""
+        filters = filters or [None] * len(query_embeddings)
+        return [
+            await self.search(embedding, top_k=top_k, filters=query_filters)
+            for embedding, query_filters in zip(query_embeddings, filters)
+        ]
+    
+    async def diversity_features(
+        self,
+        segment_ids: List[str]
+    ) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """
+        多样性重排所需特征：行归一化嵌入矩阵（缺失为零行）与 video_id
+        
+        默认逐条 get，内存存储直接读取列/字典。
+        """
+        segments = [await self.get(segment_id) for segment_id in segment_ids]
+        return (
+            embedding_matrix([s.embedding if s else None for s in segments]),
+            [s.video_id if s else None for s in segments],
+        )
+    
     @abstractmethod
     async def search_by_tags(
         self, 
@@ -135,15 +209,46 @@ class MemoryVideoStore(BaseVideoStore):
     """内存视频存储（用于测试和开发）
     
     支持从 JSON 缓存文件加载预索引的素材数据，解决后端重启后数据丢失的问题。
+    标签查询走倒排索引（tag_index），覆盖率/分面统计走聚合计数器（aggregates），
+    两者都在插入/删除时增量维护。
+    
+    compact=True（或环境变量 VIDEO_STORE_COMPACT=1）时片段以列式紧凑存储
+    （见 compact_store），行号与 tag_index 序号一致，向量搜索直接使用列矩阵。
+    quantization="float16"/"int8"（或 VIDEO_STORE_QUANTIZATION）启用量化向量，
+    全精度向量写入 vector_path（或 VIDEO_STORE_VECTOR_PATH）的 mmap 文件用于精确重排，
+    未指定时每个实例使用独立的临时文件；量化隐含紧凑模式。
     """
     
     # 默认缓存文件路径
     DEFAULT_CACHE_PATH = None  # 将在初始化时设置
     
-    def __init__(self, cache_path: str = None):
+    def __init__(
+        self,
+        cache_path: str = None,
+        compact: Optional[bool] = None,
+        quantization: Optional[str] = None,
+        vector_path: Optional[str] = None,
+    ):
+        super().__init__()
+        quantization = VectorQuantization(
+            quantization or os.getenv("VIDEO_STORE_QUANTIZATION", VectorQuantization.NONE.value)
+        )
+        if compact is None:
+            compact = os.getenv("VIDEO_STORE_COMPACT", "0") == "1"
+        # 量化向量只在紧凑模式下可用
+        self.compact = compact or quantization != VectorQuantization.NONE
         self._segments: Dict[str, VideoSegment] = {}
+        if self.compact:
+            self._segments = CompactSegmentMap(
+                self._row_of,
+                quantization,
+                vector_path or os.getenv("VIDEO_STORE_VECTOR_PATH") or None,
+            )
         self._initialized = False
         self._cache_path = cache_path
+        self.tag_index = TagInvertedIndex()
+        self.aggregates = StoreAggregates()
+        self._matrix_cache: Optional[Tuple[Tuple[int, int], np.ndarray, np.ndarray]] = None
     
     async def initialize(self) -> bool:
         """初始化存储，自动加载缓存数据"""
@@ -197,7 +302,7 @@ class MemoryVideoStore(BaseVideoStore):
                         for seg_data in segments_data:
                             segment = self._dict_to_segment(seg_data)
                             if segment:
-                                self._segments[segment.segment_id] = segment
+                                self._put(segment)
                         logger.info(f"从 {cache_path} 加载了 {len(self._segments)} 条素材数据")
                         return len(self._segments)
                     
@@ -269,8 +374,19 @@ class MemoryVideoStore(BaseVideoStore):
             logger.error(f"保存缓存失败: {e}")
             return False
     
-    async def insert(self, segment: VideoSegment) -> bool:
+    def _put(self, segment: VideoSegment):
+        """写入片段并维护索引/通知监听器（同 ID 视为先删后插）"""
+        previous = self._segments.get(segment.segment_id)
+        if previous is not None:
+            self.aggregates.remove(previous.tags, bool(previous.embedding))
+            self._notify(StoreEvent.DELETE, previous.segment_id, previous)
+        self.tag_index.add(segment.segment_id, segment.tags)
         self._segments[segment.segment_id] = segment
+        self.aggregates.add(segment.tags, bool(segment.embedding))
+        self._notify(StoreEvent.INSERT, segment.segment_id, segment)
+    
+    async def insert(self, segment: VideoSegment) -> bool:
+        self._put(segment)
         return True
     
     async def insert_batch(self, segments: List[VideoSegment]) -> int:
@@ -287,6 +403,9 @@ class MemoryVideoStore(BaseVideoStore):
         filters: Optional[Dict[str, Any]] = None
     ) -> List[SearchResult]:
         """向量搜索（余弦相似度）"""
+        if self.compact:
+            return (await self.search_batch([query_embedding], top_k=top_k, filters=[filters]))[0]
+        
         results = []
         query_vec = np.array(query_embedding)
         query_norm = np.linalg.norm(query_vec)
@@ -294,7 +413,15 @@ class MemoryVideoStore(BaseVideoStore):
         if query_norm == 0:
             return []
         
-        for segment in self._segments.values():
+        candidates = self._segments.values()
+        if filters:
+            # 标签条件先走倒排索引缩小候选集
+            tag_filters = {k: v for k, v in filters.items() if k not in self.RESERVED_FILTERS}
+            if tag_filters:
+                ids = self.tag_index.segment_ids(self.tag_index.filter(tag_filters))
+                candidates = [self._segments[i] for i in ids]
+        
+        for segment in candidates:
             if segment.embedding is None:
                 continue
             
@@ -320,50 +447,168 @@ class MemoryVideoStore(BaseVideoStore):
         results.sort(key=lambda x: x.score, reverse=True)
         return results[:top_k]
     
+    def _row_of(self, segment_id: str) -> Optional[int]:
+        """紧凑存储的行号（与 tag_index 序号一致）"""
+        return self.tag_index.ordinal_of(segment_id)
+    
+    def _embedding_matrix(self, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按标签索引序号排列的归一化嵌入矩阵（capacity × dim）及有效行掩码（字典模式）
+        
+        以变更代数缓存，存储未变化时批量查询直接复用。
+        """
+        key = (self.generation, dim)
+        if self._matrix_cache is not None and self._matrix_cache[0] == key:
+            return self._matrix_cache[1], self._matrix_cache[2]
+        
+        matrix = np.zeros((self.tag_index.capacity, dim), dtype=np.float32)
+        for segment_id, segment in self._segments.items():
+            embedding = segment.embedding
+            if embedding is None or len(embedding) != dim:
+                continue
+            matrix[self.tag_index.ordinal_of(segment_id)] = embedding
+        norms = np.linalg.norm(matrix, axis=1)
+        valid = norms > 0
+        matrix[valid] /= norms[valid, None]
+        
+        self._matrix_cache = (key, matrix, valid)
+        return matrix, valid
+    
+    def _filter_mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """过滤条件 → 序号掩码（标签条件走倒排索引，其余条件逐片段检查）"""
+        mask = np.zeros(self.tag_index.capacity, dtype=bool)
+        tag_filters = {k: v for k, v in filters.items() if k not in self.RESERVED_FILTERS}
+        mask[self.tag_index.filter(tag_filters)] = True
+        if any(k in filters for k in self.RESERVED_FILTERS):
+            ordinals = np.flatnonzero(mask)
+            for ordinal, segment_id in zip(ordinals, self.tag_index.segment_ids(ordinals)):
+                if not self._match_filters(self._segments[segment_id], filters):
+                    mask[ordinal] = False
+        return mask
+    
+    async def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        filters: Optional[List[Optional[Dict[str, Any]]]] = None
+    ) -> List[List[SearchResult]]:
+        """
+        批量向量搜索
+        
+        一次矩阵乘法（查询 × 片段）算出全部余弦相似度，
+        各查询的过滤条件作为行掩码，再逐行取 top_k。
+        紧凑模式在向量列上搜索（量化时先粗排再精确重排）。
+        """
+        if not query_embeddings:
+            return []
+        filters = filters or [None] * len(query_embeddings)
+        
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        dim = queries.shape[1]
+        query_norms = np.linalg.norm(queries, axis=1)
+        nonzero = query_norms > 0
+        queries[nonzero] /= query_norms[nonzero, None]
+        masks = [self._filter_mask(f) if f else None for f in filters]
+        
+        if self.compact:
+            vectors = self._segments.columns.vectors
+            if vectors.dim != dim or not vectors.valid.any():
+                return [[] for _ in query_embeddings]
+            hits = vectors.search(queries, masks, top_k)
+        else:
+            matrix, valid = self._embedding_matrix(dim)
+            if not valid.any():
+                return [[] for _ in query_embeddings]
+            scores = queries @ matrix.T
+            hits = []
+            for i, mask in enumerate(masks):
+                rows = top_k_rows(scores[i], valid if mask is None else mask & valid, top_k)
+                hits.append((rows, scores[i][rows]))
+        
+        results: List[List[SearchResult]] = []
+        for i, (rows, row_scores) in enumerate(hits):
+            if not nonzero[i]:
+                results.append([])
+                continue
+            results.append([
+                SearchResult(
+                    segment=self._segments[segment_id],
+                    score=float(score),
+                    match_reason="向量相似度匹配"
+                )
+                for segment_id, score in zip(self.tag_index.segment_ids(rows), row_scores)
+            ])
+        return results
+    
     async def search_by_tags(
         self, 
         tags: Dict[str, Any], 
         top_k: int = 5
     ) -> List[SearchResult]:
-        """标签搜索"""
-        results = []
+        """标签搜索（倒排索引：只访问命中任一标签的片段）"""
+        total_tags = len(tags)
+        if total_tags == 0:
+            return []
         
-        for segment in self._segments.values():
-            match_count = 0
-            total_tags = len(tags)
-            
-            for key, value in tags.items():
-                if key in segment.tags:
-                    if isinstance(value, list):
-                        # 列表匹配（任一匹配即可）
-                        if any(v in segment.tags.get(key, []) for v in value):
-                            match_count += 1
-                    elif segment.tags.get(key) == value:
-                        match_count += 1
-            
-            if match_count > 0:
-                score = match_count / total_tags if total_tags > 0 else 0
-                results.append(SearchResult(
-                    segment=segment,
-                    score=score,
-                    match_reason=f"标签匹配 {match_count}/{total_tags}"
-                ))
+        ordinals, counts = self.tag_index.match_counts(tags)
+        # 稳定排序：同分按序号（插入顺序）排列
+        order = np.argsort(-counts, kind="stable")[:top_k]
+        ordinals, counts = ordinals[order], counts[order]
         
-        results.sort(key=lambda x: x.score, reverse=True)
-        return results[:top_k]
+        results = []
+        for segment_id, match_count in zip(self.tag_index.segment_ids(ordinals), counts.tolist()):
+            results.append(SearchResult(
+                segment=self._segments[segment_id],
+                score=match_count / total_tags,
+                match_reason=f"标签匹配 {match_count}/{total_tags}"
+            ))
+        return results
     
     async def get(self, segment_id: str) -> Optional[VideoSegment]:
         return self._segments.get(segment_id)
     
+    async def diversity_features(
+        self,
+        segment_ids: List[str]
+    ) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """多样性重排特征（紧凑模式直接从向量列读取，不物化片段）"""
+        if not self.compact:
+            segments = [self._segments.get(segment_id) for segment_id in segment_ids]
+            return (
+                embedding_matrix([s.embedding if s else None for s in segments]),
+                [s.video_id if s else None for s in segments],
+            )
+        
+        columns = self._segments.columns
+        rows = [self._segments.row(segment_id) for segment_id in segment_ids]
+        present = np.array([row is not None for row in rows], dtype=bool)
+        row_array = np.array([row if row is not None else 0 for row in rows], dtype=np.int64)
+        
+        matrix = np.zeros((len(rows), columns.vectors.dim), dtype=np.float32)
+        if columns.capacity and columns.vectors.dim:
+            has_vector = present & columns.has_embedding[row_array]
+            matrix[has_vector] = columns.vectors.unit(row_array[has_vector])
+        video_ids = [
+            columns.strings.value(int(columns.text[row, 0])) if row is not None else None
+            for row in rows
+        ]
+        return matrix, video_ids
+    
     async def delete(self, segment_id: str) -> bool:
-        if segment_id in self._segments:
-            del self._segments[segment_id]
-            return True
-        return False
+        segment = self._segments.pop(segment_id, None)
+        if segment is None:
+            return False
+        self.tag_index.remove(segment_id)
+        self.aggregates.remove(segment.tags, bool(segment.embedding))
+        self._notify(StoreEvent.DELETE, segment_id, segment)
+        return True
     
     async def count(self) -> int:
         return len(self._segments)
     
+    # 非标签过滤条件
+    RESERVED_FILTERS = ("video_id", "min_duration", "max_duration")
+    
     def _match_filters(self, segment: VideoSegment, filters: Dict[str, Any]) -> bool:
         """检查片段是否匹配过滤器"""
         for key, value in filters.items():
@@ -394,6 +639,7 @@ class MilvusVideoStore(BaseVideoStore):
         port: int = 19530,
         collection_name: str = None
     ):
+        super().__init__()
         self.host = host
         self.port = port
         self.collection_name = collection_name or self.COLLECTION_NAME
@@ -480,6 +726,7 @@ class MilvusVideoStore(BaseVideoStore):
                 collection_name=self.collection_name,
                 data=[data]
             )
+            self._notify(StoreEvent.INSERT, segment.segment_id, segment)
             return True
             
         except Exception as e:
@@ -511,6 +758,8 @@ class MilvusVideoStore(BaseVideoStore):
                 collection_name=self.collection_name,
                 data=data_list
             )
+            for segment in segments:
+                self._notify(StoreEvent.INSERT, segment.segment_id, segment)
             return len(data_list)
             
         except Exception as e:
@@ -683,6 +932,7 @@ class MilvusVideoStore(BaseVideoStore):
                 collection_name=self.collection_name,
                 filter=f'segment_id == "{segment_id}"'
             )
+            self._notify(StoreEvent.DELETE, segment_id)
             return True
         except Exception as e:
             logger.error(f"删除失败: {e}")
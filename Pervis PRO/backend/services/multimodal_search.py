@@ -16,12 +16,15 @@ Task: 8.1 多模态搜索服务
 """
 
 import asyncio
+import dataclasses
 import logging
 import time
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Any, Dict, List, Optional, Tuple
 
+from .search_cache import get_search_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -139,6 +142,21 @@ class MultimodalSearchResponse:
             "mode": self.mode,
             "query": self.query,
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MultimodalSearchResponse":
+        results = []
+        for r in data["results"]:
+            r = dict(r)
+            r["matched_keyframes"] = [KeyFrameMatch(**kf) for kf in r.get("matched_keyframes", [])]
+            results.append(MultimodalSearchResult(**r))
+        return cls(
+            results=results,
+            total=data["total"],
+            search_time_ms=data["search_time_ms"],
+            mode=data["mode"],
+            query=data.get("query", ""),
+        )
 
 
 # ============================================================
@@ -179,9 +197,39 @@ class MultimodalSearchService:
         self,
         request: MultimodalSearchRequest
     ) -> MultimodalSearchResponse:
-        """执行多模态搜索"""
+        """执行多模态搜索（结果按请求 + 文本/视觉存储代数缓存）"""
         await self.initialize()
         
+        start_time = time.time()
+        cache = get_search_cache()
+        namespace = type(self).__name__
+        key = cache.make_key(namespace, request, *self._cache_version())
+        cached = await cache.get(namespace, key, MultimodalSearchResponse.from_dict)
+        if cached is not None:
+            return dataclasses.replace(
+                cached,
+                results=list(cached.results),
+                search_time_ms=(time.time() - start_time) * 1000,
+            )
+        
+        response = await self._execute_search(request)
+        await cache.put(key, response, MultimodalSearchResponse.to_dict)
+        return response
+    
+    def _cache_version(self) -> Tuple[Any, ...]:
+        """搜索结果缓存的版本：文本存储实例与代数 + 视觉存储代数"""
+        text_store = self._text_search_service.video_store
+        return (
+            getattr(text_store, "epoch", id(text_store)),
+            getattr(text_store, "generation", 0),
+            getattr(self._visual_store, "generation", 0),
+        )
+    
+    async def _execute_search(
+        self,
+        request: MultimodalSearchRequest
+    ) -> MultimodalSearchResponse:
+        """执行多模态搜索（不经缓存）"""
         start_time = time.time()
         
         # 归一化权重
@@ -5,14 +5,27 @@ Ollama 视觉模型适配器
 支持使用本地 Ollama 视觉模型（如 llava-llama3）进行图像分析，
 替代 Gemini API 进行视频帧标签生成。
 
+批量分析：
+- 并发请求数上限与 Ollama 服务端 OLLAMA_NUM_PARALLEL 对齐，并按观测到的
+  延迟与错误率自适应调整（AIMD：连续成功加一，出错或延迟劣化减半）
+- 结果按「图像内容哈希 + 提示词 + 模型」缓存，先对原文件流式哈希查缓存，
+  命中时不解码图像
+- 取得并发名额后才在内存中把图像缩放到模型输入尺寸并重新编码为 JPEG，
+  同时驻留内存的编码数据不超过并发上限
+
 Requirements: 16.6 (视频标签生成)
 """
 import os
+import io
+import copy
 import json
+import time
 import base64
+import hashlib
 import logging
 import asyncio
 import aiohttp
+from collections import OrderedDict
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 from dataclasses import dataclass
@@ -31,6 +44,83 @@ class VisionConfig:
     TIMEOUT: int = int(os.getenv("OLLAMA_VISION_TIMEOUT", "120"))
     # 是否启用本地视觉模型
     ENABLED: bool = os.getenv("OLLAMA_VISION_ENABLED", "true").lower() == "true"
+    # 并发请求上限（默认与服务端 OLLAMA_NUM_PARALLEL 一致）
+    MAX_CONCURRENCY: int = int(os.getenv("OLLAMA_VISION_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", "4")))
+    # 上传前缩放到的最长边（llava 系列输入 336-672），0 为不缩放
+    MAX_IMAGE_SIDE: int = int(os.getenv("OLLAMA_VISION_MAX_SIDE", "672"))
+    # 重新编码 JPEG 质量
+    JPEG_QUALITY: int = int(os.getenv("OLLAMA_VISION_JPEG_QUALITY", "85"))
+    # 结果缓存条目数，0 为不缓存
+    CACHE_SIZE: int = int(os.getenv("OLLAMA_VISION_CACHE_SIZE", "1024"))
+
+
+class AdaptiveLimiter:
+    """
+    自适应并发限制（AIMD）
+    
+    - 连续成功 limit 次且延迟未劣化：limit + 1（不超过上限）
+    - 延迟超过基线 latency_factor 倍：limit 减半
+    - 请求失败：limit 减半，后续请求按指数退避（成功后清零）
+    - 基线为成功请求延迟的指数滑动平均
+    """
+    
+    def __init__(self, max_limit: int, latency_factor: float = 2.0, max_backoff: float = 10.0):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.latency_factor = latency_factor
+        self.max_backoff = max_backoff
+        self.baseline: Optional[float] = None
+        self.backoff = 0.0
+        self.active = 0
+        self.peak_active = 0
+        self._successes = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop = None
+    
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+            self.active = 0
+        return self._condition
+    
+    async def acquire(self):
+        if self.backoff > 0:
+            await asyncio.sleep(self.backoff)
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+    
+    async def abort(self):
+        """释放名额但不计入延迟与错误统计（请求未发出）"""
+        condition = self._get_condition()
+        async with condition:
+            self.active -= 1
+            condition.notify_all()
+    
+    async def release(self, latency: float, ok: bool):
+        condition = self._get_condition()
+        async with condition:
+            self.active -= 1
+            if ok and (self.baseline is None or latency <= self.baseline * self.latency_factor):
+                self.baseline = latency if self.baseline is None else 0.8 * self.baseline + 0.2 * latency
+                self.backoff = 0.0
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            else:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                if ok:
+                    # 服务端整体变慢时基线随之缓慢上移，避免长期停留在最低并发
+                    self.baseline = 0.9 * self.baseline + 0.1 * latency
+                else:
+                    self.backoff = min(self.max_backoff, max(0.5, self.backoff * 2))
+            condition.notify_all()
 
 
 class OllamaVisionProvider:
@@ -50,6 +140,8 @@ class OllamaVisionProvider:
         self.base_url = base
         self.model = self.config.VISION_MODEL
         self._available: Optional[bool] = None
+        self._limiter = AdaptiveLimiter(self.config.MAX_CONCURRENCY)
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
         logger.info(f"OllamaVisionProvider 初始化: {self.base_url}, 模型: {self.model}")
     
     async def check_availability(self) -> bool:
@@ -88,10 +180,46 @@ class OllamaVisionProvider:
             self._available = False
             return False
     
+    @staticmethod
+    def _hash_file(image_path: str, chunk_size: int = 1 << 20) -> str:
+        """原始文件内容哈希（分块读取，不保留文件内容）"""
+        digest = hashlib.sha1()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
     def _encode_image(self, image_path: str) -> str:
-        """将图像编码为 base64"""
+        """
+        读取图像并编码为 base64（超过模型输入尺寸时先在内存中缩放并转 JPEG）
+        
+        Returns:
+            base64 数据
+        """
         with open(image_path, "rb") as f:
-            return base64.b64encode(f.read()).decode("utf-8")
+            raw = f.read()
+        
+        data = raw
+        max_side = self.config.MAX_IMAGE_SIDE
+        try:
+            from PIL import Image
+            
+            with Image.open(io.BytesIO(raw)) as img:
+                if (max_side and max(img.size) > max_side) or img.format not in ("JPEG", "PNG"):
+                    img = img.convert("RGB")
+                    if max_side:
+                        img.thumbnail((max_side, max_side), Image.LANCZOS)
+                    buffer = io.BytesIO()
+                    img.save(buffer, format="JPEG", quality=self.config.JPEG_QUALITY)
+                    data = buffer.getvalue()
+        except Exception as e:
+            logger.debug(f"图像缩放失败，发送原图: {e}")
+        
+        return base64.b64encode(data).decode("utf-8")
+    
+    def _cache_key(self, content_hash: str, prompt: str) -> str:
+        prompt_hash = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        return f"{self.model}:{content_hash}:{prompt_hash}"
     
     async def analyze_image(
         self,
@@ -112,6 +240,16 @@ class OllamaVisionProvider:
             logger.info("本地视觉模型已禁用")
             return self._get_fallback_tags()
         
+        async with aiohttp.ClientSession() as session:
+            return await self._analyze(session, image_path, prompt)
+    
+    async def _analyze(
+        self,
+        session: aiohttp.ClientSession,
+        image_path: str,
+        prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """分析单张图像（缓存优先，请求经自适应并发限制）"""
         if not Path(image_path).exists():
             logger.error(f"图像文件不存在: {image_path}")
             return self._get_fallback_tags()
@@ -121,71 +259,116 @@ class OllamaVisionProvider:
             prompt = self._get_default_prompt()
         
         try:
-            # 编码图像
-            image_base64 = self._encode_image(image_path)
-            
-            # 构建请求
-            url = f"{self.base_url}/api/generate"
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "images": [image_base64],
-                "stream": False,
-                "format": "json"
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=self.config.TIMEOUT)
-                ) as resp:
-                    if resp.status != 200:
-                        err_text = await resp.text()
-                        logger.error(f"Ollama Vision 错误: {resp.status} - {err_text}")
-                        return self._get_fallback_tags()
-                    
-                    data = await resp.json()
-                    response_text = data.get("response", "")
-                    
-                    # 解析 JSON 响应
-                    return self._parse_response(response_text)
-                    
-        except asyncio.TimeoutError:
-            logger.error(f"Ollama Vision 请求超时 ({self.config.TIMEOUT}s)")
+            content_hash = await asyncio.to_thread(self._hash_file, image_path)
+        except Exception as e:
+            logger.error(f"Ollama Vision 分析失败: {e}")
             return self._get_fallback_tags()
+        
+        key = self._cache_key(content_hash, prompt)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return copy.deepcopy(cached)
+        
+        await self._limiter.acquire()
+        try:
+            # 持有名额后才解码/缩放（在线程中进行）
+            image_base64 = await asyncio.to_thread(self._encode_image, image_path)
         except Exception as e:
+            await self._limiter.abort()
             logger.error(f"Ollama Vision 分析失败: {e}")
             return self._get_fallback_tags()
+        
+        start = time.perf_counter()
+        result = None
+        try:
+            result = await self._request(session, image_base64, prompt)
+        finally:
+            await self._limiter.release(time.perf_counter() - start, result is not None)
+        
+        if result is None:
+            return self._get_fallback_tags()
+        
+        tags = self._extract_tags(result)
+        if tags is None:
+            return self._get_fallback_tags()
+        if self.config.CACHE_SIZE > 0:
+            self._cache[key] = copy.deepcopy(tags)
+            while len(self._cache) > self.config.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return tags
+    
+    async def _request(
+        self,
+        session: aiohttp.ClientSession,
+        image_base64: str,
+        prompt: str
+    ) -> Optional[str]:
+        """调用 /api/generate，返回模型响应文本；失败返回 None"""
+        url = f"{self.base_url}/api/generate"
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "images": [image_base64],
+            "stream": False,
+            "format": "json"
+        }
+        
+        try:
+            async with session.post(
+                url,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=self.config.TIMEOUT)
+            ) as resp:
+                if resp.status != 200:
+                    err_text = await resp.text()
+                    logger.error(f"Ollama Vision 错误: {resp.status} - {err_text}")
+                    return None
+                
+                data = await resp.json()
+                return data.get("response", "")
+                
+        except asyncio.TimeoutError:
+            logger.error(f"Ollama Vision 请求超时 ({self.config.TIMEOUT}s)")
+            return None
+        except Exception as e:
+            logger.error(f"Ollama Vision 分析失败: {e}")
+            return None
     
     async def batch_analyze(
         self,
         image_paths: List[str],
-        progress_callback: Optional[callable] = None
+        progress_callback: Optional[callable] = None,
+        prompt: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
-        批量分析图像
+        批量分析图像（并发，结果顺序与输入一致）
         
         Args:
             image_paths: 图像路径列表
-            progress_callback: 进度回调函数 (current, total)
+            progress_callback: 进度回调函数 (completed, total)
+            prompt: 自定义提示词（可选）
         
         Returns:
             标签列表
         """
-        results = []
         total = len(image_paths)
+        if not self.config.ENABLED:
+            logger.info("本地视觉模型已禁用")
+            return [self._get_fallback_tags() for _ in image_paths]
         
-        for i, path in enumerate(image_paths):
-            result = await self.analyze_image(path)
-            results.append(result)
-            
+        results: List[Optional[Dict[str, Any]]] = [None] * total
+        completed = 0
+        
+        async def run(index: int, path: str):
+            nonlocal completed
+            results[index] = await self._analyze(session, path, prompt)
+            completed += 1
             if progress_callback:
-                progress_callback(i + 1, total)
-            
-            # 避免过快请求
-            if i < total - 1:
-                await asyncio.sleep(0.5)
+                progress_callback(completed, total)
+        
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*(run(i, path) for i, path in enumerate(image_paths)))
         
         return results
     
@@ -228,6 +411,10 @@ free_tags 要求：
     
     def _parse_response(self, response_text: str) -> Dict[str, Any]:
         """解析模型响应"""
+        return self._extract_tags(response_text) or self._get_fallback_tags()
+    
+    def _extract_tags(self, response_text: str) -> Optional[Dict[str, Any]]:
+        """从模型响应中提取标签；无法解析时返回 None"""
         try:
             # 清理 markdown 代码块
             text = response_text.strip()
@@ -246,11 +433,11 @@ free_tags 要求：
                 return self._validate_tags(result)
             
             logger.warning(f"无法从响应中提取 JSON: {text[:100]}")
-            return self._get_fallback_tags()
+            return None
             
         except json.JSONDecodeError as e:
             logger.warning(f"JSON 解析失败: {e}, 响应: {response_text[:100]}")
-            return self._get_fallback_tags()
+            return None
     
     def _validate_tags(self, tags: Dict[str, Any]) -> Dict[str, Any]:
         """验证并补充标签字段"""
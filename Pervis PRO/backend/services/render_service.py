@@ -14,6 +14,7 @@ import threading
 from datetime import datetime
 from pathlib import Path
 
+from .db_writer import get_db_writer
 from .ffmpeg_wrapper import FFmpegWrapper
 from .timeline_service import TimelineService
 
@@ -331,10 +332,16 @@ class RenderService:
                 update_fields["file_size"] = file_size
                 update_sql += ", file_size = :file_size"
             
-            update_sql += " WHERE id = :task_id"
+            # 已取消的任务不再被渲染线程后续的状态写入改回
+            update_sql += " WHERE id = :task_id AND status != 'cancelled'"
             
-            self.db.execute(text(update_sql), update_fields)
-            self.db.commit()
+            # 交给单写线程落库；纯进度更新可被同一任务更新的进度合并
+            progress_only = not (started_at or completed_at or error_message or file_size is not None)
+            get_db_writer().execute(
+                update_sql,
+                update_fields,
+                key=("render_tasks", task_id) if progress_only and status == "processing" else None,
+            )
             
             # 发送 WebSocket 事件
             self._emit_render_event(task_id, status, progress, error_message)
@@ -431,12 +438,11 @@ class RenderService:
     async def cancel_render(self, task_id: str) -> bool:
         """取消渲染任务"""
         try:
-            # 更新状态为已取消
-            self.db.execute(
-                text("UPDATE render_tasks SET status = 'cancelled' WHERE id = :task_id"),
-                {"task_id": task_id}
-            )
-            self.db.commit()
+            # 经单写线程落库，排在该任务已入队的进度写入之后，不会被其覆盖
+            await asyncio.wrap_future(get_db_writer().execute(
+                "UPDATE render_tasks SET status = 'cancelled' WHERE id = :task_id",
+                {"task_id": task_id},
+            ))
             
             logger.info(f"渲染任务已取消: {task_id}")
             return True
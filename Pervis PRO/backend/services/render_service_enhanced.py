@@ -27,6 +27,9 @@ from enum import Enum
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from services.task_registry import get_task_registry, TaskRecord
+from services.db_writer import get_db_writer
+
 logger = logging.getLogger(__name__)
 
 
@@ -141,8 +144,11 @@ FORMAT_CODECS: Dict[VideoFormat, Dict[str, str]] = {
 class EnhancedRenderService:
     """增强版渲染服务"""
     
+    TASK_SOURCE = "render"
+    
     def __init__(self, db: Session):
         self.db = db
+        self.registry = get_task_registry()
         self.output_dir = Path("storage/renders")
         self.temp_dir = Path("storage/renders/temp")
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -316,6 +322,21 @@ class EnhancedRenderService:
             )
             self.db.commit()
             
+            # 注册到任务注册表（列表查询走内存索引）
+            self.registry.create(
+                "render",
+                source=self.TASK_SOURCE,
+                task_id=task_id,
+                details={
+                    "timeline_id": timeline_id,
+                    "output_path": output_path,
+                    "format": options.format.value,
+                    "resolution": options.resolution.value,
+                    "framerate": options.framerate,
+                    "quality": options.quality.value
+                }
+            )
+            
             # 启动渲染线程
             render_thread = threading.Thread(
                 target=self._execute_render_enhanced,
@@ -573,6 +594,10 @@ class EnhancedRenderService:
     ):
         """更新任务状态"""
         try:
+            record = self.registry.get(task_id)
+            if record is not None and record.status == "cancelled":
+                return
+            
             update_fields = {"status": status, "progress": progress, "task_id": task_id}
             update_sql = "UPDATE render_tasks SET status = :status, progress = :progress"
             
@@ -592,10 +617,27 @@ class EnhancedRenderService:
                 update_fields["file_size"] = file_size
                 update_sql += ", file_size = :file_size"
             
-            update_sql += " WHERE id = :task_id"
+            # 已取消的任务不再被渲染线程后续的状态写入改回
+            update_sql += " WHERE id = :task_id AND status != 'cancelled'"
             
-            self.db.execute(text(update_sql), update_fields)
-            self.db.commit()
+            # 交给单写线程落库；纯进度更新可被同一任务更新的进度合并
+            progress_only = not (started_at or completed_at or error_message or file_size is not None)
+            get_db_writer().execute(
+                update_sql,
+                update_fields,
+                key=("render_tasks", task_id) if progress_only and status == "processing" else None,
+            )
+            
+            registry_fields = {"status": status, "progress": progress}
+            if started_at:
+                registry_fields["started_at"] = started_at.isoformat()
+            if completed_at:
+                registry_fields["completed_at"] = completed_at.timestamp()
+            if error_message:
+                registry_fields["error"] = error_message
+            if file_size is not None:
+                registry_fields["file_size"] = file_size
+            self.registry.update(task_id, **registry_fields)
             
         except Exception as e:
             logger.error(f"更新任务状态失败: {e}")
@@ -724,11 +766,12 @@ class EnhancedRenderService:
     async def cancel_render(self, task_id: str) -> bool:
         """取消渲染任务"""
         try:
-            self.db.execute(
-                text("UPDATE render_tasks SET status = 'cancelled' WHERE id = :task_id"),
-                {"task_id": task_id}
-            )
-            self.db.commit()
+            # 经单写线程落库，排在该任务已入队的进度写入之后，不会被其覆盖
+            self.registry.update(task_id, status="cancelled")
+            await asyncio.wrap_future(get_db_writer().execute(
+                "UPDATE render_tasks SET status = 'cancelled' WHERE id = :task_id",
+                {"task_id": task_id},
+            ))
             
             # 尝试终止线程（注意：Python 线程不能强制终止）
             if task_id in self._active_renders:
@@ -745,7 +788,16 @@ class EnhancedRenderService:
         limit: int = 50,
         status_filter: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        """列出渲染任务"""
+        """
+        列出渲染任务（以数据库为准，叠加注册表中的实时状态）
+        
+        数据库与注册表各按创建时间倒序取一页（注册表在来源/状态有序索引上切片，
+        O(log n + limit)），只对这两页做叠加合并。
+        """
+        live_page = self.registry.list_tasks(
+            status=status_filter, source=self.TASK_SOURCE, limit=limit
+        )["items"]
+        
         try:
             def safe_isoformat(v):
                 if v is None:
@@ -787,11 +839,55 @@ class EnhancedRenderService:
                     "completed_at": safe_isoformat(r[13]),
                 })
             
-            return tasks
-            
         except Exception as e:
             logger.error(f"列出任务失败: {e}")
-            return []
+            tasks = []
+        
+        # 单写队列中尚未落库的状态以注册表为准
+        merged = {}
+        for task in tasks:
+            record = self.registry.peek(task["id"])
+            if record is not None and record.source == self.TASK_SOURCE:
+                task = self._overlay_record(task, record)
+            merged[task["id"]] = task
+        for record in live_page:
+            if record.task_id not in merged:
+                merged[record.task_id] = self._record_to_dict(record)
+        
+        items = [t for t in merged.values() if not status_filter or t["status"] == status_filter]
+        items.sort(key=lambda t: (t["created_at"] or "").replace("T", " "), reverse=True)
+        return items[:limit]
+    
+    @classmethod
+    def _overlay_record(cls, task: Dict[str, Any], record: TaskRecord) -> Dict[str, Any]:
+        """用注册表记录中的非空字段覆盖数据库行"""
+        overlay = cls._record_to_dict(record)
+        merged = dict(task)
+        for key in ("status", "progress", "error_message", "file_size", "started_at", "completed_at"):
+            if overlay.get(key) is not None:
+                merged[key] = overlay[key]
+        return merged
+    
+    @staticmethod
+    def _record_to_dict(record: TaskRecord) -> Dict[str, Any]:
+        """将注册表记录转换为渲染任务字典"""
+        details = record.details or {}
+        return {
+            "id": record.task_id,
+            "timeline_id": details.get("timeline_id"),
+            "status": record.status,
+            "progress": record.progress,
+            "error_message": record.error,
+            "output_path": details.get("output_path"),
+            "file_size": details.get("file_size"),
+            "format": details.get("format"),
+            "resolution": details.get("resolution"),
+            "framerate": details.get("framerate"),
+            "quality": details.get("quality"),
+            "created_at": datetime.fromtimestamp(record.created_at).isoformat(),
+            "started_at": details.get("started_at"),
+            "completed_at": datetime.fromtimestamp(record.completed_at).isoformat() if record.completed_at else None,
+        }
     
     def get_download_path(self, task_id: str) -> Optional[str]:
         """获取下载路径"""
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+共享场景检测与镜头切点缓存
+
+KeyFrameExtractor（scene_change / motion / hybrid 策略）与 VideoPreprocessor
+原先各自对整段视频跑一遍 PySceneDetect 或 FFmpeg scene 滤镜。本模块统一检测入口：
+- 检测在降采样、跳帧的视频流上进行（PySceneDetect downscale + frame_skip；
+  FFmpeg framestep + scale，且不解码音频）
+- 结果按「文件身份（路径 + 大小 + mtime_ns）+ 检测参数」持久化到 SQLite，
+  文件被替换后身份变化，旧结果自动失效
+- 同一文件同一参数的并发请求合并为一次检测
+
+配置（环境变量）：
+- SCENE_CACHE_DB: 缓存库路径（默认 data/scene_cache.db）
+- SCENE_DETECT_THRESHOLD: ContentDetector 阈值（默认 27，KeyFrameConfig.scene_threshold
+  与预处理共用，同一文件只检测一次）
+- SCENE_DETECT_WIDTH: 检测时缩放到的目标宽度（默认 320，0 为不缩放）
+- SCENE_DETECT_FRAME_SKIP: 每处理一帧后跳过的帧数（默认 1）
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# 数据结构
+# ============================================================
+
+@dataclass(frozen=True)
+class SceneDetectionParams:
+    """场景检测参数（决定缓存键）"""
+    threshold: float = 27.0        # ContentDetector 阈值；FFmpeg scene 滤镜使用 threshold / 100
+    downscale_width: int = 320     # 检测分辨率（宽度），0 为原分辨率
+    frame_skip: int = 1            # 每处理一帧后跳过的帧数
+
+    @classmethod
+    def from_env(cls, threshold: Optional[float] = None) -> "SceneDetectionParams":
+        if threshold is None:
+            threshold = float(os.getenv("SCENE_DETECT_THRESHOLD", str(cls.threshold)))
+        return cls(
+            threshold=threshold,
+            downscale_width=int(os.getenv("SCENE_DETECT_WIDTH", "320")),
+            frame_skip=int(os.getenv("SCENE_DETECT_FRAME_SKIP", "1")),
+        )
+
+    @property
+    def key(self) -> str:
+        return f"content:t={self.threshold:g}:w={self.downscale_width}:s={self.frame_skip}"
+
+
+@dataclass
+class SceneCuts:
+    """场景检测结果"""
+    cuts: List[float]       # 各场景起始时间（秒，升序，含 0.0）
+    duration: float         # 视频时长（秒）
+    detector: str           # pyscenedetect / ffmpeg
+    cached: bool = False
+
+    def scenes(self) -> List[Tuple[float, float]]:
+        """切点 → [(start_time, end_time), ...]"""
+        ends = self.cuts[1:] + [max(self.duration, self.cuts[-1])]
+        return list(zip(self.cuts, ends))
+
+
+def file_identity(path: str) -> Tuple[str, int, int]:
+    """文件身份：(绝对路径, 大小, mtime_ns)"""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+# ============================================================
+# 持久化缓存
+# ============================================================
+
+class SceneCutCache:
+    """镜头切点缓存（SQLite）"""
+
+    def __init__(self, db_path: str = "data/scene_cache.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS scene_cuts (
+                path TEXT NOT NULL,
+                params TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                cuts TEXT NOT NULL,
+                duration REAL NOT NULL,
+                detector TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (path, params)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, identity: Tuple[str, int, int], params_key: str) -> Optional[SceneCuts]:
+        """查询缓存；文件大小或 mtime 变化视为未命中"""
+        path, size, mtime_ns = identity
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cuts, duration, detector FROM scene_cuts "
+                "WHERE path = ? AND params = ? AND size = ? AND mtime_ns = ?",
+                (path, params_key, size, mtime_ns)
+            ).fetchone()
+        if row is None:
+            return None
+        return SceneCuts(cuts=json.loads(row[0]), duration=row[1], detector=row[2], cached=True)
+
+    def put(self, identity: Tuple[str, int, int], params_key: str, result: SceneCuts):
+        """写入缓存（同一路径同一参数只保留最新身份）"""
+        path, size, mtime_ns = identity
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scene_cuts "
+                "(path, params, size, mtime_ns, cuts, duration, detector, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, params_key, size, mtime_ns, json.dumps(result.cuts),
+                 result.duration, result.detector, time.time())
+            )
+            self._conn.commit()
+
+    def invalidate(self, path: str):
+        """删除某个文件的全部缓存结果"""
+        with self._lock:
+            self._conn.execute("DELETE FROM scene_cuts WHERE path = ?", (os.path.abspath(path),))
+            self._conn.commit()
+
+
+# ============================================================
+# 检测服务
+# ============================================================
+
+class SceneDetectionService:
+    """带缓存的场景检测"""
+
+    def __init__(self, cache: Optional[SceneCutCache] = None, ffmpeg_path: str = "ffmpeg"):
+        self.cache = cache or SceneCutCache(os.getenv("SCENE_CACHE_DB", "data/scene_cache.db"))
+        self.ffmpeg_path = ffmpeg_path
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.detections = 0   # 实际执行检测的次数
+
+    async def detect(
+        self,
+        video_path: str,
+        params: Optional[SceneDetectionParams] = None,
+    ) -> Optional[SceneCuts]:
+        """
+        获取视频的镜头切点（缓存优先）
+
+        Returns:
+            SceneCuts；检测器均不可用或检测失败时返回 None（不缓存）
+        """
+        params = params or SceneDetectionParams.from_env()
+        try:
+            identity = file_identity(video_path)
+        except OSError as e:
+            logger.error(f"场景检测失败: {e}")
+            return None
+
+        cached = await asyncio.to_thread(self.cache.get, identity, params.key)
+        if cached is not None:
+            return cached
+
+        # 同一文件同一参数的并发请求共享一次检测
+        inflight_key = (identity[0], params.key)
+        pending = self._inflight.get(inflight_key)
+        if pending is not None and pending.get_loop() is asyncio.get_running_loop():
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[inflight_key] = future
+        try:
+            result = await asyncio.to_thread(self._detect_sync, identity[0], params)
+            if result is not None:
+                await asyncio.to_thread(self.cache.put, identity, params.key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()   # 已由调用方处理，避免 "never retrieved" 警告
+            raise
+        finally:
+            if self._inflight.get(inflight_key) is future:
+                del self._inflight[inflight_key]
+
+    def _detect_sync(self, video_path: str, params: SceneDetectionParams) -> Optional[SceneCuts]:
+        self.detections += 1
+        start = time.perf_counter()
+        try:
+            result = self._detect_pyscenedetect(video_path, params)
+        except ImportError:
+            logger.debug("PySceneDetect 未安装，使用 FFmpeg 场景检测")
+            result = self._detect_ffmpeg(video_path, params)
+        except Exception as e:
+            logger.error(f"场景检测失败: {e}")
+            result = None
+        if result is not None:
+            logger.info(
+                f"场景检测 {os.path.basename(video_path)}: {len(result.cuts)} 个场景, "
+                f"{result.detector}, {time.perf_counter() - start:.1f}s"
+            )
+        return result
+
+    @staticmethod
+    def _detect_pyscenedetect(video_path: str, params: SceneDetectionParams) -> SceneCuts:
+        from scenedetect import ContentDetector, SceneManager, open_video
+
+        video = open_video(video_path)
+        manager = SceneManager()
+        manager.add_detector(ContentDetector(threshold=params.threshold))
+        manager.auto_downscale = False
+        width = video.frame_size[0]
+        manager.downscale = max(1, width // params.downscale_width) if params.downscale_width else 1
+        manager.detect_scenes(video, frame_skip=params.frame_skip)
+
+        cuts = [scene[0].get_seconds() for scene in manager.get_scene_list()]
+        if not cuts or cuts[0] > 0:
+            cuts.insert(0, 0.0)
+        return SceneCuts(cuts=cuts, duration=video.duration.get_seconds(), detector="pyscenedetect")
+
+    def _detect_ffmpeg(self, video_path: str, params: SceneDetectionParams) -> Optional[SceneCuts]:
+        filters = []
+        if params.frame_skip > 0:
+            filters.append(f"framestep={params.frame_skip + 1}")
+        if params.downscale_width:
+            filters.append(f"scale={params.downscale_width}:-2")
+        filters.append(f"select='gt(scene,{params.threshold / 100})',showinfo")
+        cmd = [
+            self.ffmpeg_path, "-hide_banner", "-nostats",
+            "-i", video_path,
+            "-an", "-vf", ",".join(filters),
+            "-f", "null", "-",
+        ]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, errors="replace")
+        except OSError as e:
+            logger.error(f"FFmpeg 场景检测失败: {e}")
+            return None
+        if proc.returncode != 0:
+            logger.error(f"FFmpeg 场景检测失败: {proc.stderr[-500:]}")
+            return None
+        return parse_ffmpeg_scene_output(proc.stderr)
+
+
+def parse_ffmpeg_scene_output(stderr: str) -> SceneCuts:
+    """解析 FFmpeg showinfo 输出中的切点与 Duration"""
+    cuts = {0.0}
+    for match in re.finditer(r"pts_time:(\d+\.?\d*)", stderr):
+        cuts.add(float(match.group(1)))
+
+    duration = 0.0
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return SceneCuts(cuts=sorted(cuts), duration=duration, detector="ffmpeg")
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_scene_detector: Optional[SceneDetectionService] = None
+
+
+def get_scene_detector() -> SceneDetectionService:
+    """获取共享场景检测服务"""
+    global _scene_detector
+    if _scene_detector is None:
+        _scene_detector = SceneDetectionService(ffmpeg_path=os.getenv("FFMPEG_PATH", "ffmpeg"))
+    return _scene_detector
@@ -85,35 +85,36 @@ class ScriptProcessor:
                 )
                 characters.append(character)
             
-            # 4. 处理Beat数据并存储到数据库
+            # 4. 处理Beat数据并存储到数据库（一个事务内批量提交）
             beats = []
-            for i, beat_data in enumerate(ai_data.get("beats", [])):
-                # 创建Beat数据库记录
-                from models.base import BeatCreate
-                beat_create = BeatCreate(
-                    project_id=project.id,
-                    content=beat_data.get("content", ""),
-                    emotion_tags=beat_data.get("emotion_tags", []),
-                    scene_tags=beat_data.get("scene_tags", []),
-                    action_tags=beat_data.get("action_tags", []),
-                    cinematography_tags=beat_data.get("cinematography_tags", []),
-                    duration=beat_data.get("duration_estimate", 2.0)
-                )
-                
-                db_beat = await self.db_service.create_beat(beat_create, order_index=i)
+            async with self.db_service.batch():
+                for i, beat_data in enumerate(ai_data.get("beats", [])):
+                    # 创建Beat数据库记录
+                    from models.base import BeatCreate
+                    beat_create = BeatCreate(
+                        project_id=project.id,
+                        content=beat_data.get("content", ""),
+                        emotion_tags=beat_data.get("emotion_tags", []),
+                        scene_tags=beat_data.get("scene_tags", []),
+                        action_tags=beat_data.get("action_tags", []),
+                        cinematography_tags=beat_data.get("cinematography_tags", []),
+                        duration=beat_data.get("duration_estimate", 2.0)
+                    )
+                    
+                    db_beat = await self.db_service.create_beat(beat_create, order_index=i)
+                    
+                    # 转换为响应模型
+                    beat = Beat(
+                        id=db_beat.id,
+                        content=db_beat.content,
+                        emotion_tags=db_beat.emotion_tags or [],
+                        scene_tags=db_beat.scene_tags or [],
+                        action_tags=db_beat.action_tags or [],
+                        cinematography_tags=db_beat.cinematography_tags or [],
+                        duration=db_beat.duration
+                    )
+                    beats.append(beat)
                 
-                # 转换为响应模型
-                beat = Beat(
-                    id=db_beat.id,
-                    content=db_beat.content,
-                    emotion_tags=db_beat.emotion_tags or [],
-                    scene_tags=db_beat.scene_tags or [],
-                    action_tags=db_beat.action_tags or [],
-                    cinematography_tags=db_beat.cinematography_tags or [],
-                    duration=db_beat.duration
-                )
-                beats.append(beat)
-            
             processing_time = time.time() - start_time
             
             return ScriptAnalysisResponse(
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+搜索结果缓存
+
+缓存 HybridSearchService / EnhancedSearchService / MultimodalSearchService 的搜索响应：
+- 缓存键 = 命名空间 + 规范化请求哈希 + 存储变更代数（generation），
+  任何插入/删除都会改变代数，旧结果自然不再命中，无需主动失效
+- 一级：进程内有界 LRU（保存响应对象）
+- 二级（可选）：通过 CacheService 写入 Redis（保存 to_dict 结果，按 TTL 过期）。
+  Redis 键不含进程内的存储实例/代数，而是 Redis 中持久化的共享版本号
+  （search:store_version），多个 worker 共享条目，重启后仍然有效；
+  任一进程观察到本地存储代数变化时 INCR 该版本，所有进程的旧条目随之失效
+- 按命名空间统计命中率
+
+配置（环境变量）：
+- SEARCH_CACHE_ENABLED: 是否启用（默认 1）
+- SEARCH_CACHE_SIZE: LRU 容量（默认 512）
+- SEARCH_CACHE_TTL: 条目有效期秒数（默认 300）
+- SEARCH_CACHE_REDIS: 是否启用 Redis 二级缓存（默认 0）
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SearchResultCache:
+    """版本化搜索结果缓存"""
+
+    VERSION_KEY = "search:store_version"
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 300,
+        use_redis: bool = False,
+        enabled: bool = True,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._seen_versions: Dict[str, str] = {}   # 命名空间 -> 最近观察到的本地存储版本
+
+    # ---------- 键 ----------
+
+    @staticmethod
+    def make_key(namespace: str, request: Any, *generations: Any) -> str:
+        """规范化请求（dataclass 字段排序后序列化）并与存储代数组合成缓存键"""
+        payload = dataclasses.asdict(request) if dataclasses.is_dataclass(request) else request
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+        version = ":".join(str(g) for g in generations)
+        return f"search:{namespace}:{version}:{digest}"
+
+    async def _redis_key(self, key: str) -> str:
+        """
+        把本地键中的存储版本换成 Redis 共享版本
+
+        首次观察到某命名空间的本地版本只作为基线（重启后加载的是同一份数据），
+        之后本地版本变化说明存储有写入，递增共享版本。
+        """
+        from .cache_service import get_cache_service
+
+        _, namespace, rest = key.split(":", 2)
+        local_version, digest = rest.rsplit(":", 1)
+        cache_service = get_cache_service()
+        previous = self._seen_versions.get(namespace)
+        if previous is not None and previous != local_version:
+            version = await cache_service.incr(self.VERSION_KEY)
+            if version is None:
+                raise RuntimeError("共享存储版本递增失败")
+        else:
+            version = await cache_service.get(self.VERSION_KEY) or 0
+        self._seen_versions[namespace] = local_version
+        return f"search:{namespace}:r{version}:{digest}"
+
+    # ---------- 读写 ----------
+
+    def _counter(self, namespace: str) -> Dict[str, int]:
+        counter = self._stats.get(namespace)
+        if counter is None:
+            counter = self._stats[namespace] = {"hits": 0, "redis_hits": 0, "misses": 0}
+        return counter
+
+    async def get(
+        self,
+        namespace: str,
+        key: str,
+        deserialize: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    ) -> Optional[Any]:
+        """查询缓存；未命中返回 None"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            counter = self._counter(namespace)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    counter["hits"] += 1
+                    return value
+                del self._entries[key]
+
+        if self.use_redis and deserialize is not None:
+            try:
+                from .cache_service import get_cache_service
+                data = await get_cache_service().get(await self._redis_key(key))
+                if data is not None:
+                    value = deserialize(data)
+                    self._store(key, value)
+                    with self._lock:
+                        counter["redis_hits"] += 1
+                    return value
+            except Exception as e:
+                logger.warning(f"搜索缓存 Redis 读取失败: {e}")
+
+        with self._lock:
+            counter["misses"] += 1
+        return None
+
+    async def put(
+        self,
+        key: str,
+        value: Any,
+        serialize: Optional[Callable[[Any], Dict[str, Any]]] = None,
+    ):
+        """写入缓存"""
+        if not self.enabled:
+            return
+        self._store(key, value)
+        if self.use_redis and serialize is not None:
+            try:
+                from .cache_service import get_cache_service
+                await get_cache_service().set(
+                    await self._redis_key(key), serialize(value), expire=int(self.ttl)
+                )
+            except Exception as e:
+                logger.warning(f"搜索缓存 Redis 写入失败: {e}")
+
+    def _store(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空进程内缓存（Redis 条目随共享版本变化自然失效）"""
+        with self._lock:
+            self._entries.clear()
+
+    # ---------- 统计 ----------
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率统计"""
+        with self._lock:
+            namespaces = {}
+            totals = {"hits": 0, "redis_hits": 0, "misses": 0}
+            for namespace, counter in self._stats.items():
+                requests = sum(counter.values())
+                hits = counter["hits"] + counter["redis_hits"]
+                namespaces[namespace] = {
+                    **counter,
+                    "hit_ratio": round(hits / requests, 4) if requests else 0,
+                }
+                for name, count in counter.items():
+                    totals[name] += count
+            requests = sum(totals.values())
+            return {
+                "enabled": self.enabled,
+                "redis": self.use_redis,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                **totals,
+                "hit_ratio": round((totals["hits"] + totals["redis_hits"]) / requests, 4) if requests else 0,
+                "namespaces": namespaces,
+            }
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_search_cache: Optional[SearchResultCache] = None
+
+
+def get_search_cache() -> SearchResultCache:
+    """获取全局搜索结果缓存"""
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = SearchResultCache(
+            max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+            use_redis=os.getenv("SEARCH_CACHE_REDIS", "0") == "1",
+            enabled=os.getenv("SEARCH_CACHE_ENABLED", "1") == "1",
+        )
+    return _search_cache
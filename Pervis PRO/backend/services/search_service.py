@@ -13,9 +13,14 @@ Task: 3.1 实现搜索策略
 
 混合搜索权重：
 - 默认 tag_weight=0.4, vector_weight=0.6
+
+多样性重排（默认开启）：
+- 排序后对前 N 个候选做 MMR（diversity_lambda，1.0 关闭）
+- 同一 video_id 最多 max_per_video 条排在前面（0 关闭）
 """
 
 import asyncio
+import dataclasses
 import logging
 import time
 from dataclasses import dataclass, field
@@ -34,6 +39,8 @@ from .milvus_store import (
     VideoSegment,
     get_video_store,
 )
+from .diversity import mmr_rerank
+from .search_cache import get_search_cache
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +76,10 @@ class SearchRequest:
     tag_recall_k: int = 50                   # 标签召回数量
     vector_recall_k: int = 50                # 向量召回数量
     merge_k: int = 20                        # 融合后数量
+    
+    # 多样性重排
+    diversity_lambda: float = 0.7            # MMR 相关性权重（1.0 关闭相似度惩罚）
+    max_per_video: int = 2                   # 同一视频排在前面的最大数量（0 不限制）
 
 
 @dataclass
@@ -115,6 +126,16 @@ class SearchResponse:
             "mode": self.mode,
             "query": self.query,
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SearchResponse":
+        return cls(
+            results=[SearchResultItem(**r) for r in data["results"]],
+            total=data["total"],
+            search_time_ms=data["search_time_ms"],
+            mode=data["mode"],
+            query=data.get("query", ""),
+        )
 
 
 # ============================================================
@@ -226,10 +247,33 @@ class HybridSearchService:
         self._initialized = True
         logger.info("HybridSearchService 初始化完成")
     
+    def _cache_version(self) -> Tuple[Any, ...]:
+        """搜索结果缓存的版本：存储实例 + 变更代数"""
+        store = self.video_store
+        return (getattr(store, "epoch", id(store)), getattr(store, "generation", 0))
+    
     async def search(self, request: SearchRequest) -> SearchResponse:
-        """执行搜索"""
+        """执行搜索（结果按请求 + 存储代数缓存）"""
         await self.initialize()
         
+        start_time = time.time()
+        cache = get_search_cache()
+        namespace = type(self).__name__
+        key = cache.make_key(namespace, request, *self._cache_version())
+        cached = await cache.get(namespace, key, SearchResponse.from_dict)
+        if cached is not None:
+            return dataclasses.replace(
+                cached,
+                results=list(cached.results),
+                search_time_ms=(time.time() - start_time) * 1000,
+            )
+        
+        response = await self._execute_search(request)
+        await cache.put(key, response, SearchResponse.to_dict)
+        return response
+    
+    async def _execute_search(self, request: SearchRequest) -> SearchResponse:
+        """执行搜索（不经缓存）"""
         start_time = time.time()
         
         # 根据模式执行搜索
@@ -246,6 +290,9 @@ class HybridSearchService:
         if request.min_score > 0:
             results = [r for r in results if r.score >= request.min_score]
         
+        # 多样性重排
+        results = await self._diversify(request, results)
+        
         # 限制返回数量
         results = results[:request.top_k]
         
@@ -259,11 +306,47 @@ class HybridSearchService:
             query=request.query,
         )
     
+    # MMR 重排的最大候选数
+    DIVERSITY_CANDIDATES = 200
+    
+    async def _diversify(
+        self,
+        request: SearchRequest,
+        results: List[SearchResultItem]
+    ) -> List[SearchResultItem]:
+        """MMR + 每视频上限重排前 N 个候选（只改变顺序，不改变分数）"""
+        if len(results) <= 1 or (request.diversity_lambda >= 1.0 and request.max_per_video <= 0):
+            return results
+        
+        candidates = results[:self.DIVERSITY_CANDIDATES]
+        try:
+            embeddings, video_ids = await self.video_store.diversity_features(
+                [r.segment_id for r in candidates]
+            )
+        except Exception as e:
+            logger.warning(f"多样性重排跳过: {e}")
+            return results
+        
+        order = mmr_rerank(
+            [r.score for r in candidates],
+            embeddings,
+            video_ids,
+            top_k=request.top_k,
+            diversity_lambda=request.diversity_lambda,
+            max_per_group=request.max_per_video,
+        )
+        return [candidates[i] for i in order] + results[len(candidates):]
+    
     async def _search_by_tags(self, request: SearchRequest) -> List[SearchResultItem]:
         """仅标签搜索"""
         if not request.tags:
             return []
         
+        # 内存存储：倒排索引上向量化打分，只访问候选并集
+        tag_index = getattr(self.video_store, "tag_index", None)
+        if tag_index is not None:
+            return self._search_by_tag_index(tag_index, request.tags, request.tag_recall_k)
+        
         # 使用存储的标签搜索
         store_results = await self.video_store.search_by_tags(
             request.tags,
@@ -291,6 +374,37 @@ class HybridSearchService:
         results.sort(key=lambda x: x.score, reverse=True)
         return results
     
+    def _search_by_tag_index(
+        self,
+        tag_index,
+        query_tags: Dict[str, Any],
+        top_k: int
+    ) -> List[SearchResultItem]:
+        """基于倒排索引的 TagMatcher 加权打分，返回前 top_k"""
+        scores, total_weight = tag_index.weighted_scores(query_tags, TagMatcher.TAG_WEIGHTS)
+        if total_weight <= 0:
+            return []
+        
+        segments = self.video_store._segments
+        
+        results = []
+        for segment_id in tag_index.segment_ids(tag_index.top_k(scores, top_k)):
+            segment = segments[segment_id]
+            # 只对最终候选生成匹配原因
+            tag_score, match_reason = TagMatcher.match_score(segment.tags, query_tags)
+            results.append(SearchResultItem(
+                segment_id=segment.segment_id,
+                video_path=segment.video_path,
+                score=tag_score,
+                tag_score=tag_score,
+                vector_score=0.0,
+                tags=segment.tags,
+                thumbnail=segment.thumbnail_path or "",
+                description=segment.description or "",
+                match_reason=match_reason,
+            ))
+        return results
+    
     async def _search_by_vector(self, request: SearchRequest) -> List[SearchResultItem]:
         """仅向量搜索"""
         if not request.query:
@@ -388,12 +502,12 @@ class HybridSearchService:
     
     async def _filter_then_rank(self, request: SearchRequest) -> List[SearchResultItem]:
         """先过滤后排序"""
-        # 先用标签过滤
+        # 先用标签过滤（候选集及其标签分数）
         if request.tags:
             tag_results = await self._search_by_tags(request)
-            candidate_ids = {r.segment_id for r in tag_results}
+            tag_scores = {r.segment_id: r.tag_score for r in tag_results}
         else:
-            candidate_ids = None
+            tag_scores = None
         
         # 再用向量排序
         if request.query:
@@ -405,18 +519,19 @@ class HybridSearchService:
             results = []
             
             if isinstance(self.video_store, MemoryVideoStore):
-                for segment_id, segment in self.video_store._segments.items():
-                    # 过滤
-                    if candidate_ids is not None and segment_id not in candidate_ids:
-                        continue
-                    
+                all_segments = self.video_store._segments
+                if tag_scores is None:
+                    candidates = all_segments.values()
+                else:
+                    # 直接按候选 ID 取片段，不再遍历全部片段
+                    candidates = [all_segments[i] for i in tag_scores if i in all_segments]
+                
+                for segment in candidates:
                     if segment.embedding:
                         vector_score = cosine_similarity(query_embedding, segment.embedding)
                         
-                        # 计算标签分数
-                        tag_score = 0.0
-                        if request.tags:
-                            tag_score, _ = TagMatcher.match_score(segment.tags, request.tags)
+                        # 标签分数（已在标签阶段算出）
+                        tag_score = tag_scores.get(segment.segment_id, 0.0) if tag_scores else 0.0
                         
                         # 混合分数
                         final_score = (
@@ -10,6 +10,7 @@ Phase 2 Task 2.2: 素材搜索优化
 """
 
 import asyncio
+import dataclasses
 import logging
 import math
 import time
@@ -18,6 +19,8 @@ from dataclasses import dataclass, field
 from enum import Enum
 from typing import Any, Dict, List, Optional, Set, Tuple
 
+import numpy as np
+
 from .search_service import (
     SearchMode,
     SearchRequest,
@@ -34,8 +37,12 @@ from .ollama_embedding import (
 from .milvus_store import (
     BaseVideoStore,
     MemoryVideoStore,
+    StoreEvent,
+    VideoSegment,
     get_video_store,
 )
+from .search_cache import get_search_cache
+from .tag_index import TagInvertedIndex
 
 logger = logging.getLogger(__name__)
 
@@ -49,56 +56,204 @@ class TFIDFTagMatcher:
     TF-IDF 标签匹配器
     
     使用 TF-IDF 算法计算标签相似度，比简单权重匹配更准确
+    
+    索引增量维护：
+    - add_document / remove_document 更新文档频率和倒排表（由存储变更监听器调用）
+    - 每个片段预先计算归一化的 TF-IDF 稀疏向量，写入 term -> {序号: 权重} 倒排表
+    - 查询为查询向量与倒排表的稀疏点积，只触及查询词项的倒排表
+    - IDF 惰性重算：文档数相对上次快照变化超过 refresh_ratio 时，下一次查询前重算
+      全部 IDF 和文档向量；在此之前沿用快照 IDF（新词项首次出现时冻结其 IDF）
     """
     
-    def __init__(self):
+    def __init__(self, refresh_ratio: float = 0.05):
         # 文档频率缓存 (tag -> 出现在多少文档中)
         self._document_freq: Dict[str, int] = {}
         # 总文档数
         self._total_docs: int = 0
-        # IDF 缓存
+        # IDF 缓存（快照）
         self._idf_cache: Dict[str, float] = {}
         # 是否已初始化
         self._initialized = False
+        
+        self.refresh_ratio = refresh_ratio
+        self._snapshot_docs = 0
+        self._stale = False
+        
+        # 文档序号
+        self._ordinals: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        # 序号 -> 归一化 TF
+        self._doc_tf: Dict[int, Dict[str, float]] = {}
+        # 倒排表：term -> {序号: 归一化 TF-IDF 权重}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # 倒排表的数组形式（惰性物化）
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
     
     def build_index(self, segments: List[Dict[str, Any]]):
         """
         构建 TF-IDF 索引
         
         Args:
-            segments: 所有片段的标签数据
+            segments: 所有片段的标签数据（{"segment_id": ..., "tags": {...}}，
+                      segment_id 缺省时按顺序编号）
         """
-        self._document_freq.clear()
-        self._idf_cache.clear()
-        self._total_docs = len(segments)
+        self.__init__(self.refresh_ratio)
         
-        if self._total_docs == 0:
-            return
+        for i, segment in enumerate(segments):
+            self._add(segment.get("segment_id") or f"__doc_{i}", segment.get("tags", {}), index=False)
         
-        # 统计文档频率
-        for segment in segments:
-            tags = segment.get("tags", {})
-            seen_terms = set()
-            
-            for field, value in tags.items():
-                if isinstance(value, list):
-                    for v in value:
-                        term = f"{field}:{v}"
-                        seen_terms.add(term)
-                elif value and value not in ["UNKNOWN", "未知", ""]:
-                    term = f"{field}:{value}"
-                    seen_terms.add(term)
-            
-            for term in seen_terms:
-                self._document_freq[term] = self._document_freq.get(term, 0) + 1
+        self._refresh()
+        self._initialized = True
+        logger.info(f"TF-IDF 索引构建完成: {self._total_docs} 文档, {len(self._document_freq)} 词项")
+    
+    # ---------- 增量维护 ----------
+    
+    def add_document(self, segment_id: str, tags: Dict[str, Any]):
+        """添加（或替换）文档"""
+        self._add(segment_id, tags)
+        self._check_stale()
+    
+    def remove_document(self, segment_id: str) -> bool:
+        """删除文档"""
+        ordinal = self._ordinals.pop(segment_id, None)
+        if ordinal is None:
+            return False
+        
+        for term in self._doc_tf.pop(ordinal):
+            df = self._document_freq[term] - 1
+            if df:
+                self._document_freq[term] = df
+            else:
+                del self._document_freq[term]
+            posting = self._postings[term]
+            posting.pop(ordinal, None)
+            if not posting:
+                del self._postings[term]
+            self._arrays.pop(term, None)
+        
+        self._ids[ordinal] = None
+        self._free.append(ordinal)
+        self._total_docs -= 1
+        self._check_stale()
+        return True
+    
+    def _add(self, segment_id: str, tags: Dict[str, Any], index: bool = True):
+        if segment_id in self._ordinals:
+            self.remove_document(segment_id)
+        
+        if self._free:
+            ordinal = self._free.pop()
+            self._ids[ordinal] = segment_id
+        else:
+            ordinal = len(self._ids)
+            self._ids.append(segment_id)
+        self._ordinals[segment_id] = ordinal
         
-        # 计算 IDF
-        for term, df in self._document_freq.items():
+        tf = self.compute_tf(tags)
+        self._doc_tf[ordinal] = tf
+        self._total_docs += 1
+        for term in tf:
+            self._document_freq[term] = self._document_freq.get(term, 0) + 1
+        if index:
+            self._index_document(ordinal, tf)
+    
+    def _index_document(self, ordinal: int, tf: Dict[str, float]):
+        """写入文档的归一化 TF-IDF 向量"""
+        weights = {term: tf_value * self._term_idf(term) for term, tf_value in tf.items()}
+        norm = math.sqrt(sum(w ** 2 for w in weights.values()))
+        if norm == 0:
+            norm = 1.0
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[ordinal] = weight / norm
+            self._arrays.pop(term, None)
+    
+    def _term_idf(self, term: str) -> float:
+        """快照 IDF；快照之后新出现的词项按当前统计计算并冻结"""
+        idf = self._idf_cache.get(term)
+        if idf is None:
+            df = self._document_freq.get(term, 0)
+            idf = math.log(self._total_docs / df) + 1 if df else 1.0
+            self._idf_cache[term] = idf
+        return idf
+    
+    def _check_stale(self):
+        drift = abs(self._total_docs - self._snapshot_docs)
+        if drift > max(1, self.refresh_ratio * self._snapshot_docs):
+            self._stale = True
+    
+    def _refresh(self):
+        """重算全部 IDF 和文档向量"""
+        self._idf_cache = {
             # IDF = log(N / df) + 1 (平滑处理)
-            self._idf_cache[term] = math.log(self._total_docs / df) + 1
+            term: math.log(self._total_docs / df) + 1
+            for term, df in self._document_freq.items()
+        }
+        self._postings.clear()
+        self._arrays.clear()
+        for ordinal, tf in self._doc_tf.items():
+            self._index_document(ordinal, tf)
+        self._snapshot_docs = self._total_docs
+        self._stale = False
+    
+    # ---------- 查询 ----------
+    
+    def _posting_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            posting = self._postings.get(term)
+            if not posting:
+                return None
+            arrays = (
+                np.fromiter(posting.keys(), dtype=np.int32, count=len(posting)),
+                np.fromiter(posting.values(), dtype=np.float32, count=len(posting)),
+            )
+            self._arrays[term] = arrays
+        return arrays
+    
+    def search(self, query_tags: Dict[str, Any], top_k: int) -> List[Tuple[str, float]]:
+        """
+        稀疏点积检索：返回 [(segment_id, 余弦相似度)]，按分数降序
         
-        self._initialized = True
-        logger.info(f"TF-IDF 索引构建完成: {self._total_docs} 文档, {len(self._document_freq)} 词项")
+        结果与逐片段调用 match_score 一致（同一 IDF 快照下）。
+        """
+        if not query_tags or not self._ordinals:
+            return []
+        if self._stale:
+            self._refresh()
+        
+        query_tfidf = self.compute_tfidf(query_tags)
+        query_norm = math.sqrt(sum(v ** 2 for v in query_tfidf.values()))
+        if query_norm == 0:
+            return []
+        
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        for term, weight in query_tfidf.items():
+            arrays = self._posting_arrays(term)
+            if arrays is not None:
+                ordinals, doc_weights = arrays
+                scores[ordinals] += doc_weights * np.float32(weight / query_norm)
+        
+        top = TagInvertedIndex.top_k(scores, top_k)
+        return [(self._ids[o], float(scores[o])) for o in top]
+    
+    def matched_fields(self, segment_id: str, query_tags: Dict[str, Any]) -> List[str]:
+        """查询与片段共有词项的字段名"""
+        ordinal = self._ordinals.get(segment_id)
+        if ordinal is None:
+            return []
+        doc_terms = self._doc_tf[ordinal]
+        return sorted({
+            term.split(":")[0] for term in self.compute_tf(query_tags) if term in doc_terms
+        })
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": self._total_docs,
+            "terms": len(self._document_freq),
+            "snapshot_documents": self._snapshot_docs,
+            "stale": self._stale,
+        }
     
     def compute_tf(self, tags: Dict[str, Any]) -> Dict[str, float]:
         """计算词频 (TF)"""
@@ -305,22 +460,56 @@ class EnhancedSearchService(HybridSearchService):
             await self._build_tfidf_index()
     
     async def _build_tfidf_index(self):
-        """构建 TF-IDF 索引"""
+        """构建 TF-IDF 索引，并订阅存储变更做增量维护"""
         if isinstance(self.video_store, MemoryVideoStore):
             segments = [
-                {"tags": seg.tags}
-                for seg in self.video_store._segments.values()
+                {"segment_id": segment_id, "tags": seg.tags}
+                for segment_id, seg in self.video_store._segments.items()
             ]
             self._tfidf_matcher.build_index(segments)
+            self.video_store.add_listener(self._on_store_change)
             self._index_built = True
     
+    def _on_store_change(
+        self,
+        event: StoreEvent,
+        segment_id: str,
+        segment: Optional[VideoSegment]
+    ):
+        """存储变更监听：增量更新 TF-IDF 统计"""
+        if event == StoreEvent.INSERT and segment is not None:
+            self._tfidf_matcher.add_document(segment_id, segment.tags)
+        elif event == StoreEvent.DELETE:
+            self._tfidf_matcher.remove_document(segment_id)
+    
     async def search_enhanced(
         self,
         request: EnhancedSearchRequest
     ) -> SearchResponse:
-        """增强版搜索"""
+        """增强版搜索（结果按请求 + 存储代数缓存）"""
         await self.initialize()
         
+        start_time = time.time()
+        cache = get_search_cache()
+        namespace = f"{type(self).__name__}.enhanced"
+        key = cache.make_key(namespace, request, *self._cache_version())
+        cached = await cache.get(namespace, key, SearchResponse.from_dict)
+        if cached is not None:
+            return dataclasses.replace(
+                cached,
+                results=list(cached.results),
+                search_time_ms=(time.time() - start_time) * 1000,
+            )
+        
+        response = await self._execute_search_enhanced(request)
+        await cache.put(key, response, SearchResponse.to_dict)
+        return response
+    
+    async def _execute_search_enhanced(
+        self,
+        request: EnhancedSearchRequest
+    ) -> SearchResponse:
+        """增强版搜索（不经缓存）"""
         start_time = time.time()
         
         # 根据模式执行搜索
@@ -341,6 +530,9 @@ class EnhancedSearchService(HybridSearchService):
         if request.min_score > 0:
             results = [r for r in results if r.score >= request.min_score]
         
+        # 多样性重排
+        results = await self._diversify(request, results)
+        
         # 限制返回数量
         results = results[:request.top_k]
         
@@ -365,24 +557,32 @@ class EnhancedSearchService(HybridSearchService):
         results = []
         
         if isinstance(self.video_store, MemoryVideoStore):
-            for segment_id, segment in self.video_store._segments.items():
-                # 根据算法计算分数
-                if request.match_algorithm == MatchAlgorithm.TFIDF:
-                    tag_score, match_reason = self._tfidf_matcher.match_score(
-                        segment.tags, request.tags
-                    )
-                elif request.match_algorithm == MatchAlgorithm.JACCARD:
+            tag_index = self.video_store.tag_index
+            if request.match_algorithm == MatchAlgorithm.WEIGHT:
+                return self._search_by_tag_index(tag_index, request.tags, request.tag_recall_k)
+            
+            all_segments = self.video_store._segments
+            if request.match_algorithm == MatchAlgorithm.TFIDF:
+                # 稀疏点积：预计算的文档向量 × 查询向量
+                scored = []
+                for segment_id, tag_score in self._tfidf_matcher.search(
+                    request.tags, request.tag_recall_k
+                ):
+                    fields = self._tfidf_matcher.matched_fields(segment_id, request.tags)
+                    match_reason = f"TF-IDF 匹配: {', '.join(fields)}" if fields else "无匹配"
+                    scored.append((segment_id, tag_score, match_reason))
+            else:
+                # 得分 > 0 必须与查询共享至少一个 field:value，只对候选并集打分
+                scored = []
+                for segment_id in tag_index.segment_ids(tag_index.candidates(request.tags)):
                     tag_score, match_reason = JaccardMatcher.match_score(
-                        segment.tags, request.tags
+                        all_segments[segment_id].tags, request.tags
                     )
-                else:
-                    # 使用原始权重匹配
-                    from .search_service import TagMatcher
-                    tag_score, match_reason = TagMatcher.match_score(
-                        segment.tags, request.tags
-                    )
-                
-                if tag_score > 0:
+                    scored.append((segment_id, tag_score, match_reason))
+            
+            for segment_id, tag_score, match_reason in scored:
+                segment = all_segments.get(segment_id)
+                if segment is not None and tag_score > 0:
                     results.append(SearchResultItem(
                         segment_id=segment.segment_id,
                         video_path=segment.video_path,
@@ -440,8 +640,11 @@ class EnhancedSearchService(HybridSearchService):
     ) -> List[SearchResultItem]:
         """增强版混合搜索"""
         # 并行执行
-        tag_task = self._search_by_tags_enhanced(request) if request.tags else asyncio.coroutine(lambda: [])()
-        vector_task = self._search_by_vector_batch(request) if request.query else asyncio.coroutine(lambda: [])()
+        async def empty_list():
+            return []
+        
+        tag_task = self._search_by_tags_enhanced(request) if request.tags else empty_list()
+        vector_task = self._search_by_vector_batch(request) if request.query else empty_list()
         
         tag_results, vector_results = await asyncio.gather(
             tag_task,
@@ -517,12 +720,12 @@ class EnhancedSearchService(HybridSearchService):
         request: EnhancedSearchRequest
     ) -> List[SearchResultItem]:
         """增强版先过滤后排序"""
-        # 先用标签过滤
+        # 先用标签过滤（候选集及其标签分数）
         if request.tags:
             tag_results = await self._search_by_tags_enhanced(request)
-            candidate_ids = {r.segment_id for r in tag_results}
+            tag_scores = {r.segment_id: r.tag_score for r in tag_results}
         else:
-            candidate_ids = None
+            tag_scores = None
         
         # 再用向量排序
         if request.query:
@@ -534,12 +737,12 @@ class EnhancedSearchService(HybridSearchService):
             
             if isinstance(self.video_store, MemoryVideoStore):
                 # 批量计算相似度
-                batch_segments = []
-                for segment_id, segment in self.video_store._segments.items():
-                    if candidate_ids is not None and segment_id not in candidate_ids:
-                        continue
-                    if segment.embedding:
-                        batch_segments.append(segment)
+                all_segments = self.video_store._segments
+                if tag_scores is None:
+                    candidates = all_segments.values()
+                else:
+                    candidates = [all_segments[i] for i in tag_scores if i in all_segments]
+                batch_segments = [segment for segment in candidates if segment.embedding]
                 
                 # 批量处理
                 for i in range(0, len(batch_segments), request.batch_size):
@@ -548,17 +751,8 @@ class EnhancedSearchService(HybridSearchService):
                     for segment in batch:
                         vector_score = cosine_similarity(query_embedding, segment.embedding)
                         
-                        # 计算标签分数
-                        tag_score = 0.0
-                        if request.tags:
-                            if request.match_algorithm == MatchAlgorithm.TFIDF:
-                                tag_score, _ = self._tfidf_matcher.match_score(
-                                    segment.tags, request.tags
-                                )
-                            elif request.match_algorithm == MatchAlgorithm.JACCARD:
-                                tag_score, _ = JaccardMatcher.match_score(
-                                    segment.tags, request.tags
-                                )
+                        # 标签分数（已在标签阶段算出）
+                        tag_score = tag_scores.get(segment.segment_id, 0.0) if tag_scores else 0.0
                         
                         # 混合分数
                         final_score = (
@@ -615,7 +809,7 @@ class EnhancedSearchService(HybridSearchService):
         return deduplicated
     
     async def rebuild_index(self):
-        """重建索引"""
+        """重建索引（增量维护下通常不需要，保留用于强制重算 IDF）"""
         self._index_built = False
         await self._build_tfidf_index()
 
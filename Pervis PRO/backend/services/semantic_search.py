@@ -95,7 +95,7 @@ class SemanticSearchEngine:
             query_vector = self.embedding_model.encode([query_text])[0]
             
             # 4. 搜索相似向量
-            similar_vectors = self._search_similar_vectors(query_vector, fuzziness, limit)
+            similar_vectors = await self._search_similar_vectors(query_vector, fuzziness, limit)
             
             # 5. 构建推荐结果
             recommendations = await self._build_recommendations(beat, similar_vectors, query_text)
@@ -157,7 +157,7 @@ class SemanticSearchEngine:
         
         return " ".join(parts)
     
-    def _search_similar_vectors(self, query_vector, fuzziness: float, limit: int) -> List[Dict]:
+    async def _search_similar_vectors(self, query_vector, fuzziness: float, limit: int) -> List[Dict]:
         """搜索相似向量"""
         
         # P0 Fix: 校验查询向量维度
@@ -166,7 +166,7 @@ class SemanticSearchEngine:
             return []
         
         # 获取所有向量
-        all_vectors = self.db_service.search_vectors_by_similarity("", limit * 3)  # 获取更多候选
+        all_vectors = await self.db_service.search_vectors_by_similarity("", limit * 3)  # 获取更多候选
         
         if not all_vectors:
             return []
@@ -310,7 +310,7 @@ class SemanticSearchEngine:
         logger.warning("使用降级搜索模式")
         
         # 简单的标签匹配搜索
-        all_vectors = self.db_service.search_vectors_by_similarity("", limit * 2)
+        all_vectors = await self.db_service.search_vectors_by_similarity("", limit * 2)
         
         recommendations = []
         
@@ -375,6 +375,7 @@ class SemanticSearchEngine:
             return False
         
         try:
+            vector_rows = []
             for segment in segments:
                 # 构建文本内容
                 text_parts = []
@@ -406,14 +407,18 @@ class SemanticSearchEngine:
                     
                     vector_json = json.dumps(vector.tolist())
                     
-                    # 存储向量
-                    await self.db_service.create_asset_vector(
-                        asset_id=asset_id,
-                        vector_data=vector_json,
-                        content_type="segment_description",
-                        text_content=text_content,
-                        segment_id=segment.get("id")
-                    )
+                    vector_rows.append({
+                        "asset_id": asset_id,
+                        "vector_data": vector_json,
+                        "content_type": "segment_description",
+                        "text_content": text_content,
+                        "segment_id": segment.get("id")
+                    })
+            
+            # 编码完成后在一个事务内存储全部向量（编码期间不占用写锁）
+            async with self.db_service.batch():
+                for row in vector_rows:
+                    await self.db_service.create_asset_vector(**row)
             
             logger.info(f"为资产 {asset_id} 创建了 {len(segments)} 个向量")
             return True
@@ -451,7 +456,7 @@ class SemanticSearchEngine:
             
             for keyword in search_keywords + all_tags:
                 if len(keyword.strip()) > 1:  # 忽略太短的关键词
-                    results = self.db_service.search_transcription_text(keyword, limit)
+                    results = await self.db_service.search_transcription_text(keyword, limit)
                     transcription_results.extend(results)
             
             # 去重和排序
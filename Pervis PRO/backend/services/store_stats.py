@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+视频存储聚合统计
+
+随插入/删除增量维护的计数器，供 /api/search/stats 与 /api/search/facets 以 O(1) 读取：
+- 片段总数、含向量嵌入的片段数
+- 每个标签字段的非空片段数（覆盖率）
+- L1/L2 单值字段的取值直方图（分面计数）
+
+非空判定与原统计接口一致：占位值（UNKNOWN / 未知 / 空串）和空列表不计入。
+"""
+
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from .tag_index import UNKNOWN_VALUES
+
+# 统计覆盖率的标签字段
+COVERAGE_FIELDS: Tuple[str, ...] = (
+    "scene_type", "time_of_day", "shot_size",
+    "camera_move", "action_type", "mood",
+    "characters", "vfx",
+)
+
+# 维护取值直方图的字段（L1 / L2 单值标签）
+FACET_FIELDS: Tuple[str, ...] = (
+    "scene_type", "time_of_day", "shot_size",
+    "camera_move", "action_type", "mood",
+)
+
+
+def _is_present(value: Any) -> bool:
+    if isinstance(value, list):
+        return bool(value)
+    if not value:
+        return False
+    try:
+        return value not in UNKNOWN_VALUES
+    except TypeError:
+        return True
+
+
+class StoreAggregates:
+    """存储聚合计数器"""
+
+    def __init__(self):
+        self.total = 0
+        self.embedded = 0
+        self.field_counts: Dict[str, int] = {f: 0 for f in COVERAGE_FIELDS}
+        self.histograms: Dict[str, Counter] = {f: Counter() for f in FACET_FIELDS}
+
+    def _apply(self, tags: Dict[str, Any], has_embedding: bool, delta: int):
+        self.total += delta
+        if has_embedding:
+            self.embedded += delta
+        tags = tags or {}
+        for field in COVERAGE_FIELDS:
+            if _is_present(tags.get(field)):
+                self.field_counts[field] += delta
+        for field in FACET_FIELDS:
+            value = tags.get(field)
+            if isinstance(value, list) or not _is_present(value):
+                continue
+            try:
+                histogram = self.histograms[field]
+                histogram[value] += delta
+                if histogram[value] <= 0:
+                    del histogram[value]
+            except TypeError:
+                continue  # 不可哈希的值不计入直方图
+
+    def add(self, tags: Dict[str, Any], has_embedding: bool):
+        self._apply(tags, has_embedding, 1)
+
+    def remove(self, tags: Dict[str, Any], has_embedding: bool):
+        self._apply(tags, has_embedding, -1)
+
+    def clear(self):
+        self.__init__()
+
+    def coverage(self) -> Dict[str, Any]:
+        """覆盖率统计"""
+        total = self.total
+        return {
+            "total_assets": total,
+            "indexed_assets": total,
+            "embedding_coverage": round(self.embedded / total, 4) if total else 0,
+            "tag_coverage": {
+                field: round(count / total, 4) if total else 0
+                for field, count in self.field_counts.items()
+            },
+        }
+
+    def facets(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Dict[str, int]]:
+        """各字段取值计数（按计数降序）"""
+        return {
+            field: {str(value): count for value, count in self.histograms[field].most_common()}
+            for field in (fields or FACET_FIELDS)
+            if field in self.histograms
+        }
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+标签倒排索引
+
+为内存视频存储维护 field:value → 片段序号 的倒排表：
+- 插入/删除时增量维护（序号复用，保持数组紧凑）
+- 倒排表以 set 维护，查询时惰性物化为有序 int32 数组并缓存
+- 存活片段与各字段的「含该字段」以常驻布尔掩码维护，标签过滤只做掩码与
+  数组的 AND/OR，不再逐次从 Python 集合构造
+- 加权打分只在候选并集上进行
+
+标量值与列表元素分开建索引，与 TagMatcher 的匹配语义保持一致：
+标量查询值只匹配标量片段值，列表查询值只匹配列表片段值。
+过滤（filter / match_counts）沿用 MemoryVideoStore._match_filters 的 `v in 片段值` 语义：
+列表过滤值对字符串片段值按子串匹配。
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 不参与匹配的占位值
+UNKNOWN_VALUES = ("UNKNOWN", "未知", "")
+
+_EMPTY = np.empty(0, dtype=np.int32)
+
+# 倒排表键：(字段, 值, 是否列表元素)
+TermKey = Tuple[str, Any, bool]
+
+
+def _segment_terms(tags: Dict[str, Any]) -> List[TermKey]:
+    """提取片段标签的全部词项"""
+    terms: List[TermKey] = []
+    for field, value in (tags or {}).items():
+        if isinstance(value, list):
+            seen = set()
+            for item in value:
+                try:
+                    if item in seen:
+                        continue
+                    seen.add(item)
+                except TypeError:
+                    continue  # 不可哈希的值不建索引
+                terms.append((field, item, True))
+        elif value is not None:
+            try:
+                hash(value)
+            except TypeError:
+                continue
+            terms.append((field, value, False))
+    return terms
+
+
+class TagInvertedIndex:
+    """标签倒排索引"""
+
+    def __init__(self):
+        self._ordinals: Dict[str, int] = {}           # segment_id -> 序号
+        self._ids: List[Optional[str]] = []           # 序号 -> segment_id
+        self._free: List[int] = []                    # 可复用序号
+        self._terms: Dict[int, List[TermKey]] = {}    # 序号 -> 词项
+        self._postings: Dict[TermKey, Set[int]] = {}
+        self._arrays: Dict[TermKey, np.ndarray] = {}  # 物化缓存
+        self._fields: Dict[str, Set[int]] = {}        # 字段 -> 含该字段的序号
+        self._segment_fields: Dict[int, Tuple[str, ...]] = {}
+        self._scalar_strings: Dict[str, Set[str]] = {}  # 字段 -> 字符串标量值（子串过滤用）
+        self._interned: Dict[Any, Any] = {}           # 词项/字段元组驻留，片段间共享同一对象
+        self._alive = np.zeros(0, dtype=bool)         # 序号 -> 是否存活
+        self._present: Dict[str, np.ndarray] = {}     # 字段 -> 序号是否含该字段（与 _alive 等长）
+
+    # ---------- 维护 ----------
+
+    def add(self, segment_id: str, tags: Dict[str, Any]):
+        """添加（或替换）片段"""
+        if segment_id in self._ordinals:
+            self.remove(segment_id)
+
+        if self._free:
+            ordinal = self._free.pop()
+            self._ids[ordinal] = segment_id
+        else:
+            ordinal = len(self._ids)
+            self._ids.append(segment_id)
+            if ordinal >= len(self._alive):
+                self._grow_masks(max(64, 2 * len(self._alive)))
+        self._ordinals[segment_id] = ordinal
+        self._alive[ordinal] = True
+
+        fields = self._intern(tuple(tags or {}))
+        self._segment_fields[ordinal] = fields
+        for field in fields:
+            self._fields.setdefault(field, set()).add(ordinal)
+            present = self._present.get(field)
+            if present is None:
+                present = self._present[field] = np.zeros(len(self._alive), dtype=bool)
+            present[ordinal] = True
+
+        terms = [self._intern(term) for term in _segment_terms(tags)]
+        self._terms[ordinal] = terms
+        for term in terms:
+            self._postings.setdefault(term, set()).add(ordinal)
+            self._arrays.pop(term, None)
+            field, value, list_item = term
+            if not list_item and isinstance(value, str):
+                self._scalar_strings.setdefault(field, set()).add(value)
+
+    def _grow_masks(self, size: int):
+        """掩码按倍数扩容（与序号数组同步）"""
+        def grow(mask: np.ndarray) -> np.ndarray:
+            grown = np.zeros(size, dtype=bool)
+            grown[:len(mask)] = mask
+            return grown
+
+        self._alive = grow(self._alive)
+        for field, mask in self._present.items():
+            self._present[field] = grow(mask)
+
+    def _intern(self, key):
+        return self._interned.setdefault(key, key)
+
+    def remove(self, segment_id: str) -> bool:
+        """删除片段"""
+        ordinal = self._ordinals.pop(segment_id, None)
+        if ordinal is None:
+            return False
+        self._alive[ordinal] = False
+        for field in self._segment_fields.pop(ordinal, ()):
+            self._fields[field].discard(ordinal)
+            self._present[field][ordinal] = False
+        for term in self._terms.pop(ordinal, []):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.discard(ordinal)
+            if not posting:
+                del self._postings[term]
+                self._interned.pop(term, None)
+                field, value, list_item = term
+                if not list_item and isinstance(value, str):
+                    self._scalar_strings[field].discard(value)
+            self._arrays.pop(term, None)
+        self._ids[ordinal] = None
+        self._free.append(ordinal)
+        return True
+
+    def clear(self):
+        self.__init__()
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._ids)
+
+    # ---------- 查询原语 ----------
+
+    def postings(self, field: str, value: Any, list_item: bool) -> np.ndarray:
+        """某个词项的有序序号数组"""
+        term = (field, value, list_item)
+        try:
+            array = self._arrays.get(term)
+        except TypeError:
+            return _EMPTY  # 不可哈希的查询值
+        if array is None:
+            posting = self._postings.get(term)
+            if not posting:
+                return _EMPTY
+            array = np.fromiter(posting, dtype=np.int32, count=len(posting))
+            array.sort()
+            self._arrays[term] = array
+        return array
+
+    def field_postings(self, field: str, value: Any) -> np.ndarray:
+        """字段匹配某个值（标量相等或列表包含）"""
+        scalar = self.postings(field, value, False)
+        items = self.postings(field, value, True)
+        if not len(scalar):
+            return items
+        if not len(items):
+            return scalar
+        return np.union1d(scalar, items)
+
+    def contains_postings(self, field: str, values: List[Any]) -> np.ndarray:
+        """
+        列表过滤值：任一值等于标量片段值、属于列表片段值，或是字符串片段值的子串
+
+        与 `any(v in segment.tags[field] for v in values)` 等价。
+        """
+        arrays = [self.field_postings(field, v) for v in values]
+        needles = [v for v in values if isinstance(v, str)]
+        if needles:
+            for text in self._scalar_strings.get(field, ()):
+                if any(v in text for v in needles):
+                    arrays.append(self.postings(field, text, False))
+        return self.match_any(arrays)
+
+    def match_any(self, arrays: Iterable[np.ndarray]) -> np.ndarray:
+        """OR：序号并集"""
+        arrays = [a for a in arrays if len(a)]
+        if not arrays:
+            return _EMPTY
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.unique(np.concatenate(arrays))
+
+    def match_all(self, arrays: Iterable[np.ndarray]) -> np.ndarray:
+        """AND：序号交集（从最短的开始）"""
+        arrays = sorted(arrays, key=len)
+        if not arrays:
+            return _EMPTY
+        result = arrays[0]
+        for array in arrays[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, array, assume_unique=True)
+        return result
+
+    def segment_ids(self, ordinals: Iterable[int]) -> List[str]:
+        ids = self._ids
+        return [ids[o] for o in ordinals]
+
+    def ordinal_of(self, segment_id: str) -> Optional[int]:
+        return self._ordinals.get(segment_id)
+
+    # ---------- 组合查询 ----------
+
+    def candidates(self, query_tags: Dict[str, Any]) -> np.ndarray:
+        """与查询共享任一 field:value 的片段（任何相似度算法得分 > 0 的超集）"""
+        arrays = []
+        for field, value in (query_tags or {}).items():
+            values = value if isinstance(value, list) else [value]
+            for v in values:
+                arrays.append(self.field_postings(field, v))
+        return self.match_any(arrays)
+
+    def filter(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        标签过滤（字段间 AND，列表值字段内 OR），语义同 MemoryVideoStore._match_filters：
+        片段没有该字段时不受该条件约束。
+
+        只处理标签字段；video_id / 时长等条件由调用方处理。
+        """
+        n = self.capacity
+        alive = self._alive[:n].copy()
+        for field, value in filters.items():
+            present = self._present.get(field)
+            if present is None:
+                continue  # 没有片段含该字段，条件不起作用
+            if isinstance(value, list):
+                matched = self.contains_postings(field, value)
+            else:
+                matched = self.postings(field, value, False)
+            excluded = present[:n].copy()
+            excluded[matched] = False
+            alive &= ~excluded
+        return np.flatnonzero(alive).astype(np.int32)
+
+    def match_counts(self, query_tags: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        每个片段命中的查询字段数（MemoryVideoStore.search_by_tags 语义）
+
+        Returns:
+            (命中序号, 命中字段数)
+        """
+        counts = np.zeros(self.capacity, dtype=np.int32)
+        for field, value in query_tags.items():
+            if isinstance(value, list):
+                matched = self.contains_postings(field, value)
+            else:
+                matched = self.postings(field, value, False)
+            if len(matched):
+                counts[matched] += 1
+        ordinals = np.flatnonzero(counts).astype(np.int32)
+        return ordinals, counts[ordinals]
+
+    def weighted_scores(
+        self,
+        query_tags: Dict[str, Any],
+        weights: Dict[str, float],
+    ) -> Tuple[np.ndarray, float]:
+        """
+        TagMatcher.match_score 的向量化实现
+
+        Returns:
+            (按序号排列的稠密得分（未归一化，0 表示未命中）, 总权重)
+        """
+        scores = np.zeros(self.capacity, dtype=np.float32)
+        total_weight = 0.0
+        for field, query_value in query_tags.items():
+            weight = weights.get(field)
+            if weight is None:
+                continue
+            total_weight += weight
+
+            if isinstance(query_value, list):
+                if not query_value:
+                    continue
+                share = weight / len(query_value)
+                unique = set()
+                for v in query_value:
+                    try:
+                        if v in unique:
+                            continue
+                        unique.add(v)
+                    except TypeError:
+                        continue
+                    array = self.postings(field, v, True)
+                    if len(array):
+                        scores[array] += share
+            elif query_value not in UNKNOWN_VALUES:
+                array = self.postings(field, query_value, False)
+                if len(array):
+                    scores[array] += weight
+
+        return scores, total_weight
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        得分最高的 k 个正分序号（降序，同分按序号升序）
+
+        用 partition 找第 k 大的分值，只对入选的不超过 k 个元素排序，
+        避免对全部候选做 argsort。
+        """
+        n = len(scores)
+        if n == 0 or k <= 0:
+            return _EMPTY
+        if k < n:
+            kth = np.partition(scores, n - k)[n - k]
+        else:
+            kth = scores.min()
+        if kth <= 0:
+            selected = np.flatnonzero(scores > 0)
+        else:
+            above = np.flatnonzero(scores > kth)
+            ties = np.flatnonzero(scores == kth)[:k - len(above)]
+            selected = np.sort(np.concatenate([above, ties]))
+        order = np.argsort(-scores[selected], kind="stable")[:k]
+        return selected[order].astype(np.int32)
+
+    def terms(self) -> List[Tuple[str, Any]]:
+        """当前出现过的全部 (字段, 值) 词项"""
+        return [(field, value) for field, value, _ in self._postings]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "segments": len(self._ordinals),
+            "terms": len(self._postings),
+            "capacity": self.capacity,
+            "materialized": len(self._arrays),
+        }
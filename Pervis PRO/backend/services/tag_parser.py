@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+查询文本 → 结构化标签解析
+
+基于 Aho-Corasick 自动机，一次线性扫描找出文本中出现的全部标签关键词。
+词表来源：
+- models/asset_tags 的枚举值与关键词映射（KEYWORD_MAPPINGS / CHARACTER_KEYWORDS /
+  ANIME_KEYWORDS / VFX_KEYWORDS）
+- 数据库 TagHierarchy 表的标签名
+- 视频存储中实际出现的标签值（订阅存储变更，新值出现时增量加入）
+
+新关键词只插入字典树并标记失配指针待重建，下一次解析时一次 BFS 重建。
+词表只增不减：删除片段不会移除已学到的关键词。
+
+解析规则：
+- 重叠的匹配取最左最长（“大特写”优先于“特写”）
+- 纯 ASCII 关键词要求单词边界（避免 "INT" 命中 "print"）
+- 单选字段（L1/L2）取命中次数最多的值，次数相同取先出现的；多选字段按出现顺序去重
+
+快速搜索、向导素材召回与 StoryboardAgentService.generate_search_terms 共用 get_tag_parser()。
+"""
+
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models.asset_tags import (
+    ANIME_KEYWORDS,
+    CHARACTER_KEYWORDS,
+    KEYWORD_MAPPINGS,
+    L1_FIELDS,
+    L2_FIELDS,
+    L3_FIELDS,
+    VFX_KEYWORDS,
+    ActionType,
+    CameraMove,
+    Mood,
+    SceneType,
+    ShotSize,
+    TimeOfDay,
+)
+
+from .milvus_store import StoreEvent, get_video_store
+
+logger = logging.getLogger(__name__)
+
+# 单选字段
+SINGLE_VALUE_FIELDS = tuple(L1_FIELDS + L2_FIELDS)
+
+# 从存储学习标签值的字段
+OBSERVED_FIELDS = tuple(L3_FIELDS + ["free_tags", "source_work"])
+
+# TagHierarchy.category → 标签字段（未列出的分类归入 free_tags）
+HIERARCHY_CATEGORY_FIELDS = {
+    "location": "environment",
+}
+
+_ENUM_FIELDS = {
+    "scene_type": SceneType,
+    "time_of_day": TimeOfDay,
+    "shot_size": ShotSize,
+    "camera_move": CameraMove,
+    "action_type": ActionType,
+    "mood": Mood,
+}
+
+# 学习的标签值长度上限（过长的多为描述性文本）
+MAX_KEYWORD_LENGTH = 32
+
+
+@dataclass
+class TagMatch:
+    """关键词命中"""
+    keyword: str
+    start: int
+    end: int
+    targets: Tuple[Tuple[str, Any], ...]   # (字段, 值)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and (ch.isalnum() or ch == "_")
+
+
+class TagAutomaton:
+    """Aho-Corasick 自动机（关键词不区分大小写）"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[str]] = [None]   # 以该节点结尾的关键词
+        self._dict_link: List[int] = [0]             # 失配链上最近的输出节点
+        self._targets: Dict[str, List[Tuple[str, Any]]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword.lower() in self._targets
+
+    def add(self, keyword: str, field: str, value: Any) -> bool:
+        """加入关键词 → (字段, 值)；返回是否有新增"""
+        key = keyword.strip().lower()
+        if not key:
+            return False
+        with self._lock:
+            targets = self._targets.get(key)
+            if targets is None:
+                targets = self._targets[key] = []
+                node = 0
+                for ch in key:
+                    nxt = self._goto[node].get(ch)
+                    if nxt is None:
+                        nxt = len(self._goto)
+                        self._goto[node][ch] = nxt
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._output.append(None)
+                        self._dict_link.append(0)
+                    node = nxt
+                self._output[node] = key
+                self._dirty = True
+            if (field, value) in targets:
+                return False
+            targets.append((field, value))
+            return True
+
+    def _build(self):
+        """BFS 重建失配指针与输出链"""
+        goto, fail, output, dict_link = self._goto, self._fail, self._output, self._dict_link
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            dict_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(ch, 0)
+                fail[child] = target if target != child else 0
+                dict_link[child] = fail[child] if output[fail[child]] else dict_link[fail[child]]
+                queue.append(child)
+        self._dirty = False
+
+    def find(self, text: str) -> List[TagMatch]:
+        """线性扫描文本，返回全部命中（含重叠）"""
+        if self._dirty:
+            with self._lock:
+                if self._dirty:
+                    self._build()
+
+        goto, fail, output, dict_link = self._goto, self._fail, self._output, self._dict_link
+        lowered = text.lower()
+        source = text if len(lowered) == len(text) else lowered
+        matches: List[TagMatch] = []
+        node = 0
+        for i, ch in enumerate(lowered):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if output[node] else dict_link[node]
+            while hit:
+                keyword = output[hit]
+                start = i + 1 - len(keyword)
+                if self._on_boundary(lowered, keyword, start, i + 1):
+                    matches.append(TagMatch(
+                        keyword=source[start:i + 1],
+                        start=start,
+                        end=i + 1,
+                        targets=tuple(self._targets[keyword]),
+                    ))
+                hit = dict_link[hit]
+        return matches
+
+    @staticmethod
+    def _on_boundary(text: str, keyword: str, start: int, end: int) -> bool:
+        """ASCII 关键词需位于单词边界"""
+        if _is_word_char(keyword[0]) and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if _is_word_char(keyword[-1]) and end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
+
+
+class TagParser:
+    """标签解析器"""
+
+    def __init__(self, builtin: bool = True):
+        self.automaton = TagAutomaton()
+        self._stores = []
+        if builtin:
+            self._load_builtin()
+
+    # ---------- 词表 ----------
+
+    def add_keyword(self, keyword: str, field: str, value: Any) -> bool:
+        if not keyword or "�" in keyword or len(keyword) > MAX_KEYWORD_LENGTH:
+            return False
+        return self.automaton.add(keyword, field, value)
+
+    def _load_builtin(self):
+        """models/asset_tags 中的枚举与关键词映射"""
+        for field, enum_cls in _ENUM_FIELDS.items():
+            for member in enum_cls:
+                if member.value != "UNKNOWN":
+                    self.add_keyword(member.value, field, member.value)
+        for field, mapping in KEYWORD_MAPPINGS.items():
+            for value, keywords in mapping.items():
+                for keyword in keywords:
+                    self.add_keyword(keyword, field, value)
+        for field, mapping in (
+            ("characters", CHARACTER_KEYWORDS),
+            ("source_work", ANIME_KEYWORDS),
+            ("vfx", VFX_KEYWORDS),
+        ):
+            for value, keywords in mapping.items():
+                self.add_keyword(value, field, value)
+                for keyword in keywords:
+                    self.add_keyword(keyword, field, value)
+
+    def load_hierarchy(self, rows: Optional[Iterable[Tuple[str, Optional[str]]]] = None) -> int:
+        """
+        加载 TagHierarchy 标签名
+
+        Args:
+            rows: (tag_name, category) 列表；None 时从数据库读取
+
+        Returns:
+            新增的关键词数
+        """
+        if rows is None:
+            try:
+                from database import SessionLocal, TagHierarchy
+                db = SessionLocal()
+                try:
+                    rows = db.query(TagHierarchy.tag_name, TagHierarchy.category).all()
+                finally:
+                    db.close()
+            except Exception as e:
+                logger.warning(f"读取标签层级失败: {e}")
+                return 0
+        added = 0
+        for tag_name, category in rows:
+            field = HIERARCHY_CATEGORY_FIELDS.get(category or "", "free_tags")
+            added += self.add_keyword(tag_name, field, tag_name)
+        return added
+
+    def observe(self, tags: Dict[str, Any]) -> int:
+        """学习片段标签中的新值"""
+        added = 0
+        for field in OBSERVED_FIELDS:
+            value = (tags or {}).get(field)
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                if isinstance(item, str):
+                    added += self.add_keyword(item, field, item)
+        return added
+
+    def attach_store(self, store) -> int:
+        """学习存储中已有的标签值，并订阅后续插入"""
+        if store in self._stores:
+            return 0
+        self._stores.append(store)
+        added = 0
+        tag_index = getattr(store, "tag_index", None)
+        if tag_index is not None:
+            for field, value in tag_index.terms():
+                if field in OBSERVED_FIELDS and isinstance(value, str):
+                    added += self.add_keyword(value, field, value)
+        store.add_listener(self._on_store_change)
+        return added
+
+    def _on_store_change(self, event, segment_id: str, segment) -> None:
+        """存储变更监听：插入时学习新标签值"""
+        if segment is not None and event == StoreEvent.INSERT:
+            self.observe(segment.tags)
+
+    # ---------- 解析 ----------
+
+    def matches(self, text: str) -> List[TagMatch]:
+        """不重叠的命中（最左最长）"""
+        if not text:
+            return []
+        selected = []
+        last_end = 0
+        for match in sorted(self.automaton.find(text), key=lambda m: (m.start, -m.end)):
+            if match.start >= last_end:
+                selected.append(match)
+                last_end = match.end
+        return selected
+
+    def parse(self, text: str, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        文本 → 结构化标签
+
+        Args:
+            text: 查询文本
+            fields: 只输出这些字段（默认全部）
+
+        Returns:
+            {字段: 值}；单选字段为字符串，多选字段为列表
+        """
+        counts: Dict[str, Dict[Any, int]] = {}
+        multi: Dict[str, List[Any]] = {}
+        for match in self.matches(text):
+            for field, value in match.targets:
+                if fields is not None and field not in fields:
+                    continue
+                if field in SINGLE_VALUE_FIELDS:
+                    field_counts = counts.setdefault(field, {})
+                    field_counts[value] = field_counts.get(value, 0) + 1
+                else:
+                    values = multi.setdefault(field, [])
+                    if value not in values:
+                        values.append(value)
+
+        tags: Dict[str, Any] = {}
+        for field, field_counts in counts.items():
+            # dict 保持首次出现顺序，max 在次数相同时取先出现的值
+            tags[field] = max(field_counts, key=field_counts.get)
+        tags.update(multi)
+        return tags
+
+    def parse_tag_list(self, tags: Sequence[str]) -> Dict[str, Any]:
+        """
+        标签列表 → 结构化标签
+
+        key:value 形式直接使用（多选字段合并为列表，单选字段以显式值为准）；
+        其余标签经词表解析，不是词表关键词本身的标签同时保留为自由标签。
+        """
+        tags_dict: Dict[str, Any] = {}
+        free_tags: List[str] = []
+
+        def merge(field: str, values: List[Any]):
+            existing = tags_dict.setdefault(field, [])
+            existing.extend(v for v in values if v not in existing)
+
+        for tag in tags:
+            if ":" in tag:
+                key, value = tag.split(":", 1)
+                if key in SINGLE_VALUE_FIELDS:
+                    tags_dict[key] = value
+                else:
+                    merge(key, [value])
+                continue
+            for field, value in self.parse(tag).items():
+                if field in SINGLE_VALUE_FIELDS:
+                    tags_dict.setdefault(field, value)
+                else:
+                    merge(field, value)
+            if not self.is_keyword(tag) and tag not in free_tags:
+                free_tags.append(tag)
+        if free_tags:
+            merge("free_tags", free_tags)
+        return tags_dict
+
+    def keywords(self, text: str) -> List[str]:
+        """文本中命中的关键词（原文形式，按出现顺序去重）"""
+        return list(dict.fromkeys(m.keyword for m in self.matches(text)))
+
+    def is_keyword(self, text: str) -> bool:
+        return text.strip() in self.automaton
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keywords": len(self.automaton),
+            "stores": len(self._stores),
+        }
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_tag_parser: Optional[TagParser] = None
+
+
+def get_tag_parser() -> TagParser:
+    """获取全局标签解析器（首次调用时加载标签层级并订阅视频存储）"""
+    global _tag_parser
+    if _tag_parser is None:
+        _tag_parser = TagParser()
+        _tag_parser.load_hierarchy()
+        try:
+            _tag_parser.attach_store(get_video_store())
+        except Exception as e:
+            logger.warning(f"标签解析器订阅视频存储失败: {e}")
+    return _tag_parser
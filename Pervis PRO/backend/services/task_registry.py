@@ -0,0 +1,685 @@
+# -*- coding: utf-8 -*-
+"""
+统一任务注册表
+
+替代各服务中的内存任务字典（wizard `_tasks`、AgentService、BatchProcessor、
+ImageGenerationService 等），提供：
+- 紧凑的内存索引（按 id / 状态 / 类型 / 来源，按创建时间有序）
+- 批量写回 SQLite 的 write-behind 持久化
+- 已结束任务的 TTL 淘汰
+- 分页列表查询（二分定位，O(log n)）
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# 相对路径的基准目录（backend），不依赖进程工作目录
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+# ============================================================
+# 配置与数据结构
+# ============================================================
+
+# 结束态：只有这些状态的任务会被 TTL 淘汰
+FINISHED_STATUSES = frozenset({"completed", "failed", "cancelled"})
+
+# 重启时视为中断的状态
+UNFINISHED_STATUSES = frozenset({"pending", "running", "processing", "working", "reviewing", "generating"})
+
+
+@dataclass
+class TaskRegistryConfig:
+    """任务注册表配置"""
+    # SQLite 文件路径（相对路径基于 backend 目录）
+    db_path: str = "data/task_registry.db"
+
+    # write-behind 批量写回
+    flush_interval: float = 2.0       # 秒
+    flush_batch_size: int = 200       # 脏记录达到该数量时立即写回
+
+    # 已结束任务在内存中的保留时间（秒）
+    finished_ttl: float = 3600.0
+    # 已结束任务在 SQLite 中的保留时间（秒）
+    persist_retention: float = 7 * 24 * 3600.0
+    # 淘汰扫描间隔（秒）
+    evict_interval: float = 60.0
+
+    # 启动时加载的最近任务数量上限
+    preload_limit: int = 5000
+
+    def __post_init__(self):
+        if self.db_path != ":memory:" and not os.path.isabs(self.db_path):
+            self.db_path = str(BACKEND_DIR / self.db_path)
+
+
+@dataclass
+class TaskRecord:
+    """任务记录"""
+    task_id: str
+    task_type: str
+    source: str = "default"           # 任务归属：wizard / agent / batch / image_generation / render
+    status: str = "pending"
+    progress: float = 0.0
+    message: str = ""
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    details: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    completed_at: Optional[float] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "task_type": self.task_type,
+            "source": self.source,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "details": self.details,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "completed_at": self.completed_at,
+        }
+
+
+def _status_value(status: Any) -> str:
+    """兼容 Enum 与字符串状态"""
+    return getattr(status, "value", status) or "pending"
+
+
+# ============================================================
+# 有序索引
+# ============================================================
+
+class _SortedIndex:
+    """按 (created_at, task_id) 有序的键列表，支持二分插入/删除和分页切片"""
+
+    __slots__ = ("_keys",)
+
+    def __init__(self):
+        self._keys: List[Tuple[float, str]] = []
+
+    def add(self, key: Tuple[float, str]):
+        insort(self._keys, key)
+
+    def remove(self, key: Tuple[float, str]):
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def page_desc(self, offset: int, limit: int) -> List[Tuple[float, str]]:
+        """按创建时间倒序分页"""
+        n = len(self._keys)
+        end = n - offset
+        if end <= 0:
+            return []
+        start = max(0, end - limit)
+        return self._keys[start:end][::-1]
+
+
+# ============================================================
+# 任务注册表
+# ============================================================
+
+class TaskRegistry:
+    """
+    任务注册表
+
+    内存中维护全部活跃任务和近期结束的任务；所有变更先标记为脏，
+    由后台线程按批次写回 SQLite。被淘汰或重启后的任务可通过 id 回查 SQLite。
+    """
+
+    def __init__(self, config: Optional[TaskRegistryConfig] = None):
+        self.config = config or TaskRegistryConfig()
+
+        self._lock = threading.RLock()
+        self._records: Dict[str, TaskRecord] = {}
+        self._all = _SortedIndex()
+        self._by_status: Dict[str, _SortedIndex] = {}
+        self._by_type: Dict[str, _SortedIndex] = {}
+        self._by_source: Dict[str, _SortedIndex] = {}
+        # 常用组合查询（某来源下某状态的任务）
+        self._by_source_status: Dict[str, _SortedIndex] = {}
+
+        # write-behind
+        self._dirty: Dict[str, TaskRecord] = {}
+        self._deleted: set = set()
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._last_evict = time.time()
+
+        self._stats = {"flushes": 0, "rows_written": 0, "evicted": 0, "db_lookups": 0}
+
+        self._init_db()
+        self._preload()
+        self._start_flusher()
+
+    # ------------------------------------------------------------
+    # SQLite
+    # ------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.config.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """初始化任务表"""
+        if self.config.db_path != ":memory:":
+            Path(self.config.db_path).parent.mkdir(parents=True, exist_ok=True)
+        # 文件库每次操作新建短连接；内存库只能共享单个连接。两者都经 _db_lock 串行化
+        self._db_lock = threading.Lock()
+        self._conn = self._connect() if self.config.db_path == ":memory:" else None
+        with self._db() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_registry (
+                    task_id TEXT PRIMARY KEY,
+                    task_type TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL DEFAULT 0,
+                    message TEXT,
+                    result TEXT,
+                    error TEXT,
+                    details TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    completed_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_task_registry_created ON task_registry(created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_task_registry_status ON task_registry(status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_task_registry_source ON task_registry(source, created_at)")
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        """获取 SQLite 连接（串行化访问，退出时提交）"""
+        with self._db_lock:
+            conn = self._conn or self._connect()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                if conn is not self._conn:
+                    conn.close()
+
+    @staticmethod
+    def _dumps(value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        try:
+            return json.dumps(value, ensure_ascii=False, default=str)
+        except Exception:
+            return json.dumps(str(value), ensure_ascii=False)
+
+    @staticmethod
+    def _loads(value: Optional[str]) -> Any:
+        if value is None:
+            return None
+        try:
+            return json.loads(value)
+        except Exception:
+            return value
+
+    def _row_to_record(self, row: Tuple) -> TaskRecord:
+        return TaskRecord(
+            task_id=row[0],
+            task_type=row[1],
+            source=row[2],
+            status=row[3],
+            progress=row[4] or 0.0,
+            message=row[5] or "",
+            result=self._loads(row[6]),
+            error=row[7],
+            details=self._loads(row[8]) or {},
+            created_at=row[9],
+            updated_at=row[10],
+            completed_at=row[11],
+        )
+
+    _SELECT_COLUMNS = (
+        "task_id, task_type, source, status, progress, message, result, error, "
+        "details, created_at, updated_at, completed_at"
+    )
+
+    def _preload(self):
+        """启动时载入近期任务；未结束的任务标记为因重启中断"""
+        try:
+            with self._db() as conn:
+                rows = conn.execute(
+                    f"SELECT {self._SELECT_COLUMNS} FROM task_registry "
+                    "ORDER BY created_at DESC LIMIT ?",
+                    (self.config.preload_limit,)
+                ).fetchall()
+        except Exception as e:
+            logger.error(f"任务注册表加载失败: {e}")
+            return
+
+        now = time.time()
+        interrupted = 0
+        with self._lock:
+            for row in rows:
+                record = self._row_to_record(row)
+                if record.status in UNFINISHED_STATUSES:
+                    record.status = "failed"
+                    record.error = record.error or "服务重启，任务中断"
+                    record.completed_at = now
+                    record.updated_at = now
+                    self._dirty[record.task_id] = record
+                    interrupted += 1
+                elif record.is_finished and now - (record.completed_at or record.updated_at) > self.config.finished_ttl:
+                    continue
+                self._index_add(record)
+
+        if rows:
+            logger.info(f"任务注册表已加载 {len(self._records)} 个任务（{interrupted} 个标记为中断）")
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._flush_loop, name="task-registry-flusher", daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop_event.is_set():
+            self._flush_event.wait(self.config.flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+                if time.time() - self._last_evict >= self.config.evict_interval:
+                    self.evict_expired()
+            except Exception as e:
+                logger.error(f"任务注册表写回失败: {e}")
+
+    def flush(self) -> int:
+        """
+        将脏记录批量写回 SQLite，返回写入行数
+
+        写入失败时未落盘的记录与删除并回待写集合（期间再次变更的任务以新状态为准），
+        下次写回重试，异常继续抛出。
+        """
+        with self._lock:
+            if not self._dirty and not self._deleted:
+                return 0
+            dirty, deleted_ids = self._dirty, self._deleted
+            rows = [
+                (
+                    r.task_id, r.task_type, r.source, r.status, r.progress, r.message,
+                    self._dumps(r.result), r.error, self._dumps(r.details),
+                    r.created_at, r.updated_at, r.completed_at,
+                )
+                for r in dirty.values()
+            ]
+            deleted = [(task_id,) for task_id in deleted_ids]
+            self._dirty = {}
+            self._deleted = set()
+
+        try:
+            with self._db() as conn:
+                if rows:
+                    conn.executemany(
+                        f"INSERT OR REPLACE INTO task_registry ({self._SELECT_COLUMNS}) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+                if deleted:
+                    conn.executemany("DELETE FROM task_registry WHERE task_id = ?", deleted)
+        except Exception:
+            with self._lock:
+                for task_id, record in dirty.items():
+                    if task_id not in self._dirty and task_id not in self._deleted:
+                        self._dirty[task_id] = record
+                for task_id in deleted_ids:
+                    if task_id not in self._dirty:
+                        self._deleted.add(task_id)
+            raise
+
+        self._stats["flushes"] += 1
+        self._stats["rows_written"] += len(rows)
+        return len(rows)
+
+    def close(self):
+        """停止写回线程并落盘剩余变更"""
+        self._stop_event.set()
+        self._flush_event.set()
+        if self._flusher and self._flusher.is_alive():
+            self._flusher.join(timeout=5)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"任务注册表关闭时写回失败（{len(self._dirty)} 条未落盘）: {e}")
+
+    # ------------------------------------------------------------
+    # 索引维护
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _bucket(mapping: Dict[str, _SortedIndex], name: str) -> _SortedIndex:
+        index = mapping.get(name)
+        if index is None:
+            index = mapping[name] = _SortedIndex()
+        return index
+
+    def _index_add(self, record: TaskRecord):
+        key = (record.created_at, record.task_id)
+        self._records[record.task_id] = record
+        self._all.add(key)
+        self._bucket(self._by_status, record.status).add(key)
+        self._bucket(self._by_type, record.task_type).add(key)
+        self._bucket(self._by_source, record.source).add(key)
+        self._bucket(self._by_source_status, f"{record.source}/{record.status}").add(key)
+
+    def _index_remove(self, record: TaskRecord):
+        key = (record.created_at, record.task_id)
+        self._records.pop(record.task_id, None)
+        self._all.remove(key)
+        for mapping, name in (
+            (self._by_status, record.status),
+            (self._by_type, record.task_type),
+            (self._by_source, record.source),
+            (self._by_source_status, f"{record.source}/{record.status}"),
+        ):
+            index = mapping.get(name)
+            if index is not None:
+                index.remove(key)
+                if not len(index):
+                    del mapping[name]
+
+    def _mark_dirty(self, record: TaskRecord):
+        self._dirty[record.task_id] = record
+        self._deleted.discard(record.task_id)
+        if len(self._dirty) >= self.config.flush_batch_size:
+            self._flush_event.set()
+
+    # ------------------------------------------------------------
+    # 公共 API
+    # ------------------------------------------------------------
+
+    def create(
+        self,
+        task_type: str,
+        source: str = "default",
+        task_id: Optional[str] = None,
+        status: Any = "pending",
+        message: str = "",
+        details: Optional[Dict[str, Any]] = None,
+    ) -> TaskRecord:
+        """创建并注册任务"""
+        now = time.time()
+        record = TaskRecord(
+            task_id=task_id or f"task_{uuid4().hex[:12]}",
+            task_type=task_type,
+            source=source,
+            status=_status_value(status),
+            message=message,
+            details=details or {},
+            created_at=now,
+            updated_at=now,
+        )
+        return self.put(record)
+
+    def put(self, record: TaskRecord) -> TaskRecord:
+        """注册或整体替换任务记录"""
+        record.status = _status_value(record.status)
+        with self._lock:
+            existing = self._records.get(record.task_id)
+            if existing is not None:
+                self._index_remove(existing)
+            self._index_add(record)
+            self._mark_dirty(record)
+        return record
+
+    def update(self, task_id: str, **fields) -> Optional[TaskRecord]:
+        """更新任务字段；未知字段写入 details"""
+        with self._lock:
+            record = self._records.get(task_id)
+            if record is None:
+                record = self._load_from_db(task_id)
+                if record is None:
+                    return None
+                self._index_add(record)
+
+            old_status = record.status
+            new_status = _status_value(fields.pop("status", old_status))
+            if new_status != old_status:
+                key = (record.created_at, record.task_id)
+                for mapping, old_name, new_name in (
+                    (self._by_status, old_status, new_status),
+                    (self._by_source_status, f"{record.source}/{old_status}", f"{record.source}/{new_status}"),
+                ):
+                    index = mapping.get(old_name)
+                    if index is not None:
+                        index.remove(key)
+                        if not len(index):
+                            del mapping[old_name]
+                    self._bucket(mapping, new_name).add(key)
+                record.status = new_status
+                if new_status in FINISHED_STATUSES and record.completed_at is None:
+                    record.completed_at = time.time()
+
+            for name, value in fields.items():
+                if name in ("progress", "message", "result", "error", "completed_at"):
+                    setattr(record, name, value)
+                elif name == "details":
+                    record.details.update(value or {})
+                else:
+                    record.details[name] = value
+
+            record.updated_at = time.time()
+            self._mark_dirty(record)
+            return record
+
+    def get(self, task_id: str) -> Optional[TaskRecord]:
+        """按 id 获取任务；内存未命中时回查 SQLite（不重新入索引）"""
+        with self._lock:
+            record = self._records.get(task_id)
+            if record is not None:
+                return record
+            pending = self._dirty.get(task_id)
+            if pending is not None:
+                return pending
+        return self._load_from_db(task_id)
+
+    def peek(self, task_id: str) -> Optional[TaskRecord]:
+        """只查内存（含待写回的记录），不回查 SQLite"""
+        with self._lock:
+            return self._records.get(task_id) or self._dirty.get(task_id)
+
+    def delete(self, task_id: str) -> bool:
+        """删除任务"""
+        with self._lock:
+            record = self._records.get(task_id)
+            if record is not None:
+                self._index_remove(record)
+            self._dirty.pop(task_id, None)
+            self._deleted.add(task_id)
+            return record is not None
+
+    def _load_from_db(self, task_id: str) -> Optional[TaskRecord]:
+        self._stats["db_lookups"] += 1
+        try:
+            with self._db() as conn:
+                row = conn.execute(
+                    f"SELECT {self._SELECT_COLUMNS} FROM task_registry WHERE task_id = ?",
+                    (task_id,)
+                ).fetchone()
+            return self._row_to_record(row) if row else None
+        except Exception as e:
+            logger.error(f"任务回查失败: {task_id}, {e}")
+            return None
+
+    def list_tasks(
+        self,
+        status: Optional[Any] = None,
+        task_type: Optional[str] = None,
+        source: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """
+        分页列出任务（按创建时间倒序）
+
+        单一过滤条件（或来源 + 状态组合）直接在对应有序索引上切片；
+        其余组合以最小的候选索引为基础逐条过滤。
+        """
+        offset = max(0, offset)
+        limit = max(0, limit)
+        status = _status_value(status) if status is not None else None
+
+        with self._lock:
+            candidates = []
+            filters = []
+            if status is not None:
+                candidates.append(self._by_status.get(status, _SortedIndex()))
+                filters.append(("status", status))
+            if task_type is not None:
+                candidates.append(self._by_type.get(task_type, _SortedIndex()))
+                filters.append(("task_type", task_type))
+            if source is not None:
+                candidates.append(self._by_source.get(source, _SortedIndex()))
+                filters.append(("source", source))
+            if status is not None and source is not None:
+                candidates.append(self._by_source_status.get(f"{source}/{status}", _SortedIndex()))
+                if task_type is None:
+                    filters = [("source_status", None)]
+
+            if not candidates:
+                base = self._all
+            else:
+                base = min(candidates, key=len)
+
+            if len(filters) <= 1:
+                total = len(base)
+                keys = base.page_desc(offset, limit)
+                items = [self._records[task_id] for _, task_id in keys]
+            else:
+                matched = [
+                    self._records[task_id]
+                    for _, task_id in base.page_desc(0, len(base))
+                    if all(getattr(self._records[task_id], f) == v for f, v in filters)
+                ]
+                total = len(matched)
+                items = matched[offset:offset + limit]
+
+        return {
+            "items": items,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "has_more": offset + len(items) < total,
+        }
+
+    def count(self, status: Optional[Any] = None, source: Optional[str] = None) -> int:
+        """统计任务数量"""
+        with self._lock:
+            if status is None and source is None:
+                return len(self._all)
+            if source is None:
+                return len(self._by_status.get(_status_value(status), ()))
+            if status is None:
+                return len(self._by_source.get(source, ()))
+            return len(self._by_source_status.get(f"{source}/{_status_value(status)}", ()))
+
+    def evict_expired(self, ttl: Optional[float] = None, source: Optional[str] = None) -> int:
+        """淘汰超过 TTL 的已结束任务（内存），并清理超过保留期的持久化记录"""
+        ttl = self.config.finished_ttl if ttl is None else ttl
+        now = time.time()
+        evicted = 0
+        with self._lock:
+            for status in FINISHED_STATUSES:
+                if source is None:
+                    index = self._by_status.get(status)
+                else:
+                    index = self._by_source_status.get(f"{source}/{status}")
+                if index is None:
+                    continue
+                for _, task_id in list(index._keys):
+                    record = self._records.get(task_id)
+                    if record is None:
+                        continue
+                    finished_at = record.completed_at or record.updated_at
+                    if now - finished_at >= ttl and task_id not in self._dirty:
+                        self._index_remove(record)
+                        evicted += 1
+            self._last_evict = now
+
+        try:
+            with self._db() as conn:
+                conn.execute(
+                    "DELETE FROM task_registry WHERE completed_at IS NOT NULL AND completed_at < ?",
+                    (now - self.config.persist_retention,)
+                )
+        except Exception as e:
+            logger.error(f"任务持久化清理失败: {e}")
+
+        if evicted:
+            self._stats["evicted"] += evicted
+            logger.info(f"任务注册表淘汰 {evicted} 个已结束任务")
+        return evicted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取注册表统计"""
+        with self._lock:
+            return {
+                "in_memory": len(self._records),
+                "dirty": len(self._dirty),
+                "by_status": {k: len(v) for k, v in self._by_status.items()},
+                "by_source": {k: len(v) for k, v in self._by_source.items()},
+                **self._stats,
+            }
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_task_registry: Optional[TaskRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_task_registry() -> TaskRegistry:
+    """获取全局任务注册表"""
+    global _task_registry
+    if _task_registry is None:
+        with _registry_lock:
+            if _task_registry is None:
+                config = TaskRegistryConfig(
+                    db_path=os.getenv("TASK_REGISTRY_DB", TaskRegistryConfig.db_path),
+                    finished_ttl=float(os.getenv("TASK_REGISTRY_TTL", TaskRegistryConfig.finished_ttl)),
+                )
+                _task_registry = TaskRegistry(config)
+    return _task_registry
+
+
+def shutdown_task_registry():
+    """关闭全局任务注册表（落盘剩余变更）"""
+    global _task_registry
+    if _task_registry is not None:
+        _task_registry.close()
+        _task_registry = None
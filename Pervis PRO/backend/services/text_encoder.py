@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+共享文本编码服务
+
+StoryboardAgentService 与 VideoPreprocessor 共用同一个 SentenceTransformer：
+- 每个进程只加载一次模型（可在启动时预热，TEXT_ENCODER_WARMUP=1）
+- 编码在专用单线程执行器中运行，不阻塞事件循环
+- 短时间窗口内的并发编码请求合并为一次 model.encode 批量调用
+- 最近的查询向量按规范化文本缓存在 LRU 中，重复查询不再调用模型
+
+配置（环境变量）：
+- TEXT_ENCODER_MODEL: 模型名称（默认 all-MiniLM-L6-v2）
+- TEXT_ENCODER_CACHE_SIZE: 查询向量 LRU 容量（默认 1024）
+- TEXT_ENCODER_BATCH_WINDOW_MS: 请求合并等待窗口毫秒数（默认 5）
+- TEXT_ENCODER_MAX_BATCH: 单批最大文本数（默认 64）
+- TEXT_ENCODER_WARMUP: 启动时预加载模型（默认 0）
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本（NFKC + 合并空白），作为缓存键"""
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+class TextEncoderService:
+    """共享文本编码服务"""
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        cache_size: int = 1024,
+        batch_window: float = 0.005,
+        max_batch: int = 64,
+        model: Any = None,
+    ):
+        """
+        Args:
+            model_name: SentenceTransformer 模型名称
+            cache_size: 查询向量 LRU 容量（0 表示不缓存）
+            batch_window: 请求合并等待窗口（秒）
+            max_batch: 单批最大文本数
+            model: 已加载的模型（提供 encode(List[str]) 即可，主要用于测试）
+        """
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.batch_window = batch_window
+        self.max_batch = max(1, max_batch)
+
+        self._model = model
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="text-encoder")
+
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        # 待合并的编码请求：[(规范化文本, future)]
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._pending_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batch_tasks = set()
+
+        self._stats = {"hits": 0, "misses": 0, "batches": 0, "encoded": 0}
+
+    # ---------- 模型 ----------
+
+    def _load_model(self):
+        """加载模型（线程安全，失败后标记为不可用）"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    try:
+                        # 注意：可能因为 NumPy 版本不兼容而失败
+                        from sentence_transformers import SentenceTransformer
+                        self._model = SentenceTransformer(self.model_name)
+                        logger.info(f"文本编码模型加载成功: {self.model_name}")
+                    except ImportError as e:
+                        logger.warning(f"sentence_transformers 未安装: {e}")
+                        self._model = False
+                    except Exception as e:
+                        logger.warning(f"文本编码模型加载失败（可能是 NumPy 版本问题）: {e}")
+                        logger.info("提示: 可以尝试运行 'pip install numpy<2' 来解决此问题")
+                        self._model = False
+        return self._model or None
+
+    @property
+    def available(self) -> bool:
+        """模型是否可用（会触发加载）"""
+        return self._load_model() is not None
+
+    async def warmup(self) -> bool:
+        """在执行器中预加载模型"""
+        loop = asyncio.get_running_loop()
+        model = await loop.run_in_executor(self._executor, self._load_model)
+        return model is not None
+
+    def _encode_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """执行器线程中的批量编码"""
+        model = self._load_model()
+        if model is None:
+            return None
+        return np.asarray(model.encode(texts), dtype=np.float64).tolist()
+
+    # ---------- 缓存 ----------
+
+    def _cache_get(self, key: str) -> Optional[List[float]]:
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            return vector
+
+    def _cache_put(self, key: str, vector: List[float]):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    # ---------- 编码 ----------
+
+    async def encode(self, texts: List[str], use_cache: bool = True) -> Optional[List[List[float]]]:
+        """
+        批量编码
+
+        Args:
+            texts: 文本列表
+            use_cache: 是否读写查询向量 LRU（素材描述等一次性文本可关闭）
+
+        Returns:
+            与输入一一对应的向量列表；模型不可用或编码失败时返回 None
+        """
+        if not texts:
+            return []
+
+        keys = [normalize_text(t) for t in texts]
+        vectors: Dict[str, List[float]] = {}
+        if use_cache:
+            for key in keys:
+                if key in vectors:
+                    continue
+                vector = self._cache_get(key)
+                if vector is not None:
+                    vectors[key] = vector
+            self._stats["hits"] += sum(1 for key in keys if key in vectors)
+
+        missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+        if missing:
+            self._stats["misses"] += len(missing)
+            futures = [self._submit(key) for key in missing]
+            try:
+                encoded = await asyncio.gather(*futures)
+            except Exception as e:
+                logger.error(f"文本编码失败: {e}")
+                return None
+            if any(v is None for v in encoded):
+                return None
+            for key, vector in zip(missing, encoded):
+                vectors[key] = vector
+                if use_cache:
+                    self._cache_put(key, vector)
+
+        return [vectors[key] for key in keys]
+
+    async def encode_one(self, text: str, use_cache: bool = True) -> Optional[List[float]]:
+        """编码单条文本"""
+        vectors = await self.encode([text], use_cache=use_cache)
+        return vectors[0] if vectors else None
+
+    def _submit(self, key: str) -> asyncio.Future:
+        """加入待合并批次，窗口到期或达到批量上限时提交执行器"""
+        loop = asyncio.get_running_loop()
+        if self._pending_loop is not loop:
+            # 事件循环切换（如测试中多次 asyncio.run），旧批次随旧循环失效
+            self._pending = []
+            self._flush_handle = None
+            self._pending_loop = loop
+
+        future = loop.create_future()
+        self._pending.append((key, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        texts = list(dict.fromkeys(key for key, _ in batch))
+        self._stats["batches"] += 1
+        self._stats["encoded"] += len(texts)
+        try:
+            encoded = await loop.run_in_executor(self._executor, self._encode_batch, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, encoded)) if encoded is not None else {}
+        for key, future in batch:
+            if not future.done():
+                future.set_result(by_text.get(key))
+
+    # ---------- 统计 ----------
+
+    def stats(self) -> Dict[str, Any]:
+        model_state = "unloaded" if self._model is None else ("unavailable" if self._model is False else "loaded")
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            "model": self.model_name,
+            "model_state": model_state,
+            "cache_entries": len(self._cache),
+            "cache_size": self.cache_size,
+            **self._stats,
+            "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0,
+        }
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_text_encoder: Optional[TextEncoderService] = None
+
+
+def get_text_encoder() -> TextEncoderService:
+    """获取全局文本编码服务"""
+    global _text_encoder
+    if _text_encoder is None:
+        _text_encoder = TextEncoderService(
+            model_name=os.getenv("TEXT_ENCODER_MODEL", DEFAULT_MODEL),
+            cache_size=int(os.getenv("TEXT_ENCODER_CACHE_SIZE", "1024")),
+            batch_window=float(os.getenv("TEXT_ENCODER_BATCH_WINDOW_MS", "5")) / 1000,
+            max_batch=int(os.getenv("TEXT_ENCODER_MAX_BATCH", "64")),
+        )
+    return _text_encoder
+
+
+async def warmup_text_encoder():
+    """按 TEXT_ENCODER_WARMUP 在启动时预加载模型"""
+    if os.getenv("TEXT_ENCODER_WARMUP", "0") != "1":
+        return
+    if await get_text_encoder().warmup():
+        logger.info("文本编码模型已预热")
@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+"""
+全文检索索引（SQLite FTS5）
+
+转录文本、片段描述和关键帧描述写入 text_documents 表，由外部内容 FTS5 表
+text_fts 建立倒排索引（触发器保持同步），查询返回片段级命中与 BM25 分数，
+不再逐个读取素材的 processing_metadata 做子串匹配：
+- 中日韩文字没有空格分词，写入前在 Python 中切分：默认按重叠二元组（bigram），
+  TEXT_INDEX_TOKENIZER=jieba 且已安装 jieba 时使用搜索引擎模式分词；
+  拉丁文字按单词切分并转小写。切分结果以空格拼接写入 tokens 列，FTS5 使用
+  unicode61 分词器按空格还原
+- 查询使用相同的切分，词项以 OR（相关性排序）或 AND（过滤）组合；
+  单个汉字的查询词按前缀匹配二元组
+- 表结构由 init_database / 迁移 011 创建，并从已有素材数据回填；回填完成后在
+  text_index_meta 写入已回填标记（含分词方式）。只有标记存在且分词方式一致时
+  available() 才返回 True，否则（含非 SQLite、缺少 FTS5、回填前的空表）
+  调用方回退到原有的扫描匹配，不会对已有素材返回空结果
+
+切换分词方式后 init_database 会在启动时重建索引（也可手动运行迁移 011）。
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import bindparam, inspect, text
+
+logger = logging.getLogger(__name__)
+
+try:
+    import jieba
+    JIEBA_AVAILABLE = True
+except ImportError:
+    JIEBA_AVAILABLE = False
+
+
+# 文档来源
+SOURCE_TRANSCRIPT = "transcript"   # 转录片段
+SOURCE_SEGMENT = "segment"         # AssetSegment 描述
+SOURCE_KEYFRAME = "keyframe"       # 关键帧描述
+SOURCE_VISUAL = "visual"           # 视觉摘要标签
+
+
+# ============================================================
+# 分词
+# ============================================================
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN_RE = re.compile(f"(?P<cjk>[{_CJK}]+)|(?P<word>[^\\W_{_CJK}]+)")
+
+
+def _cjk_bigrams(run: str) -> List[str]:
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(content: str, tokenizer: str = "bigram") -> List[str]:
+    """
+    切分文本为索引词项
+
+    Args:
+        content: 文本
+        tokenizer: "bigram" 或 "jieba"（jieba 未安装时按 bigram）
+    """
+    tokens: List[str] = []
+    for match in _TOKEN_RE.finditer((content or "").lower()):
+        word = match.group("word")
+        if word:
+            tokens.append(word)
+            continue
+        run = match.group("cjk")
+        if tokenizer == "jieba" and JIEBA_AVAILABLE:
+            tokens.extend(t for t in jieba.cut_for_search(run) if t.strip())
+        else:
+            tokens.extend(_cjk_bigrams(run))
+    return tokens
+
+
+def build_match_query(query: str, tokenizer: str = "bigram", operator: str = "OR",
+                      prefix: bool = False) -> Optional[str]:
+    """
+    构造 FTS5 MATCH 表达式
+
+    Args:
+        query: 查询文本
+        operator: "OR"（按相关性排序）或 "AND"（全部词项命中）
+        prefix: 是否对所有词项做前缀匹配（单个汉字总是前缀匹配）
+
+    Returns:
+        MATCH 表达式；查询没有可检索的词项时返回 None
+    """
+    terms = []
+    seen = set()
+    for token in tokenize(query, tokenizer):
+        if token in seen:
+            continue
+        seen.add(token)
+        quoted = '"' + token.replace('"', '""') + '"'
+        single_cjk = len(token) == 1 and re.match(f"[{_CJK}]", token)
+        terms.append(quoted + "*" if prefix or single_cjk else quoted)
+    if not terms:
+        return None
+    return f" {operator} ".join(terms)
+
+
+# ============================================================
+# 文档构造
+# ============================================================
+
+def _document(ref_id: Any, start_time: Optional[float], end_time: Optional[float],
+              content: str) -> Dict[str, Any]:
+    return {
+        "ref_id": None if ref_id is None else str(ref_id),
+        "start_time": start_time,
+        "end_time": end_time,
+        "content": content,
+    }
+
+
+def transcription_documents(transcription: dict) -> List[Dict[str, Any]]:
+    """转录数据 → 每个转录片段一条文档"""
+    documents = []
+    for segment in (transcription or {}).get("segments", []):
+        content = (segment.get("text") or "").strip()
+        if content:
+            documents.append(_document(
+                segment.get("id"), segment.get("start_time"), segment.get("end_time"), content
+            ))
+    return documents
+
+
+def keyframe_documents(visual_data: dict) -> List[Dict[str, Any]]:
+    """视觉分析数据 → 每个带描述的关键帧一条文档"""
+    documents = []
+    for keyframe in (visual_data or {}).get("keyframes", []):
+        analysis = keyframe.get("analysis") or {}
+        caption = (
+            keyframe.get("caption") or keyframe.get("summary") or keyframe.get("description")
+            or analysis.get("caption") or analysis.get("summary") or analysis.get("description")
+        )
+        if isinstance(caption, str) and caption.strip():
+            timestamp = keyframe.get("timestamp")
+            documents.append(_document(keyframe.get("frame_index"), timestamp, timestamp, caption.strip()))
+    return documents
+
+
+def visual_summary_documents(visual_data: dict) -> List[Dict[str, Any]]:
+    """视觉分析数据 → 视觉摘要与标签一条文档"""
+    description = (visual_data or {}).get("visual_description") or {}
+    parts = [str(v) for v in (description.get("visual_summary") or {}).values() if v]
+    parts.extend(str(tag) for tag in description.get("visual_tags") or [])
+    if not parts:
+        return []
+    return [_document(None, 0.0, (visual_data or {}).get("duration"), " ".join(parts))]
+
+
+def segment_documents(segment) -> List[Dict[str, Any]]:
+    """AssetSegment → 片段描述一条文档"""
+    content = (segment.description or "").strip()
+    if not content:
+        return []
+    return [_document(segment.id, segment.start_time, segment.end_time, content)]
+
+
+# ============================================================
+# 表结构
+# ============================================================
+
+SCHEMA_STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS text_documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        asset_id VARCHAR(64) NOT NULL,
+        source VARCHAR(20) NOT NULL,
+        ref_id VARCHAR(64),
+        start_time FLOAT,
+        end_time FLOAT,
+        content TEXT,
+        tokens TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS text_index_meta (
+        key VARCHAR(32) PRIMARY KEY,
+        value TEXT
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_text_documents_asset_source
+    ON text_documents(asset_id, source)
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS text_fts USING fts5(
+        tokens, content='text_documents', content_rowid='id', tokenize='unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS text_documents_ai AFTER INSERT ON text_documents BEGIN
+        INSERT INTO text_fts(rowid, tokens) VALUES (new.id, new.tokens);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS text_documents_ad AFTER DELETE ON text_documents BEGIN
+        INSERT INTO text_fts(text_fts, rowid, tokens) VALUES ('delete', old.id, old.tokens);
+    END
+    """,
+)
+
+DROP_STATEMENTS = (
+    "DROP TRIGGER IF EXISTS text_documents_ai",
+    "DROP TRIGGER IF EXISTS text_documents_ad",
+    "DROP TABLE IF EXISTS text_fts",
+    "DROP TABLE IF EXISTS text_documents",
+    "DROP TABLE IF EXISTS text_index_meta",
+)
+
+INSERT_DOCUMENTS_SQL = text("""
+    INSERT INTO text_documents (asset_id, source, ref_id, start_time, end_time, content, tokens)
+    VALUES (:asset_id, :source, :ref_id, :start_time, :end_time, :content, :tokens)
+""")
+
+DELETE_DOCUMENTS_SQL = text("DELETE FROM text_documents WHERE asset_id = :asset_id AND source = :source")
+
+
+def fts5_supported(conn) -> bool:
+    """当前连接是否为支持 FTS5 的 SQLite（同步连接）"""
+    if conn.dialect.name != "sqlite":
+        return False
+    return bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+def create_schema(conn) -> bool:
+    """创建索引表（同步连接，调用方负责提交）；不支持时返回 False"""
+    if not fts5_supported(conn):
+        logger.info("数据库不支持 FTS5，全文检索回退到扫描匹配")
+        return False
+    for statement in SCHEMA_STATEMENTS:
+        conn.execute(text(statement))
+    return True
+
+
+def drop_schema(conn):
+    """删除索引表（同步连接）"""
+    for statement in DROP_STATEMENTS:
+        conn.execute(text(statement))
+
+
+# 已回填标记：text_index_meta 中该键的值为回填时使用的分词方式
+POPULATED_KEY = "populated"
+
+POPULATED_SQL = text("SELECT value FROM text_index_meta WHERE key = :key")
+
+
+def populated_tokenizer(conn) -> Optional[str]:
+    """已完成回填时返回其分词方式，否则返回 None（同步连接）"""
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'text_index_meta'"
+    )).scalar()
+    if not exists:
+        return None
+    return conn.execute(POPULATED_SQL, {"key": POPULATED_KEY}).scalar()
+
+
+def _load_json(raw):
+    return json.loads(raw) if isinstance(raw, str) else raw
+
+
+def rebuild_index(conn, tokenizer: str = None, batch_size: int = 500) -> Optional[int]:
+    """
+    重建索引表并从已有数据回填（同步连接，调用方负责提交）
+
+    回填 assets.processing_metadata 中的转录片段、关键帧描述、视觉摘要，
+    以及 asset_segments 描述，最后写入已回填标记。
+
+    Returns:
+        回填的文档数；数据库不支持 FTS5 时返回 None
+    """
+    if not fts5_supported(conn):
+        return None
+    index = TextSearchIndex(tokenizer)
+    tables = set(inspect(conn).get_table_names())
+    drop_schema(conn)
+    create_schema(conn)
+
+    indexed = 0
+    if "assets" in tables:
+        rows = conn.execute(text(
+            "SELECT id, processing_metadata FROM assets WHERE processing_metadata IS NOT NULL"
+        ))
+        pending = []
+        for asset_id, raw in rows:
+            metadata = _load_json(raw) or {}
+            transcription = metadata.get("transcription")
+            visual = metadata.get("visual_analysis")
+            if transcription:
+                pending += index.rows(asset_id, SOURCE_TRANSCRIPT, transcription_documents(transcription))
+            if visual:
+                pending += index.rows(asset_id, SOURCE_KEYFRAME, keyframe_documents(visual))
+                pending += index.rows(asset_id, SOURCE_VISUAL, visual_summary_documents(visual))
+        for start in range(0, len(pending), batch_size):
+            conn.execute(INSERT_DOCUMENTS_SQL, pending[start:start + batch_size])
+        indexed += len(pending)
+
+    if "asset_segments" in tables:
+        rows = conn.execute(text("""
+            SELECT id, asset_id, start_time, end_time, description FROM asset_segments
+            WHERE description IS NOT NULL AND description != ''
+        """)).fetchall()
+        for start in range(0, len(rows), batch_size):
+            batch = [
+                row for segment_id, asset_id, start_time, end_time, description in rows[start:start + batch_size]
+                for row in index.rows(asset_id, SOURCE_SEGMENT, [{
+                    "ref_id": segment_id,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "content": description,
+                }])
+            ]
+            conn.execute(INSERT_DOCUMENTS_SQL, batch)
+        indexed += len(rows)
+
+    conn.execute(
+        text("INSERT OR REPLACE INTO text_index_meta (key, value) VALUES (:key, :value)"),
+        {"key": POPULATED_KEY, "value": index.tokenizer},
+    )
+    return indexed
+
+
+def ensure_index(conn, tokenizer: str = None) -> bool:
+    """
+    确保索引可用（init_database 调用）：首次创建或分词方式变化时回填
+
+    Returns:
+        索引是否可用
+    """
+    if not fts5_supported(conn):
+        logger.info("数据库不支持 FTS5，全文检索回退到扫描匹配")
+        return False
+    expected = TextSearchIndex(tokenizer).tokenizer
+    if populated_tokenizer(conn) == expected:
+        return True
+    indexed = rebuild_index(conn, expected)
+    logger.info(f"全文检索索引已回填: {indexed} 条文档（{expected}）")
+    return True
+
+
+# ============================================================
+# 索引
+# ============================================================
+
+class TextSearchIndex:
+    """FTS5 全文检索索引（操作在调用方的 AsyncSession 事务内执行）"""
+
+    def __init__(self, tokenizer: str = None):
+        self.tokenizer = (tokenizer or os.getenv("TEXT_INDEX_TOKENIZER", "bigram")).lower()
+        if self.tokenizer == "jieba" and not JIEBA_AVAILABLE:
+            logger.warning("jieba 未安装，全文检索使用 bigram 分词")
+            self.tokenizer = "bigram"
+        self._available: Dict[str, bool] = {}
+
+    def rows(self, asset_id: str, source: str, documents: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """文档 → text_documents 行参数"""
+        return [
+            {**doc, "asset_id": asset_id, "source": source,
+             "tokens": " ".join(tokenize(doc["content"], self.tokenizer))}
+            for doc in documents
+        ]
+
+    async def available(self, session) -> bool:
+        """索引已按当前分词方式回填完成（按数据库缓存肯定结果）"""
+        bind = session.bind
+        key = str(bind.url) if bind is not None else ""
+        if self._available.get(key):
+            return True
+        if bind is None or bind.dialect.name != "sqlite":
+            return False
+        exists = (await session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'text_index_meta'")
+        )).scalar() is not None
+        ready = exists and (await session.execute(
+            POPULATED_SQL, {"key": POPULATED_KEY}
+        )).scalar() == self.tokenizer
+        if ready:
+            self._available[key] = True
+        return ready
+
+    async def add(self, session, asset_id: str, source: str, documents: Sequence[Dict[str, Any]]) -> bool:
+        """追加文档"""
+        if not documents or not await self.available(session):
+            return False
+        await session.execute(INSERT_DOCUMENTS_SQL, self.rows(asset_id, source, documents))
+        return True
+
+    async def replace(self, session, asset_id: str, source: str, documents: Sequence[Dict[str, Any]]) -> bool:
+        """替换素材某一来源的全部文档"""
+        if not await self.available(session):
+            return False
+        await session.execute(DELETE_DOCUMENTS_SQL, {"asset_id": asset_id, "source": source})
+        if documents:
+            await session.execute(INSERT_DOCUMENTS_SQL, self.rows(asset_id, source, documents))
+        return True
+
+    async def search(self, session, query: str, limit: int = 20,
+                     sources: Optional[Sequence[str]] = None,
+                     asset_ids: Optional[Sequence[str]] = None,
+                     operator: str = "OR", prefix: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """
+        BM25 检索
+
+        Returns:
+            按分数降序的片段级命中（score 越大越相关）；索引不可用时返回 None
+        """
+        if not await self.available(session):
+            return None
+        match = build_match_query(query, self.tokenizer, operator, prefix)
+        if match is None:
+            return []
+
+        conditions = ["text_fts MATCH :match"]
+        params: Dict[str, Any] = {"match": match, "limit": limit}
+        statement_params = []
+        if sources:
+            conditions.append("d.source IN :sources")
+            params["sources"] = list(sources)
+            statement_params.append(bindparam("sources", expanding=True))
+        if asset_ids:
+            conditions.append("d.asset_id IN :asset_ids")
+            params["asset_ids"] = list(asset_ids)
+            statement_params.append(bindparam("asset_ids", expanding=True))
+
+        statement = text(f"""
+            SELECT d.asset_id, d.source, d.ref_id, d.start_time, d.end_time, d.content,
+                   bm25(text_fts) AS rank
+            FROM text_fts JOIN text_documents d ON d.id = text_fts.rowid
+            WHERE {" AND ".join(conditions)}
+            ORDER BY rank
+            LIMIT :limit
+        """).bindparams(*statement_params)
+
+        rows = (await session.execute(statement, params)).fetchall()
+        return [
+            {
+                "asset_id": row.asset_id,
+                "source": row.source,
+                "ref_id": row.ref_id,
+                "start_time": row.start_time,
+                "end_time": row.end_time,
+                "text": row.content,
+                "score": -float(row.rank),   # FTS5 的 bm25() 越小越相关
+            }
+            for row in rows
+        ]
+
+
+# ============================================================
+# 全局实例
+# ============================================================
+
+_text_index: Optional[TextSearchIndex] = None
+
+
+def get_text_index() -> TextSearchIndex:
+    """获取全局全文检索索引"""
+    global _text_index
+    if _text_index is None:
+        _text_index = TextSearchIndex()
+    return _text_index
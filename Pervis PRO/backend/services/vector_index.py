@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+行对齐向量列（可选量化）
+
+为 MemoryVideoStore（紧凑模式）与 VisualVectorStore 保存向量：
+- 向量按行号存放为单位向量 + 模长，余弦相似度即点积
+- 量化模式：
+  - none:    float32 常驻内存，精确搜索
+  - float16: 半精度常驻内存（内存减半）
+  - int8:    每个向量独立缩放的 int8 常驻内存（内存约 1/4）
+- 量化模式下全精度单位向量写入 mmap 文件，第一轮在量化向量上打分，
+  取前 k × rerank_factor 个候选从 mmap 读取 float32 精确重排；
+  未指定文件路径时每个实例使用独立临时文件（实例回收或 close 时删除）
+
+量化向量的第一轮打分按块转换为 float32 计算，临时内存与块大小成正比。
+"""
+
+import logging
+import os
+import tempfile
+import weakref
+from enum import Enum
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 第一轮打分的分块行数
+SCORE_BLOCK_ROWS = 8192
+
+
+class VectorQuantization(str, Enum):
+    """向量量化模式"""
+    NONE = "none"
+    FLOAT16 = "float16"
+    INT8 = "int8"
+
+
+_CODE_DTYPES = {
+    VectorQuantization.NONE: np.float32,
+    VectorQuantization.FLOAT16: np.float16,
+    VectorQuantization.INT8: np.int8,
+}
+
+
+def top_k_rows(scores: np.ndarray, mask: Optional[np.ndarray], k: int) -> np.ndarray:
+    """掩码内得分最高的 k 行（降序）"""
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+        available = int(mask.sum())
+    else:
+        available = len(scores)
+    k = min(k, available)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    rows = np.argpartition(-scores, k - 1)[:k]
+    return rows[np.argsort(-scores[rows], kind="stable")]
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class VectorColumn:
+    """行对齐的向量列"""
+
+    def __init__(
+        self,
+        quantization: VectorQuantization = VectorQuantization.NONE,
+        path: Optional[str] = None,
+        dim: int = 0,
+        rerank_factor: int = 4,
+    ):
+        self.quantization = VectorQuantization(quantization)
+        self.path = path
+        self.dim = dim
+        self.rerank_factor = max(1, rerank_factor)
+        self.capacity = 0
+
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.valid = np.zeros(0, dtype=bool)
+        self._codes = np.zeros((0, dim), dtype=_CODE_DTYPES[self.quantization])
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._full: Optional[np.memmap] = None
+
+        if self.quantized and not path:
+            # 多个实例共用默认文件会在首次创建时互相截断，改用实例独占的临时文件
+            fd, self.path = tempfile.mkstemp(prefix="vectors_", suffix=".f32")
+            os.close(fd)
+            weakref.finalize(self, _remove_file, self.path)
+
+    @property
+    def quantized(self) -> bool:
+        return self.quantization != VectorQuantization.NONE
+
+    # ---------- 容量 ----------
+
+    def _grow(self, row: int):
+        if row < self.capacity:
+            return
+        capacity = max(16, row + 1, self.capacity + self.capacity // 2)
+
+        def resize(array: np.ndarray) -> np.ndarray:
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self.norms = resize(self.norms)
+        self.valid = resize(self.valid)
+        self._codes = resize(self._codes)
+        if self.quantization == VectorQuantization.INT8:
+            self._scales = resize(self._scales)
+        if self.quantized:
+            self._resize_full(capacity)
+        self.capacity = capacity
+
+    def _resize_full(self, capacity: int):
+        """扩展全精度 mmap 文件（首次创建时覆盖旧文件）"""
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        size = capacity * self.dim * 4
+        if self._full is None:
+            with open(self.path, "wb") as f:
+                f.truncate(size)
+        else:
+            self._full.flush()
+            self._full = None
+            with open(self.path, "r+b") as f:
+                f.truncate(size)
+        self._full = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    # ---------- 写入 ----------
+
+    def set(self, row: int, vector: Sequence[float]) -> bool:
+        """
+        写入一行；维度与列不一致（或为空）时不写入并返回 False
+
+        第一条非空向量决定列维度。
+        """
+        if vector is None or not len(vector):
+            return False
+        if not self.dim:
+            self.dim = len(vector)
+            self._codes = np.zeros((self.capacity, self.dim), dtype=self._codes.dtype)
+        if len(vector) != self.dim:
+            return False
+        self._grow(row)
+
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        unit = vector / norm if norm > 0 else vector
+        self.norms[row] = norm
+        self.valid[row] = norm > 0
+
+        if self.quantization == VectorQuantization.INT8:
+            peak = float(np.abs(unit).max())
+            scale = peak / 127 if peak > 0 else 1.0
+            self._codes[row] = np.round(unit / scale).astype(np.int8)
+            self._scales[row] = scale
+        else:
+            self._codes[row] = unit
+        if self.quantized:
+            self._full[row] = unit
+        return True
+
+    def clear(self, row: int):
+        if row >= self.capacity:
+            return
+        self.norms[row] = 0
+        self.valid[row] = False
+        self._codes[row] = 0
+
+    # ---------- 读取 ----------
+
+    def unit(self, rows) -> np.ndarray:
+        """全精度单位向量（量化模式从 mmap 读取）"""
+        if self.quantized:
+            return np.asarray(self._full[rows])
+        return self._codes[rows]
+
+    def get(self, row: int) -> List[float]:
+        """还原的原始向量（单位向量 × 模长）"""
+        return (self.unit(row) * self.norms[row]).tolist()
+
+    def approx_scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        第一轮打分：单位查询向量（n × dim）与全部行的点积
+
+        非量化模式即精确余弦相似度。
+        """
+        capacity = self.capacity
+        if self.quantization == VectorQuantization.NONE:
+            return queries @ self._codes[:capacity].T
+        scores = np.empty((len(queries), capacity), dtype=np.float32)
+        for start in range(0, capacity, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, capacity)
+            block = self._codes[start:end].astype(np.float32)
+            scores[:, start:end] = queries @ block.T
+            if self.quantization == VectorQuantization.INT8:
+                scores[:, start:end] *= self._scales[start:end]
+        return scores
+
+    def search(
+        self,
+        queries: np.ndarray,
+        masks: List[Optional[np.ndarray]],
+        k: int,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        批量搜索
+
+        Args:
+            queries: 单位查询向量（n × dim）
+            masks: 每个查询的候选行掩码（None 表示全部有效行；长度可超过列容量）
+            k: 每个查询返回的数量
+
+        Returns:
+            [(行号, 余弦相似度), ...]，与查询一一对应
+        """
+        scores = self.approx_scores(queries)
+        valid = self.valid
+        pool = k * self.rerank_factor if self.quantized else k
+
+        results = []
+        for i, mask in enumerate(masks):
+            mask = valid if mask is None else (self._fit(mask) & valid)
+            rows = top_k_rows(scores[i], mask, pool)
+            if not self.quantized or not len(rows):
+                results.append((rows, scores[i][rows]))
+                continue
+            # 精确重排：按行号顺序读取 mmap 以获得顺序 I/O
+            ordered = np.sort(rows)
+            exact = self.unit(ordered) @ queries[i]
+            best = np.argsort(-exact, kind="stable")[:k]
+            results.append((ordered[best], exact[best]))
+        return results
+
+    def _fit(self, mask: np.ndarray) -> np.ndarray:
+        """掩码对齐到列容量"""
+        if len(mask) >= self.capacity:
+            return mask[:self.capacity]
+        fitted = np.zeros(self.capacity, dtype=bool)
+        fitted[:len(mask)] = mask
+        return fitted
+
+    def nbytes(self) -> int:
+        """常驻内存字节数（不含 mmap 文件）"""
+        return int(self.norms.nbytes + self.valid.nbytes + self._codes.nbytes + self._scales.nbytes)
+
+    def file_bytes(self) -> int:
+        return self.capacity * self.dim * 4 if self.quantized else 0
+
+    def close(self):
+        """释放 mmap 并删除全精度向量文件"""
+        if self._full is not None:
+            self._full = None
+            _remove_file(self.path)
@@ -92,18 +92,14 @@ class VideoPreprocessor:
         self.gemini_api_key = gemini_api_key or os.getenv("GEMINI_API_KEY")
         self.use_gpu = use_gpu
         self._progress: Dict[str, PreprocessProgress] = {}
-        self._embedding_model = None
+        self._text_encoder = None
     
-    def _get_embedding_model(self):
-        """延迟加载嵌入模型"""
-        if self._embedding_model is None:
-            try:
-                from sentence_transformers import SentenceTransformer
-                self._embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-                logger.info("嵌入模型加载完成")
-            except Exception as e:
-                logger.error(f"嵌入模型加载失败: {e}")
-        return self._embedding_model
+    def _get_text_encoder(self):
+        """延迟获取共享文本编码服务"""
+        if self._text_encoder is None:
+            from services.text_encoder import get_text_encoder
+            self._text_encoder = get_text_encoder()
+        return self._text_encoder
     
     async def preprocess(
         self,
@@ -169,32 +165,22 @@ class VideoPreprocessor:
     
     async def _detect_scenes(self, video_path: str) -> List[Tuple[float, float]]:
         """
-        使用 PySceneDetect 检测场景
+        检测场景（共享场景检测缓存）
         
         Returns:
             场景列表 [(start_time, end_time), ...]
         """
-        try:
-            from scenedetect import detect, ContentDetector, AdaptiveDetector
-            
-            # 使用内容检测器
-            scene_list = detect(video_path, ContentDetector(threshold=27.0))
-            
-            # 转换为时间列表
-            scenes = []
-            for scene in scene_list:
-                start_time = scene[0].get_seconds()
-                end_time = scene[1].get_seconds()
-                scenes.append((start_time, end_time))
-            
+        from services.scene_detection import SceneDetectionParams, get_scene_detector
+        
+        result = await get_scene_detector().detect(video_path, SceneDetectionParams.from_env())
+        if result is not None and result.duration > 0:
+            scenes = result.scenes()
             logger.info(f"检测到 {len(scenes)} 个场景")
             return scenes
-            
-        except Exception as e:
-            logger.error(f"场景检测失败: {e}")
-            # 回退：获取视频时长，作为单个场景
-            duration = await self._get_video_duration(video_path)
-            return [(0.0, duration)]
+        
+        # 回退：获取视频时长，作为单个场景
+        duration = await self._get_video_duration(video_path)
+        return [(0.0, duration)]
     
     async def _get_video_duration(self, video_path: str) -> float:
         """获取视频时长"""
@@ -403,18 +389,26 @@ class VideoPreprocessor:
             logger.info(f"使用本地视觉模型 ({vision.model}) 生成标签...")
             
             total = len(segments)
-            for i, segment in enumerate(segments):
-                try:
-                    if segment.thumbnail_path and Path(segment.thumbnail_path).exists():
-                        tags = await vision.analyze_image(segment.thumbnail_path)
-                        segment.tags = tags
-                        segment.description = tags.get("summary", "")
-                        logger.debug(f"片段 {i+1}/{total} 标签生成完成")
-                    else:
-                        segment.tags = self._generate_basic_tags(segment)
-                        segment.description = segment.tags.get("summary", "")
-                except Exception as e:
-                    logger.warning(f"本地视觉分析失败 {segment.segment_id}: {e}")
+            with_thumbnail = []
+            for segment in segments:
+                if segment.thumbnail_path and Path(segment.thumbnail_path).exists():
+                    with_thumbnail.append(segment)
+                else:
+                    segment.tags = self._generate_basic_tags(segment)
+                    segment.description = segment.tags.get("summary", "")
+            
+            # 缩略图并发批量分析
+            try:
+                results = await vision.batch_analyze(
+                    [s.thumbnail_path for s in with_thumbnail],
+                    progress_callback=lambda done, n: logger.debug(f"片段标签 {done}/{n} 完成"),
+                )
+                for segment, tags in zip(with_thumbnail, results):
+                    segment.tags = tags
+                    segment.description = tags.get("summary", "")
+            except Exception as e:
+                logger.warning(f"本地视觉分析失败: {e}")
+                for segment in with_thumbnail:
                     segment.tags = self._generate_basic_tags(segment)
                     segment.description = segment.tags.get("summary", "")
             
@@ -479,32 +473,29 @@ class VideoPreprocessor:
         self,
         segments: List[VideoSegmentInfo]
     ) -> List[VideoSegmentInfo]:
-        """生成向量嵌入"""
-        model = self._get_embedding_model()
-        if model is None:
+        """生成向量嵌入（一次批量编码全部片段文本）"""
+        texts = []
+        for segment in segments:
+            # 使用描述和标签生成文本
+            text_parts = []
+            if segment.description:
+                text_parts.append(segment.description)
+            if segment.tags:
+                for key, value in segment.tags.items():
+                    if key == "free_tags" and isinstance(value, list):
+                        text_parts.extend(value)
+                    elif isinstance(value, str) and value != "未知":
+                        text_parts.append(value)
+            texts.append(" ".join(text_parts) if text_parts else "video segment")
+        
+        # 素材描述是一次性文本，不写入查询向量缓存
+        embeddings = await self._get_text_encoder().encode(texts, use_cache=False)
+        if embeddings is None:
+            logger.error("生成嵌入失败: 文本编码服务不可用")
             return segments
         
-        for segment in segments:
-            try:
-                # 使用描述和标签生成文本
-                text_parts = []
-                if segment.description:
-                    text_parts.append(segment.description)
-                if segment.tags:
-                    for key, value in segment.tags.items():
-                        if key == "free_tags" and isinstance(value, list):
-                            text_parts.extend(value)
-                        elif isinstance(value, str) and value != "未知":
-                            text_parts.append(value)
-                
-                text = " ".join(text_parts) if text_parts else "video segment"
-                
-                # 生成嵌入
-                embedding = model.encode(text).tolist()
-                segment.tags["embedding"] = embedding
-                
-            except Exception as e:
-                logger.error(f"生成嵌入失败 {segment.segment_id}: {e}")
+        for segment, embedding in zip(segments, embeddings):
+            segment.tags["embedding"] = embedding
         
         return segments
     
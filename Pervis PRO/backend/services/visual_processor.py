@@ -1,6 +1,17 @@
 """
 视觉处理服务
 Phase 4: CLIP集成，视觉特征提取和画面分析
+
+帧采样与特征提取：
+- 顺序读取：逐帧 grab()，只对采样帧 retrieve() 解码输出，避免每个采样点
+  seek 后从 GOP 起点重新解码
+- 采样帧先缩小（长边不超过 VISUAL_FRAME_MAX_SIDE）再做颜色转换
+- 采样帧累积成批，每批一次 CLIP 前向（torch.inference_mode）
+
+配置（环境变量）：
+- VISUAL_BATCH_SIZE: 每批 CLIP 推理的帧数（默认 16）
+- VISUAL_FRAME_MAX_SIDE: 采样帧长边上限，0 为不缩放（默认 640）
+- VISUAL_NUM_THREADS: torch / OpenCV 线程数，0 为使用库默认值（默认 0）
 """
 
 from __future__ import annotations
@@ -55,6 +66,39 @@ else:
     
     Image = MockPILImage()
 
+
+def iter_sampled_frames(cap, frame_interval: int, max_side: int = 0):
+    """
+    顺序读取视频，产出采样帧
+    
+    每帧只 grab()（解复用 + 解码，不做输出转换），采样帧才 retrieve()；
+    采样帧在颜色转换前按长边缩小到 max_side。
+    
+    Args:
+        cap: 已打开的 cv2.VideoCapture
+        frame_interval: 采样间隔（帧）
+        max_side: 长边上限，0 为不缩放
+    
+    Yields:
+        (帧序号, BGR 帧)
+    """
+    frame_interval = max(1, int(frame_interval))
+    frame_idx = 0
+    while cap.grab():
+        if frame_idx % frame_interval == 0:
+            ret, frame = cap.retrieve()
+            if ret and frame is not None:
+                height, width = frame.shape[:2]
+                scale = max_side / max(height, width) if max_side else 1.0
+                if scale < 1.0:
+                    frame = cv2.resize(
+                        frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                        interpolation=cv2.INTER_AREA
+                    )
+                yield frame_idx, frame
+        frame_idx += 1
+
+
 class VisualProcessor:
     
     def __init__(self):
@@ -63,6 +107,9 @@ class VisualProcessor:
         self.preprocess = None
         self.device = None
         self.clip_available = CLIP_AVAILABLE
+        self.batch_size = max(1, int(os.getenv("VISUAL_BATCH_SIZE", "16")))
+        self.max_frame_side = int(os.getenv("VISUAL_FRAME_MAX_SIDE", "640"))
+        self.num_threads = int(os.getenv("VISUAL_NUM_THREADS", "0"))
         
         if self.clip_available:
             try:
@@ -84,6 +131,10 @@ class VisualProcessor:
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
             logger.info(f"使用设备: {self.device}")
             
+            if self.num_threads > 0:
+                torch.set_num_threads(self.num_threads)
+                cv2.setNumThreads(self.num_threads)
+            
             # 加载CLIP模型
             self.model, self.preprocess = clip.load(self.model_name, device=self.device)
             
@@ -155,49 +206,56 @@ class VisualProcessor:
             fps = cap.get(cv2.CAP_PROP_FPS)
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
             duration = total_frames / fps if fps > 0 else 0
+            dimensions = {
+                "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            }
             
             # 计算采样帧
             frame_interval = int(fps * sample_interval) if fps > 0 else 30
-            sample_frames = list(range(0, total_frames, frame_interval))
             
-            logger.info(f"视频时长: {duration:.1f}秒, 采样{len(sample_frames)}帧")
+            logger.info(f"视频时长: {duration:.1f}秒, 采样约{total_frames // max(1, frame_interval) + 1}帧")
             
             # 提取关键帧和特征
             keyframes = []
             visual_features = []
             pil_images_list = []
+            pending: List[Tuple[int, Any]] = []
+            
+            def flush():
+                # 一批采样帧一次 CLIP 前向
+                batch_features = self._extract_clip_features_batch([image for _, image in pending])
+                for (frame_idx, pil_image), image_features in zip(pending, batch_features):
+                    timestamp = frame_idx / fps if fps > 0 else 0.0
+                    
+                    if return_images:
+                        pil_images_list.append(pil_image)
+                    
+                    # 分析画面内容
+                    frame_analysis = self._analyze_frame_content(pil_image, timestamp, dimensions)
+                    
+                    keyframes.append({
+                        "frame_index": frame_idx,
+                        "timestamp": timestamp,
+                        "features": image_features.tolist() if image_features is not None else [],
+                        "analysis": frame_analysis
+                    })
+                    
+                    if image_features is not None:
+                        visual_features.append(image_features)
+                pending.clear()
             
-            for frame_idx in sample_frames:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-                ret, frame = cap.read()
-                
-                if not ret:
-                    continue
-                
-                # 转换为RGB格式
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                pil_image = Image.fromarray(frame_rgb)
-                
-                # 提取CLIP特征
-                image_features = self._extract_clip_features(pil_image)
-                
-                if return_images:
-                    pil_images_list.append(pil_image)
-                
-                # 分析画面内容
-                frame_analysis = self._analyze_frame_content(pil_image, frame_idx / fps)
-                
-                keyframes.append({
-                    "frame_index": frame_idx,
-                    "timestamp": frame_idx / fps,
-                    "features": image_features.tolist() if image_features is not None else [],
-                    "analysis": frame_analysis
-                })
-                
-                if image_features is not None:
-                    visual_features.append(image_features)
-            
-            cap.release()
+            try:
+                for frame_idx, frame in iter_sampled_frames(cap, frame_interval, self.max_frame_side):
+                    # 转换为RGB格式（已缩小）
+                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    pending.append((frame_idx, Image.fromarray(frame_rgb)))
+                    if len(pending) >= self.batch_size:
+                        flush()
+                if pending:
+                    flush()
+            finally:
+                cap.release()
             
             # 计算全局视觉特征
             global_features = self._compute_global_features(visual_features)
@@ -230,29 +288,42 @@ class VisualProcessor:
     
     def _extract_clip_features(self, image: Image.Image) -> Optional[np.ndarray]:
         """使用CLIP提取图像特征"""
+        return self._extract_clip_features_batch([image])[0]
+    
+    def _extract_clip_features_batch(self, images: List[Image.Image]) -> List[Optional[np.ndarray]]:
+        """使用CLIP批量提取图像特征（一次前向），批量失败时逐张重试"""
+        
+        if not images:
+            return []
         
         try:
             # 预处理图像
-            image_input = self.preprocess(image).unsqueeze(0).to(self.device)
+            image_input = torch.stack([self.preprocess(image) for image in images]).to(self.device)
             
             # 提取特征
-            with torch.no_grad():
+            with torch.inference_mode():
                 image_features = self.model.encode_image(image_input)
                 image_features = image_features / image_features.norm(dim=-1, keepdim=True)
             
-            return image_features.cpu().numpy()[0]
+            return list(image_features.float().cpu().numpy())
             
         except Exception as e:
-            logger.warning(f"CLIP特征提取失败: {e}")
-            return None
+            if len(images) == 1:
+                logger.warning(f"CLIP特征提取失败: {e}")
+                return [None]
+            logger.warning(f"CLIP批量特征提取失败，逐张重试: {e}")
+            return [self._extract_clip_features_batch([image])[0] for image in images]
     
-    def _analyze_frame_content(self, image: Image.Image, timestamp: float) -> Dict[str, Any]:
-        """分析单帧内容"""
+    def _analyze_frame_content(self, image: Image.Image, timestamp: float,
+                               dimensions: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """分析单帧内容（dimensions 为原始分辨率，图像可能已缩小）"""
         
         try:
             # 基础图像分析
             width, height = image.size
             aspect_ratio = width / height
+            if not dimensions or not dimensions.get("width") or not dimensions.get("height"):
+                dimensions = {"width": width, "height": height}
             
             # 转换为numpy数组进行分析
             img_array = np.array(image)
@@ -272,7 +343,7 @@ class VisualProcessor:
             
             return {
                 "timestamp": timestamp,
-                "dimensions": {"width": width, "height": height},
+                "dimensions": dimensions,
                 "aspect_ratio": aspect_ratio,
                 "brightness": float(brightness),
                 "contrast": float(contrast),
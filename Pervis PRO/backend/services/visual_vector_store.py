@@ -10,15 +10,20 @@ Task: 7.2 视觉向量存储
 - 支持视觉相似度搜索
 - 支持文本到图像的跨模态搜索
 - 持久化存储和加载
+- 向量按行存入向量列（矩阵化搜索），可选 float16 / int8 量化 + mmap 精确重排
 """
 
 import asyncio
 import json
 import logging
 import os
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, asdict, replace
 from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
+
+from .vector_index import VectorColumn, VectorQuantization
+
 logger = logging.getLogger(__name__)
 
 
@@ -56,23 +61,82 @@ class VisualSearchResult:
 # ============================================================
 
 class VisualVectorStore:
-    """视觉向量存储服务"""
+    """视觉向量存储服务
+    
+    KeyFrameVector 只保存元数据（vector 为空列表），向量本身在按行对齐的向量列中；
+    get / get_by_asset 返回时还原 vector。
+    quantization="float16"/"int8"（或 VISUAL_STORE_QUANTIZATION）启用量化向量，
+    全精度向量写入 storage_path 下的 mmap 文件用于精确重排。
+    """
+    
+    VECTOR_FILE = "visual_vectors.f32"
     
     def __init__(
         self,
         dimension: int = 768,
         storage_path: Optional[str] = None,
+        quantization: Optional[str] = None,
     ):
         self.dimension = dimension
         self.storage_path = storage_path or "data/visual_vectors"
+        self.quantization = VectorQuantization(
+            quantization or os.getenv("VISUAL_STORE_QUANTIZATION", VectorQuantization.NONE.value)
+        )
         
         # 内存存储
         self._vectors: Dict[str, KeyFrameVector] = {}
         self._asset_index: Dict[str, List[str]] = {}  # asset_id -> [keyframe_ids]
+        self._rows: Dict[str, int] = {}               # keyframe_id -> 行号
+        self._row_ids: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+        self._column = self._new_column()
+        
+        # 变更代数：每次增删递增，作为搜索结果缓存键的一部分
+        self.generation = 0
         
         # 确保存储目录存在
         os.makedirs(self.storage_path, exist_ok=True)
     
+    def _new_column(self) -> VectorColumn:
+        return VectorColumn(
+            self.quantization,
+            path=os.path.join(self.storage_path, self.VECTOR_FILE),
+            dim=self.dimension,
+        )
+    
+    def _fit_dimension(self, vector: List[float]) -> List[float]:
+        """截断或补零到存储维度"""
+        if len(vector) > self.dimension:
+            return vector[:self.dimension]
+        return list(vector) + [0.0] * (self.dimension - len(vector))
+    
+    def _put(self, kf_vector: KeyFrameVector, vector: List[float]):
+        """写入元数据与向量列"""
+        keyframe_id = kf_vector.keyframe_id
+        row = self._rows.get(keyframe_id)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+                self._row_ids[row] = keyframe_id
+            else:
+                row = len(self._row_ids)
+                self._row_ids.append(keyframe_id)
+            self._rows[keyframe_id] = row
+        self._column.set(row, vector)
+        self._vectors[keyframe_id] = kf_vector
+    
+    def _drop(self, keyframe_id: str):
+        """释放关键帧的行"""
+        row = self._rows.pop(keyframe_id, None)
+        if row is not None:
+            self._column.clear(row)
+            self._row_ids[row] = None
+            self._free_rows.append(row)
+    
+    def _with_vector(self, kf_vector: KeyFrameVector) -> KeyFrameVector:
+        """还原 vector 字段"""
+        return replace(kf_vector, vector=self._column.get(self._rows[kf_vector.keyframe_id]))
+    
     def add(
         self,
         keyframe_id: str,
@@ -105,10 +169,7 @@ class VisualVectorStore:
                 f"向量维度不匹配: 期望 {self.dimension}, 实际 {len(vector)}"
             )
             # 尝试调整维度
-            if len(vector) > self.dimension:
-                vector = vector[:self.dimension]
-            else:
-                vector = vector + [0.0] * (self.dimension - len(vector))
+            vector = self._fit_dimension(vector)
         
         kf_vector = KeyFrameVector(
             keyframe_id=keyframe_id,
@@ -117,11 +178,12 @@ class VisualVectorStore:
             timestamp=timestamp,
             timecode=timecode,
             thumbnail_path=thumbnail_path,
-            vector=vector,
+            vector=[],
             metadata=metadata or {},
         )
         
-        self._vectors[keyframe_id] = kf_vector
+        self._put(kf_vector, vector)
+        self.generation += 1
         
         # 更新素材索引
         if asset_id not in self._asset_index:
@@ -133,12 +195,13 @@ class VisualVectorStore:
     
     def get(self, keyframe_id: str) -> Optional[KeyFrameVector]:
         """获取关键帧向量"""
-        return self._vectors.get(keyframe_id)
+        kf_vector = self._vectors.get(keyframe_id)
+        return self._with_vector(kf_vector) if kf_vector else None
     
     def get_by_asset(self, asset_id: str) -> List[KeyFrameVector]:
         """获取素材的所有关键帧向量"""
         keyframe_ids = self._asset_index.get(asset_id, [])
-        return [self._vectors[kf_id] for kf_id in keyframe_ids if kf_id in self._vectors]
+        return [self._with_vector(self._vectors[kf_id]) for kf_id in keyframe_ids if kf_id in self._vectors]
     
     def remove(self, keyframe_id: str) -> bool:
         """删除关键帧向量"""
@@ -146,6 +209,8 @@ class VisualVectorStore:
             return False
         
         kf_vector = self._vectors.pop(keyframe_id)
+        self._drop(keyframe_id)
+        self.generation += 1
         
         # 更新素材索引
         if kf_vector.asset_id in self._asset_index:
@@ -163,7 +228,10 @@ class VisualVectorStore:
         for kf_id in keyframe_ids:
             if kf_id in self._vectors:
                 del self._vectors[kf_id]
+                self._drop(kf_id)
                 count += 1
+        if count:
+            self.generation += 1
         return count
     
     def search(
@@ -185,34 +253,41 @@ class VisualVectorStore:
         Returns:
             搜索结果列表
         """
-        if not self._vectors:
+        if not self._vectors or not query_vector:
             return []
         
-        results = []
+        query = np.asarray(self._fit_dimension(query_vector), dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm == 0:
+            return []
         
-        for kf_id, kf_vector in self._vectors.items():
-            # 素材过滤
-            if asset_filter and kf_vector.asset_id not in asset_filter:
-                continue
-            
-            # 计算相似度
-            similarity = self._cosine_similarity(query_vector, kf_vector.vector)
-            
-            if similarity >= min_similarity:
-                results.append(VisualSearchResult(
-                    keyframe_id=kf_id,
-                    asset_id=kf_vector.asset_id,
-                    similarity=similarity,
-                    timestamp=kf_vector.timestamp,
-                    timecode=kf_vector.timecode,
-                    thumbnail_path=kf_vector.thumbnail_path,
-                    metadata=kf_vector.metadata,
-                ))
+        mask = None
+        if asset_filter:
+            mask = np.zeros(len(self._row_ids), dtype=bool)
+            for asset_id in asset_filter:
+                for kf_id in self._asset_index.get(asset_id, []):
+                    row = self._rows.get(kf_id)
+                    if row is not None:
+                        mask[row] = True
         
-        # 按相似度排序
-        results.sort(key=lambda x: x.similarity, reverse=True)
+        [(rows, scores)] = self._column.search((query / norm)[None, :], [mask], top_k)
         
-        return results[:top_k]
+        results = []
+        for row, similarity in zip(rows.tolist(), scores.tolist()):
+            if similarity < min_similarity:
+                break
+            kf_vector = self._vectors[self._row_ids[row]]
+            results.append(VisualSearchResult(
+                keyframe_id=kf_vector.keyframe_id,
+                asset_id=kf_vector.asset_id,
+                similarity=similarity,
+                timestamp=kf_vector.timestamp,
+                timecode=kf_vector.timecode,
+                thumbnail_path=kf_vector.thumbnail_path,
+                metadata=kf_vector.metadata,
+            ))
+        
+        return results
     
     async def search_by_text(
         self,
@@ -271,25 +346,6 @@ class VisualVectorStore:
         return self.search(image_vector, top_k=top_k, asset_filter=asset_filter)
 
     
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """计算余弦相似度"""
-        if not vec1 or not vec2:
-            return 0.0
-        
-        # 确保维度一致
-        min_len = min(len(vec1), len(vec2))
-        vec1 = vec1[:min_len]
-        vec2 = vec2[:min_len]
-        
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        norm1 = sum(a * a for a in vec1) ** 0.5
-        norm2 = sum(b * b for b in vec2) ** 0.5
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        return dot_product / (norm1 * norm2)
-    
     def save(self, filename: Optional[str] = None) -> bool:
         """
         保存到文件
@@ -307,7 +363,7 @@ class VisualVectorStore:
             data = {
                 "dimension": self.dimension,
                 "vectors": {
-                    kf_id: asdict(kf_vector)
+                    kf_id: asdict(self._with_vector(kf_vector))
                     for kf_id, kf_vector in self._vectors.items()
                 },
                 "asset_index": self._asset_index,
@@ -347,9 +403,16 @@ class VisualVectorStore:
             self.dimension = data.get("dimension", self.dimension)
             self._asset_index = data.get("asset_index", {})
             
+            self._column.close()
+            self._column = self._new_column()
             self._vectors = {}
+            self._rows = {}
+            self._row_ids = []
+            self._free_rows = []
             for kf_id, kf_data in data.get("vectors", {}).items():
-                self._vectors[kf_id] = KeyFrameVector(**kf_data)
+                kf_vector = KeyFrameVector(**{**kf_data, "vector": []})
+                self._put(kf_vector, self._fit_dimension(kf_data.get("vector") or []))
+            self.generation += 1
             
             logger.info(f"视觉向量存储已加载: {filepath}, 共 {len(self._vectors)} 条")
             return True
@@ -375,6 +438,9 @@ class VisualVectorStore:
             "total_assets": len(self._asset_index),
             "dimension": self.dimension,
             "storage_path": self.storage_path,
+            "quantization": self.quantization.value,
+            "vector_memory_bytes": self._column.nbytes(),
+            "vector_file_bytes": self._column.file_bytes(),
         }
 
 
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+批量处理调度测试
+验证优先级老化防饿死、准入控制、资源池并发上限与任务类型路由
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.batch_processor as batch_processor
+from services.batch_processor import (
+    POOL_CPU,
+    POOL_IO,
+    POOL_LLM,
+    AdmissionRejectedError,
+    AgingPriorityQueue,
+    BatchProcessor,
+    BatchTask,
+    TaskPriority,
+    TaskStatus,
+)
+from services.task_registry import TaskRegistry, TaskRegistryConfig
+
+
+def _task(task_id: str, priority: TaskPriority) -> BatchTask:
+    return BatchTask(
+        id=task_id,
+        task_type="transcription",
+        asset_id="a1",
+        file_path="/tmp/a1.mp4",
+        parameters={},
+        priority=priority,
+        status=TaskStatus.PENDING,
+        created_at=time.time(),
+    )
+
+
+class TestAgingPriorityQueue:
+    """带老化的优先级队列测试"""
+
+    def test_priority_then_aging(self):
+        """测试高优先级先出队，低优先级等待足够久后排到新来的高优先级之前"""
+        queue = AgingPriorityQueue(aging_seconds=10)
+        queue.put(_task("low", TaskPriority.LOW), enqueued_at=0)          # 键 -10
+        queue.put(_task("urgent_new", TaskPriority.URGENT), enqueued_at=35)  # 键 -5
+        queue.put(_task("urgent_old", TaskPriority.URGENT), enqueued_at=25)  # 键 -15
+
+        async def drain():
+            return [(await queue.get()).id for _ in range(3)]
+
+        assert asyncio.run(drain()) == ["urgent_old", "low", "urgent_new"]
+
+    def test_remove_skips_task(self):
+        """测试惰性删除的任务不会出队，也不计入队列长度"""
+        queue = AgingPriorityQueue()
+        queue.put(_task("t1", TaskPriority.NORMAL), enqueued_at=0)
+        queue.put(_task("t2", TaskPriority.NORMAL), enqueued_at=1)
+        assert queue.remove("t1").id == "t1"
+        assert queue.qsize() == 1
+        assert asyncio.run(queue.get()).id == "t2"
+
+
+class TestBatchProcessorScheduling:
+    """批量处理器调度测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path, monkeypatch):
+        """测试前准备"""
+        self.registry = TaskRegistry(TaskRegistryConfig(db_path=str(tmp_path / "tasks.db"), flush_interval=60))
+        monkeypatch.setattr(batch_processor, "get_task_registry", lambda: self.registry)
+        monkeypatch.setattr(os, "getloadavg", lambda: (0.0, 0.0, 0.0), raising=False)
+        self.processors = []
+        yield
+        for processor in self.processors:
+            processor.thread_executor.shutdown(wait=False)
+            processor.process_executor.shutdown(wait=False)
+        self.registry.close()
+
+    def _processor(self, **kwargs) -> BatchProcessor:
+        processor = BatchProcessor(**kwargs)
+        self.processors.append(processor)
+        return processor
+
+    def test_task_types_routed_to_pools(self):
+        """测试任务类型路由：转录/视觉分析 → CPU，视频处理 → IO，视觉标签 → LLM"""
+        processor = self._processor(cpu_workers=1)
+        assert processor._pool_for("transcription").name == POOL_CPU
+        assert processor._pool_for("visual_analysis").name == POOL_CPU
+        assert processor._pool_for("video_processing").name == POOL_IO
+        assert processor._pool_for("visual_tagging").name == POOL_LLM
+
+    def test_admission_control(self, monkeypatch):
+        """测试队列上限、系统负载与资源池积压的准入控制"""
+        processor = self._processor(cpu_workers=1, llm_slots=1, max_queue_size=60)
+
+        async def scenario():
+            for i in range(50):
+                await processor.submit_task("visual_tagging", f"a{i}", "/tmp/x.jpg")
+            with pytest.raises(AdmissionRejectedError, match="积压"):
+                await processor.submit_task("visual_tagging", "a50", "/tmp/x.jpg")
+            await processor.submit_task("transcription", "b0", "/tmp/x.mp4")
+
+            monkeypatch.setattr(os, "getloadavg", lambda: (1000.0, 0.0, 0.0), raising=False)
+            with pytest.raises(AdmissionRejectedError, match="负载"):
+                await processor.submit_task("transcription", "b1", "/tmp/x.mp4")
+            await processor.submit_task("transcription", "b2", "/tmp/x.mp4", priority=TaskPriority.HIGH)
+
+            for i in range(8):
+                await processor.submit_task("video_processing", f"c{i}", "/tmp/x.mp4", priority=TaskPriority.URGENT)
+            with pytest.raises(AdmissionRejectedError, match="队列已满"):
+                await processor.submit_task("video_processing", "c8", "/tmp/x.mp4", priority=TaskPriority.URGENT)
+
+        asyncio.run(scenario())
+        assert processor.stats["rejected_tasks"] == 3
+        assert processor.type_metrics["visual_tagging"].rejected == 1
+
+    def test_pool_concurrency_limits(self, monkeypatch):
+        """测试每个资源池的并发不超过其上限，任务全部完成"""
+        processor = self._processor(cpu_workers=2, max_concurrent_tasks=3, llm_slots=1)
+        active = {POOL_CPU: 0, POOL_IO: 0, POOL_LLM: 0}
+        peak = dict(active)
+
+        async def execute(task):
+            pool = batch_processor.TASK_POOLS[task.task_type]
+            active[pool] += 1
+            peak[pool] = max(peak[pool], active[pool])
+            await asyncio.sleep(0.02)
+            active[pool] -= 1
+            return {"ok": True}
+
+        monkeypatch.setattr(processor, "_execute_task", execute)
+
+        async def scenario():
+            await processor.start()
+            for task_type in ("transcription", "video_processing", "visual_tagging"):
+                for i in range(6):
+                    await processor.submit_task(task_type, f"{task_type}_{i}", "/tmp/x")
+            for _ in range(200):
+                if processor.registry.count(status="completed", source="batch") == 18:
+                    break
+                await asyncio.sleep(0.01)
+            status = await processor.get_queue_status()
+            await processor.stop()
+            return status
+
+        status = asyncio.run(scenario())
+        assert peak == {POOL_CPU: 2, POOL_IO: 3, POOL_LLM: 1}
+        assert status["per_type"]["visual_tagging"]["completed"] == 6
+        assert status["pools"][POOL_LLM]["concurrency"] == 1
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+批量素材召回测试
+验证批量向量检索与逐条检索一致，以及跨场次去重
+"""
+
+import asyncio
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.agents.storyboard_agent import AssetCandidate, StoryboardAgentService
+from services.milvus_store import MemoryVideoStore, VideoSegment
+from services.text_encoder import TextEncoderService
+
+
+class KeywordModel:
+    """按关键词生成查询向量的嵌入模型"""
+
+    def encode(self, queries):
+        return np.array([[1.0, 0.0] if "战斗" in q else [0.0, 1.0] for q in queries])
+
+
+class RecordingKeywordModel(KeywordModel):
+    """记录实际编码的查询"""
+
+    def __init__(self):
+        self.queries = []
+
+    def encode(self, queries):
+        self.queries.extend(queries)
+        return super().encode(queries)
+
+
+class TestBatchRecall:
+    """批量召回测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """测试前准备"""
+        rng = random.Random(3)
+        self.store = MemoryVideoStore()
+        self.store._initialized = True
+        segments = [
+            VideoSegment(
+                f"s{i}", "v", "p", 0, 1, rng.uniform(1, 10),
+                tags={"mood": rng.choice(["紧张", "平静"])},
+                embedding=[rng.gauss(0, 1) for _ in range(16)] if i % 5 else None,
+            )
+            for i in range(200)
+        ]
+        asyncio.run(self.store.insert_batch(segments))
+        asyncio.run(self.store.delete("s7"))
+        self.rng = rng
+
+    @pytest.mark.asyncio
+    async def test_search_batch_matches_search(self):
+        """测试批量检索与逐条检索结果一致（含过滤条件）"""
+        queries = [[self.rng.gauss(0, 1) for _ in range(16)] for _ in range(6)]
+        filters = [None, {"mood": "紧张"}, {"max_duration": 4}, None, {"mood": "平静", "min_duration": 3}, None]
+
+        batch = await self.store.search_batch(queries, top_k=8, filters=filters)
+        for results, query, query_filters in zip(batch, queries, filters):
+            expected = await self.store.search(query, top_k=8, filters=query_filters)
+            assert [r.segment.segment_id for r in results] == [r.segment.segment_id for r in expected]
+            assert [r.score for r in results] == pytest.approx([r.score for r in expected], abs=1e-5)
+
+    @pytest.mark.asyncio
+    async def test_cross_scene_deduplication(self):
+        """测试跨场次去重后素材不重复推荐"""
+        store = MemoryVideoStore()
+        store._initialized = True
+        for i in range(12):
+            await store.insert(VideoSegment(f"c{i}", "v", "p", 0, 1, 1, embedding=[1.0, 0.1 * i]))
+
+        agent = StoryboardAgentService()
+        agent._video_store = store
+        agent._text_encoder = TextEncoderService(model=KeywordModel())
+        scenes = [{"scene_id": f"scene_{n}", "query": "战斗"} for n in range(3)]
+
+        plain = await agent.recall_assets_batch(scenes, strategy="vector_only")
+        assert all(
+            [c.asset_id for c in r.candidates] == [c.asset_id for c in plain[0].candidates]
+            for r in plain
+        )
+
+        unique = await agent.recall_assets_batch(scenes, strategy="vector_only", deduplicate=True)
+        asset_ids = [c.asset_id for r in unique for c in r.candidates]
+        assert len(asset_ids) == len(set(asset_ids)) == 12
+        # 场次轮流沿各自的多样性顺序取素材
+        assert [len(r.candidates) for r in unique] == [4, 4, 4]
+        assert [r.candidates[0].asset_id for r in unique] == [c.asset_id for c in plain[0].candidates[:3]]
+        assert [c.rank for c in unique[2].candidates] == [1, 2, 3, 4]
+
+    def test_assign_unique_keeps_mmr_order(self):
+        """测试去重分配保留每个场次的 MMR 顺序，而不是按全局得分重排"""
+        agent = StoryboardAgentService()
+
+        def cand(asset_id, score):
+            return AssetCandidate(candidate_id=asset_id, asset_id=asset_id, asset_path="p", score=score, rank=0)
+
+        # 场次 0 的 MMR 顺序把低分的 b 提到高分的 c 前面
+        ranked = [
+            [cand("a", 0.9), cand("b", 0.5), cand("c", 0.8)],
+            [cand("a", 0.95), cand("c", 0.7), cand("d", 0.6)],
+        ]
+        assigned = agent._assign_unique(ranked)
+        assert [c.asset_id for c in assigned[0]] == ["a", "b"]
+        assert [c.asset_id for c in assigned[1]] == ["c", "d"]
+
+    @pytest.mark.asyncio
+    async def test_empty_query_skips_vector_search(self):
+        """测试空白查询不编码、不做向量召回，只保留标签召回"""
+        store = MemoryVideoStore()
+        store._initialized = True
+        await store.insert(VideoSegment("t0", "v", "p", 0, 1, 1, tags={"mood": "紧张"}, embedding=[0.0, 1.0]))
+        await store.insert(VideoSegment("e0", "v", "p", 0, 1, 1, tags={"mood": "平静"}, embedding=[1.0, 0.0]))
+
+        model = RecordingKeywordModel()
+        agent = StoryboardAgentService()
+        agent._video_store = store
+        agent._text_encoder = TextEncoderService(model=model)
+        scenes = [
+            {"scene_id": "blank", "query": "   ", "tags": {"mood": "紧张"}},
+            {"scene_id": "missing"},
+            {"scene_id": "fight", "query": "战斗"},
+        ]
+
+        results = await agent.recall_assets_batch(scenes)
+        assert model.queries == ["战斗"]
+        assert [c.asset_id for c in results[0].candidates] == ["t0"]
+        assert results[1].candidates == [] and not results[1].has_match
+        assert results[2].candidates[0].asset_id == "e0"
+
+        single = await agent.recall_assets("blank", "", tags={"mood": "紧张"})
+        assert model.queries == ["战斗"]
+        assert [c.asset_id for c in single.candidates] == ["t0"]
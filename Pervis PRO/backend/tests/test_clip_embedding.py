@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+CLIP 批量嵌入测试
+验证 HuggingFace 路径按批前向、结果顺序与失败项，以及 Ollama 路径的并发上限
+"""
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.clip_embedding import CLIPConfig, CLIPEmbeddingService
+
+
+class RecordingHFService(CLIPEmbeddingService):
+    """以路径编号代替模型输出、记录每批大小的服务"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._initialized = True
+        self.forward_batches = []
+        self.preprocess_threads = set()
+
+    def _preprocess_images(self, image_paths):
+        self.preprocess_threads.add(threading.current_thread().name)
+        valid = [i for i, path in enumerate(image_paths) if not path.startswith("missing")]
+        return [float(image_paths[i].split("_")[1]) for i in valid], valid
+
+    def _image_features(self, pixel_values):
+        self.forward_batches.append(len(pixel_values))
+        return [[value, 1.0] for value in pixel_values]
+
+    def _text_features(self, texts):
+        self.forward_batches.append(len(texts))
+        return [[float(len(text))] for text in texts]
+
+
+class TestCLIPBatching:
+    """CLIP 批量嵌入测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """测试前准备"""
+        self.config = CLIPConfig(use_huggingface=True, batch_size=4, prefetch_batches=2, decode_workers=2)
+        self.service = RecordingHFService(self.config)
+
+    def test_images_batched_in_order(self):
+        """测试图像按批前向、结果与输入一一对应，失败项为 None"""
+        paths = [f"img_{i}" for i in range(10)]
+        paths[5] = "missing_5"
+
+        results = asyncio.run(self.service.embed_images_batch(paths))
+
+        assert self.service.forward_batches == [4, 3, 2]
+        assert results[5] is None
+        assert [r[0] for i, r in enumerate(results) if i != 5] == [0, 1, 2, 3, 4, 6, 7, 8, 9]
+        assert all(name.startswith("clip-decode") for name in self.service.preprocess_threads)
+
+    def test_texts_batched(self):
+        """测试文本按 batch_size 分批"""
+        results = asyncio.run(self.service.embed_texts_batch(["a", "bb", "ccc", "dddd", "eeeee"]))
+
+        assert self.service.forward_batches == [4, 1]
+        assert results == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+        assert asyncio.run(self.service.embed_text("xy")) == [2.0]
+
+    def test_ollama_concurrency_bounded(self, monkeypatch):
+        """测试 Ollama 图像描述请求并发不超过 max_concurrency"""
+        service = CLIPEmbeddingService(CLIPConfig(max_concurrency=3))
+        service._initialized = True
+        active = {"now": 0, "peak": 0}
+
+        async def describe(client, image_path):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+            return None if image_path == "bad" else f"desc {image_path}"
+
+        class RecordingEmbedding:
+            async def embed_batch(self, texts, batch_size=10, show_progress=False):
+                return [[float(text.split()[1])] for text in texts]
+
+        import services.ollama_embedding as ollama_embedding
+        monkeypatch.setattr(service, "_describe_image_ollama", describe)
+        monkeypatch.setattr(ollama_embedding, "get_embedding_service", lambda: RecordingEmbedding())
+
+        paths = ["1", "2", "bad", "4", "5", "6", "7"]
+        results = asyncio.run(service.embed_images_batch(paths))
+
+        assert active["peak"] == 3
+        assert results == [[1.0], [2.0], None, [4.0], [5.0], [6.0], [7.0]]
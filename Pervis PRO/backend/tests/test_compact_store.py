@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑列式存储测试
+验证物化的 VideoSegment 与写入时一致，紧凑模式的搜索与字典模式一致
+"""
+
+import os
+import random
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.milvus_store import MemoryVideoStore, VideoSegment
+
+
+def make_segment(rng: random.Random, i: int) -> VideoSegment:
+    return VideoSegment(
+        f"s{i}", f"v{i % 3}", f"/videos/v{i % 3}.mp4", i * 1.5, i * 1.5 + 2, 2.0,
+        tags={
+            "mood": rng.choice(["紧张", "平静"]),
+            "characters": rng.sample(["男", "女", "儿童"], rng.randint(0, 2)),
+            "shot_size": rng.choice(["近景", "远景", "UNKNOWN"]),
+        },
+        embedding=[rng.gauss(0, 1) for _ in range(8)] if i % 4 else None,
+        thumbnail_path=f"/thumbs/s{i}.jpg" if i % 2 else None,
+    )
+
+
+class TestCompactStore:
+    """紧凑存储测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """测试前准备"""
+        self.rng = random.Random(5)
+
+    @pytest.mark.asyncio
+    async def test_materialized_segment_round_trip(self):
+        """测试物化结果与原片段一致（含不可驻留的标签值）"""
+        store = MemoryVideoStore(compact=True)
+        created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+        segment = VideoSegment(
+            "a", "v", "/videos/a.mp4", 1.25, 3.5, 2.25,
+            tags={"flag": True, "count": 1, "extra": {"k": [1, 2]}, "vfx": ["雨", "雾"]},
+            embedding=[3.0, 4.0], description="雨夜", created_at=created_at,
+        )
+        await store.insert(segment)
+
+        restored = await store.get("a")
+        assert restored.tags == segment.tags
+        assert list(restored.tags) == list(segment.tags)
+        assert type(restored.tags["flag"]) is bool and type(restored.tags["count"]) is int
+        assert restored.embedding == pytest.approx([3.0, 4.0], abs=1e-6)
+        assert restored.created_at == created_at
+        assert (restored.video_path, restored.description, restored.thumbnail_path) == ("/videos/a.mp4", "雨夜", None)
+        assert (restored.start_time, restored.end_time, restored.duration) == (1.25, 3.5, 2.25)
+
+    @pytest.mark.asyncio
+    async def test_compact_matches_dict_store(self):
+        """测试插入/替换/删除后搜索结果与字典模式一致"""
+        stores = [MemoryVideoStore(compact=False), MemoryVideoStore(compact=True)]
+        segments = [make_segment(self.rng, i) for i in range(120)]
+        replacements = [make_segment(self.rng, i) for i in range(0, 120, 7)]
+        for store in stores:
+            await store.insert_batch(segments)
+            await store.insert_batch(replacements)
+            for i in range(0, 120, 5):
+                await store.delete(f"s{i}")
+
+        query = [self.rng.gauss(0, 1) for _ in range(8)]
+        plain, compact = stores
+        for filters in (None, {"mood": "紧张"}, {"video_id": "v1", "characters": ["女"]}):
+            expected = await plain.search(query, top_k=10, filters=filters)
+            actual = await compact.search(query, top_k=10, filters=filters)
+            assert [r.segment.segment_id for r in actual] == [r.segment.segment_id for r in expected]
+            assert [r.score for r in actual] == pytest.approx([r.score for r in expected], abs=1e-5)
+
+        tag_query = {"mood": "平静", "characters": ["男"]}
+        expected = await plain.search_by_tags(tag_query, top_k=20)
+        actual = await compact.search_by_tags(tag_query, top_k=20)
+        assert [r.segment.segment_id for r in actual] == [r.segment.segment_id for r in expected]
+        assert compact.aggregates.coverage() == plain.aggregates.coverage()
+        assert await compact.count() == await plain.count()
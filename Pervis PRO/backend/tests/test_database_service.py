@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+异步数据库服务层测试
+验证 AsyncSession 下的 CRUD、批量提交与回滚、处理元数据读写，以及两种会话模式
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from app.sqlite_mode import create_async_database_engine
+from database import Base
+from models.base import AssetCreate
+from services.database_service import DatabaseService
+
+
+class TestDatabaseService:
+    """DatabaseService 异步数据层测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path, monkeypatch):
+        """测试前准备"""
+        url = f"sqlite:///{tmp_path / 'service.db'}"
+        sync_engine = create_engine(url)
+        Base.metadata.create_all(sync_engine)
+        sync_engine.dispose()
+
+        self.engine = create_async_database_engine(url, mode="production")
+        self.commits = 0
+
+        @event.listens_for(self.engine.sync_engine, "commit")
+        def _count(conn):
+            self.commits += 1
+
+        self.factory = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        monkeypatch.setattr(database, "_async_session_factory", self.factory)
+        yield
+        asyncio.run(self.engine.dispose())
+
+    @staticmethod
+    def _asset_data(name="clip.mp4"):
+        return AssetCreate(project_id="p1", filename=name, mime_type="video/mp4")
+
+    def test_asset_crud(self):
+        """测试每个操作独立会话时的创建、查询与更新"""
+        async def scenario():
+            service = DatabaseService()
+            asset = await service.create_asset(self._asset_data())
+            await service.update_asset_status(asset.id, "processing", 40)
+            await service.update_asset_paths(asset.id, proxy_path="/tmp/proxy.mp4")
+
+            loaded = await service.get_asset(asset.id)
+            many = await service.get_assets([asset.id, "missing"])
+            return asset, loaded, many
+
+        asset, loaded, many = asyncio.run(scenario())
+        assert loaded.filename == "clip.mp4"
+        assert loaded.processing_status == "processing"
+        assert loaded.processing_progress == 40
+        assert loaded.proxy_path == "/tmp/proxy.mp4"
+        assert [a.id for a in many] == [asset.id]
+
+    def test_batch_commits_once(self):
+        """测试 batch() 内的写入只提交一次"""
+        async def scenario():
+            service = DatabaseService()
+            asset = await service.create_asset(self._asset_data())
+            commits_before = self.commits
+            async with service.batch():
+                for i in range(20):
+                    await service.create_asset_segment(asset.id, float(i), float(i + 1), f"片段 {i}", {})
+            return asset, self.commits - commits_before, await service.get_asset_segments(asset.id)
+
+        asset, commits, segments = asyncio.run(scenario())
+        assert commits == 1
+        assert len(segments) == 20
+        assert all(s.asset_id == asset.id for s in segments)
+
+    def test_batch_rolls_back_on_error(self):
+        """测试 batch() 内出错时整体回滚"""
+        async def scenario():
+            service = DatabaseService()
+            asset = await service.create_asset(self._asset_data())
+            with pytest.raises(RuntimeError):
+                async with service.batch():
+                    await service.create_asset_segment(asset.id, 0.0, 1.0, "片段", {})
+                    raise RuntimeError("中断")
+            return await service.get_asset_segments(asset.id)
+
+        assert asyncio.run(scenario()) == []
+
+    def test_metadata_round_trip_and_search(self):
+        """测试转录与视觉数据写入 processing_metadata 并可检索"""
+        transcription = {
+            "full_text": "Hello world from the city",
+            "language": "en",
+            "segments": [
+                {"id": "s1", "start_time": 0.0, "end_time": 2.0, "text": "Hello world", "confidence": 0.9},
+                {"id": "s2", "start_time": 2.0, "end_time": 4.0, "text": "from the city", "confidence": 0.8},
+            ],
+        }
+        visual = {"keyframes": [{"timestamp": 1.0}]}
+
+        async def scenario():
+            service = DatabaseService()
+            asset = await service.create_asset(self._asset_data())
+            await service.store_transcription_data(asset.id, transcription)
+            await service.store_visual_data(asset.id, visual)
+            return (
+                await service.get_transcription_data(asset.id),
+                await service.get_visual_data(asset.id),
+                await service.search_transcription_text("city"),
+            )
+
+        stored_transcription, stored_visual, hits = asyncio.run(scenario())
+        assert stored_transcription == transcription
+        assert stored_visual == visual
+        assert len(hits) == 1
+        assert [s["segment_id"] for s in hits[0]["matching_segments"]] == ["s2"]
+
+    def test_request_session_is_shared(self):
+        """测试传入请求级 AsyncSession 时所有操作共用该会话"""
+        async def scenario():
+            async with self.factory() as session:
+                service = DatabaseService(session)
+                asset = await service.create_asset(self._asset_data())
+                in_session = asset in session
+                loaded = await service.get_asset(asset.id)
+            return in_session, loaded
+
+        in_session, asset = asyncio.run(scenario())
+        assert in_session
+        assert asset.filename == "clip.mp4"
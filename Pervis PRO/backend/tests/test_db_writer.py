@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite 并发模式与单写线程队列测试
+验证 production 模式的 PRAGMA 与连接池、写入合并、批量提交与失败隔离
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.sqlite_mode import create_sqlite_engine
+from services.db_writer import DatabaseWriter
+
+
+class TestSQLiteMode:
+    """SQLite 引擎模式测试"""
+
+    def test_production_mode_pragmas(self, tmp_path):
+        """测试 production 模式启用 WAL 与连接池"""
+        engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'app.db'}", mode="production")
+        assert isinstance(engine.pool, QueuePool)
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1      # NORMAL
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+        # 每个线程的会话使用各自的连接
+        connections = set()
+
+        def worker():
+            with engine.connect() as conn:
+                connections.add(id(conn.connection.dbapi_connection))
+                barrier.wait()
+
+        barrier = threading.Barrier(3)
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(connections) == 3
+        engine.dispose()
+
+    def test_static_and_memory_modes(self, tmp_path):
+        """测试 static 模式与内存数据库保持共享单连接"""
+        assert isinstance(create_sqlite_engine(f"sqlite:///{tmp_path / 'a.db'}", mode="static").pool, StaticPool)
+        assert isinstance(create_sqlite_engine("sqlite://", mode="production").pool, StaticPool)
+        assert isinstance(create_sqlite_engine("sqlite:///:memory:", mode="production").pool, StaticPool)
+
+
+class TestDatabaseWriter:
+    """单写线程写入队列测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        self.engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'writer.db'}", mode="production")
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE tasks (id TEXT PRIMARY KEY, progress REAL, status TEXT)"))
+            for i in range(4):
+                conn.execute(text("INSERT INTO tasks VALUES (:id, 0, 'pending')"), {"id": f"t{i}"})
+        self.writer = DatabaseWriter(sessionmaker(bind=self.engine), max_batch=64)
+        yield
+        self.writer.close()
+        self.engine.dispose()
+
+    def _fetch(self, sql):
+        with self.engine.connect() as conn:
+            return conn.execute(text(sql)).fetchall()
+
+    def test_keyed_writes_coalesce(self):
+        """测试同 key 的排队写入只落库最新值，且全部 Future 完成"""
+        gate = threading.Event()
+        self.writer.submit(lambda session: gate.wait(5))   # 阻塞写线程，让后续写入排队
+
+        futures = [
+            self.writer.execute(
+                "UPDATE tasks SET progress = :p WHERE id = 't0'", {"p": p}, key=("tasks", "t0")
+            )
+            for p in range(1, 51)
+        ]
+        final = self.writer.execute("UPDATE tasks SET status = 'done' WHERE id = 't0'")
+        gate.set()
+        final.result(timeout=5)
+
+        assert all(f.done() for f in futures)
+        assert self._fetch("SELECT progress, status FROM tasks WHERE id = 't0'") == [(50.0, "done")]
+        stats = self.writer.stats()
+        assert stats["coalesced"] == 49
+        assert stats["executed"] == 3
+
+    def test_batch_failure_is_isolated(self):
+        """测试批量事务失败时逐个重试，只有出错的写入失败"""
+        gate = threading.Event()
+        self.writer.submit(lambda session: gate.wait(5))
+        good = [
+            self.writer.execute("UPDATE tasks SET status = 'ok' WHERE id = :id", {"id": f"t{i}"})
+            for i in (1, 2)
+        ]
+        bad = self.writer.execute("INSERT INTO tasks VALUES ('t1', 0, 'dup')")
+        gate.set()
+
+        for future in good:
+            future.result(timeout=5)
+        with pytest.raises(Exception):
+            bad.result(timeout=5)
+        assert self._fetch("SELECT id FROM tasks WHERE status = 'ok' ORDER BY id") == [("t1",), ("t2",)]
+
+    def test_concurrent_writers_and_readers(self):
+        """测试多线程提交写入的同时读取不被阻塞"""
+        errors = []
+
+        def producer(task_id):
+            for p in range(200):
+                self.writer.execute(
+                    "UPDATE tasks SET progress = :p WHERE id = :id",
+                    {"p": p, "id": task_id},
+                    key=("tasks", task_id),
+                )
+
+        def reader():
+            try:
+                for _ in range(200):
+                    self._fetch("SELECT COUNT(*) FROM tasks")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=producer, args=(f"t{i}",)) for i in range(4)]
+        threads += [threading.Thread(target=reader) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert self.writer.flush(timeout=5)
+        assert not errors
+        assert self._fetch("SELECT progress FROM tasks ORDER BY id") == [(199.0,)] * 4
+        assert self.writer.stats()["transactions"] < 800
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+多样性重排测试
+验证 MMR 打散近似片段、每视频上限与搜索服务默认开启重排
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.diversity import embedding_matrix, mmr_rerank
+from services.milvus_store import MemoryVideoStore, VideoSegment
+from services.search_service import HybridSearchService, SearchMode, SearchRequest
+
+
+class QueryEmbedding:
+    """固定查询向量的嵌入服务"""
+
+    async def embed(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+class TestDiversity:
+    """多样性重排测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """测试前准备"""
+        # a0-a3：同一视频的近似片段；b0 / c0：其它视频、相似度略低
+        self.segments = [
+            VideoSegment(f"a{i}", "va", "/videos/a.mp4", i, i + 1, 1, embedding=[1.0, 0.01 * i, 0.0])
+            for i in range(4)
+        ] + [
+            VideoSegment("b0", "vb", "/videos/b.mp4", 0, 1, 1, embedding=[0.9, 0.3, 0.0]),
+            VideoSegment("c0", "vc", "/videos/c.mp4", 0, 1, 1, embedding=[0.9, 0.0, 0.3]),
+        ]
+
+    def test_mmr_spreads_near_duplicates(self):
+        """测试 MMR 将近似片段后移，λ=1 且不限数量时保持原顺序"""
+        embeddings = embedding_matrix([s.embedding for s in self.segments])
+        query = np.array([1.0, 0.1, 0.1], dtype=np.float32)
+        scores = embeddings @ (query / np.linalg.norm(query))
+        assert np.argsort(-scores).tolist() == [3, 2, 1, 0, 4, 5]
+
+        order = mmr_rerank(scores, embeddings, top_k=3, diversity_lambda=0.5)
+        assert order[0] == 3 and set(order[1:3]) == {4, 5}
+        assert sorted(order) == list(range(6))
+
+        assert mmr_rerank(scores, embeddings, diversity_lambda=1.0) == list(range(6))
+
+    def test_group_cap_defers_and_backfills(self):
+        """测试每组上限：超限候选排到最后但不丢失"""
+        groups = ["va", "va", "va", "vb", None, None]
+        order = mmr_rerank([0.9, 0.8, 0.7, 0.6, 0.5, 0.4], groups=groups, max_per_group=2)
+        assert order == [0, 1, 3, 4, 5, 2]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("compact", [False, True])
+    async def test_search_results_diversified_by_default(self, compact):
+        """测试向量搜索默认按视频打散（紧凑与字典存储一致）"""
+        store = MemoryVideoStore(compact=compact)
+        store._initialized = True
+        await store.insert_batch(self.segments)
+        service = HybridSearchService(video_store=store, embedding_service=QueryEmbedding())
+
+        request = SearchRequest(query="战斗", mode=SearchMode.VECTOR_ONLY, top_k=4)
+        response = await service.search(request)
+        video_ids = [r.video_path for r in response.results]
+        assert response.results[0].segment_id == "a0"
+        assert video_ids.count("/videos/a.mp4") <= 2
+        assert {"b0", "c0"} <= {r.segment_id for r in response.results}
+
+        plain = await service.search(SearchRequest(
+            query="战斗", mode=SearchMode.VECTOR_ONLY, top_k=4, diversity_lambda=1.0, max_per_video=0,
+        ))
+        assert [r.segment_id for r in plain.results] == ["a0", "a1", "a2", "a3"]
+
+    def test_mmr_latency(self):
+        """测试 N=200 的重排耗时"""
+        rng = np.random.default_rng(0)
+        embeddings = embedding_matrix(rng.normal(size=(200, 384)).tolist())
+        scores = np.sort(rng.random(200))[::-1]
+        groups = [f"v{i % 20}" for i in range(200)]
+
+        mmr_rerank(scores, embeddings, groups, top_k=20, max_per_group=2)
+        start = time.perf_counter()
+        for _ in range(20):
+            mmr_rerank(scores, embeddings, groups, top_k=20, max_per_group=2)
+        assert (time.perf_counter() - start) / 20 < 0.01
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+关键帧感知哈希测试
+验证 dHash/pHash 对近重复帧稳定、素材内合并、BK 树半径查询与跨素材重复检测
+"""
+
+import asyncio
+import importlib
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.keyframe import KeyFrame, KeyFrameData, KeyFrameExtractionJob
+from services.frame_hash import (
+    BKTree,
+    collapse_near_duplicates,
+    compute_hash,
+    dhash,
+    get_frame_hash_index,
+    hamming_distance,
+    hash_to_hex,
+    phash,
+)
+from services.keyframe_store import KeyFrameStore
+
+
+def _image(seed: int, noise: float = 0.0) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, size=(9, 16, 3)).astype(np.float64)
+    pixels = np.kron(base, np.ones((20, 20, 1)))
+    if noise:
+        pixels += np.random.default_rng(seed + 1000).normal(0, noise, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def _keyframe(index: int, timestamp: float, frame_hash, asset_id: str = "asset_a") -> KeyFrameData:
+    return KeyFrameData(
+        keyframe_id=f"kf_{asset_id}_{index}",
+        asset_id=asset_id,
+        frame_index=index,
+        timestamp=timestamp,
+        timecode="00:00:00:00",
+        image_path=f"/tmp/{asset_id}_{index}.jpg",
+        frame_hash=frame_hash,
+    )
+
+
+class TestPerceptualHash:
+    """哈希计算与素材内合并测试"""
+
+    def test_near_duplicates_close_distinct_far(self):
+        """测试轻微噪声与缩放后哈希距离小，不同画面距离大"""
+        for algorithm in (dhash, phash):
+            original = algorithm(_image(1))
+            noisy = algorithm(_image(1, noise=4.0))
+            resized = algorithm(_image(1).resize((160, 90)))
+            other = algorithm(_image(2))
+            assert hamming_distance(original, noisy) <= 6
+            assert hamming_distance(original, resized) <= 6
+            assert hamming_distance(original, other) > 12
+
+    def test_collapse_keeps_representative_with_time_range(self):
+        """测试连续近重复帧并入代表帧，代表帧记录覆盖范围与并入数量"""
+        static = dhash(_image(1))
+        keyframes = [
+            _keyframe(0, 0.0, hash_to_hex(static)),
+            _keyframe(1, 5.0, hash_to_hex(static ^ 0b1)),
+            _keyframe(2, 10.0, hash_to_hex(static ^ 0b11)),
+            _keyframe(3, 15.0, hash_to_hex(dhash(_image(2)))),
+            _keyframe(4, 20.0, None),
+            _keyframe(5, 25.0, hash_to_hex(dhash(_image(2)))),
+        ]
+
+        kept, dropped = collapse_near_duplicates(keyframes, threshold=4)
+
+        assert [kf.frame_index for kf in kept] == [0, 3, 4, 5]
+        assert [kf.frame_index for kf in dropped] == [1, 2]
+        assert kept[0].end_timestamp == 10.0 and kept[0].duplicate_count == 2
+        assert kept[1].end_timestamp is None and kept[1].duplicate_count == 0
+
+
+class TestFrameHashIndex:
+    """BK 树与跨素材哈希索引测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        self.engine = create_engine("sqlite://")
+        KeyFrame.__table__.create(self.engine)
+        KeyFrameExtractionJob.__table__.create(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.store = KeyFrameStore(
+            self.db,
+            storage_dir=str(tmp_path / "keyframes"),
+            cache_dir=str(tmp_path / "cache"),
+        )
+        self.index = get_frame_hash_index()
+        self.index.clear()
+        yield
+        self.index.clear()
+        self.db.close()
+
+    def test_bk_tree_radius_search(self):
+        """测试 BK 树半径查询与暴力比较结果一致"""
+        rng = np.random.default_rng(7)
+        hashes = [int(h) for h in rng.integers(0, 2 ** 63, size=300)]
+        tree = BKTree()
+        for i, value in enumerate(hashes):
+            tree.add(value, i)
+        query = hashes[0] ^ 0b10110
+        expected = {i for i, value in enumerate(hashes) if hamming_distance(query, value) <= 10}
+
+        assert {item for _, item in tree.search(query, 10)} == expected
+        assert len(tree) == 300
+
+    def test_duplicate_assets_detected(self):
+        """测试载入已存关键帧后识别重复素材，删除素材后不再命中"""
+        hashes = [hash_to_hex(dhash(_image(seed))) for seed in range(5)]
+        asyncio.run(self.store.save_keyframes_batch(
+            [_keyframe(i, float(i), h, "asset_a") for i, h in enumerate(hashes)]
+            + [_keyframe(i, float(i), h, "asset_b") for i, h in enumerate(hashes[:2])]
+        ))
+        self.index.ensure_loaded(self.db)
+
+        copy = [hash_to_hex(dhash(_image(seed, noise=4.0))) for seed in range(5)]
+        duplicates = self.index.find_duplicate_assets("asset_c", copy, threshold=6)
+        assert [d["asset_id"] for d in duplicates] == ["asset_a"]
+        assert duplicates[0]["ratio"] == 1.0
+
+        loose = self.index.find_duplicate_assets("asset_c", copy, threshold=6, min_ratio=0.4)
+        assert [d["asset_id"] for d in loose] == ["asset_a", "asset_b"]
+
+        asyncio.run(self.store.delete_keyframes_by_asset("asset_a"))
+        assert self.index.find_duplicate_assets("asset_c", copy, threshold=6) == []
+
+    def test_migration_backfill_uses_configured_algorithm(self, tmp_path, monkeypatch):
+        """测试迁移 012 按 KEYFRAME_HASH_ALGORITHM 补算哈希，与提取时一致"""
+        monkeypatch.setenv("KEYFRAME_HASH_ALGORITHM", "phash")
+        image_path = tmp_path / "frame.png"
+        _image(3).save(image_path)
+        keyframe = _keyframe(0, 0.0, None)
+        keyframe.image_path = str(image_path)
+        asyncio.run(self.store.save_keyframes_batch([keyframe]))
+
+        migration = importlib.import_module("migrations.012_keyframe_frame_hash")
+        migration.upgrade(self.engine)
+
+        with Image.open(image_path) as img:
+            expected = hash_to_hex(compute_hash(img, "phash"))
+        self.db.expire_all()
+        assert self.db.query(KeyFrame).one().frame_hash == expected != hash_to_hex(dhash(_image(3)))
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+故事板图片导出测试
+验证流式 ZIP 导出、写线程失败时不阻塞生产者，以及按字节限制的图片缓存
+"""
+
+import asyncio
+import os
+import sys
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.image_exporter as image_exporter
+from database import Asset, Beat, ExportHistory, Project
+from services.image_exporter import ImageExporter, _ImageCache
+
+
+class TestStoryboardZipExport:
+    """故事板 ZIP 流式导出测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path, monkeypatch):
+        """测试前准备"""
+        monkeypatch.chdir(tmp_path)
+        engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+        for model in (Project, Beat, Asset, ExportHistory):
+            model.__table__.create(engine)
+        self.db = sessionmaker(bind=engine)()
+
+        # 线程池代替进程池，避免测试中派生进程
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        monkeypatch.setattr(image_exporter, "_get_render_pool", lambda: self.pool)
+
+        image_path = tmp_path / "still.png"
+        Image.new("RGB", (64, 36), (200, 30, 30)).save(image_path)
+        self.db.add(Project(id="p1", title="测试项目"))
+        self.db.add(Asset(id="a1", project_id="p1", filename="still.png",
+                          file_path=str(image_path), thumbnail_path=str(image_path)))
+        for i in range(6):
+            self.db.add(Beat(id=f"b{i}", project_id="p1", order_index=i, content=f"镜头 {i}",
+                             duration=2.0, main_asset_id="a1" if i == 0 else None))
+        self.db.commit()
+        self.exporter = ImageExporter(self.db)
+
+        yield
+
+        self.pool.shutdown(wait=True)
+        self.db.close()
+
+    def _export(self, **kwargs):
+        return asyncio.run(asyncio.wait_for(
+            self.exporter.export_storyboard_zip("p1", width=160, height=90, **kwargs), timeout=20
+        ))
+
+    def test_streaming_export(self):
+        """测试每个 Beat 与联系表都写入 ZIP，并记录导出历史"""
+        result = self._export()
+        assert result["status"] == "success"
+        assert result["file_count"] == 7
+
+        with zipfile.ZipFile(result["file_path"]) as zipf:
+            names = sorted(zipf.namelist())
+            assert all(info.compress_type == zipfile.ZIP_STORED for info in zipf.infolist())
+            with zipf.open("未分类/beat_001.png") as f, Image.open(f) as img:
+                assert img.size == (160, 90)
+        assert names == ["00_contact_sheet.png"] + [f"未分类/beat_{i:03d}.png" for i in range(1, 7)]
+
+        record = self.db.query(ExportHistory).one()
+        assert record.options["file_count"] == 7 and record.file_size == result["file_size"]
+
+    def test_writer_failure_does_not_block_producers(self, monkeypatch):
+        """测试写线程异常后生产者不再阻塞在满队列上，导出失败并删除残留 ZIP"""
+        monkeypatch.setattr(image_exporter, "ZIP_QUEUE_SIZE", 1)
+
+        def failing_writestr(self, arcname, data, *args, **kwargs):
+            raise OSError("磁盘已满")
+
+        monkeypatch.setattr(zipfile.ZipFile, "writestr", failing_writestr)
+
+        result = self._export(group_by_scene=False)
+        assert result["status"] == "error"
+        assert "磁盘已满" in result["message"]
+        assert list((self.exporter.export_dir).glob("*.zip")) == []
+        assert self.db.query(ExportHistory).count() == 0
+
+
+class TestImageCache:
+    """按字节限制的图片缓存测试"""
+
+    def test_evicts_by_bytes(self):
+        """测试超出字节上限时淘汰最久未用的图片，超大单图不缓存"""
+        one = 10 * 10 * 3
+        cache = _ImageCache(max_bytes=3 * one)
+        for i in range(3):
+            cache.put(("img", i), Image.new("RGB", (10, 10)))
+        assert cache.get(("img", 0)) is not None      # 0 变为最近使用
+        cache.put(("img", 3), Image.new("RGB", (10, 10)))
+
+        assert cache.get(("img", 1)) is None
+        assert all(cache.get(("img", i)) is not None for i in (0, 2, 3))
+        assert cache.current_bytes == 3 * one
+
+        cache.put(("big",), Image.new("RGB", (40, 40)))
+        assert cache.get(("big",)) is None and cache.current_bytes == 3 * one
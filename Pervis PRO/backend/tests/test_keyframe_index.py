@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+关键帧向量索引测试
+验证二进制嵌入列、索引检索与逐行余弦计算一致，以及保存/更新/删除后的增量同步
+"""
+
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.keyframe import KeyFrame, KeyFrameData, KeyFrameExtractionJob, pack_embedding, unpack_embedding
+from services.keyframe_index import KeyFrameRef, KeyFrameVectorIndex, get_keyframe_index
+from services.keyframe_store import KeyFrameStore
+
+
+def _keyframe(keyframe_id, asset_id, timestamp, embedding=None):
+    return KeyFrameData(
+        keyframe_id=keyframe_id,
+        asset_id=asset_id,
+        frame_index=int(timestamp * 25),
+        timestamp=timestamp,
+        timecode="00:00:00:00",
+        image_path=f"/tmp/{keyframe_id}.jpg",
+        visual_embedding=embedding,
+    )
+
+
+def _brute_force(keyframes, query, top_k, asset_ids=None):
+    query = np.asarray(query)
+    scored = []
+    for kf in keyframes:
+        if kf.visual_embedding is None or (asset_ids and kf.asset_id not in asset_ids):
+            continue
+        vec = np.asarray(kf.visual_embedding)
+        scored.append((float(vec @ query / (np.linalg.norm(vec) * np.linalg.norm(query))), kf.keyframe_id))
+    scored.sort(reverse=True)
+    return [keyframe_id for _, keyframe_id in scored[:top_k]]
+
+
+class TestKeyFrameIndex:
+    """关键帧向量索引测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        engine = create_engine("sqlite://")
+        KeyFrame.__table__.create(engine)
+        KeyFrameExtractionJob.__table__.create(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.store = KeyFrameStore(
+            self.db,
+            storage_dir=str(tmp_path / "keyframes"),
+            cache_dir=str(tmp_path / "cache"),
+        )
+        get_keyframe_index().clear()
+
+        rng = np.random.default_rng(7)
+        self.keyframes = [
+            _keyframe(f"kf_{a}_{i}", f"asset_{a}", float(i), rng.normal(size=16).tolist())
+            for a in range(5) for i in range(20)
+        ]
+        asyncio.run(self.store.save_keyframes_batch(self.keyframes))
+        self.rng = rng
+        yield
+        get_keyframe_index().clear()
+        self.db.close()
+
+    def test_embedding_blob_roundtrip(self):
+        """测试嵌入以 float32 二进制存储"""
+        embedding = [0.25, -1.5, 3.0]
+        assert unpack_embedding(pack_embedding(embedding)).tolist() == embedding
+
+        row = self.db.query(KeyFrame).filter(KeyFrame.keyframe_id == "kf_0_0").first()
+        assert row.visual_embedding is None
+        assert row.embedding_dim == 16
+        assert len(row.visual_embedding_blob) == 16 * 4
+        np.testing.assert_allclose(row.get_embedding(), self.keyframes[0].visual_embedding, rtol=1e-6)
+
+        # 未迁移的 JSON 列仍可读取
+        row.visual_embedding_blob = None
+        row.visual_embedding = [1.0, 2.0]
+        assert row.get_embedding() == [1.0, 2.0]
+
+    def test_search_matches_brute_force(self):
+        """测试索引检索与逐行余弦计算一致（含素材过滤）"""
+        for _ in range(5):
+            query = self.rng.normal(size=16).tolist()
+            results = asyncio.run(self.store.search_by_embedding(query, top_k=10))
+            assert [r["keyframe_id"] for r in results] == _brute_force(self.keyframes, query, 10)
+
+            asset_ids = ["asset_3", "asset_1"]
+            results = asyncio.run(self.store.search_by_embedding(query, top_k=7, asset_ids=asset_ids))
+            assert [r["keyframe_id"] for r in results] == _brute_force(self.keyframes, query, 7, asset_ids)
+
+        result = asyncio.run(self.store.search_by_embedding(self.keyframes[5].visual_embedding, top_k=1))[0]
+        assert result["keyframe_id"] == "kf_0_5"
+        assert result["timestamp"] == 5.0
+        assert result["score"] == pytest.approx(1.0, abs=1e-5)
+        assert asyncio.run(self.store.search_by_embedding([0.0] * 16)) == []
+        assert asyncio.run(self.store.search_by_embedding([1.0] * 16, asset_ids=["missing"])) == []
+
+    def test_index_tracks_updates_and_deletes(self):
+        """测试更新嵌入、新增关键帧与删除素材后索引同步"""
+        query = self.rng.normal(size=16).tolist()
+        asyncio.run(self.store.search_by_embedding(query))   # 载入索引
+
+        asyncio.run(self.store.update_embedding("kf_2_3", query))
+        assert asyncio.run(self.store.search_by_embedding(query, top_k=1))[0]["keyframe_id"] == "kf_2_3"
+
+        asyncio.run(self.store.save_keyframe(_keyframe("kf_new", "asset_9", 1.0, query)))
+        top = asyncio.run(self.store.search_by_embedding(query, top_k=2, asset_ids=["asset_9"]))
+        assert [r["keyframe_id"] for r in top] == ["kf_new"]
+
+        asyncio.run(self.store.delete_keyframes_by_asset("asset_2"))
+        results = asyncio.run(self.store.search_by_embedding(query, top_k=200))
+        assert len(results) == 81
+        assert all(r["asset_id"] != "asset_2" for r in results)
+
+        # 新进程（重新载入）得到同样的结果
+        get_keyframe_index().clear()
+        reloaded = asyncio.run(self.store.search_by_embedding(query, top_k=200))
+        assert [r["keyframe_id"] for r in reloaded] == [r["keyframe_id"] for r in results]
+
+    def test_keyframe_moved_to_other_asset(self):
+        """测试同一 keyframe_id 改挂到其他素材时从原素材块移除，不会重复命中"""
+        index = KeyFrameVectorIndex()
+        index.loaded = True
+        vector = [1.0, 0.0, 0.0]
+        index.upsert([(KeyFrameRef("kf", "asset_a", 0.0, "", ""), vector)])
+        index.upsert([(KeyFrameRef("kf", "asset_b", 1.0, "", ""), vector)])
+
+        assert [r["asset_id"] for r in index.search(vector, top_k=10)] == ["asset_b"]
+        assert index.search(vector, asset_ids=["asset_a"]) == []
+
+        # 删除只带 keyframe_id 时按当前所属素材移除
+        index.upsert([(KeyFrameRef("kf", "asset_a", 0.0, "", ""), None)])
+        assert index.search(vector) == []
+        assert index.remove_asset("asset_b") == 0
+
+    def test_get_keyframes_by_asset(self):
+        """测试按素材查询可选择是否包含嵌入"""
+        without = asyncio.run(self.store.get_keyframes_by_asset("asset_1"))
+        assert [kf.keyframe_id for kf in without] == [f"kf_1_{i}" for i in range(20)]
+        assert all(kf.visual_embedding is None for kf in without)
+
+        with_embeddings = asyncio.run(self.store.get_keyframes_by_asset("asset_1", include_embeddings=True))
+        assert len(with_embeddings[0].visual_embedding) == 16
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+关键帧批量保存测试
+验证集合式 upsert 的语句数量、更新语义与缓存有序合并
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.keyframe import KeyFrame, KeyFrameData, KeyFrameExtractionJob
+from services.keyframe_index import get_keyframe_index
+from services.keyframe_store import KeyFrameStore
+
+
+def _keyframe(keyframe_id, asset_id, timestamp, **kwargs):
+    return KeyFrameData(
+        keyframe_id=keyframe_id,
+        asset_id=asset_id,
+        frame_index=int(timestamp * 25),
+        timestamp=timestamp,
+        timecode="00:00:00:00",
+        image_path=f"/tmp/{keyframe_id}.jpg",
+        **kwargs,
+    )
+
+
+class TestKeyFrameBatchUpsert:
+    """关键帧批量保存测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        self.engine = create_engine("sqlite://")
+        KeyFrame.__table__.create(self.engine)
+        KeyFrameExtractionJob.__table__.create(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.store = KeyFrameStore(
+            self.db,
+            storage_dir=str(tmp_path / "keyframes"),
+            cache_dir=str(tmp_path / "cache"),
+        )
+        get_keyframe_index().clear()
+
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        yield
+        self.db.close()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement.split()[0].upper())
+
+    def test_batch_uses_set_based_statements(self):
+        """测试批量保存不随关键帧数量逐条查询"""
+        keyframes = [_keyframe(f"kf_{i}", "asset_a", float(i)) for i in range(600)]
+        assert asyncio.run(self.store.save_keyframes_batch(keyframes)) == 600
+        assert self.statements.count("SELECT") == 2      # 600 个 id 分两块 IN 查询
+        assert self.statements.count("INSERT") == 1      # executemany
+        assert self.db.query(KeyFrame).count() == 600
+
+        self.statements.clear()
+        updated = [_keyframe(f"kf_{i}", "asset_a", float(i), brightness=50.0) for i in range(0, 600, 2)]
+        assert asyncio.run(self.store.save_keyframes_batch(updated)) == 300
+        assert self.statements.count("SELECT") == 1
+        assert self.statements.count("UPDATE") == 1
+        assert self.statements.count("INSERT") == 0
+
+    def test_upsert_semantics(self):
+        """测试更新只覆盖可变列，同批重复 id 以最后一个为准"""
+        asyncio.run(self.store.save_keyframes_batch([
+            _keyframe("kf_1", "asset_a", 1.0, image_width=640, visual_embedding=[1.0, 0.0]),
+        ]))
+        asyncio.run(self.store.save_keyframes_batch([
+            _keyframe("kf_1", "asset_a", 2.0, image_width=320, brightness=10.0),
+            _keyframe("kf_1", "asset_a", 3.0, image_width=320, brightness=20.0),
+            _keyframe("kf_2", "asset_b", 1.0, visual_embedding=[0.0, 1.0]),
+        ]))
+
+        self.db.expire_all()
+        row = self.db.query(KeyFrame).filter(KeyFrame.keyframe_id == "kf_1").one()
+        assert (row.timestamp, row.brightness, row.image_width) == (3.0, 20.0, 640)
+        assert row.has_embedding is False and row.visual_embedding_blob is None
+        assert row.updated_at >= row.created_at
+
+        other = self.db.query(KeyFrame).filter(KeyFrame.keyframe_id == "kf_2").one()
+        assert other.get_embedding() == [0.0, 1.0]
+        assert self.db.query(KeyFrame).count() == 2
+
+    def test_cache_merge_keeps_timestamp_order(self):
+        """测试缓存按时间戳有序合并（含被更新时间戳的条目）"""
+        asyncio.run(self.store.save_keyframes_batch([
+            _keyframe(f"kf_{i}", "asset_a", float(i)) for i in (8, 2, 6, 4)
+        ]))
+        asyncio.run(self.store.save_keyframes_batch([
+            _keyframe("kf_8", "asset_a", 1.0),
+            _keyframe("kf_5", "asset_a", 5.0),
+            _keyframe("kf_x", "asset_b", 0.0),
+        ]))
+        asyncio.run(self.store.save_keyframe(_keyframe("kf_3", "asset_a", 3.0)))
+
+        cached = asyncio.run(self.store.get_keyframes_by_asset("asset_a"))
+        assert [kf.keyframe_id for kf in cached] == ["kf_8", "kf_2", "kf_3", "kf_4", "kf_5", "kf_6"]
+        assert [kf.keyframe_id for kf in self.store._cache["asset_b"]] == ["kf_x"]
+
+        self.store.clear_cache()
+        from_db = asyncio.run(self.store.get_keyframes_by_asset("asset_a"))
+        assert [kf.keyframe_id for kf in from_db] == [kf.keyframe_id for kf in cached]
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+增量素材库扫描测试
+验证未变化目录复用日志、扫描中断后续扫、删除文件与目录的检测
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.library_scanner import IncrementalScanner, ScanJournal
+
+
+class TestIncrementalScanner:
+    """增量扫描器测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        self.root = tmp_path / "library"
+        for rel, size in [("a.mp4", 10), ("sub1/b.mp4", 20), ("sub1/c.txt", 5), ("sub2/d.mov", 30)]:
+            path = self.root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * size)
+        self.journal_path = str(tmp_path / "journal.db")
+        self.scanner = IncrementalScanner(ScanJournal(self.journal_path), max_workers=4)
+
+    def _paths(self, result):
+        return sorted(os.path.relpath(f.path, result.root) for f in result.files)
+
+    def test_unchanged_directories_reuse_journal(self, monkeypatch):
+        """测试目录 mtime 未变时不重新读取，文件大小取自日志"""
+        first = self.scanner.scan(str(self.root), extensions={".mp4", ".mov"})
+        assert self._paths(first) == ["a.mp4", "sub1/b.mp4", "sub2/d.mov"]
+        assert first.dirs_scanned == 3
+
+        reads = []
+        original = IncrementalScanner._read_directory
+        monkeypatch.setattr(IncrementalScanner, "_read_directory",
+                            staticmethod(lambda path: reads.append(path) or original(path)))
+
+        # 新的扫描器实例（模拟重启）只靠持久化日志
+        scanner = IncrementalScanner(ScanJournal(self.journal_path))
+        second = scanner.scan(str(self.root), extensions={".mp4", ".mov"})
+        assert reads == []
+        assert second.dirs_skipped == 3 and second.added == [] and second.removed == []
+        assert {f.name: f.size for f in second.files} == {"a.mp4": 10, "b.mp4": 20, "d.mov": 30}
+
+        (self.root / "sub2" / "e.mp4").write_bytes(b"y" * 7)
+        third = scanner.scan(str(self.root))
+        assert reads == [str(self.root / "sub2")]
+        assert [os.path.relpath(p, third.root) for p in third.added] == ["sub2/e.mp4"]
+
+    def test_resume_after_interrupted_scan(self, monkeypatch):
+        """测试某目录读取失败时其余目录照常入日志，下次只补读该目录"""
+        original = IncrementalScanner._read_directory
+        failing = str(self.root / "sub1")
+
+        def flaky(path):
+            if path == failing:
+                raise OSError("stale NFS handle")
+            return original(path)
+
+        monkeypatch.setattr(IncrementalScanner, "_read_directory", staticmethod(flaky))
+        interrupted = self.scanner.scan(str(self.root))
+        assert len(interrupted.errors) == 1 and failing in interrupted.errors[0]
+        assert self._paths(interrupted) == ["a.mp4", "sub2/d.mov"]
+
+        reads = []
+        monkeypatch.setattr(IncrementalScanner, "_read_directory",
+                            staticmethod(lambda path: reads.append(path) or original(path)))
+        resumed = self.scanner.scan(str(self.root))
+        assert reads == [failing]
+        assert resumed.errors == []
+        assert sorted(os.path.relpath(p, resumed.root) for p in resumed.added) == ["sub1/b.mp4", "sub1/c.txt"]
+
+    def test_deleted_files_and_directories(self):
+        """测试删除的文件和整个子目录出现在 removed 中，日志同步清除"""
+        self.scanner.scan(str(self.root))
+        (self.root / "a.mp4").unlink()
+        for name in ("b.mp4", "c.txt"):
+            (self.root / "sub1" / name).unlink()
+        (self.root / "sub1").rmdir()
+
+        result = self.scanner.scan(str(self.root))
+        assert [os.path.relpath(p, result.root) for p in result.removed] == [
+            "a.mp4", "sub1/b.mp4", "sub1/c.txt"
+        ]
+        assert self._paths(result) == ["sub2/d.mov"]
+        assert set(self.scanner.journal.load(result.root)) == {str(self.root), str(self.root / "sub2")}
+
+    def test_full_scan_sees_in_place_rewrites(self):
+        """测试原地覆盖写入（目录 mtime 不变）需 full=True 才能发现新大小"""
+        self.scanner.scan(str(self.root))
+        target = self.root / "sub2" / "d.mov"
+        dir_stat = os.stat(self.root / "sub2")
+        target.write_bytes(b"z" * 99)
+        os.utime(self.root / "sub2", ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+
+        cached = self.scanner.scan(str(self.root))
+        full = self.scanner.scan(str(self.root), full=True)
+        assert {f.name: f.size for f in cached.files}["d.mov"] == 30
+        assert {f.name: f.size for f in full.files}["d.mov"] == 99
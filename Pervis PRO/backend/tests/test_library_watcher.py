@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+素材库监听测试
+验证令牌桶限流、事件去抖与合批、入库路径以及 watchdog 事件驱动模式
+"""
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import services.keyframe_extractor as keyframe_extractor
+import services.milvus_store as milvus_store
+import services.task_registry as task_registry
+from database import Asset
+from models.keyframe import KeyFrame, KeyFrameData
+from services.frame_hash import get_frame_hash_index
+from services.keyframe_extractor import ExtractionResult
+from services.library_watcher import (
+    WATCHDOG_AVAILABLE,
+    LibraryWatch,
+    LibraryWatcherService,
+    TokenBucket,
+    WatcherConfig,
+)
+from services.task_registry import TaskRegistry, TaskRegistryConfig
+
+
+class TestTokenBucket:
+    """令牌桶测试"""
+
+    def test_burst_then_rate_limited(self):
+        """测试突发容量内立即放行，超出后按速率等待"""
+        bucket = TokenBucket(rate_per_minute=600, burst=3)   # 每秒 10 个
+
+        async def scenario():
+            start = time.monotonic()
+            for _ in range(3):
+                await bucket.acquire()
+            burst_elapsed = time.monotonic() - start
+            for _ in range(2):
+                await bucket.acquire()
+            return burst_elapsed, time.monotonic() - start
+
+        burst_elapsed, total = asyncio.run(scenario())
+        assert burst_elapsed < 0.05
+        assert total >= 0.18
+
+    def test_default_burst(self):
+        """测试默认突发为每分钟速率的六分之一"""
+        assert TokenBucket(120).capacity == 20
+        assert TokenBucket(3).capacity == 1
+
+
+class TestDebounce:
+    """事件去抖与合批测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        self.root = tmp_path / "library"
+        self.root.mkdir()
+        self.service = LibraryWatcherService(WatcherConfig(debounce_seconds=0.05, batch_size=2))
+        self.service._jobs = asyncio.Queue()
+        self.watch = LibraryWatch(library_id=1, root=str(self.root), extensions={".mp4"}, exclude_patterns=["tmp"])
+        self.service._watches[1] = self.watch
+
+    def _write(self, rel: str, size: int) -> str:
+        path = self.root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+        return str(path)
+
+    def _jobs(self):
+        jobs = []
+        while not self.service._jobs.empty():
+            jobs.append(self.service._jobs.get_nowait())
+        return jobs
+
+    def test_filtered_events_ignored(self):
+        """测试扩展名不符、排除目录与库外路径不进入待处理"""
+        for path in [self._write("a.txt", 1), self._write("tmp/b.mp4", 1), "/elsewhere/c.mp4"]:
+            self.service._record_event(1, path)
+        assert self.watch.pending == {} and self.watch.events_received == 0
+
+    def test_quiet_period_and_size_stability(self):
+        """测试静默期内不出队，大小仍在变化的文件重新计时，稳定文件按批大小合批"""
+        paths = [self._write(f"clip_{i}.mp4", 10) for i in range(3)]
+        growing = self._write("growing.mp4", 10)
+        for path in paths + [growing]:
+            self.service._record_event(1, path)
+
+        self.service._flush_watch(self.watch)
+        assert self._jobs() == []
+
+        time.sleep(0.06)
+        self._write("growing.mp4", 20)
+        self.service._flush_watch(self.watch)
+        jobs = self._jobs()
+        assert [len(added) for _, added, _ in jobs] == [2, 1]
+        assert sorted(p for _, added, _ in jobs for p in added) == sorted(paths)
+        assert list(self.watch.pending) == [growing]
+
+        time.sleep(0.06)
+        self.service._flush_watch(self.watch)
+        assert self._jobs() == [(1, [growing], [])]
+
+    def test_removed_events(self):
+        """测试删除事件撤销待处理文件并单独成批"""
+        path = self._write("clip.mp4", 10)
+        self.service._record_event(1, path)
+        self.service._record_event(1, path, removed=True)
+        self.service._flush_watch(self.watch)
+        assert self.watch.pending == {}
+        assert self._jobs() == [(1, [], [path])]
+
+
+class TestIngest:
+    """入库路径测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path, monkeypatch):
+        """测试前准备"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'assets.db'}")
+        Asset.__table__.create(engine)
+        self.Session = sessionmaker(bind=engine)
+        monkeypatch.setattr(database, "SessionLocal", self.Session)
+
+        self.registry = TaskRegistry(TaskRegistryConfig(db_path=str(tmp_path / "tasks.db"), flush_interval=60))
+        monkeypatch.setattr(task_registry, "get_task_registry", lambda: self.registry)
+
+        self.service = LibraryWatcherService(WatcherConfig(rate_per_minute=600))
+        self.service._limiter = TokenBucket(600, burst=2)
+        self.indexed = []
+
+        async def index_file(asset_id, path):
+            self.indexed.append((asset_id, path, time.monotonic()))
+            if path.endswith("bad.mp4"):
+                raise RuntimeError("decode error")
+
+        monkeypatch.setattr(self.service, "_index_file", index_file)
+
+        self.paths = []
+        for name in ["a.mp4", "bad.mp4", "c.mp4"]:
+            path = tmp_path / "library" / name
+            path.parent.mkdir(exist_ok=True)
+            path.write_bytes(b"0" * 16)
+            self.paths.append(str(path))
+        yield
+        self.registry.close()
+
+    def test_batch_inserted_indexed_and_rate_limited(self):
+        """测试批量写入 Asset、逐个限流索引、单文件失败不中断、已存在路径跳过"""
+        record = self.registry.create("library_ingest", source="library_watch")
+
+        ingested = asyncio.run(self.service._ingest_batch(1, self.paths, record.task_id))
+        assert ingested == 3
+        assert [p for _, p, _ in self.indexed] == self.paths
+        assert self.indexed[2][2] - self.indexed[1][2] >= 0.08     # 突发用尽后按速率放行
+        assert self.registry.get(record.task_id).progress == 100
+
+        db = self.Session()
+        try:
+            rows = db.query(Asset).all()
+            assert sorted(a.file_path for a in rows) == sorted(self.paths)
+            assert {a.id for a in rows} == {asset_id for asset_id, _, _ in self.indexed}
+            assert all(a.processing_metadata["ingest"] == "library_watch" for a in rows)
+        finally:
+            db.close()
+
+        assert asyncio.run(self.service._ingest_batch(1, self.paths, record.task_id)) == 0
+        assert len(self.indexed) == 3
+
+
+class TestKeyframePersistence:
+    """关键帧落库与重复检测测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path, monkeypatch):
+        """测试前准备"""
+        monkeypatch.chdir(tmp_path)
+        engine = create_engine(f"sqlite:///{tmp_path / 'assets.db'}")
+        for model in (Asset, KeyFrame):
+            model.__table__.create(engine)
+        self.Session = sessionmaker(bind=engine)
+        monkeypatch.setattr(database, "SessionLocal", self.Session)
+        monkeypatch.setattr(milvus_store, "get_video_store", lambda: milvus_store.MemoryVideoStore())
+
+        hashes = [f"{0x0f0f0f0f0f0f0f0f * (i + 1) & 0xFFFFFFFFFFFFFFFF:016x}" for i in range(4)]
+
+        class FakeExtractor:
+            async def extract(self, path, asset_id):
+                keyframes = [
+                    KeyFrameData(keyframe_id=f"{asset_id}_kf_{i}", asset_id=asset_id, frame_index=i,
+                                 timestamp=float(i), timecode="00:00:00:00",
+                                 image_path=f"/missing/{asset_id}_{i}.jpg", frame_hash=h)
+                    for i, h in enumerate(hashes)
+                ]
+                return ExtractionResult(success=True, keyframes=keyframes, total_frames=100,
+                                        duration=4.0, fps=25.0)
+
+        monkeypatch.setattr(keyframe_extractor, "get_keyframe_extractor", lambda: FakeExtractor())
+        self.service = LibraryWatcherService(WatcherConfig(embed_text=False, embed_visual=False))
+        self.paths = []
+        for name in ("a.mp4", "b.mp4"):
+            path = tmp_path / name
+            path.write_bytes(b"0" * 16)
+            self.paths.append(str(path))
+        self.index = get_frame_hash_index()
+        self.index.clear()
+        yield
+        self.index.clear()
+
+    def test_duplicates_detected_after_restart(self):
+        """测试关键帧哈希写入 keyframes 表，内存索引清空（模拟重启）后仍能识别重复源文件"""
+        db = self.Session()
+        db.add_all([Asset(id="a", project_id="default_project", filename="a.mp4", file_path=self.paths[0]),
+                    Asset(id="b", project_id="default_project", filename="b.mp4", file_path=self.paths[1])])
+        db.commit()
+        db.close()
+
+        asyncio.run(self.service._index_file("a", self.paths[0]))
+        db = self.Session()
+        try:
+            assert db.query(KeyFrame).filter(KeyFrame.asset_id == "a").count() == 4
+        finally:
+            db.close()
+
+        self.index.clear()
+        asyncio.run(self.service._index_file("b", self.paths[1]))
+        db = self.Session()
+        try:
+            assert db.get(Asset, "b").processing_metadata["duplicate_of"] == ["a"]
+            assert db.query(KeyFrame).count() == 8
+        finally:
+            db.close()
+
+
+@pytest.mark.skipif(not WATCHDOG_AVAILABLE, reason="watchdog 未安装")
+class TestWatchdogMode:
+    """watchdog 事件驱动模式测试"""
+
+    def test_new_file_reaches_ingest_queue(self, tmp_path, monkeypatch):
+        """测试本地库用 inotify 模式，新文件经去抖后进入入库"""
+        root = tmp_path / "library"
+        root.mkdir()
+        service = LibraryWatcherService(WatcherConfig(debounce_seconds=0.1))
+        batches = []
+
+        async def ingest_batch(library_id, paths, task_id):
+            batches.append((library_id, paths))
+            return len(paths)
+
+        monkeypatch.setattr(service, "_ingest_batch", ingest_batch)
+        registry = TaskRegistry(TaskRegistryConfig(db_path=str(tmp_path / "tasks.db"), flush_interval=60))
+        monkeypatch.setattr(task_registry, "get_task_registry", lambda: registry)
+        library = SimpleNamespace(
+            id=7, path=str(root), file_extensions=[".mp4"], exclude_patterns=[],
+            scan_subdirs=True, path_type="local",
+        )
+
+        async def scenario():
+            assert await service.watch(library)
+            assert service.get_status()["libraries"][0]["mode"] == "inotify"
+            (root / "clip.mp4").write_bytes(b"0" * 32)
+            for _ in range(100):
+                if batches:
+                    break
+                await asyncio.sleep(0.05)
+            files_ingested = service._watches[7].files_ingested
+            await service.shutdown()
+            return files_ingested
+
+        try:
+            files_ingested = asyncio.run(scenario())
+        finally:
+            registry.close()
+        assert batches == [(7, [str(root / "clip.mp4")])]
+        assert files_ingested == 1
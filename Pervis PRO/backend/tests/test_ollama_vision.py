@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Ollama 视觉批量分析测试
+验证并发上限、结果顺序、内容哈希缓存、取得名额后才编码、上传前缩放与自适应限流
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ollama_vision import AdaptiveLimiter, OllamaVisionProvider, VisionConfig
+
+
+class RecordingProvider(OllamaVisionProvider):
+    """不访问网络、按图像尺寸返回标签并记录并发的 Provider"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+        self.encoded = 0
+        self.held = 0             # 已编码、请求尚未结束的图像数
+        self.peak_held = 0
+
+    def _encode_image(self, image_path):
+        self.encoded += 1
+        self.held += 1
+        self.peak_held = max(self.peak_held, self.held)
+        return super()._encode_image(image_path)
+
+    async def _request(self, session, image_base64, prompt):
+        self.held -= 1
+        self.requests += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        with Image.open(io.BytesIO(base64.b64decode(image_base64))) as img:
+            width = img.size[0]
+        return json.dumps({"scene_type": "室外", "summary": f"宽 {width}", "free_tags": ["a"]})
+
+
+class TestOllamaVisionBatch:
+    """批量分析测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        self.config = VisionConfig(MAX_CONCURRENCY=3, MAX_IMAGE_SIDE=64, CACHE_SIZE=16, ENABLED=True)
+        self.provider = RecordingProvider(self.config)
+        self.paths = []
+        for i in range(8):
+            path = tmp_path / f"frame_{i}.png"
+            Image.new("RGB", (32 + i, 16), (i * 20, 0, 0)).save(path)
+            self.paths.append(str(path))
+
+    def test_concurrent_batch_in_order(self):
+        """测试并发不超过上限、结果与输入顺序一致、进度回调完整"""
+        progress = []
+        results = asyncio.run(self.provider.batch_analyze(
+            self.paths, progress_callback=lambda done, total: progress.append((done, total))
+        ))
+
+        assert self.provider.peak == 3
+        assert self.provider.peak_held <= 3           # 编码数据不超过并发上限
+        assert [r["summary"] for r in results] == [f"宽 {32 + i}" for i in range(8)]
+        assert results[0]["time"] == "未知"          # 缺失字段已补全
+        assert progress[-1] == (8, 8) and len(progress) == 8
+
+    def test_results_cached_by_content_and_prompt(self):
+        """测试相同内容 + 提示词命中缓存，换提示词重新请求"""
+        asyncio.run(self.provider.batch_analyze(self.paths[:2]))
+        cached = asyncio.run(self.provider.batch_analyze(self.paths[:2]))
+        assert self.provider.requests == 2
+        assert self.provider.encoded == 2             # 命中缓存时不解码图像
+
+        cached[0]["free_tags"].append("mutated")
+        again = asyncio.run(self.provider.analyze_image(self.paths[0]))
+        assert again["free_tags"] == ["a"]
+
+        asyncio.run(self.provider.analyze_image(self.paths[0], prompt="只描述颜色"))
+        assert self.provider.requests == 3
+
+    def test_large_image_downscaled_before_upload(self, tmp_path):
+        """测试超过模型输入尺寸的图像在内存中缩放并转 JPEG，哈希取原文件"""
+        path = tmp_path / "large.png"
+        Image.new("RGB", (400, 200), (10, 200, 30)).save(path)
+
+        encoded = self.provider._encode_image(str(path))
+        with Image.open(io.BytesIO(base64.b64decode(encoded))) as img:
+            assert img.format == "JPEG" and img.size == (64, 32)
+        assert self.provider._hash_file(str(path)) == hashlib.sha1(path.read_bytes()).hexdigest()
+
+        small_encoded = self.provider._encode_image(self.paths[0])
+        assert base64.b64decode(small_encoded) == open(self.paths[0], "rb").read()
+
+
+class TestAdaptiveLimiter:
+    """自适应限流测试"""
+
+    def test_errors_shrink_and_successes_grow(self):
+        """测试失败减半并退避，连续成功后逐步恢复"""
+        limiter = AdaptiveLimiter(4)
+
+        async def scenario():
+            await limiter.acquire()
+            await limiter.release(0.1, ok=True)
+            for _ in range(2):
+                await limiter.acquire()
+                await limiter.release(0.1, ok=False)
+            shrunk = (limiter.limit, limiter.backoff)
+            limiter.backoff = 0.0
+            await limiter.acquire()
+            await limiter.release(0.5, ok=True)      # 延迟劣化
+            slow = limiter.limit
+            for _ in range(3):
+                await limiter.acquire()
+                await limiter.release(0.1, ok=True)
+            return shrunk, slow
+
+        (limit, backoff), slow = asyncio.run(scenario())
+        assert limit == 1 and backoff == 1.0
+        assert slow == 1
+        assert limiter.limit == 3
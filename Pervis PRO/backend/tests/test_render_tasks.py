@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+渲染任务状态测试
+验证任务列表以数据库为准并叠加注册表实时状态，以及取消不被排队中的进度写入覆盖
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.render_service_enhanced as render_service_enhanced
+from database import RenderTask
+from services.db_writer import DatabaseWriter
+from services.render_service_enhanced import EnhancedRenderService
+from services.task_registry import TaskRecord, TaskRegistry, TaskRegistryConfig
+
+
+class TestRenderTaskListing:
+    """渲染任务列表测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        self.engine = create_engine(f"sqlite:///{tmp_path / 'render.db'}")
+        RenderTask.__table__.create(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.registry = TaskRegistry(TaskRegistryConfig(db_path=str(tmp_path / "tasks.db"), flush_interval=60))
+        self.service = EnhancedRenderService(self.db)
+        self.service.registry = self.registry
+
+        base = datetime(2025, 1, 1, 12, 0, 0)
+        for i, status in enumerate(["completed", "failed", "pending"]):
+            self.db.execute(text("""
+                INSERT INTO render_tasks (id, timeline_id, status, progress, created_at)
+                VALUES (:id, 't1', :status, 0, :created_at)
+            """), {"id": f"r{i}", "status": status, "created_at": base + timedelta(minutes=i)})
+        self.db.commit()
+
+        yield
+
+        self.registry.close()
+        self.db.close()
+
+    def test_db_history_kept_with_live_tasks(self):
+        """测试有实时任务时仍列出数据库历史，实时状态覆盖尚未落库的行"""
+        self.registry.create("render", source="render", task_id="r2")
+        self.registry.update("r2", status="processing", progress=40)
+
+        tasks = asyncio.run(self.service.list_tasks(limit=10))
+        assert [t["id"] for t in tasks] == ["r2", "r1", "r0"]
+        assert tasks[0]["status"] == "processing" and tasks[0]["progress"] == 40
+        assert tasks[2]["status"] == "completed"
+
+    def test_registry_paged_not_loaded_in_full(self, monkeypatch):
+        """测试只从注册表取一页，且页外的数据库行仍能叠加实时状态"""
+        for i in range(30):
+            self.registry.create("render", source="render", task_id=f"live{i}")
+        # r1 的实时状态：创建时间早于全部实时任务，不在注册表的首页中
+        self.registry.put(TaskRecord(task_id="r1", task_type="render", source="render",
+                                     status="processing", created_at=datetime(2025, 1, 1, 12, 1).timestamp()))
+
+        limits = []
+        original = self.registry.list_tasks
+        monkeypatch.setattr(self.registry, "list_tasks",
+                            lambda **kw: limits.append(kw["limit"]) or original(**kw))
+
+        tasks = asyncio.run(self.service.list_tasks(limit=5))
+        assert limits == [5]
+        assert [t["id"] for t in tasks] == [f"live{i}" for i in range(29, 24, -1)]
+
+        failed = asyncio.run(self.service.list_tasks(limit=5, status_filter="failed"))
+        processing = asyncio.run(self.service.list_tasks(limit=5, status_filter="processing"))
+        assert failed == []
+        assert [t["id"] for t in processing] == ["r1"]
+
+    def test_status_filter_uses_live_status(self):
+        """测试状态过滤以叠加后的状态为准"""
+        self.registry.create("render", source="render", task_id="r2")
+        self.registry.update("r2", status="processing")
+
+        processing = asyncio.run(self.service.list_tasks(status_filter="processing"))
+        pending = asyncio.run(self.service.list_tasks(status_filter="pending"))
+        assert [t["id"] for t in processing] == ["r2"]
+        assert pending == []
+
+    def test_cancel_not_overwritten_by_queued_progress(self, monkeypatch):
+        """测试取消经写线程排在已入队的进度写入之后，且之后的进度写入不再改回状态"""
+        writer = DatabaseWriter(session_factory=sessionmaker(bind=self.engine))
+        monkeypatch.setattr(render_service_enhanced, "get_db_writer", lambda: writer)
+        self.registry.create("render", source="render", task_id="r2")
+
+        # 写线程忙时进度更新在队列中等待
+        gate = threading.Event()
+        writer.submit(lambda session: gate.wait(5))
+        self.service._update_task_status("r2", "processing", 40)
+        threading.Timer(0.1, gate.set).start()
+
+        assert asyncio.run(self.service.cancel_render("r2")) is True
+        self.service._update_task_status("r2", "processing", 60)   # 无法中止的渲染线程继续上报
+        assert writer.flush(5)
+        writer.close()
+
+        self.db.expire_all()
+        row = self.db.execute(text("SELECT status, progress FROM render_tasks WHERE id = 'r2'")).fetchone()
+        assert tuple(row) == ("cancelled", 40)
+        assert self.registry.get("r2").status == "cancelled"
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+场景检测缓存测试
+验证同一文件同一参数只检测一次、文件变化后失效、并发请求合并与 FFmpeg 输出解析
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.scene_detection import (
+    SceneCutCache,
+    SceneCuts,
+    SceneDetectionParams,
+    SceneDetectionService,
+    parse_ffmpeg_scene_output,
+)
+
+
+class RecordingDetector(SceneDetectionService):
+    """返回固定切点并记录检测次数的检测服务"""
+
+    def __init__(self, cache):
+        super().__init__(cache)
+        self.calls = []
+
+    def _detect_sync(self, video_path, params):
+        self.calls.append((video_path, params.key))
+        time.sleep(0.05)
+        return SceneCuts(cuts=[0.0, 4.0, 9.5], duration=12.0, detector="test")
+
+
+class TestSceneDetectionCache:
+    """场景检测缓存测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        self.db_path = str(tmp_path / "scene_cache.db")
+        self.video = tmp_path / "clip.mp4"
+        self.video.write_bytes(b"0" * 128)
+        self.detector = RecordingDetector(SceneCutCache(self.db_path))
+
+    def test_detected_once_per_file_and_params(self):
+        """测试同一参数复用缓存（含重启后），不同参数各检测一次"""
+        params = SceneDetectionParams(threshold=30.0)
+        first = asyncio.run(self.detector.detect(str(self.video), params))
+        second = asyncio.run(self.detector.detect(str(self.video), params))
+        restarted = RecordingDetector(SceneCutCache(self.db_path))
+        third = asyncio.run(restarted.detect(str(self.video), params))
+        asyncio.run(self.detector.detect(str(self.video), SceneDetectionParams(threshold=27.0)))
+
+        assert not first.cached and second.cached and third.cached
+        assert third.cuts == [0.0, 4.0, 9.5]
+        assert third.scenes() == [(0.0, 4.0), (4.0, 9.5), (9.5, 12.0)]
+        assert len(self.detector.calls) == 2 and restarted.calls == []
+
+    def test_keyframe_and_preprocessor_defaults_share_key(self, monkeypatch):
+        """测试关键帧提取与预处理的默认参数一致（同一缓存键），阈值可由环境变量统一调整"""
+        from models.keyframe import KeyFrameConfig
+
+        for value in (None, "32"):
+            if value is not None:
+                monkeypatch.setenv("SCENE_DETECT_THRESHOLD", value)
+            extractor_params = SceneDetectionParams.from_env(KeyFrameConfig().scene_threshold)
+            assert extractor_params.key == SceneDetectionParams.from_env().key
+        assert SceneDetectionParams.from_env().threshold == 32.0
+
+    def test_changed_file_invalidates(self):
+        """测试文件大小或 mtime 变化后重新检测"""
+        asyncio.run(self.detector.detect(str(self.video)))
+        self.video.write_bytes(b"1" * 256)
+        result = asyncio.run(self.detector.detect(str(self.video)))
+
+        assert not result.cached
+        assert len(self.detector.calls) == 2
+
+    def test_concurrent_requests_share_detection(self):
+        """测试并发请求同一文件只执行一次检测"""
+        async def scenario():
+            return await asyncio.gather(*[self.detector.detect(str(self.video)) for _ in range(5)])
+
+        results = asyncio.run(scenario())
+        assert len(self.detector.calls) == 1
+        assert all(r.cuts == [0.0, 4.0, 9.5] for r in results)
+
+    def test_missing_file(self):
+        """测试文件不存在时返回 None"""
+        assert asyncio.run(self.detector.detect(str(self.video) + ".missing")) is None
+        assert self.detector.calls == []
+
+    def test_parse_ffmpeg_output(self):
+        """测试解析 showinfo 切点与时长"""
+        stderr = (
+            "  Duration: 00:01:02.50, start: 0.000000, bitrate: 1000 kb/s\n"
+            "[Parsed_showinfo_2 @ 0x1] n:   0 pts:  90000 pts_time:3.6 duration: 1\n"
+            "[Parsed_showinfo_2 @ 0x1] n:   1 pts: 300000 pts_time:12.04 duration: 1\n"
+        )
+        result = parse_ffmpeg_scene_output(stderr)
+        assert result.cuts == [0.0, 3.6, 12.04]
+        assert result.duration == 62.5
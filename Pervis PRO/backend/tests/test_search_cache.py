@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+搜索结果缓存测试
+验证缓存命中、存储变更后隐式失效与 Redis 二级缓存
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.search_cache as search_cache
+from services.milvus_store import MemoryVideoStore, VideoSegment
+from services.search_cache import SearchResultCache
+from services.search_service import HybridSearchService, SearchMode, SearchRequest
+
+
+def make_segment(segment_id: str, **tags) -> VideoSegment:
+    return VideoSegment(segment_id, "v", f"/videos/{segment_id}.mp4", 0, 5, 5, tags=tags)
+
+
+class TestSearchResultCache:
+    """搜索结果缓存测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch):
+        """测试前准备"""
+        self.cache = SearchResultCache(max_entries=8)
+        monkeypatch.setattr(search_cache, "_search_cache", self.cache)
+
+        self.store = MemoryVideoStore()
+        self.store._initialized = True
+        asyncio.run(self.store.insert(make_segment("a", mood="紧张")))
+
+        self.service = HybridSearchService(video_store=self.store, embedding_service=object())
+        self.request = SearchRequest(tags={"mood": "紧张"}, mode=SearchMode.TAG_ONLY)
+
+    @pytest.mark.asyncio
+    async def test_repeated_request_hits(self):
+        """测试相同请求命中缓存"""
+        first = await self.service.search(self.request)
+        second = await self.service.search(SearchRequest(tags={"mood": "紧张"}, mode=SearchMode.TAG_ONLY))
+
+        assert [r.segment_id for r in second.results] == [r.segment_id for r in first.results]
+        stats = self.cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_store_mutation_invalidates(self):
+        """测试插入/删除后不再命中旧结果"""
+        await self.service.search(self.request)
+        await self.store.insert(make_segment("b", mood="紧张"))
+        response = await self.service.search(self.request)
+        assert {r.segment_id for r in response.results} == {"a", "b"}
+
+        await self.store.delete("a")
+        response = await self.service.search(self.request)
+        assert [r.segment_id for r in response.results] == ["b"]
+        assert self.cache.stats()["hits"] == 0
+
+    @pytest.mark.asyncio
+    async def test_redis_tier_round_trip(self):
+        """测试 LRU 淘汰后从 Redis 二级缓存恢复"""
+        self.cache.use_redis = True
+        first = await self.service.search(self.request)
+        self.cache.clear()
+
+        second = await self.service.search(self.request)
+        assert self.cache.stats()["redis_hits"] == 1
+        assert second.results[0].segment_id == first.results[0].segment_id
+        assert second.results[0].tags == {"mood": "紧张"}
+
+    @pytest.mark.asyncio
+    async def test_redis_tier_shared_across_workers(self, monkeypatch):
+        """测试 Redis 键使用共享版本：另一进程（不同存储实例）可命中，任一进程写入后全部失效"""
+        import services.cache_service as cache_service
+        monkeypatch.setattr(cache_service, "_cache_service", cache_service.CacheService(use_mock=True))
+
+        self.cache.use_redis = True
+        first = await self.service.search(self.request)
+
+        # 另一个 worker / 重启后的进程：新缓存实例、新存储实例（epoch 不同）、相同数据
+        other_cache = SearchResultCache(max_entries=8, use_redis=True)
+        monkeypatch.setattr(search_cache, "_search_cache", other_cache)
+        other_store = MemoryVideoStore()
+        other_store._initialized = True
+        await other_store.insert(make_segment("a", mood="紧张"))
+        other = HybridSearchService(video_store=other_store, embedding_service=object())
+
+        second = await other.search(self.request)
+        assert other_cache.stats()["redis_hits"] == 1
+        assert [r.segment_id for r in second.results] == [r.segment_id for r in first.results]
+
+        await other_store.insert(make_segment("b", mood="紧张"))
+        third = await other.search(self.request)
+        assert {r.segment_id for r in third.results} == {"a", "b"}
+        assert other_cache.stats()["redis_hits"] == 1
+        assert await cache_service.get_cache_service().get(SearchResultCache.VERSION_KEY) == 1
+
+        # 原进程的 LRU 清空后，从 Redis 取到的是共享最新版本下的结果，而不是旧条目
+        self.cache.clear()
+        monkeypatch.setattr(search_cache, "_search_cache", self.cache)
+        latest = await self.service.search(self.request)
+        assert self.cache.stats()["redis_hits"] == 1
+        assert {r.segment_id for r in latest.results} == {"a", "b"}
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+增强版搜索服务测试
+测试 TF-IDF 索引随存储变更增量维护
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.milvus_store import MemoryVideoStore, VideoSegment
+from services.search_service import SearchMode
+from services.search_service_enhanced import (
+    EnhancedSearchRequest,
+    EnhancedSearchService,
+    MatchAlgorithm,
+    TFIDFTagMatcher,
+)
+
+
+def make_segment(segment_id: str, **tags) -> VideoSegment:
+    return VideoSegment(segment_id, "v", f"/videos/{segment_id}.mp4", 0, 5, 5, tags=tags)
+
+
+class TestIncrementalTFIDF:
+    """TF-IDF 增量维护测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """测试前准备"""
+        self.store = MemoryVideoStore()
+        self.store._initialized = True
+        asyncio.run(self.store.insert_batch([
+            make_segment("a", scene_type="室内", mood="紧张"),
+            make_segment("b", scene_type="室外", mood="平静"),
+        ]))
+
+        self.service = EnhancedSearchService(video_store=self.store, embedding_service=object())
+        self.service._initialized = True
+        asyncio.run(self.service._build_tfidf_index())
+
+    async def search(self, **tags):
+        request = EnhancedSearchRequest(
+            tags=tags, mode=SearchMode.TAG_ONLY,
+            match_algorithm=MatchAlgorithm.TFIDF, deduplicate=False,
+        )
+        return await self.service._search_by_tags_enhanced(request)
+
+    @pytest.mark.asyncio
+    async def test_inserted_segment_is_searchable(self):
+        """测试索引构建后插入的片段可被检索"""
+        await self.store.insert(make_segment("c", scene_type="室内", mood="欢快", vfx=["雨"]))
+
+        results = await self.search(vfx=["雨"])
+        assert [r.segment_id for r in results] == ["c"]
+
+    @pytest.mark.asyncio
+    async def test_deleted_segment_is_dropped(self):
+        """测试删除的片段从索引移除"""
+        await self.store.delete("a")
+
+        results = await self.search(scene_type="室内")
+        assert results == []
+        assert self.service._tfidf_matcher.stats()["documents"] == 1
+
+    @pytest.mark.asyncio
+    async def test_scores_match_full_rebuild(self):
+        """测试增量维护后的分数与全量重建一致"""
+        for i in range(20):
+            await self.store.insert(make_segment(f"x{i}", scene_type="室内", characters=["男"] * (i % 3)))
+        await self.store.delete("b")
+
+        results = await self.search(scene_type="室内", characters=["男"])
+
+        rebuilt = TFIDFTagMatcher()
+        rebuilt.build_index([
+            {"segment_id": segment_id, "tags": segment.tags}
+            for segment_id, segment in self.store._segments.items()
+        ])
+        for item in results:
+            expected, _ = rebuilt.match_score(item.tags, {"scene_type": "室内", "characters": ["男"]})
+            assert item.score == pytest.approx(expected, abs=1e-5)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+存储聚合统计测试
+验证增量维护的计数器与逐片段扫描的结果一致
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.milvus_store import MemoryVideoStore, VideoSegment
+
+
+def make_segment(segment_id: str, embedding=None, **tags) -> VideoSegment:
+    return VideoSegment(segment_id, "v", "p", 0, 1, 1, tags=tags, embedding=embedding)
+
+
+class TestStoreAggregates:
+    """存储聚合计数器测试"""
+
+    @pytest.mark.asyncio
+    async def test_counters_follow_insert_replace_delete(self):
+        """测试插入、同 ID 替换、删除后计数正确"""
+        store = MemoryVideoStore()
+        await store.insert(make_segment("a", [0.1], scene_type="室内", mood="紧张", characters=["男"]))
+        await store.insert(make_segment("b", None, scene_type="UNKNOWN", mood="紧张", characters=[]))
+        await store.insert(make_segment("c", [0.2], scene_type="室外"))
+        await store.insert(make_segment("a", None, scene_type="室外", mood="平静"))
+        await store.delete("c")
+
+        stats = store.aggregates.coverage()
+        assert stats["total_assets"] == 2
+        assert stats["embedding_coverage"] == 0
+        assert stats["tag_coverage"]["scene_type"] == 0.5
+        assert stats["tag_coverage"]["mood"] == 1.0
+        assert stats["tag_coverage"]["characters"] == 0
+
+        facets = store.aggregates.facets()
+        assert facets["scene_type"] == {"室外": 1}
+        assert facets["mood"] == {"紧张": 1, "平静": 1}
+
+    @pytest.mark.asyncio
+    async def test_facets_field_selection(self):
+        """测试只返回请求的分面字段"""
+        store = MemoryVideoStore()
+        await store.insert(make_segment("a", shot_size="近景", mood="欢快"))
+
+        assert store.aggregates.facets(("shot_size",)) == {"shot_size": {"近景": 1}}
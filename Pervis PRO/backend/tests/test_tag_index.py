@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+标签倒排索引测试
+验证索引打分/过滤与逐片段扫描的结果一致，以及大规模过滤耗时
+"""
+
+import os
+import random
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.milvus_store import MemoryVideoStore, VideoSegment
+from services.search_service import TagMatcher
+from services.tag_index import TagInvertedIndex
+
+VALUES = {
+    "scene_type": ["室内", "室外", "UNKNOWN"],
+    "time_of_day": ["白天", "夜晚"],
+    "mood": ["紧张", "平静", "欢快"],
+    "characters": ["男", "女", "儿童"],
+    "vfx": ["爆炸", "雨"],
+}
+
+
+def random_tags(rng: random.Random):
+    tags = {}
+    for field, values in VALUES.items():
+        if field in ("characters", "vfx"):
+            tags[field] = rng.sample(values, rng.randint(0, 2))
+        elif rng.random() < 0.8:
+            tags[field] = rng.choice(values)
+    return tags
+
+
+class TestTagInvertedIndex:
+    """标签倒排索引测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """测试前准备：插入、删除、重新插入以覆盖序号复用"""
+        rng = random.Random(7)
+        self.index = TagInvertedIndex()
+        self.tags = {}
+        for i in range(500):
+            self.tags[f"s{i}"] = random_tags(rng)
+            self.index.add(f"s{i}", self.tags[f"s{i}"])
+        for i in range(0, 500, 5):
+            self.index.remove(f"s{i}")
+            del self.tags[f"s{i}"]
+        for i in range(0, 500, 10):
+            self.tags[f"s{i}"] = random_tags(rng)
+            self.index.add(f"s{i}", self.tags[f"s{i}"])
+
+    def test_weighted_scores_match_tag_matcher(self):
+        """测试加权得分与 TagMatcher 一致"""
+        query = {"scene_type": "室内", "mood": "紧张", "characters": ["男", "女", "男"]}
+        scores, total_weight = self.index.weighted_scores(query, TagMatcher.TAG_WEIGHTS)
+
+        for segment_id, tags in self.tags.items():
+            expected, _ = TagMatcher.match_score(tags, query)
+            ordinal = self.index.ordinal_of(segment_id)
+            assert scores[ordinal] / total_weight == pytest.approx(expected, abs=1e-6)
+
+    def test_top_k_order(self):
+        """测试 top_k 降序且同分按序号升序"""
+        query = {"mood": "平静", "vfx": ["雨"]}
+        scores, _ = self.index.weighted_scores(query, TagMatcher.TAG_WEIGHTS)
+        top = self.index.top_k(scores, 20)
+
+        expected = sorted(
+            (o for o in range(len(scores)) if scores[o] > 0),
+            key=lambda o: (-scores[o], o)
+        )[:20]
+        assert top.tolist() == expected
+
+    def test_filter_matches_store_semantics(self):
+        """测试过滤与 MemoryVideoStore._match_filters 一致"""
+        store = MemoryVideoStore()
+        filters = {"mood": "紧张", "characters": ["儿童"]}
+        expected = {
+            segment_id for segment_id, tags in self.tags.items()
+            if store._match_filters(VideoSegment(segment_id, "v", "p", 0, 1, 1, tags=tags), filters)
+        }
+        assert set(self.index.segment_ids(self.index.filter(filters))) == expected
+
+    def test_list_filter_on_scalar_values_uses_containment(self):
+        """测试列表过滤值对标量片段值沿用 `v in 值` 语义（等值或子串），match_counts 同理"""
+        store = MemoryVideoStore()
+        filters = {"time_of_day": ["夜"], "mood": ["欢", "平静"], "characters": ["女"]}
+        expected = {
+            segment_id for segment_id, tags in self.tags.items()
+            if store._match_filters(VideoSegment(segment_id, "v", "p", 0, 1, 1, tags=tags), filters)
+        }
+        assert set(self.index.segment_ids(self.index.filter(filters))) == expected
+        assert any(self.tags[s].get("time_of_day") == "夜晚" for s in expected)
+
+        ordinals, counts = self.index.match_counts({"time_of_day": ["夜"], "mood": "紧张"})
+        got = dict(zip(self.index.segment_ids(ordinals), counts.tolist()))
+        for segment_id, tags in self.tags.items():
+            count = int("夜" in tags.get("time_of_day", "")) + int(tags.get("mood") == "紧张")
+            assert got.get(segment_id, 0) == count
+
+        # 删除最后一个“夜晚”片段后子串候选随之清除
+        for segment_id, tags in list(self.tags.items()):
+            if tags.get("time_of_day") == "夜晚":
+                self.index.remove(segment_id)
+        assert len(self.index.filter({"time_of_day": ["夜"]})) == len(self.index) - sum(
+            1 for tags in self.tags.values() if tags.get("time_of_day") == "白天"
+        )
+
+    @pytest.mark.asyncio
+    async def test_store_maintains_index(self):
+        """测试存储插入/删除时维护索引"""
+        store = MemoryVideoStore()
+        await store.insert(VideoSegment("a", "v", "p", 0, 1, 1, tags={"mood": "紧张"}))
+        await store.insert(VideoSegment("b", "v", "p", 0, 1, 1, tags={"mood": "平静"}))
+        await store.insert(VideoSegment("a", "v", "p", 0, 1, 1, tags={"mood": "平静"}))
+
+        results = await store.search_by_tags({"mood": "平静"})
+        assert [r.segment.segment_id for r in results] == ["a", "b"]
+
+        await store.delete("a")
+        results = await store.search_by_tags({"mood": "平静"})
+        assert [r.segment.segment_id for r in results] == ["b"]
+        assert len(store.tag_index) == 1
+
+
+class TestTagIndexFilterPerformance:
+    """标签过滤耗时测试"""
+
+    def test_filter_40k_segments_under_1ms(self):
+        """测试 4 万片段上 3 个标签条件的过滤在 1 ms 内（取多次最快值），且增删后掩码正确"""
+        rng = random.Random(11)
+        index = TagInvertedIndex()
+        tags = {}
+        for i in range(40000):
+            tags[f"s{i}"] = random_tags(rng)
+            index.add(f"s{i}", tags[f"s{i}"])
+        for i in range(0, 40000, 7):
+            index.remove(f"s{i}")
+            del tags[f"s{i}"]
+
+        filters = {"mood": "紧张", "time_of_day": "夜晚", "characters": ["男"]}
+        index.filter(filters)     # 物化倒排数组
+        timings = []
+        for _ in range(20):
+            start = time.perf_counter()
+            result = index.filter(filters)
+            timings.append(time.perf_counter() - start)
+        assert min(timings) < 0.001
+
+        store = MemoryVideoStore()
+        expected = {
+            segment_id for segment_id, segment_tags in tags.items()
+            if store._match_filters(VideoSegment(segment_id, "v", "p", 0, 1, 1, tags=segment_tags), filters)
+        }
+        assert set(index.segment_ids(result)) == expected
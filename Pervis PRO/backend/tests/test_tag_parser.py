@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+标签解析器测试
+验证自动机的最左最长匹配、单选/多选字段解析、标签列表解析与从存储增量学习标签值
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.milvus_store import MemoryVideoStore, VideoSegment
+from services.tag_parser import TagAutomaton, TagParser
+
+
+class TestTagParser:
+    """标签解析器测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """测试前准备"""
+        self.parser = TagParser()
+
+    def test_automaton_finds_overlapping_keywords(self):
+        """测试自动机找出全部（含重叠、后缀）命中"""
+        automaton = TagAutomaton()
+        for keyword in ["雨", "雨夜", "夜", "夜色", "色彩"]:
+            automaton.add(keyword, "free_tags", keyword)
+        found = [(m.keyword, m.start) for m in automaton.find("小雨夜色")]
+        assert sorted(found) == [("夜", 2), ("夜色", 2), ("雨", 1), ("雨夜", 1)]
+
+    def test_parse_structured_tags(self):
+        """测试文本解析为结构化标签"""
+        tags = self.parser.parse("夜晚的森林里善逸追逐敌人，大特写")
+        assert tags["time_of_day"] == "NIGHT"
+        assert tags["action_type"] == "CHASE"
+        assert tags["shot_size"] == "ECU"          # 最长匹配：大特写 而非 特写
+        assert tags["characters"][0] == "善逸"
+        assert tags["source_work"] == ["鬼灭之刃"]
+
+        assert self.parser.parse("紧张危险的对决", fields=["mood"]) == {"mood": "TENSE"}
+        assert self.parser.parse("print it") == {}   # ASCII 关键词需单词边界
+        assert self.parser.parse("an INT scene")["scene_type"] == "INT"
+        assert self.parser.keywords("悲伤的离别，悲伤") == ["悲伤", "离别"]
+
+    def test_parse_tag_list_merges_explicit_and_parsed(self):
+        """测试 key:value 与词表解析命中同一多选字段时合并为列表（两种顺序）"""
+        assert self.parser.parse_tag_list(["characters:炭治郎", "善逸"])["characters"] == ["炭治郎", "善逸"]
+        assert self.parser.parse_tag_list(["善逸", "characters:炭治郎"])["characters"] == ["善逸", "炭治郎"]
+
+        tags = self.parser.parse_tag_list(["夜晚", "time_of_day:DAY", "free_tags:雨", "蒸汽朋克"])
+        assert tags["time_of_day"] == "DAY"            # 单选字段以显式值为准
+        assert tags["free_tags"] == ["雨", "夜晚", "蒸汽朋克"]
+
+    def test_learns_store_values_incrementally(self):
+        """测试订阅存储后学习已有与新插入的标签值"""
+        store = MemoryVideoStore()
+        asyncio.run(store.insert(VideoSegment("a", "v", "p", 0, 1, 1, tags={"props": ["日轮刀鞘"]})))
+        parser = TagParser()
+        parser.attach_store(store)
+        assert parser.parse("拔出日轮刀鞘")["props"] == ["日轮刀鞘"]
+
+        assert "free_tags" not in parser.parse("蒸汽朋克城市")
+        asyncio.run(store.insert(VideoSegment("b", "v", "p", 0, 1, 1, tags={"free_tags": ["蒸汽朋克"]})))
+        assert parser.parse("蒸汽朋克城市")["free_tags"] == ["蒸汽朋克"]
+
+        parser.load_hierarchy([("废弃工厂", "location"), ("赛博", "visual_style")])
+        tags = parser.parse("赛博风格的废弃工厂")
+        assert tags["environment"] == ["废弃工厂"] and tags["free_tags"] == ["赛博"]
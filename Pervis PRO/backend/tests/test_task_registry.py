@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+任务注册表测试
+测试内存索引、分页、write-behind 持久化和 TTL 淘汰
+"""
+
+import os
+import sqlite3
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.task_registry import BACKEND_DIR, TaskRegistry, TaskRegistryConfig
+
+
+class TestTaskRegistry:
+    """任务注册表测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        self.db_path = str(tmp_path / "tasks.db")
+        self.registry = TaskRegistry(TaskRegistryConfig(db_path=self.db_path, flush_interval=60))
+
+        yield
+
+        self.registry.close()
+
+    def test_create_and_update(self):
+        """测试创建和更新任务"""
+        record = self.registry.create("parse_script", source="wizard")
+        self.registry.update(record.task_id, status="working", progress=50, asset_id="a1")
+
+        task = self.registry.get(record.task_id)
+        assert task.status == "working"
+        assert task.progress == 50
+        assert task.details["asset_id"] == "a1"
+        assert self.registry.count(status="working", source="wizard") == 1
+        assert self.registry.count(status="pending") == 0
+
+    def test_list_tasks_pagination(self):
+        """测试分页按创建时间倒序"""
+        ids = [self.registry.create("render", source="render").task_id for _ in range(25)]
+        self.registry.create("other", source="batch")
+
+        page = self.registry.list_tasks(source="render", offset=0, limit=10)
+        assert page["total"] == 25
+        assert page["has_more"]
+        assert [r.task_id for r in page["items"]] == ids[::-1][:10]
+
+        last = self.registry.list_tasks(source="render", offset=20, limit=10)
+        assert [r.task_id for r in last["items"]] == ids[::-1][20:]
+        assert not last["has_more"]
+
+    def test_list_tasks_combined_filters(self):
+        """测试来源 + 状态 + 类型组合过滤"""
+        a = self.registry.create("video_processing", source="batch")
+        self.registry.create("transcription", source="batch")
+        self.registry.update(a.task_id, status="completed")
+
+        page = self.registry.list_tasks(status="completed", source="batch")
+        assert [r.task_id for r in page["items"]] == [a.task_id]
+
+        page = self.registry.list_tasks(status="completed", source="batch", task_type="transcription")
+        assert page["total"] == 0
+
+    def test_failed_flush_keeps_pending_writes(self, monkeypatch):
+        """测试写回失败时变更与删除并回待写集合，期间的新变更不被旧快照覆盖"""
+        kept = self.registry.create("parse_script", source="wizard")
+        changed = self.registry.create("parse_script", source="wizard")
+        removed = self.registry.create("parse_script", source="wizard")
+        self.registry.flush()
+        self.registry.update(kept.task_id, progress=10)
+        self.registry.update(changed.task_id, progress=20)
+        self.registry.delete(removed.task_id)
+
+        original = self.registry._db
+
+        def locked_db():
+            self.registry.update(changed.task_id, progress=30)   # 写入期间再次变更
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(self.registry, "_db", locked_db)
+        with pytest.raises(sqlite3.OperationalError):
+            self.registry.flush()
+        assert set(self.registry._dirty) == {kept.task_id, changed.task_id}
+        assert self.registry._deleted == {removed.task_id}
+
+        monkeypatch.setattr(self.registry, "_db", original)
+        assert self.registry.flush() == 2
+        self.registry.close()
+
+        reloaded = TaskRegistry(TaskRegistryConfig(db_path=self.db_path, flush_interval=60))
+        try:
+            assert reloaded.get(kept.task_id).progress == 10
+            assert reloaded.get(changed.task_id).progress == 30
+            assert reloaded.get(removed.task_id) is None
+        finally:
+            reloaded.close()
+
+    def test_relative_db_path_resolved_from_backend_dir(self):
+        """测试相对路径以 backend 目录为基准，与工作目录无关"""
+        config = TaskRegistryConfig()
+        assert config.db_path == str(BACKEND_DIR / "data" / "task_registry.db")
+        assert TaskRegistryConfig(db_path=self.db_path).db_path == self.db_path
+        assert TaskRegistryConfig(db_path=":memory:").db_path == ":memory:"
+
+    def test_persistence_and_restart(self):
+        """测试写回后重启可恢复，未结束任务标记为中断"""
+        done = self.registry.create("parse_script", source="wizard")
+        running = self.registry.create("parse_script", source="wizard")
+        self.registry.update(done.task_id, status="completed", result={"ok": True})
+        self.registry.update(running.task_id, status="working")
+        self.registry.close()
+
+        reloaded = TaskRegistry(TaskRegistryConfig(db_path=self.db_path, flush_interval=60))
+        try:
+            assert reloaded.get(done.task_id).result == {"ok": True}
+            assert reloaded.get(running.task_id).status == "failed"
+        finally:
+            reloaded.close()
+
+    def test_evict_finished_tasks(self):
+        """测试淘汰已结束任务，淘汰后仍可从 SQLite 回查"""
+        done = self.registry.create("render", source="render")
+        active = self.registry.create("render", source="render")
+        self.registry.update(done.task_id, status="completed")
+        self.registry.flush()
+
+        assert self.registry.evict_expired(ttl=0) == 1
+        assert self.registry.count(source="render") == 1
+        assert self.registry.get(active.task_id).status == "pending"
+        assert self.registry.get(done.task_id).status == "completed"
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+共享文本编码服务测试
+验证查询向量缓存命中不再调用模型，以及并发请求合并为一次批量编码
+"""
+
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.text_encoder import TextEncoderService
+
+
+class CountingModel:
+    """记录 encode 调用的嵌入模型"""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t)), 1.0] for t in texts])
+
+
+class TestTextEncoder:
+    """文本编码服务测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """测试前准备"""
+        self.model = CountingModel()
+        self.encoder = TextEncoderService(cache_size=2, model=self.model)
+
+    @pytest.mark.asyncio
+    async def test_cached_query_skips_model(self):
+        """测试规范化后相同的查询命中缓存"""
+        first = await self.encoder.encode_one("雨夜  街头 追逐")
+        second = await self.encoder.encode_one(" 雨夜 街头\n追逐 ")
+
+        assert first == second == [8.0, 1.0]
+        assert self.model.calls == [["雨夜 街头 追逐"]]
+        assert self.encoder.stats()["hits"] == 1
+
+        # LRU 淘汰最久未使用的条目
+        await self.encoder.encode(["a", "bb"])
+        await self.encoder.encode_one("雨夜 街头 追逐")
+        assert len(self.model.calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_are_batched(self):
+        """测试并发请求合并为一次模型调用，且不缓存时不写入 LRU"""
+        results = await asyncio.gather(
+            self.encoder.encode_one("甲"),
+            self.encoder.encode(["乙乙", "甲"]),
+            self.encoder.encode_one("丙丙丙", use_cache=False),
+        )
+
+        assert results == [[1.0, 1.0], [[2.0, 1.0], [1.0, 1.0]], [3.0, 1.0]]
+        assert len(self.model.calls) == 1
+        assert sorted(self.model.calls[0]) == ["丙丙丙", "乙乙", "甲"]
+        assert self.encoder.stats()["cache_entries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_unavailable_model_returns_none(self):
+        """测试模型不可用时返回 None"""
+        encoder = TextEncoderService(model=False)
+        assert await encoder.encode_one("查询") is None
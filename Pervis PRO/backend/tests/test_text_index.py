@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+FTS5 全文检索索引测试
+验证中文 bigram 分词、写入同步、BM25 片段级命中、视觉特征预筛与迁移回填
+"""
+
+import asyncio
+import importlib
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from app.sqlite_mode import create_async_database_engine
+from database import Base
+from models.base import AssetCreate
+from services.database_service import DatabaseService
+from services.text_index import build_match_query, create_schema, ensure_index, get_text_index, tokenize
+
+TRANSCRIPTION = {
+    "full_text": "夜晚的城市灯火通明。主角在雨中奔跑。城市的清晨很安静。",
+    "language": "zh",
+    "segments": [
+        {"id": "t1", "start_time": 0.0, "end_time": 3.0, "text": "夜晚的城市灯火通明", "confidence": 0.9},
+        {"id": "t2", "start_time": 3.0, "end_time": 6.0, "text": "主角在雨中奔跑", "confidence": 0.8},
+        {"id": "t3", "start_time": 6.0, "end_time": 9.0, "text": "城市的清晨很安静，城市醒来", "confidence": 0.7},
+    ],
+}
+
+VISUAL = {
+    "duration": 12.0,
+    "keyframes": [
+        {"frame_index": 0, "timestamp": 0.0, "analysis": {"summary": "霓虹灯下的街道"}},
+        {"frame_index": 30, "timestamp": 1.0, "analysis": {"brightness": 90.0}},
+    ],
+    "visual_description": {
+        "visual_summary": {
+            "brightness_level": "very_bright",
+            "color_tone": "warm",
+            "visual_complexity": "high",
+            "lighting_quality": "natural",
+        },
+        "visual_tags": ["very_bright", "warm_tone"],
+    },
+}
+
+
+class TestTokenizer:
+    """分词与查询构造测试"""
+
+    def test_cjk_bigrams_and_words(self):
+        """测试中文按重叠二元组、英文按单词切分"""
+        assert tokenize("夜晚的城市 Night city_lights") == [
+            "夜晚", "晚的", "的城", "城市", "night", "city", "lights"
+        ]
+        assert tokenize("雨") == ["雨"]
+
+    def test_match_query(self):
+        """测试 MATCH 表达式（单字前缀匹配、去重、引号转义）"""
+        assert build_match_query("雨 城市 城市") == '"雨"* OR "城市"'
+        assert build_match_query("bright warm", operator="AND", prefix=True) == '"bright"* AND "warm"*'
+        assert build_match_query("，。!") is None
+
+
+class TestTextSearchIndex:
+    """DatabaseService 全文检索测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path, monkeypatch):
+        """测试前准备"""
+        self.url = f"sqlite:///{tmp_path / 'fts.db'}"
+        self.sync_engine = create_engine(self.url)
+        Base.metadata.create_all(self.sync_engine)
+
+        self.engine = create_async_database_engine(self.url, mode="production")
+        factory = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        monkeypatch.setattr(database, "_async_session_factory", factory)
+        yield
+        asyncio.run(self.engine.dispose())
+        self.sync_engine.dispose()
+
+    def _create_schema(self):
+        with self.sync_engine.begin() as conn:
+            assert ensure_index(conn)
+
+    async def _asset_with_data(self, service):
+        asset = await service.create_asset(
+            AssetCreate(project_id="p1", filename="city.mp4", mime_type="video/mp4")
+        )
+        await service.store_transcription_data(asset.id, TRANSCRIPTION)
+        await service.store_visual_data(asset.id, VISUAL)
+        return asset
+
+    def test_transcription_hits_ranked_by_bm25(self):
+        """测试转录检索返回按 BM25 排序的片段级命中，重新写入时替换旧文档"""
+        self._create_schema()
+
+        async def scenario():
+            service = DatabaseService()
+            asset = await self._asset_with_data(service)
+            ranked = await service.search_transcription_text("城市")
+            await service.store_transcription_data(asset.id, {
+                "language": "zh",
+                "segments": [{"id": "n1", "start_time": 0.0, "end_time": 1.0, "text": "海边日落", "confidence": 1.0}],
+            })
+            stale = await service.search_transcription_text("城市")
+            fresh = await service.search_transcription_text("日落")
+            return asset, ranked, stale, fresh
+
+        asset, ranked, stale, fresh = asyncio.run(scenario())
+        assert len(ranked) == 1 and ranked[0]["asset_id"] == asset.id
+        segments = ranked[0]["matching_segments"]
+        assert [s["segment_id"] for s in segments] == ["t3", "t1"]   # t3 含两次“城市”
+        assert segments[0]["score"] > segments[1]["score"] > 0
+        assert segments[0]["confidence"] == 0.7
+        assert stale == []
+        assert [s["segment_id"] for s in fresh[0]["matching_segments"]] == ["n1"]
+
+    def test_partial_bigram_not_matched(self):
+        """测试只共享部分二元组的转录片段不命中，索引与扫描回退结果一致"""
+        self._create_schema()
+
+        async def scenario():
+            service = DatabaseService()
+            asset = await service.create_asset(
+                AssetCreate(project_id="p1", filename="slayer.mp4", mime_type="video/mp4")
+            )
+            await service.store_transcription_data(asset.id, {
+                "language": "zh",
+                "full_text": "炭治郎拔刀 善逸喊治郎",
+                "segments": [
+                    {"id": "s1", "start_time": 0.0, "end_time": 1.0, "text": "炭治郎拔刀", "confidence": 1.0},
+                    {"id": "s2", "start_time": 1.0, "end_time": 2.0, "text": "善逸喊治郎", "confidence": 1.0},
+                ],
+            })
+            return (
+                await service.search_transcription_text("炭治郎"),
+                await service._scan_transcription_text("炭治郎", 10),
+            )
+
+        indexed, scanned = asyncio.run(scenario())
+        assert [s["segment_id"] for s in indexed[0]["matching_segments"]] == ["s1"]
+        assert [s["segment_id"] for s in scanned[0]["matching_segments"]] == ["s1"]
+
+    def test_segment_level_hits_across_sources(self):
+        """测试片段描述、关键帧描述与转录片段共同参与检索，可按来源过滤"""
+        self._create_schema()
+
+        async def scenario():
+            service = DatabaseService()
+            asset = await self._asset_with_data(service)
+            async with service.batch():
+                segment = await service.create_asset_segment(asset.id, 2.0, 5.0, "雨夜街道上的霓虹灯", {})
+            all_hits = await service.search_text_segments("霓虹灯")
+            segment_hits = await service.search_text_segments("霓虹灯", sources=["segment"])
+            return segment, all_hits, segment_hits
+
+        segment, all_hits, segment_hits = asyncio.run(scenario())
+        assert {(h["source"], h["ref_id"]) for h in all_hits} == {("segment", segment.id), ("keyframe", "0")}
+        assert [h["ref_id"] for h in segment_hits] == [segment.id]
+        assert segment_hits[0]["start_time"] == 2.0 and segment_hits[0]["end_time"] == 5.0
+
+    def test_visual_features_prefiltered_by_index(self):
+        """测试视觉特征检索经索引预筛后仍按原规则精确匹配"""
+        self._create_schema()
+
+        async def scenario():
+            service = DatabaseService()
+            asset = await self._asset_with_data(service)
+            return (
+                asset,
+                await service.search_visual_features({"brightness_level": "bright", "color_tone": "warm"}),
+                await service.search_visual_features({"color_tone": "cool"}),
+            )
+
+        asset, matched, unmatched = asyncio.run(scenario())
+        assert [r["asset_id"] for r in matched] == [asset.id]
+        assert unmatched == []
+
+    def test_fallback_without_index(self):
+        """测试索引表不存在时回退到扫描匹配"""
+        async def scenario():
+            service = DatabaseService()
+            await self._asset_with_data(service)
+            return (
+                await service.search_transcription_text("雨中"),
+                await service.search_text_segments("雨中"),
+            )
+
+        scanned, hits = asyncio.run(scenario())
+        assert [s["segment_id"] for s in scanned[0]["matching_segments"]] == ["t2"]
+        assert hits == []
+
+    def test_empty_index_not_used_until_populated(self):
+        """测试仅建表（未回填）时仍走扫描匹配，ensure_index 回填已有数据后切换到索引"""
+        async def prepare():
+            service = DatabaseService()
+            await self._asset_with_data(service)
+
+        asyncio.run(prepare())
+        with self.sync_engine.begin() as conn:
+            assert create_schema(conn)
+
+        async def search():
+            service = DatabaseService()
+            return await service.search_transcription_text("雨中"), await service.search_text_segments("雨中")
+
+        scanned, hits = asyncio.run(search())
+        assert [s["segment_id"] for s in scanned[0]["matching_segments"]] == ["t2"]
+        assert hits == []
+
+        with self.sync_engine.begin() as conn:
+            assert ensure_index(conn)
+        indexed, hits = asyncio.run(search())
+        assert [s["segment_id"] for s in indexed[0]["matching_segments"]] == ["t2"]
+        assert [(h["source"], h["ref_id"]) for h in hits] == [("transcript", "t2")]
+
+        # 已回填且分词方式一致时不再重建
+        with self.sync_engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM text_documents")
+            assert ensure_index(conn)
+            assert conn.exec_driver_sql("SELECT COUNT(*) FROM text_documents").scalar() == 0
+        assert get_text_index().tokenizer == "bigram"
+
+    def test_migration_backfills_existing_data(self):
+        """测试迁移 011 从已有数据重建索引"""
+        async def prepare():
+            service = DatabaseService()
+            asset = await self._asset_with_data(service)
+            await service.create_asset_segment(asset.id, 0.0, 2.0, "清晨的城市", {})
+            return asset
+
+        asset = asyncio.run(prepare())
+        migration = importlib.import_module("migrations.011_add_text_search_index")
+        migration.upgrade(self.sync_engine)
+
+        async def search():
+            service = DatabaseService()
+            return await service.search_text_segments("清晨")
+
+        hits = asyncio.run(search())
+        assert sorted(h["source"] for h in hits) == ["segment", "transcript"]
+        assert [h["ref_id"] for h in hits if h["source"] == "transcript"] == ["t3"]
+        assert all(h["asset_id"] == asset.id for h in hits)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+量化向量列测试
+验证量化搜索经精确重排后与 float32 精确搜索一致，以及视觉向量存储的量化模式
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_index import VectorColumn, VectorQuantization
+from services.visual_vector_store import VisualVectorStore
+
+
+class TestVectorIndex:
+    """量化向量列测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """测试前准备"""
+        rng = np.random.default_rng(11)
+        self.data = rng.normal(size=(300, 32)).astype(np.float32)
+        self.queries = rng.normal(size=(5, 32)).astype(np.float32)
+        self.queries /= np.linalg.norm(self.queries, axis=1, keepdims=True)
+        self.tmp_path = tmp_path
+
+    def build(self, quantization: VectorQuantization) -> VectorColumn:
+        column = VectorColumn(quantization, path=str(self.tmp_path / f"{quantization.value}.f32"))
+        for row, vector in enumerate(self.data):
+            column.set(row, vector)
+        column.clear(3)
+        return column
+
+    @pytest.mark.parametrize("quantization", [VectorQuantization.FLOAT16, VectorQuantization.INT8])
+    def test_quantized_rerank_matches_exact(self, quantization):
+        """测试量化搜索重排后的结果与精确搜索一致（含掩码）"""
+        exact = self.build(VectorQuantization.NONE)
+        column = self.build(quantization)
+        mask = np.arange(300) % 2 == 1
+
+        masks = [None, mask, None, mask, None]
+        for (rows, scores), (exact_rows, exact_scores) in zip(
+            column.search(self.queries, masks, 10), exact.search(self.queries, masks, 10)
+        ):
+            assert rows.tolist() == exact_rows.tolist()
+            assert scores == pytest.approx(exact_scores, abs=1e-5)
+            assert 3 not in rows.tolist()
+
+        assert column.nbytes() < exact.nbytes()
+        assert column.get(5) == pytest.approx(self.data[5].tolist(), abs=1e-4)
+
+    def test_default_path_is_per_instance(self):
+        """测试未指定文件时各实例使用独立临时文件，互不覆盖，关闭/回收后删除"""
+        first = VectorColumn(VectorQuantization.INT8, dim=32)
+        second = VectorColumn(VectorQuantization.INT8, dim=32)
+        assert first.path != second.path
+
+        for row, vector in enumerate(self.data[:20]):
+            first.set(row, vector)
+        second.set(0, self.data[100])
+        assert first.get(0) == pytest.approx(self.data[0].tolist(), abs=1e-4)
+        assert second.get(0) == pytest.approx(self.data[100].tolist(), abs=1e-4)
+
+        first_path, second_path = first.path, second.path
+        first.close()
+        del second
+        assert not os.path.exists(first_path) and not os.path.exists(second_path)
+
+    def test_visual_store_quantized_search(self):
+        """测试视觉向量存储量化模式的搜索、读取与持久化"""
+        stores = [
+            VisualVectorStore(dimension=32, storage_path=str(self.tmp_path / mode), quantization=mode)
+            for mode in ("none", "int8")
+        ]
+        for store in stores:
+            for i, vector in enumerate(self.data[:60]):
+                store.add(f"kf{i}", f"a{i % 4}", vector.tolist(), frame_index=i, timestamp=float(i))
+            store.remove("kf8")
+            store.remove_by_asset("a3")
+
+        plain, quantized = stores
+        for query in self.queries:
+            expected = plain.search(query.tolist(), top_k=5, asset_filter=["a0", "a1"])
+            actual = quantized.search(query.tolist(), top_k=5, asset_filter=["a0", "a1"])
+            assert [r.keyframe_id for r in actual] == [r.keyframe_id for r in expected]
+            assert all(r.asset_id in ("a0", "a1") for r in actual)
+
+        assert quantized.get("kf1").vector == pytest.approx(self.data[1].tolist(), abs=1e-4)
+        assert quantized.get("kf8") is None and quantized.stats()["total_vectors"] == 44
+
+        assert quantized.save()
+        quantized._column.close()
+        restored = VisualVectorStore(dimension=32, storage_path=quantized.storage_path, quantization="int8")
+        assert restored.load()
+        query = self.queries[0].tolist()
+        assert [r.keyframe_id for r in restored.search(query, top_k=5)] == \
+               [r.keyframe_id for r in plain.search(query, top_k=5)]
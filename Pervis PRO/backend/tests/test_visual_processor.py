@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+视觉处理帧采样测试
+验证顺序读取采样器只解码输出采样帧、采样序号正确
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.visual_processor import iter_sampled_frames
+
+
+class RecordingCapture:
+    """按顺序返回帧并记录 grab / retrieve 调用的视频源"""
+
+    def __init__(self, frame_count: int):
+        self.frames = [np.full((4, 6, 3), i % 256, dtype=np.uint8) for i in range(frame_count)]
+        self.position = -1
+        self.grabs = 0
+        self.retrieved = []
+
+    def grab(self):
+        if self.position + 1 >= len(self.frames):
+            return False
+        self.position += 1
+        self.grabs += 1
+        return True
+
+    def retrieve(self):
+        self.retrieved.append(self.position)
+        return True, self.frames[self.position]
+
+
+class TestFrameSampler:
+    """顺序读取采样器测试"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """测试前准备"""
+        self.cap = RecordingCapture(125)
+
+    def test_retrieves_only_sampled_frames(self):
+        """测试每帧只 grab 一次，只有采样帧被 retrieve"""
+        sampled = list(iter_sampled_frames(self.cap, 30))
+
+        assert [idx for idx, _ in sampled] == [0, 30, 60, 90, 120]
+        assert self.cap.retrieved == [0, 30, 60, 90, 120]
+        assert self.cap.grabs == 125
+        assert all(int(frame[0, 0, 0]) == idx for idx, frame in sampled)
+
+    def test_interval_floor_and_small_frames(self):
+        """测试采样间隔不足 1 时逐帧采样，小于上限的帧不缩放"""
+        sampled = list(iter_sampled_frames(RecordingCapture(3), 0, max_side=640))
+
+        assert [idx for idx, _ in sampled] == [0, 1, 2]
+        assert sampled[0][1].shape == (4, 6, 3)
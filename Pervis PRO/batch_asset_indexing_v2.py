@@ -441,21 +441,24 @@ class BatchAssetIndexerV2:
             if self.use_visual_embedding and self.clip_service and self.visual_store and keyframes:
                 try:
                     visual_count = 0
-                    for kf in keyframes:
-                        if kf.image_path and os.path.exists(kf.image_path):
-                            visual_vec = await self.clip_service.embed_image(kf.image_path)
-                            if visual_vec:
-                                self.visual_store.add(
-                                    keyframe_id=f"{segment_id}_kf_{kf.frame_index:04d}",
-                                    asset_id=segment_id,
-                                    vector=visual_vec,
-                                    frame_index=kf.frame_index,
-                                    timestamp=kf.timestamp,
-                                    timecode=kf.timecode,
-                                    thumbnail_path=kf.image_path,
-                                    metadata={"scene_id": kf.scene_id},
-                                )
-                                visual_count += 1
+                    valid_keyframes = [kf for kf in keyframes if kf.image_path and os.path.exists(kf.image_path)]
+                    # 一个文件的全部关键帧一次批量嵌入
+                    visual_vecs = await self.clip_service.embed_images_batch(
+                        [kf.image_path for kf in valid_keyframes]
+                    )
+                    for kf, visual_vec in zip(valid_keyframes, visual_vecs):
+                        if visual_vec:
+                            self.visual_store.add(
+                                keyframe_id=f"{segment_id}_kf_{kf.frame_index:04d}",
+                                asset_id=segment_id,
+                                vector=visual_vec,
+                                frame_index=kf.frame_index,
+                                timestamp=kf.timestamp,
+                                timecode=kf.timecode,
+                                thumbnail_path=kf.image_path,
+                                metadata={"scene_id": kf.scene_id},
+                            )
+                            visual_count += 1
                     if visual_count > 0:
                         self.stats.visual_embedded += 1
                 except Exception as e: